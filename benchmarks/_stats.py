@@ -0,0 +1,17 @@
+"""Small helpers shared by the benchmark scripts."""
+
+
+def percentile(samples, pct):
+    """Return the ``pct`` percentile of ``samples`` (nearest-rank)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def format_latency(samples):
+    return (
+        f"p50={percentile(samples, 50) * 1000:.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:.2f}ms"
+    )
@@ -0,0 +1,137 @@
+"""Benchmark a cold browser launch per page against the warm browser pool.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_browser --pages 200 --concurrency 8
+
+Needs Playwright's Chromium (``python -m playwright install chromium``). A
+local static HTML server stands in for the site, so the numbers show the cost
+of starting browsers and contexts rather than of the network.
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from benchmarks._stats import format_latency
+from scrapers.browser.pool import BrowserPool, PlaywrightLauncher, chromium_memory
+
+PAGE = """<!doctype html>
+<html><head><title>Item {n}</title></head>
+<body><ul>{items}</ul><script>document.title += " (rendered)";</script></body>
+</html>"""
+
+
+def make_app(items):
+    rows = "".join(f'<li class="item">Item {n}</li>' for n in range(items))
+
+    async def page(request):
+        body = PAGE.format(n=request.match_info["n"], items=rows)
+        return web.Response(text=body, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/page/{n}", page)
+    return app
+
+
+async def visit(page, url):
+    await page.goto(url)
+    if not (await page.title()).endswith("(rendered)"):
+        raise SystemExit(f"page did not render: {url}")
+
+
+async def cold(urls, concurrency):
+    launcher = PlaywrightLauncher()
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(url):
+        async with limit:
+            start = time.perf_counter()
+            browser = await launcher()
+            try:
+                await visit(await browser.new_page(), url)
+            finally:
+                await browser.close()
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        await asyncio.gather(*(one(url) for url in urls))
+    finally:
+        await launcher.close()
+    return latencies, len(urls), None
+
+
+async def pooled(urls, concurrency, args):
+    latencies = []
+    peak_memory = 0
+    pool = BrowserPool(
+        max_browsers=args.browsers,
+        max_contexts=max(1, concurrency // args.browsers),
+        max_pages=args.max_pages,
+    )
+
+    async def one(url):
+        nonlocal peak_memory
+        start = time.perf_counter()
+        async with pool.page() as page:
+            await visit(page, url)
+            if pool.stats.checkouts % 20 == 0:
+                memory = await chromium_memory(page.context.browser)
+                peak_memory = max(peak_memory, memory or 0)
+        latencies.append(time.perf_counter() - start)
+
+    async with pool:
+        await asyncio.gather(*(one(url) for url in urls))
+    return latencies, pool.stats.launches, peak_memory
+
+
+def report(name, wall, latencies, launches, peak_memory):
+    print(f"{name}:")
+    print(f"  wall time:    {wall:.2f}s")
+    print(f"  throughput:   {len(latencies) / wall:.1f} pages/sec")
+    print(f"  latency:      {format_latency(latencies)}")
+    print(f"  launches:     {launches}")
+    if peak_memory:
+        print(f"  peak memory:  {peak_memory / 2**20:.0f} MiB per browser")
+
+
+async def run(args):
+    runner = web.AppRunner(make_app(args.items), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    urls = [f"http://127.0.0.1:{port}/page/{n}" for n in range(args.pages)]
+
+    try:
+        if not args.skip_cold:
+            cold_urls = urls[: args.cold_pages]
+            start = time.perf_counter()
+            result = await cold(cold_urls, args.concurrency)
+            report("cold launch per page", time.perf_counter() - start, *result)
+        start = time.perf_counter()
+        result = await pooled(urls, args.concurrency, args)
+        report("pooled contexts", time.perf_counter() - start, *result)
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument(
+        "--cold-pages", type=int, default=40, help="pages for the (slow) cold run"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--browsers", type=int, default=2)
+    parser.add_argument("--max-pages", type=int, default=100)
+    parser.add_argument("--items", type=int, default=200, help="list items per page")
+    parser.add_argument("--skip-cold", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
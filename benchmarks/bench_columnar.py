@@ -0,0 +1,90 @@
+"""Benchmark columnar result files against JSON result chunks.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_columnar --items 1000000
+
+Generates product items like those a listing recipe extracts and stores them
+as ``ResultsWriter`` does (JSON chunks of 500 items) and as Parquet and
+Arrow IPC files. Reports the stored size and the time to scan one column
+back, which for JSON means decoding every chunk.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from scrapers.core import columnar
+
+# Items per Results row, as ResultsWriter stores them.
+JSON_CHUNK_SIZE = 500
+CATEGORIES = ["Audio", "Computers", "Phones", "Cameras", "Gaming", "Wearables"]
+
+
+def generate_items(count):
+    for n in range(count):
+        yield {
+            "name": f"Product {n} - {CATEGORIES[n % len(CATEGORIES)]} edition",
+            "price": f"${n % 500}.99",
+            "url": f"https://shop.example.com/products/{n}",
+            "category": CATEGORIES[n % len(CATEGORIES)],
+            "tags": ["sale"] if n % 7 == 0 else [],
+        }
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def json_chunks(count):
+    chunks = [
+        json.dumps({"items": chunk})
+        for chunk in batches(generate_items(count), JSON_CHUNK_SIZE)
+    ]
+    start = time.perf_counter()
+    prices = [item["price"] for chunk in chunks for item in json.loads(chunk)["items"]]
+    return sum(map(len, chunks)), time.perf_counter() - start, len(prices)
+
+
+def columnar_file(count, fmt, directory):
+    location = Path(directory) / f"items{columnar.FORMATS[fmt]}"
+    with columnar.ColumnarFileWriter(location, fmt) as writer:
+        for batch in batches(generate_items(count), columnar.DEFAULT_BATCH_SIZE):
+            writer.write_batch(batch)
+        artifact = writer.close()
+    start = time.perf_counter()
+    prices = columnar.read_table(artifact, columns=["price"]).column("price")
+    return artifact["bytes"], time.perf_counter() - start, len(prices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    size, scan, rows = json_chunks(args.items)
+    assert rows == args.items
+    print(f"{args.items} items")
+    print(f"json chunks: {size / 2**20:8.1f} MiB  price scan {scan * 1000:8.1f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in columnar.FORMATS:
+            fsize, fscan, rows = columnar_file(args.items, fmt, directory)
+            assert rows == args.items
+            print(
+                f"{fmt + ':':12} {fsize / 2**20:8.1f} MiB  price scan "
+                f"{fscan * 1000:8.1f} ms  ({size / fsize:.1f}x smaller, "
+                f"{scan / fscan:.0f}x faster)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark the compiled extractor against naive per-selector querying.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_extract --products 5000
+    python -m benchmarks.bench_extract --fixture page.html --recipe recipe.yaml
+
+Without ``--fixture`` a large product listing is generated and extracted with
+the built-in recipe below. The naive baseline is what a hand-written scraper
+typically does with lxml: call ``.cssselect()`` once per field per item block,
+which re-translates each CSS selector and builds a dict for every item.
+"""
+
+import argparse
+import time
+
+import lxml.html
+import yaml
+
+from scrapers.core.extract import Extractor, parse_html
+from scrapers.core.recipe import compile_recipe
+
+RECIPE = """
+name: Product Listings Scraper
+url: https://example-store.com/products
+items: .product
+selectors:
+  name: .product-title
+  price: .price
+  availability: .stock-status
+  link: {css: a.product-link, attr: href}
+"""
+
+
+def generate_listing(products):
+    rows = []
+    for n in range(products):
+        rows.append(
+            f'<li class="product card" data-id="{n}">'
+            f'<div class="media"><img src="/img/{n}.jpg" alt=""></div>'
+            f'<div class="body"><h2 class="product-title">Product {n}</h2>'
+            f'<p class="description">Description for product {n}.</p>'
+            f'<span class="price">${n % 500}.99</span>'
+            f'<span class="stock-status">{"In Stock" if n % 3 else "Sold Out"}</span>'
+            f'<a class="product-link" href="/products/{n}">View</a></div></li>'
+        )
+    return (
+        "<html><head><title>Products</title></head><body>"
+        '<nav><ul><li><a href="/">Home</a></li></ul></nav>'
+        f'<ul class="listing">{"".join(rows)}</ul></body></html>'
+    ).encode()
+
+
+def naive_extract(document, config):
+    """Query every selector separately, building one dict per item."""
+    rows = []
+    selectors = config["selectors"]
+    for item in document.cssselect(config["items"]):
+        row = {}
+        for name, spec in selectors.items():
+            css = spec["css"] if isinstance(spec, dict) else spec
+            found = item.cssselect(css)
+            if not found:
+                row[name] = None
+            elif isinstance(spec, dict) and spec.get("attr"):
+                row[name] = found[0].get(spec["attr"])
+            else:
+                row[name] = " ".join(found[0].text_content().split())
+        rows.append(row)
+    return rows
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--fixture", help="saved HTML page to extract from")
+    parser.add_argument("--recipe", help="recipe YAML (must declare 'items')")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    source = open(args.recipe).read() if args.recipe else RECIPE
+    config = yaml.safe_load(source)
+    if args.fixture:
+        with open(args.fixture, "rb") as fixture:
+            html = fixture.read()
+    else:
+        html = generate_listing(args.products)
+
+    document = parse_html(html)
+    naive_document = lxml.html.fromstring(html)
+    extractor = Extractor(compile_recipe(source))
+
+    naive_time, naive_rows = best_of(
+        args.repeat, lambda: naive_extract(naive_document, config)
+    )
+    fast_time, fast_rows = best_of(args.repeat, lambda: extractor.extract(document))
+    assert [tuple(row.values()) for row in naive_rows] == fast_rows
+
+    print(f"document:   {len(html) / 1024:.0f} KiB, {len(fast_rows)} rows")
+    print(f"naive:      {naive_time * 1000:.1f} ms")
+    print(f"compiled:   {fast_time * 1000:.1f} ms")
+    print(f"speedup:    {naive_time / fast_time:.1f}x")
+    print(f"throughput: {len(fast_rows) / fast_time:.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark the pooled fetcher against a local stub server.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_fetch --pages 5000 --per-host 32
+
+The stub server answers every ``/page/<n>`` request with a fixed-size HTML
+body after an optional artificial delay, so the numbers reflect the client's
+pooling and scheduling rather than a real site.
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from benchmarks._stats import format_latency
+from scrapers.core.fetch import Fetcher
+
+
+def make_app(body_size, delay):
+    body = b"<html><body>" + b"x" * body_size + b"</body></html>"
+
+    async def page(request):
+        if delay:
+            await asyncio.sleep(delay)
+        return web.Response(body=body, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/page/{n}", page)
+    return app
+
+
+async def run(args):
+    runner = web.AppRunner(make_app(args.body_size, args.delay), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    urls = [f"http://127.0.0.1:{port}/page/{n}" for n in range(args.pages)]
+
+    try:
+        async with Fetcher(concurrency=args.concurrency, per_host=args.per_host) as f:
+            latencies = []
+            start = time.perf_counter()
+            async for result in f.fetch_many(urls):
+                if not result.ok:
+                    raise SystemExit(f"request failed: {result.error}")
+                latencies.append(result.elapsed)
+            wall = time.perf_counter() - start
+            stats = f.stats
+    finally:
+        await runner.cleanup()
+
+    print(f"pages:        {len(latencies)}")
+    print(f"wall time:    {wall:.2f}s")
+    print(f"throughput:   {len(latencies) / wall:.0f} pages/sec")
+    print(f"latency:      {format_latency(latencies)}")
+    print(
+        f"connections:  {stats.connections_opened} opened, "
+        f"{stats.connections_reused} reused"
+    )
+    print(f"bytes:        {stats.bytes_received}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--per-host", type=int, default=16)
+    parser.add_argument("--body-size", type=int, default=20_000)
+    parser.add_argument("--delay", type=float, default=0.0, help="server delay (s)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
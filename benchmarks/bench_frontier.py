@@ -0,0 +1,98 @@
+"""Benchmark the crawl frontier's memory per URL and throughput.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_frontier --urls 1000000
+
+Adds ``--urls`` distinct product URLs to a :class:`Frontier` in batches, as a
+crawl discovering links would, then adds them all again (every one a
+duplicate) and finally pops and completes them all. For comparison the same
+canonical URLs are kept in a Python ``set``, the naive in-memory dedup.
+
+Reported per URL: the frontier's Bloom filter, its resident memory growth
+(the filter plus SQLite's page cache, which is bounded, so this shrinks per
+URL as the crawl grows), its size on disk with every URL pending, and the
+heap size of the ``set``.
+"""
+
+import argparse
+import resource
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from scrapers.core.frontier import Frontier, canonicalize
+
+# Links queued per page, as add_many is called once per crawled page.
+BATCH = 100
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * resource.getpagesize()
+
+
+def generate_urls(count):
+    return [
+        f"https://shop.example.com/category/{n % 97}/products/{n}?ref=list&page={n % 50}"
+        for n in range(count)
+    ]
+
+
+def timed_batches(method, urls):
+    start = time.perf_counter()
+    total = 0
+    for offset in range(0, len(urls), BATCH):
+        total += method(urls[offset : offset + BATCH])
+    return total, time.perf_counter() - start
+
+
+def disk_bytes(directory):
+    return sum(path.stat().st_size for path in Path(directory).iterdir())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=200_000)
+    args = parser.parse_args()
+    urls = generate_urls(args.urls)
+    count = len(urls)
+
+    with tempfile.TemporaryDirectory() as directory:
+        rss = rss_bytes()
+        with Frontier(directory, capacity=count) as frontier:
+            added, add_time = timed_batches(frontier.add_many, urls)
+            grown = rss_bytes() - rss
+            on_disk = disk_bytes(directory)
+            duplicates, dup_time = timed_batches(frontier.add_many, urls)
+            start = time.perf_counter()
+            while entries := frontier.pop_many(1000):
+                frontier.done_many(entries)
+            pop_time = time.perf_counter() - start
+            stats = frontier.stats
+            bloom_bytes = frontier.bloom.nbytes
+
+    tracemalloc.start()
+    seen = {canonicalize(url) for url in urls}
+    set_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del seen
+
+    print(f"{count} URLs, added {added}, re-added {duplicates}")
+    print(f"add new        {count / add_time:10.0f} URLs/sec")
+    print(f"add duplicate  {count / dup_time:10.0f} URLs/sec")
+    print(f"pop + done     {count / pop_time:10.0f} URLs/sec")
+    print(
+        f"bloom negatives {stats.bloom_negatives}, exact lookups "
+        f"{stats.exact_lookups}, false positives {stats.false_positives}"
+    )
+    print("bytes per URL:")
+    print(f"  frontier Bloom filter  {bloom_bytes / count:7.1f}")
+    print(f"  frontier RSS growth    {grown / count:7.1f}")
+    print(f"  frontier on disk       {on_disk / count:7.1f}")
+    print(f"  set of URL strings     {set_heap / count:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
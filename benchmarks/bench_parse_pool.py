@@ -0,0 +1,72 @@
+"""Benchmark how page parsing throughput scales with parse pool processes.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_parse_pool --pages 400 --products 500
+
+Every page is a generated product listing (see ``bench_extract``). The
+baseline parses in the calling process, as the runner does with
+``SCRAPER_PARSE_PROCESSES = 0``; each pool size is then timed on the same
+pages, excluding worker start-up.
+"""
+
+import argparse
+import os
+import time
+
+from benchmarks.bench_extract import RECIPE, generate_listing
+from scrapers.core.extract import Extractor
+from scrapers.core.recipe import compile_recipe
+from scrapers.runners.parse_pool import ParsePool
+
+
+def process_counts(limit):
+    counts, n = [], 1
+    while n < limit:
+        counts.append(n)
+        n *= 2
+    return counts + [limit]
+
+
+def inline(plan, pages):
+    extractor = Extractor(plan)
+    start = time.perf_counter()
+    rows = sum(len(extractor.extract(body, url)) for url, body, _ in pages)
+    return time.perf_counter() - start, rows
+
+
+def pooled(plan, pages, processes):
+    with ParsePool(plan, processes=processes) as pool:
+        # Start every worker before timing.
+        list(pool.imap((n, pages[0][1], None) for n in range(processes * 2)))
+        start = time.perf_counter()
+        rows = sum(len(page.rows) for page in pool.imap(pages))
+        return time.perf_counter() - start, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--products", type=int, default=500, help="per page")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    plan = compile_recipe(RECIPE)
+    body = generate_listing(args.products)
+    pages = [(f"https://example.com/{n}", body, None) for n in range(args.pages)]
+    print(f"{args.pages} pages of {len(body) / 1024:.0f} KiB, {os.cpu_count()} CPUs")
+
+    baseline, expected = inline(plan, pages)
+    print(f"in-process:   {args.pages / baseline:8.1f} pages/sec")
+    for processes in process_counts(args.max_processes):
+        wall, rows = pooled(plan, pages, processes)
+        if rows != expected:
+            raise SystemExit(f"{processes} processes extracted {rows} rows")
+        print(
+            f"{processes:2d} processes: {args.pages / wall:8.1f} pages/sec "
+            f"({baseline / wall:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark shared per-domain rate limiting against a rate-limited server.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_politeness --runs 4 --pages 100 --limit 40
+
+The stub server allows ``--limit`` requests per second (with a small burst)
+and answers the rest with ``429`` and ``Retry-After: 1``. Several concurrent
+"runs", each with its own :class:`Fetcher`, fetch ``--pages`` pages from it:
+
+- without a scheduler, as before;
+- sharing one :class:`PolitenessScheduler` whose ceiling is twice the real
+  limit, so it has to find the limit by backing off;
+- sharing one scheduler whose ceiling is the real limit.
+
+Reported are the pages fetched, the 429s the server sent and the sustained
+rate of successful pages.
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from scrapers.core.fetch import Fetcher
+from scrapers.core.politeness import PolitenessScheduler
+
+
+class LimitedSite:
+    """A server enforcing ``limit`` requests per second with a token bucket."""
+
+    def __init__(self, limit, burst=5):
+        self.limit = limit
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.throttled = 0
+
+    async def page(self, request):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.limit)
+        self.updated = now
+        if self.tokens < 1:
+            self.throttled += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        self.tokens -= 1
+        return web.Response(text="<p>ok</p>", content_type="text/html")
+
+
+async def fetch_run(urls, politeness):
+    async with Fetcher(politeness=politeness) as fetcher:
+        return [result.ok async for result in fetcher.fetch_many(urls)]
+
+
+async def scenario(args, politeness):
+    site = LimitedSite(args.limit)
+    app = web.Application()
+    app.router.add_get("/page/{n}", site.page)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    tcp = web.TCPSite(runner, "127.0.0.1", 0)
+    await tcp.start()
+    port = runner.addresses[0][1]
+    runs = [
+        [f"http://127.0.0.1:{port}/page/{run}-{n}" for n in range(args.pages)]
+        for run in range(args.runs)
+    ]
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(fetch_run(urls, politeness) for urls in runs))
+        wall = time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+    ok = sum(sum(run) for run in results)
+    return ok, site.throttled, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=100, help="per run")
+    parser.add_argument("--limit", type=float, default=40.0, help="server req/s")
+    args = parser.parse_args()
+
+    total = args.runs * args.pages
+    print(f"{args.runs} runs x {args.pages} pages, server limit {args.limit:g}/s")
+    scenarios = [
+        ("no scheduler", None),
+        ("adaptive, 2x ceiling", PolitenessScheduler(rate=2 * args.limit, burst=5)),
+        ("ceiling = limit", PolitenessScheduler(rate=args.limit, burst=5)),
+    ]
+    for name, politeness in scenarios:
+        ok, throttled, wall = asyncio.run(scenario(args, politeness))
+        print(
+            f"{name:22} {ok:5}/{total} ok  {throttled:5} x 429  "
+            f"{wall:6.2f}s  {ok / wall:6.1f} ok pages/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,15 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path
+from ninja import NinjaAPI
+from scraper.api import router as scraper_router
+from scraper.metrics import metrics_view
+
+api = NinjaAPI(title="Scraper API")
+api.add_router("/", scraper_router)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/", api.urls),
+    path("metrics", metrics_view, name="metrics"),
 ]
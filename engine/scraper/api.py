@@ -0,0 +1,254 @@
+"""Async JSON API for projects, jobs, runs and their results.
+
+List endpoints are keyset paginated (see :mod:`scraper.pagination`) and never
+load the large text columns (``Job.raw_yaml``/``parsed_yaml``, ``Run.logs``,
+``Results.payload``); related objects that are serialized are fetched with
+``select_related`` in the same query. Under async views a missed relation
+raises ``SynchronousOnlyOperation`` instead of silently adding a query per row.
+"""
+
+import asyncio
+from typing import Literal, Optional
+from uuid import UUID
+
+from django.http import HttpResponse
+from django.shortcuts import aget_object_or_404
+from ninja import Router
+from ninja.errors import HttpError
+from scraper.export import export_response, results_for_job, results_for_run
+from scraper.models import Job, Project, Results, Run
+from scraper.pagination import DEFAULT_LIMIT, keyset_page
+from scraper.schemas import (
+    JobDetail,
+    JobIn,
+    JobPage,
+    ProjectIn,
+    ProjectOut,
+    ProjectPage,
+    RecipeBatchIn,
+    RecipeBatchOut,
+    RecipeErrorsOut,
+    ResultsDetail,
+    ResultsIn,
+    ResultsOut,
+    ResultsPage,
+    RunDetail,
+    RunIn,
+    RunOut,
+    RunPage,
+)
+
+from scrapers.core.profiling import flamegraph_svg
+from scrapers.core.validation import RecipeValidationError, validate_recipe
+from scrapers.runners.changes import lost_pages
+from scrapers.runners.profiling import profiles_of, read_profile
+
+router = Router()
+
+ExportFormat = Literal["ndjson", "csv"]
+ProfileFormat = Literal["svg", "folded", "pstats"]
+PROFILE_FORMATS = {"folded": "text/plain", "pstats": "application/octet-stream"}
+
+
+@router.get("/projects", response=ProjectPage)
+async def list_projects(
+    request, cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT
+):
+    return await keyset_page(Project.objects.all(), cursor, limit)
+
+
+@router.post("/projects", response={201: ProjectOut})
+async def create_project(request, data: ProjectIn):
+    return 201, await Project.objects.acreate(**data.dict())
+
+
+@router.get("/jobs", response=JobPage)
+async def list_jobs(
+    request,
+    project: Optional[UUID] = None,
+    is_active: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+):
+    jobs = Job.objects.select_related("project").defer("raw_yaml", "parsed_yaml")
+    if project is not None:
+        jobs = jobs.filter(project_id=project)
+    if is_active is not None:
+        jobs = jobs.filter(is_active=is_active)
+    return await keyset_page(jobs, cursor, limit)
+
+
+@router.post("/jobs", response={201: JobDetail, 422: RecipeErrorsOut})
+async def create_job(request, data: JobIn):
+    """Create a job; its ``raw_yaml`` is validated into ``parsed_yaml``."""
+    project = await aget_object_or_404(Project, pk=data.project_id)
+    fields = data.dict(exclude={"project_id"})
+    try:
+        return 201, await Job.objects.acreate(project=project, **fields)
+    except RecipeValidationError as exc:
+        return 422, {"errors": [issue.to_dict() for issue in exc.issues]}
+
+
+@router.post("/recipes/validate", response=RecipeBatchOut)
+def validate_recipes(request, data: RecipeBatchIn):
+    """Validate many recipes at once without saving them.
+
+    Validation is CPU-bound, so this view is synchronous: under ASGI Django
+    runs it in a thread instead of on the event loop.
+    """
+    results = []
+    for source in data.recipes:
+        try:
+            results.append({"valid": True, "parsed_yaml": validate_recipe(source)})
+        except RecipeValidationError as exc:
+            errors = [issue.to_dict() for issue in exc.issues]
+            results.append({"valid": False, "errors": errors})
+    return {"results": results}
+
+
+@router.get("/jobs/{job_id}", response=JobDetail)
+async def get_job(request, job_id: UUID):
+    return await aget_object_or_404(Job.objects.select_related("project"), pk=job_id)
+
+
+@router.get("/jobs/{job_id}/export")
+async def export_job(
+    request, job_id: UUID, format: ExportFormat = "ndjson", gzip: bool = False
+):
+    """Stream every stored item of every run of a job, tagged with its run."""
+    job = await aget_object_or_404(Job.objects.only("id"), pk=job_id)
+    return export_response(
+        request, results_for_job(job), f"job-{job.id}", format, gzip, with_run=True
+    )
+
+
+@router.get("/runs", response=RunPage)
+async def list_runs(
+    request,
+    job: Optional[UUID] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+):
+    runs = Run.objects.select_related("job__project").defer(
+        "logs", "checkpoint", "job__raw_yaml", "job__parsed_yaml"
+    )
+    if job is not None:
+        runs = runs.filter(job_id=job)
+    if status is not None:
+        runs = runs.filter(status=status)
+    return await keyset_page(runs, cursor, limit)
+
+
+@router.post("/runs", response={201: RunOut})
+async def create_run(request, data: RunIn):
+    """Queue a run of a job for the workers to pick up."""
+    job = await aget_object_or_404(
+        Job.objects.select_related("project").defer("raw_yaml", "parsed_yaml"),
+        pk=data.job_id,
+    )
+    return 201, await Run.objects.acreate(job=job, profile=data.profile)
+
+
+@router.get("/runs/{run_id}", response=RunDetail)
+async def get_run(request, run_id: UUID):
+    return await aget_object_or_404(
+        Run.objects.select_related("job__project").defer(
+            "logs", "job__raw_yaml", "job__parsed_yaml"
+        ),
+        pk=run_id,
+    )
+
+
+@router.post("/runs/{run_id}/retry", response=RunDetail)
+async def retry_run(request, run_id: UUID):
+    """Queue a failed run again; it resumes from its last checkpoint."""
+    run = await aget_object_or_404(Run.objects.only("id"), pk=run_id)
+    retried = await Run.objects.filter(pk=run.pk, status="failure").aupdate(
+        status="queued",
+        claimed_by=None,
+        claim_token=None,
+        started_at=None,
+        finished_at=None,
+    )
+    if not retried:
+        raise HttpError(409, "Only failed runs can be retried")
+    return await (
+        Run.objects.select_related("job__project")
+        .defer("logs", "job__raw_yaml", "job__parsed_yaml")
+        .aget(pk=run.pk)
+    )
+
+
+@router.get("/runs/{run_id}/export")
+async def export_run(
+    request, run_id: UUID, format: ExportFormat = "ndjson", gzip: bool = False
+):
+    """Stream every item of a run, including those of its unchanged pages."""
+    run = await aget_object_or_404(Run.objects.only("id"), pk=run_id)
+    lost = await lost_pages(run).values_list("url", flat=True).afirst()
+    if lost is not None:
+        raise HttpError(409, f"The items of unchanged page {lost} are not stored")
+    return export_response(
+        request, results_for_run(run), f"run-{run.id}", format, gzip, run=run
+    )
+
+
+@router.get("/runs/{run_id}/profile")
+async def get_run_profile(request, run_id: UUID, format: ProfileFormat = "svg"):
+    """The run's latest profile, drawn as a flamegraph or as stored.
+
+    ``folded`` stacks open in speedscope or ``flamegraph.pl``, ``pstats``
+    (cProfile only) in ``pstats`` or snakeviz.
+    """
+    run = await aget_object_or_404(Run.objects.only("id"), pk=run_id)
+    profile = await profiles_of(run.pk).only("artifacts").afirst()
+    if profile is None:
+        raise HttpError(404, "The run has no profile")
+    artifact = profile.artifacts
+    if format == "pstats" and "pstats" not in artifact:
+        raise HttpError(404, "Only cProfile profiles have pstats")
+    data = await asyncio.to_thread(
+        read_profile, artifact, "pstats" if format == "pstats" else "location"
+    )
+    if format == "svg":
+        title = f"Run {run.pk} ({artifact['mode']})"
+        svg = await asyncio.to_thread(
+            flamegraph_svg, data.decode(), title, artifact.get("unit", "samples")
+        )
+        return HttpResponse(svg, content_type="image/svg+xml")
+    response = HttpResponse(data, content_type=PROFILE_FORMATS[format])
+    response["Content-Disposition"] = (
+        f'attachment; filename="run-{run.pk}-profile.{format}"'
+    )
+    return response
+
+
+@router.get("/results", response=ResultsPage)
+async def list_results(
+    request,
+    run: Optional[UUID] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+):
+    results = Results.objects.defer("payload")
+    if run is not None:
+        results = results.filter(run_id=run)
+    return await keyset_page(results, cursor, limit)
+
+
+@router.post("/results", response={201: ResultsOut})
+async def create_results(request, data: ResultsIn):
+    run = await aget_object_or_404(Run.objects.only("id"), pk=data.run_id)
+    items = data.payload.get("items") if isinstance(data.payload, dict) else None
+    return 201, await Results.objects.acreate(
+        run=run,
+        payload=data.payload,
+        artifacts=data.artifacts,
+        item_count=len(items) if isinstance(items, list) else 0,
+    )
+
+
+@router.get("/results/{results_id}", response=ResultsDetail)
+async def get_results(request, results_id: UUID):
+    return await aget_object_or_404(Results, pk=results_id)
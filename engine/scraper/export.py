@@ -0,0 +1,216 @@
+"""Streaming export of stored result items as NDJSON or CSV, optionally gzipped.
+
+Rows are read with ``.iterator(chunk_size=...)`` (``.aiterator()`` under
+ASGI), encoded one item at a time and sent in blocks of roughly
+``BLOCK_SIZE`` bytes, so the memory a download needs is bounded by one
+database chunk and one output block however many results the run holds.
+Results stored as columnar files (see :mod:`scrapers.core.columnar`) are
+streamed from their files one record batch at a time.
+
+The export of a run also holds the items of the pages it found unchanged,
+read from the earlier runs that stored them (see
+:func:`scrapers.runners.changes.carried_items`), after its own. A job's
+export does not need them: every item is exported with the run that stored
+it.
+
+A CSV header must name every column before the first row, and items of a
+run, let alone of a job's runs, need not share their keys. CSV exports
+therefore read the results twice: once for the keys of every item (only
+the schema of a columnar file) and once for the rows.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from scraper.models import Results
+
+from scrapers.core import columnar
+from scrapers.runners.changes import carried_items
+from scrapers.runners.results import stored_batches
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CHUNK_SIZE = 200
+BLOCK_SIZE = 64 * 1024
+
+# ``values()`` rather than ``values_list()``: only the former defers its query
+# until the first row under ``aiterator()``, off the event loop.
+_COLUMNS = ("run_id", "payload", "artifacts")
+
+
+def results_for_run(run):
+    return Results.objects.filter(run=run).order_by("chunk_index", "created_at")
+
+
+def results_for_job(job):
+    return Results.objects.filter(run__job=job).order_by(
+        "run__created_at", "run_id", "chunk_index"
+    )
+
+
+async def _abatches(row):
+    # Columnar files are read in a thread so the event loop is not blocked.
+    batches = stored_batches(row)
+    while (items := await asyncio.to_thread(next, batches, None)) is not None:
+        yield items
+
+
+def _carried_batches(run):
+    """Yield the items of ``run``'s unchanged pages in lists."""
+    items = carried_items(run)
+    while batch := list(islice(items, CHUNK_SIZE)):
+        yield batch
+
+
+async def _acarried_batches(run):
+    # The queries stay on the one thread the ORM is used from.
+    batches = _carried_batches(run)
+    take = sync_to_async(next, thread_sensitive=True)
+    while (items := await take(batches, None)) is not None:
+        yield items
+
+
+def _row_columns(row):
+    """The keys of the row's items, in the order they first appear."""
+    if columnar.is_columnar(row["artifacts"]):
+        return [field["name"] for field in row["artifacts"]["schema"]]
+    return [key for items in stored_batches(row) for item in items for key in item]
+
+
+def _tagged(items, row, with_run):
+    if not with_run:
+        return items
+    run_id = str(row["run_id"])
+    return ({"run_id": run_id, **item} for item in items)
+
+
+class _Encoder:
+    """Turns items into encoded, optionally compressed output blocks."""
+
+    def __init__(self, fmt, compress, block_size=None, columns=None):
+        self.fmt = fmt
+        self.columns = columns
+        self.block_size = block_size or BLOCK_SIZE
+        self._compressor = zlib.compressobj(wbits=31) if compress else None
+        self._buffer = io.StringIO()
+        self._csv = None
+
+    def _write_csv(self, item):
+        if self._csv is None:
+            # Items with keys the header lacks raise rather than lose them.
+            self._csv = csv.DictWriter(self._buffer, fieldnames=list(self.columns))
+            self._csv.writeheader()
+        self._csv.writerow(
+            {
+                key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                for key, value in item.items()
+            }
+        )
+
+    def add(self, item):
+        """Encode an item; return an output block once enough has accumulated."""
+        if self.fmt == "csv":
+            self._write_csv(item)
+        else:
+            self._buffer.write(json.dumps(item, default=str))
+            self._buffer.write("\n")
+        if self._buffer.tell() >= self.block_size:
+            return self._take()
+        return b""
+
+    def _take(self):
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        return data
+
+    def finish(self):
+        data = self._take()
+        if self._compressor is not None:
+            data += self._compressor.flush()
+        return data
+
+
+def iter_export(results, fmt="ndjson", compress=False, with_run=False, run=None):
+    """Yield the encoded export of ``results`` in blocks.
+
+    With ``run``, the items of its unchanged pages follow.
+    """
+    columns = None
+    if fmt == "csv":
+        columns = dict.fromkeys(["run_id"] if with_run else [])
+        for row in results.values(*_COLUMNS).iterator(chunk_size=CHUNK_SIZE):
+            columns.update(dict.fromkeys(_row_columns(row)))
+        if run is not None:
+            for items in _carried_batches(run):
+                columns.update(dict.fromkeys(key for item in items for key in item))
+    encoder = _Encoder(fmt, compress, columns=columns)
+    for items in _batches_of(results, run, with_run):
+        for item in items:
+            block = encoder.add(item)
+            if block:
+                yield block
+    yield encoder.finish()
+
+
+def _batches_of(results, run, with_run):
+    rows = results.values(*_COLUMNS).iterator(chunk_size=CHUNK_SIZE)
+    for row in rows:
+        for items in stored_batches(row):
+            yield _tagged(items, row, with_run)
+    if run is not None:
+        for items in _carried_batches(run):
+            yield _tagged(items, {"run_id": run.pk}, with_run)
+
+
+async def _abatches_of(results, run, with_run):
+    rows = results.values(*_COLUMNS).aiterator(chunk_size=CHUNK_SIZE)
+    async for row in rows:
+        async for items in _abatches(row):
+            yield _tagged(items, row, with_run)
+    if run is not None:
+        async for items in _acarried_batches(run):
+            yield _tagged(items, {"run_id": run.pk}, with_run)
+
+
+async def aiter_export(results, fmt="ndjson", compress=False, with_run=False, run=None):
+    """Async version of :func:`iter_export`."""
+    columns = None
+    if fmt == "csv":
+        columns = dict.fromkeys(["run_id"] if with_run else [])
+        async for row in results.values(*_COLUMNS).aiterator(chunk_size=CHUNK_SIZE):
+            columns.update(dict.fromkeys(_row_columns(row)))
+        if run is not None:
+            async for items in _acarried_batches(run):
+                columns.update(dict.fromkeys(key for item in items for key in item))
+    encoder = _Encoder(fmt, compress, columns=columns)
+    async for items in _abatches_of(results, run, with_run):
+        for item in items:
+            block = encoder.add(item)
+            if block:
+                yield block
+    yield encoder.finish()
+
+
+def export_response(request, results, name, fmt="ndjson", compress=False, **kwargs):
+    """A streaming download of ``results``.
+
+    The body is produced asynchronously when served over ASGI and
+    synchronously over WSGI, which would otherwise buffer an async iterator.
+    """
+    stream = aiter_export if isinstance(request, ASGIRequest) else iter_export
+    response = StreamingHttpResponse(
+        stream(results, fmt, compress, **kwargs),
+        content_type="application/gzip" if compress else FORMATS[fmt],
+    )
+    filename = f"{name}.{fmt}" + (".gz" if compress else "")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
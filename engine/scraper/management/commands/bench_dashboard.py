@@ -0,0 +1,141 @@
+import random
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from scraper.models import Job, Project, Results, Run
+
+BENCH_PREFIX = "bench_dashboard"
+
+# Plan lines that mean a table is read in full rather than through an index.
+FULL_SCAN = re.compile(
+    r"\bSCAN (scraper_\w+)(?! USING)|Seq Scan on (scraper_\w+)|"
+    r"type: ALL.*table: (scraper_\w+)",
+)
+
+
+def dashboard_queries(project, job, run):
+    """The queries behind the project/job/run dashboards."""
+    return {
+        "successful runs of project": Run.objects.filter(
+            job__project=project, status="success"
+        ),
+        "results of project": Results.objects.filter(run__job__project=project),
+        "recent runs of job": Run.objects.filter(job=job).order_by("-started_at")[:20],
+        "failed runs of job": Run.objects.filter(job=job, status="failure"),
+        "results of run": Results.objects.filter(run=run).order_by("created_at"),
+        "active jobs of project": Job.objects.filter(project=project, is_active=True),
+        "next queued runs": Run.objects.filter(status="queued").order_by("created_at")[
+            :10
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large synthetic dataset, then time the dashboard queries and "
+        "print their EXPLAIN plans. Full table scans are flagged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--projects", type=int, default=20)
+        parser.add_argument("--jobs", type=int, default=25, help="per project")
+        parser.add_argument("--runs", type=int, default=40, help="per job")
+        parser.add_argument("--results", type=int, default=2, help="per run")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--fail-on-scan",
+            action="store_true",
+            help="exit with an error if any query reads a table in full",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="keep the seeded rows afterwards"
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        projects = self.seed(options)
+        self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+        try:
+            scans = self.report(projects, options["repeat"])
+        finally:
+            if not options["keep"]:
+                self.cleanup(projects)
+        if scans and options["fail_on_scan"]:
+            raise CommandError(f"Full table scans in: {', '.join(scans)}")
+
+    @transaction.atomic
+    def seed(self, options):
+        now = timezone.now()
+        # Only finished runs: workers and the reaper must leave the data alone.
+        statuses = ["success"] * 9 + ["failure"]
+        projects = Project.objects.bulk_create(
+            Project(name=f"{BENCH_PREFIX} {n}") for n in range(options["projects"])
+        )
+        jobs = Job.objects.bulk_create(
+            Job(project=project, name=f"{BENCH_PREFIX} job {n}", is_active=n % 5 != 0)
+            for project in projects
+            for n in range(options["jobs"])
+        )
+        runs = Run.objects.bulk_create(
+            (
+                Run(
+                    job=job,
+                    status=random.choice(statuses),
+                    started_at=now - timedelta(hours=n),
+                    finished_at=now - timedelta(hours=n) + timedelta(minutes=5),
+                )
+                for job in jobs
+                for n in range(options["runs"])
+            ),
+            batch_size=5000,
+        )
+        Results.objects.bulk_create(
+            (
+                Results(run=run, payload={"items": []}, chunk_index=n)
+                for run in runs
+                for n in range(options["results"])
+            ),
+            batch_size=5000,
+        )
+        return projects
+
+    def report(self, projects, repeat):
+        project = projects[len(projects) // 2]
+        job = Job.objects.filter(project=project).first()
+        run = Run.objects.filter(job=job).first()
+        self.stdout.write(
+            f"Dataset: {Job.objects.count()} jobs, {Run.objects.count()} runs, "
+            f"{Results.objects.count()} results ({connection.vendor})\n"
+        )
+        scans = []
+        for name, queryset in dashboard_queries(project, job, run).items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append(time.perf_counter() - start)
+            plan = queryset.explain()
+            scanned = {
+                table
+                for match in FULL_SCAN.finditer(plan)
+                for table in match.groups()
+                if table
+            }
+            if scanned:
+                scans.append(name)
+            flag = f"  FULL SCAN: {', '.join(sorted(scanned))}" if scanned else ""
+            self.stdout.write(f"{name}: {min(timings) * 1000:.2f} ms{flag}")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+        return scans
+
+    @transaction.atomic
+    def cleanup(self, projects):
+        Results.objects.filter(run__job__project__in=projects).delete()
+        Run.objects.filter(job__project__in=projects).delete()
+        Job.objects.filter(project__in=projects).delete()
+        Project.objects.filter(pk__in=[project.pk for project in projects]).delete()
@@ -0,0 +1,74 @@
+import multiprocessing
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from scraper.models import Job, Project, Run
+
+from scrapers.runners.worker import Worker
+
+
+def _drain(args):
+    """Body of one benchmark worker process."""
+    index, work_seconds = args
+    executed = []
+
+    def execute(run):
+        if work_seconds:
+            time.sleep(work_seconds)
+        executed.append(str(run.pk))
+
+    worker = Worker(execute, worker_id=f"bench-{index}")
+    worker.run(exit_when_empty=True)
+    connections.close_all()
+    return executed
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure run-queue throughput with N worker processes and check that "
+        "no run is executed twice. Needs a database shared between processes "
+        "(not SQLite :memory:)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--runs", type=int, default=2000)
+        parser.add_argument(
+            "--work-ms", type=float, default=0.0, help="simulated work per run"
+        )
+
+    def handle(self, *args, **options):
+        if connections["default"].settings_dict["NAME"] in (":memory:", ""):
+            raise CommandError("bench_queue needs an on-disk database")
+
+        project = Project.objects.create(name="bench_queue")
+        job = Job.objects.create(project=project, name="bench_queue")
+        Run.objects.bulk_create(Run(job=job) for _ in range(options["runs"]))
+
+        # Children must open their own connections after the fork.
+        connections.close_all()
+        work = [(n, options["work_ms"] / 1000) for n in range(options["workers"])]
+        start = time.perf_counter()
+        with multiprocessing.get_context("fork").Pool(options["workers"]) as pool:
+            executed = pool.map(_drain, work)
+        wall = time.perf_counter() - start
+
+        counts = Counter(run_id for ids in executed for run_id in ids)
+        total = sum(counts.values())
+        duplicates = sum(count - 1 for count in counts.values() if count > 1)
+        left = Run.objects.filter(job=job, status="queued").count()
+
+        self.stdout.write(f"workers:      {options['workers']}")
+        self.stdout.write(f"runs:         {total} executed, {left} left queued")
+        self.stdout.write(f"per worker:   {[len(ids) for ids in executed]}")
+        self.stdout.write(f"wall time:    {wall:.2f}s")
+        self.stdout.write(f"throughput:   {total / wall:.0f} runs/sec")
+        self.stdout.write(f"duplicates:   {duplicates}")
+
+        Run.objects.filter(job=job).delete()
+        job.delete()
+        project.delete()
+        if duplicates or left:
+            raise CommandError("queue benchmark found double or missed executions")
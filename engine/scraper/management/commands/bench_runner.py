@@ -0,0 +1,105 @@
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from scraper.models import Job, Project, Run
+
+from scrapers.runners.executor import execute_run
+from scrapers.runners.inprocess import WarmRunner, execute_isolated
+
+PAGE = b"<html><body><h1>bench_runner</h1></body></html>"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this a kept-alive
+    # connection waits out the client's delayed ACK on every response.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the end-to-end latency of a one-page run executed on the warm "
+        "in-process runner, cold in the worker, and isolated in a new process "
+        "(what a container adds on top of its own start-up). Needs a database "
+        "shared between processes (not SQLite :memory:)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connections["default"].settings_dict["NAME"] in (":memory:", ""):
+            raise CommandError("bench_runner needs an on-disk database")
+        server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/"
+        project = Project.objects.create(name="bench_runner")
+        job = Job.objects.create(
+            project=project, name="bench_runner", raw_yaml=f"url: {url}\nselector: h1"
+        )
+        # The page is served locally: no cache or rate limit in the way.
+        fetcher_options = {"cache": None, "politeness": None}
+        command = [
+            sys.executable,
+            str(settings.BASE_DIR / "manage.py"),
+            "execute_run",
+            "{run_id}",
+        ]
+        os.environ["DJANGO_SETTINGS_MODULE"] = settings.SETTINGS_MODULE
+
+        start = time.perf_counter()
+        warm = WarmRunner(**fetcher_options)
+        warm_start = time.perf_counter() - start
+        paths = {
+            "warm": warm.execute,
+            "cold": lambda run: execute_run(run, **fetcher_options),
+            "isolated": lambda run: execute_isolated(run, command),
+        }
+        try:
+            timings = {
+                name: self._time(job, execute, options["runs"])
+                for name, execute in paths.items()
+            }
+        finally:
+            warm.close()
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write(f"warm runner start-up: {warm_start * 1000:.1f} ms (once)")
+        for name, seconds in timings.items():
+            ms = sorted(s * 1000 for s in seconds)
+            p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+            self.stdout.write(
+                f"{name:>8}: p50 {statistics.median(ms):7.1f} ms  "
+                f"p95 {p95:7.1f} ms  mean {statistics.fmean(ms):7.1f} ms"
+            )
+        speedup = statistics.median(timings["isolated"]) / statistics.median(
+            timings["warm"]
+        )
+        self.stdout.write(f"warm is {speedup:.0f}x faster than isolated at p50")
+
+    def _time(self, job, execute, runs):
+        seconds = []
+        for _ in range(runs):
+            run = Run.objects.create(job=job, status="running")
+            start = time.perf_counter()
+            execute(run)
+            seconds.append(time.perf_counter() - start)
+        return seconds
@@ -0,0 +1,27 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from scraper.models import Run
+
+from scrapers.runners.executor import execute_run
+
+
+class Command(BaseCommand):
+    help = (
+        "Execute one claimed run in this process and exit, as an isolated "
+        "worker (e.g. a container) does. The run's status is left to the "
+        "worker that claimed it; the exit status reports the outcome."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("run_id")
+
+    def handle(self, *args, **options):
+        try:
+            run = Run.objects.select_related("job").get(pk=options["run_id"])
+        except (Run.DoesNotExist, ValidationError) as exc:
+            raise CommandError(f"No run {options['run_id']}") from exc
+        try:
+            items = execute_run(run)
+        except Exception as exc:
+            raise CommandError(f"Run {run.pk} failed: {exc}") from exc
+        self.stdout.write(f"Run {run.pk} stored {items} items")
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from scraper.models import Job, Project
+
+from scrapers.core.validation import RecipeValidationError, validate_recipe
+
+RECIPE_SUFFIXES = (".yaml", ".yml")
+
+
+def recipe_files(paths):
+    """The recipe files among ``paths``, searching directories recursively."""
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(
+                found
+                for found in path.rglob("*")
+                if found.suffix in RECIPE_SUFFIXES and found.is_file()
+            )
+        else:
+            yield path
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate recipe YAML files and create a job for each, all in one "
+        "transaction: if any recipe is invalid, no job is created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="recipe files or directories")
+        parser.add_argument("--project", help="id of the project to add the jobs to")
+        parser.add_argument(
+            "--validate-only",
+            action="store_true",
+            help="report invalid recipes without creating jobs",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        valid, invalid = self._validate(recipe_files(options["paths"]))
+        if invalid:
+            raise CommandError(
+                f"{invalid} of {invalid + len(valid)} recipes are invalid;"
+                " no jobs were created"
+            )
+        if options["validate_only"]:
+            self.stdout.write(f"{len(valid)} recipes are valid")
+            return
+        project = self._project(options["project"])
+        jobs = [
+            Job(
+                project=project,
+                name=str(data.get("name") or path.stem),
+                raw_yaml=source,
+                parsed_yaml=data,
+            )
+            for path, source, data in valid
+        ]
+        # bulk_create bypasses Job.save(): the recipes were validated above
+        # and, having no schedule, the jobs have no next_run_at to compute.
+        with transaction.atomic():
+            Job.objects.bulk_create(jobs, batch_size=options["batch_size"])
+        self.stdout.write(f"Created {len(jobs)} jobs")
+
+    def _validate(self, files):
+        valid, invalid = [], 0
+        for path in files:
+            try:
+                source = path.read_text(encoding="utf-8")
+                valid.append((path, source, validate_recipe(source)))
+            except OSError as exc:
+                invalid += 1
+                self.stderr.write(f"{path}: {exc.strerror}")
+            except RecipeValidationError as exc:
+                invalid += 1
+                for issue in exc.issues:
+                    where = f"{issue.path}: " if issue.path else ""
+                    self.stderr.write(
+                        f"{path}:{issue.line or 1}: {where}{issue.message}"
+                    )
+        return valid, invalid
+
+    def _project(self, project_id):
+        if project_id is None:
+            return None
+        try:
+            return Project.objects.get(pk=project_id)
+        except (Project.DoesNotExist, ValidationError) as exc:
+            raise CommandError(f"Unknown project {project_id}") from exc
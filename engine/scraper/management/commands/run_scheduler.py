@@ -0,0 +1,31 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from scrapers.runners.scheduler import DEFAULT_INTERVAL, Scheduler
+
+
+class Command(BaseCommand):
+    help = "Queue runs of scheduled jobs as they become due, until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--once", action="store_true", help="queue what is due now and return"
+        )
+
+    def handle(self, *args, **options):
+        scheduler = Scheduler(
+            interval=options["interval"], batch_size=options["batch_size"]
+        )
+        if options["once"]:
+            self.stdout.write(f"Queued {scheduler.tick()} runs")
+            return
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        self.stdout.write("Scheduler started")
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Scheduler queued {scheduler.queued} runs")
@@ -0,0 +1,46 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from scrapers.core.metrics import process_exited
+from scrapers.runners.inprocess import ISOLATED, WARM, RunDispatcher
+from scrapers.runners.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Claim and execute queued runs until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker-id", help="defaults to <hostname>:<pid>")
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--mode",
+            choices=[WARM, ISOLATED],
+            help="execute every run this way instead of choosing by recipe size",
+        )
+        parser.add_argument(
+            "--exit-when-empty",
+            action="store_true",
+            help="return once the queue is drained instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        with RunDispatcher(mode=options["mode"]) as dispatcher:
+            worker = Worker(
+                dispatcher,
+                worker_id=options["worker_id"],
+                poll_interval=options["poll_interval"],
+            )
+            signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+            self.stdout.write(f"Worker {worker.worker_id} started")
+            try:
+                worker.run(exit_when_empty=options["exit_when_empty"])
+            except KeyboardInterrupt:
+                pass
+            finally:
+                process_exited()
+        modes = ", ".join(f"{n} {mode}" for mode, n in dispatcher.executed.items())
+        self.stdout.write(
+            f"Worker {worker.worker_id} processed {worker.processed} runs"
+            + (f" ({modes})" if modes else "")
+        )
@@ -0,0 +1,34 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scrapers.runners.prefect_sync import PrefectSync
+
+
+class Command(BaseCommand):
+    help = "Keep runs in step with their Prefect flow runs, until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=None)
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--once", action="store_true", help="sync every run once and return"
+        )
+
+    def handle(self, *args, **options):
+        if not settings.PREFECT_API_URL:
+            raise CommandError("PREFECT_API_URL is not set")
+        with PrefectSync(
+            batch_size=options["batch_size"], interval=options["interval"]
+        ) as sync:
+            if options["once"]:
+                self.stdout.write(f"Updated {sync.tick()} runs")
+                return
+            signal.signal(signal.SIGTERM, lambda *_: sync.stop())
+            self.stdout.write("Prefect sync started")
+            try:
+                sync.run()
+            except KeyboardInterrupt:
+                pass
+            self.stdout.write(f"Prefect sync updated {sync.updated} runs")
@@ -0,0 +1,55 @@
+"""The ``/metrics`` endpoint: the scraper's Prometheus metrics.
+
+Serves the metrics of :mod:`scrapers.core.metrics` (merged from every
+process when ``PROMETHEUS_MULTIPROC_DIR`` is set) along with the number of
+queued and running runs, counted in the database when scraped; runs
+waiting on Prefect are not in the queue. Prometheus
+is answered in the OpenMetrics format when it asks for it.
+"""
+
+from django.http import HttpResponse
+from prometheus_client import REGISTRY, CollectorRegistry
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.exposition import choose_encoder
+from prometheus_client.multiprocess import MultiProcessCollector
+from scraper.models import Run
+
+from scrapers.core.metrics import multiprocess_dir
+
+# Statuses of runs still waiting or executing; each is counted on the
+# (status, created_at) index.
+PENDING_STATUSES = ("queued", "running")
+
+
+class RunStatusCollector:
+    """Counts the queued and running runs whenever metrics are collected."""
+
+    def collect(self):
+        runs = GaugeMetricFamily(
+            "scraper_runs",
+            "Runs queued or running; queued runs are the queue depth.",
+            labels=["status"],
+        )
+        for status in PENDING_STATUSES:
+            pending = Run.objects.filter(status=status)
+            if status == "queued":
+                pending = pending.filter(prefect_flow_run_id__isnull=True)
+            runs.add_metric([status], pending.count())
+        yield runs
+
+
+def metrics_registry():
+    """A registry of everything ``/metrics`` serves."""
+    registry = CollectorRegistry()
+    directory = multiprocess_dir()
+    if directory is not None:
+        MultiProcessCollector(registry, path=directory)
+    else:
+        registry.register(REGISTRY)
+    registry.register(RunStatusCollector())
+    return registry
+
+
+def metrics_view(request):
+    encoder, content_type = choose_encoder(request.headers.get("Accept"))
+    return HttpResponse(encoder(metrics_registry()), content_type=content_type)
@@ -1,8 +1,20 @@
+import hashlib
 import uuid
 
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from users.models import User
 
+from scrapers.core.cron import next_due
+from scrapers.core.validation import validate_recipe
+
+# Ways of profiling runs (see scrapers.runners.profiling).
+PROFILE_CHOICES = [
+    ("sample", "Sampled stacks"),
+    ("cprofile", "cProfile"),
+]
+
 
 class Project(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -10,10 +22,20 @@ class Project(models.Model):
     owner = models.ForeignKey(User, on_delete=models.PROTECT, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (see scraper.pagination).
+            models.Index(fields=["created_at", "id"], name="project_created_id_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+# Job fields that decide when it runs; saving a change reschedules the job.
+SCHEDULE_FIELDS = ("schedule", "schedule_timezone")
+
+
 class Job(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     project = models.ForeignKey(
@@ -26,10 +48,113 @@ class Job(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     last_run_at = models.DateTimeField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Cron expression (see scrapers.core.cron) evaluated in schedule_timezone.
+    schedule = models.CharField(max_length=255, blank=True, null=True)
+    schedule_timezone = models.CharField(max_length=64, default="UTC")
+    # When the scheduler should next queue a run; kept up to date by save().
+    next_run_at = models.DateTimeField(blank=True, null=True)
+    # Profile every run of the job this way; off when null.
+    profile = models.CharField(
+        max_length=16, choices=PROFILE_CHOICES, blank=True, null=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["project", "is_active"], name="job_project_active_idx"
+            ),
+            # Jobs due for a scheduled run, earliest first.
+            models.Index(
+                fields=["is_active", "next_run_at"], name="job_active_next_run_idx"
+            ),
+            # Keyset pagination order (see scraper.pagination).
+            models.Index(fields=["created_at", "id"], name="job_created_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def schedule_offset(self):
+        """This job's share of ``SCRAPER_SCHEDULE_JITTER``, in whole seconds.
+
+        Derived from the job's id, so the job keeps its period while jobs on
+        the same schedule are spread over the jitter window.
+        """
+        digest = hashlib.blake2b(self.pk.bytes, digest_size=8).digest()
+        return int.from_bytes(digest, "big") % (settings.SCRAPER_SCHEDULE_JITTER + 1)
+
+    def next_scheduled_run(self, after):
+        """When the job is due next after ``after``, or ``None`` if unscheduled."""
+        if not self.schedule:
+            return None
+        return next_due(
+            self.schedule, self.schedule_timezone, after, self.schedule_offset
+        )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        job = super().from_db(db, field_names, values)
+        job._saved_schedule = job._schedule()
+        return job
+
+    def _schedule(self):
+        # Deferred fields are left out rather than loaded.
+        return tuple(
+            self.__dict__.get(name, models.DEFERRED) for name in SCHEDULE_FIELDS
+        )
+
+    def _schedule_changed(self, update_fields):
+        if update_fields is not None:
+            return bool(set(SCHEDULE_FIELDS) & set(update_fields))
+        if self._state.adding:
+            return True
+        saved = getattr(self, "_saved_schedule", None)
+        return saved is None or self._schedule() != saved
+
+    def validate_recipe(self):
+        """Validate ``raw_yaml`` against the recipe schema into ``parsed_yaml``.
+
+        Raises :class:`~scrapers.core.validation.RecipeValidationError`.
+        Jobs without YAML keep the ``parsed_yaml`` they were given.
+        """
+        if self.raw_yaml and self.raw_yaml.strip():
+            self.parsed_yaml = validate_recipe(self.raw_yaml)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "raw_yaml" in update_fields:
+            self.validate_recipe()
+            if update_fields is not None:
+                kwargs["update_fields"] = update_fields = {
+                    *update_fields,
+                    "parsed_yaml",
+                }
+        # Only a new job or a changed schedule is rescheduled; other saves
+        # keep next_run_at, so a due job stays due.
+        if self._schedule_changed(update_fields):
+            self.next_run_at = self.next_scheduled_run(timezone.now())
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "next_run_at"}
+        super().save(*args, **kwargs)
+        if update_fields is None or set(SCHEDULE_FIELDS) & set(update_fields):
+            self._saved_schedule = self._schedule()
+
+
+class CompiledRecipe(models.Model):
+    """Persisted, already validated and compiled form of ``Job.raw_yaml``."""
+
+    job = models.OneToOneField(
+        Job, on_delete=models.CASCADE, related_name="compiled_recipe"
+    )
+    content_hash = models.CharField(max_length=64)
+    job_updated_at = models.DateTimeField()
+    plan = models.JSONField()
+    compiled_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job.name} ({self.content_hash[:12]})"
+
 
 class Run(models.Model):
     STATUS_CHOICES = [
@@ -45,16 +170,109 @@ class Run(models.Model):
     prefect_state = models.CharField(max_length=100, blank=True, null=True)
     prefect_flow_run_id = models.CharField(max_length=100, blank=True, null=True)
     logs = models.TextField(blank=True, null=True)
+    # Set when a worker claims the run; ``claim_token`` identifies the batch.
+    claimed_by = models.CharField(max_length=255, blank=True, null=True)
+    claim_token = models.UUIDField(blank=True, null=True)
+    # Renewed by the claiming worker while it is alive; a running run whose
+    # heartbeat is older than SCRAPER_RUN_LEASE is reaped as failed.
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    # Progress saved while the run executes, so that a retry or the job's
+    # next run can resume it (see scrapers.runners.checkpoint).
+    checkpoint = models.JSONField(blank=True, null=True)
+    # Phase timings and counters of the run's execution, a compact summary
+    # from scrapers.core.telemetry.RunTelemetry.
+    metrics = models.JSONField(blank=True, null=True)
+    # Profile this run this way; when null, as its job says.
+    profile = models.CharField(
+        max_length=16, choices=PROFILE_CHOICES, blank=True, null=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(blank=True, null=True)
     finished_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["job", "status"], name="run_job_status_idx"),
+            models.Index(fields=["job", "started_at"], name="run_job_started_idx"),
+            # Queue order for claiming queued runs.
+            models.Index(
+                fields=["status", "created_at"], name="run_status_created_idx"
+            ),
+            # Keyset pagination order (see scraper.pagination), of all runs
+            # and of a job's.
+            models.Index(fields=["created_at", "id"], name="run_created_id_idx"),
+            models.Index(
+                fields=["job", "created_at", "id"], name="run_job_created_id_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Run {self.job.name} - {self.started_at} - {self.status}"
 
 
+class RunLogChunk(models.Model):
+    """An append-only slice of a run's log, written in batches by the runner."""
+
+    run = models.ForeignKey(Run, on_delete=models.CASCADE, related_name="log_chunks")
+    seq = models.PositiveIntegerField()
+    content = models.TextField()
+    line_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["run", "seq"], name="runlogchunk_run_seq_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.run_id} #{self.seq}"
+
+
 class Results(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     run = models.ForeignKey(Run, on_delete=models.PROTECT, blank=True, null=True)
     payload = models.JSONField(blank=True, null=True)
     artifacts = models.JSONField(blank=True, null=True)
+    # Large runs are stored as many rows, each holding ``item_count`` items in
+    # ``payload["items"]``; ``chunk_index`` gives their order within the run.
+    chunk_index = models.PositiveIntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["run", "created_at"], name="results_run_created_idx"),
+            # Keyset pagination order (see scraper.pagination).
+            models.Index(fields=["created_at", "id"], name="results_created_id_idx"),
+        ]
+
+
+class PageDigest(models.Model):
+    """The content hash of the items one run extracted from one page.
+
+    When a page yields the same items as in the job's previous successful run,
+    no ``Results`` are written for it and the digest is stored with
+    ``unchanged`` set; ``source_run`` then points at the run whose ``Results``
+    hold the items. ``first_item`` is where the page's items start among the
+    items of that run (or of ``run``, for pages it stored), counted in chunk
+    order, so they can be read back (see
+    :func:`scrapers.runners.changes.carried_items`).
+    """
+
+    run = models.ForeignKey(Run, on_delete=models.CASCADE, related_name="page_digests")
+    url = models.TextField()
+    content_hash = models.CharField(max_length=64)
+    item_count = models.PositiveIntegerField(default=0)
+    unchanged = models.BooleanField(default=False)
+    source_run = models.ForeignKey(
+        Run, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    # Null for digests recorded before item positions were.
+    first_item = models.PositiveBigIntegerField(blank=True, null=True)
+
+    def __str__(self):
+        return (
+            f"{self.url} ({'unchanged' if self.unchanged else self.content_hash[:12]})"
+        )
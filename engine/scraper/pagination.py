@@ -0,0 +1,48 @@
+"""Keyset (cursor) pagination over ``created_at``/``id``.
+
+Pages are read newest first. Instead of an ``OFFSET`` that makes the database
+skip every earlier row, the cursor carries the ``(created_at, id)`` of the
+last row returned and the next page starts strictly after it, so every page
+costs the same however deep the client has scrolled, and rows inserted
+meanwhile do not shift the pages.
+"""
+
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from ninja.errors import HttpError
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the ``(created_at, id)`` a cursor points at."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HttpError(400, "Invalid cursor")
+
+
+async def keyset_page(queryset, cursor=None, limit=DEFAULT_LIMIT):
+    """Return ``{"items": [...], "next_cursor": ...}`` for one page."""
+    limit = max(1, min(limit, MAX_LIMIT))
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    items = [obj async for obj in queryset[: limit + 1]]
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return {"items": items[:limit], "next_cursor": next_cursor}
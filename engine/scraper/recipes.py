@@ -0,0 +1,58 @@
+from scraper.models import CompiledRecipe
+
+from scrapers.core.recipe import (
+    PLAN_VERSION,
+    RecipeError,
+    RecipePlan,
+    compile_recipe,
+    recipe_cache,
+    recipe_hash,
+)
+
+
+def job_recipe_source(job):
+    """Return what a job's plan is compiled from: the YAML, else the mapping."""
+    if job.raw_yaml and job.raw_yaml.strip():
+        return job.raw_yaml
+    if job.parsed_yaml:
+        return job.parsed_yaml
+    raise RecipeError(f"Job {job.pk} has no recipe")
+
+
+def _is_current(persisted, job, content_hash):
+    return (
+        persisted.content_hash == content_hash
+        and persisted.job_updated_at == job.updated_at
+        and persisted.plan.get("version") == PLAN_VERSION
+    )
+
+
+def get_recipe_plan(job, cache=recipe_cache):
+    """Return the compiled plan for ``job``, compiling at most once.
+
+    Lookups go through the in-process LRU first, then the persisted
+    :class:`CompiledRecipe` row. The row is only trusted while both the recipe
+    hash and ``Job.updated_at`` still match; otherwise the recipe is compiled
+    again and the row refreshed.
+    """
+    source = job_recipe_source(job)
+    content_hash = recipe_hash(source)
+    plan = cache.get(content_hash)
+    if plan is not None:
+        return plan
+
+    persisted = CompiledRecipe.objects.filter(job=job).first()
+    if persisted is not None and _is_current(persisted, job, content_hash):
+        plan = RecipePlan.from_dict(persisted.plan)
+    else:
+        plan = compile_recipe(source, content_hash)
+        CompiledRecipe.objects.update_or_create(
+            job=job,
+            defaults={
+                "content_hash": content_hash,
+                "job_updated_at": job.updated_at,
+                "plan": plan.to_dict(),
+            },
+        )
+    cache.put(plan)
+    return plan
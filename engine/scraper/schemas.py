@@ -0,0 +1,165 @@
+from datetime import datetime, timezone
+from typing import Any, List, Literal, Optional
+from uuid import UUID
+
+from ninja import Schema
+from pydantic import field_validator
+
+from scrapers.core.cron import CronError, get_timezone, next_due
+
+ProfileMode = Literal["sample", "cprofile"]
+
+
+class ProjectRef(Schema):
+    id: UUID
+    name: str
+
+
+class JobRef(Schema):
+    id: UUID
+    name: str
+    project: Optional[ProjectRef] = None
+
+
+class ProjectIn(Schema):
+    name: str
+
+
+class ProjectOut(Schema):
+    id: UUID
+    name: str
+    owner_id: Optional[int] = None
+    created_at: datetime
+
+
+class JobIn(Schema):
+    project_id: UUID
+    name: str
+    raw_yaml: Optional[str] = None
+    parsed_yaml: Optional[dict] = None
+    is_active: bool = True
+    schedule: Optional[str] = None
+    schedule_timezone: str = "UTC"
+    profile: Optional[ProfileMode] = None
+
+    @field_validator("schedule")
+    @classmethod
+    def check_schedule(cls, value):
+        if value is not None:
+            try:
+                # Schedules can parse yet never fire, such as on February 30.
+                next_due(value, "UTC", datetime.now(timezone.utc))
+            except CronError as exc:
+                raise ValueError(str(exc)) from exc
+        return value
+
+    @field_validator("schedule_timezone")
+    @classmethod
+    def check_timezone(cls, value):
+        try:
+            get_timezone(value)
+        except CronError as exc:
+            raise ValueError(str(exc)) from exc
+        return value
+
+
+class RecipeIssueOut(Schema):
+    line: Optional[int] = None
+    path: str = ""
+    message: str
+
+
+class RecipeErrorsOut(Schema):
+    errors: List[RecipeIssueOut]
+
+
+class RecipeBatchIn(Schema):
+    recipes: List[str]
+
+
+class RecipeValidationOut(Schema):
+    valid: bool
+    parsed_yaml: Optional[dict] = None
+    errors: List[RecipeIssueOut] = []
+
+
+class RecipeBatchOut(Schema):
+    results: List[RecipeValidationOut]
+
+
+class JobOut(Schema):
+    id: UUID
+    name: str
+    project: Optional[ProjectRef] = None
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+    last_run_at: Optional[datetime] = None
+    schedule: Optional[str] = None
+    schedule_timezone: str = "UTC"
+    next_run_at: Optional[datetime] = None
+    profile: Optional[str] = None
+
+
+class JobDetail(JobOut):
+    raw_yaml: Optional[str] = None
+    parsed_yaml: Optional[dict] = None
+
+
+class RunIn(Schema):
+    job_id: UUID
+    profile: Optional[ProfileMode] = None
+
+
+class RunOut(Schema):
+    id: UUID
+    job: Optional[JobRef] = None
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    metrics: Optional[dict] = None
+    profile: Optional[str] = None
+
+
+class RunDetail(RunOut):
+    checkpoint: Optional[dict] = None
+
+
+class ResultsIn(Schema):
+    run_id: UUID
+    payload: Any = None
+    artifacts: Optional[dict] = None
+
+
+class ResultsOut(Schema):
+    id: UUID
+    run_id: Optional[UUID] = None
+    chunk_index: int
+    item_count: int
+    artifacts: Optional[dict] = None
+    created_at: datetime
+
+
+class ResultsDetail(ResultsOut):
+    payload: Any = None
+
+
+class ProjectPage(Schema):
+    items: List[ProjectOut]
+    next_cursor: Optional[str] = None
+
+
+class JobPage(Schema):
+    items: List[JobOut]
+    next_cursor: Optional[str] = None
+
+
+class RunPage(Schema):
+    items: List[RunOut]
+    next_cursor: Optional[str] = None
+
+
+class ResultsPage(Schema):
+    items: List[ResultsOut]
+    next_cursor: Optional[str] = None
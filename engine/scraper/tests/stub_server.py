@@ -0,0 +1,55 @@
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves the responses registered on the server by path."""
+
+    def do_GET(self):
+        self.body = b""
+        self._respond()
+
+    def do_POST(self):
+        self.body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._respond()
+
+    def _respond(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        response = self.server.routes.get(self.path)
+        if callable(response):
+            response = response(self)
+        status, headers, body = response or (404, {}, b"not found")
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def stub_server(routes=None):
+    """Run a local HTTP server in a thread.
+
+    ``routes`` maps a path to ``(status, headers, body)`` or to a callable
+    taking the request handler (whose ``body`` holds what was POSTed) and
+    returning that tuple. The server exposes ``url(path)`` and the list of
+    received ``requests``.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.routes = dict(routes or {})
+    server.requests = []
+    server.url = lambda path: f"http://127.0.0.1:{server.server_port}{path}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
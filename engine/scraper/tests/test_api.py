@@ -0,0 +1,201 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.utils import timezone
+from scraper.models import Job, Results, Run
+from scraper.pagination import decode_cursor, encode_cursor
+from scraper.tests.factories import (
+    JobFactory,
+    ProjectFactory,
+    ResultsFactory,
+    RunFactory,
+)
+
+client = AsyncClient()
+
+
+def call(method, path, *args, **kwargs):
+    """Call the async API from a sync test, on the test's database connection."""
+
+    async def request():
+        return await getattr(client, method)(f"/api{path}", *args, **kwargs)
+
+    return async_to_sync(request)()
+
+
+def get(path, **params):
+    return call("get", path, params)
+
+
+def post(path, data):
+    return call("post", path, data, content_type="application/json")
+
+
+def make_runs(count):
+    """Create runs over several jobs and projects, oldest first."""
+    now = timezone.now()
+    runs = []
+    for n in range(count):
+        job = JobFactory(project=ProjectFactory())
+        run = RunFactory(job=job)
+        Run.objects.filter(pk=run.pk).update(created_at=now - timedelta(minutes=n))
+        runs.append(run)
+    return runs
+
+
+@pytest.mark.unit
+class TestCursor:
+    """Test cases for keyset pagination cursors."""
+
+    @pytest.mark.django_db
+    def test_round_trip(self):
+        """Test that a cursor decodes to the row it was made from."""
+        run = RunFactory()
+        assert decode_cursor(encode_cursor(run)) == (run.created_at, run.id)
+
+    @pytest.mark.django_db
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is a client error."""
+        assert get("/runs", cursor="not-a-cursor").status_code == 400
+
+
+@pytest.mark.integration
+class TestListEndpoints:
+    """Test cases for the paginated list endpoints."""
+
+    @pytest.mark.django_db
+    def test_keyset_pagination_walks_every_row_once(self):
+        """Test paging through runs newest first without gaps or repeats."""
+        runs = make_runs(7)
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            page = get("/runs", **params).json()
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == [str(run.id) for run in runs]
+
+    @pytest.mark.django_db
+    def test_ties_on_created_at_are_broken_by_id(self):
+        """Test that rows sharing a timestamp are neither skipped nor repeated."""
+        runs = make_runs(5)
+        Run.objects.update(created_at=timezone.now())
+        first = get("/runs", limit=2).json()
+        rest = get("/runs", limit=10, cursor=first["next_cursor"]).json()
+        ids = [item["id"] for item in first["items"] + rest["items"]]
+        assert sorted(ids) == sorted(str(run.id) for run in runs)
+        assert len(set(ids)) == 5
+
+    @pytest.mark.parametrize("count", [2, 12])
+    @pytest.mark.django_db
+    def test_runs_list_has_no_n_plus_one(self, count, django_assert_num_queries):
+        """Test that listing runs with their job and project is one query."""
+        make_runs(count)
+        with django_assert_num_queries(1) as captured:
+            response = get("/runs", limit=50)
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert len(items) == count
+        assert items[0]["job"]["project"]["name"].startswith("Test Project")
+        assert "checkpoint" not in items[0]
+        sql = captured.captured_queries[0]["sql"]
+        assert "logs" not in sql and "raw_yaml" not in sql
+        assert "checkpoint" not in sql
+
+    @pytest.mark.django_db
+    def test_jobs_list_filters_and_defers_yaml(self, django_assert_num_queries):
+        """Test filtering jobs by project without loading their recipes."""
+        project = ProjectFactory()
+        JobFactory.create_batch(3, project=project)
+        JobFactory(project=project, is_active=False)
+        JobFactory()
+        with django_assert_num_queries(1) as captured:
+            response = get("/jobs", project=str(project.id), is_active=True)
+        assert len(response.json()["items"]) == 3
+        assert "raw_yaml" not in response.json()["items"][0]
+        assert "raw_yaml" not in captured.captured_queries[0]["sql"]
+
+    @pytest.mark.django_db
+    def test_results_list_defers_payload(self, django_assert_num_queries):
+        """Test that results are listed without their payload."""
+        run = RunFactory()
+        ResultsFactory.create_batch(3, run=run)
+        ResultsFactory()
+        with django_assert_num_queries(1) as captured:
+            response = get("/results", run=str(run.id))
+        assert len(response.json()["items"]) == 3
+        assert "payload" not in captured.captured_queries[0]["sql"]
+
+    @pytest.mark.django_db
+    def test_projects_list(self):
+        """Test listing projects."""
+        ProjectFactory.create_batch(2)
+        assert len(get("/projects").json()["items"]) == 2
+
+
+@pytest.mark.integration
+class TestCreateEndpoints:
+    """Test cases for the create endpoints."""
+
+    @pytest.mark.django_db
+    def test_create_project_job_and_run(self):
+        """Test creating a project, a job in it and queueing a run."""
+        project = post("/projects", {"name": "Catalogue"})
+        assert project.status_code == 201
+        job = post(
+            "/jobs",
+            {
+                "project_id": project.json()["id"],
+                "name": "Products",
+                "raw_yaml": "url: https://example.com\nselector: .title\n",
+            },
+        )
+        assert job.status_code == 201
+        assert job.json()["project"]["name"] == "Catalogue"
+        assert job.json()["raw_yaml"].startswith("url:")
+        run = post("/runs", {"job_id": job.json()["id"]})
+        assert run.status_code == 201
+        assert run.json()["status"] == "queued"
+        assert run.json()["job"]["project"]["name"] == "Catalogue"
+        assert Run.objects.get(pk=run.json()["id"]).job.name == "Products"
+
+    @pytest.mark.django_db
+    def test_create_results(self):
+        """Test storing results for a run and reading the payload back."""
+        run = RunFactory()
+        payload = {"items": [{"name": "a"}, {"name": "b"}]}
+        created = post("/results", {"run_id": str(run.id), "payload": payload})
+        assert created.status_code == 201
+        assert created.json()["item_count"] == 2
+        detail = get(f"/results/{created.json()['id']}").json()
+        assert detail["payload"] == payload
+        assert Results.objects.get(run=run).item_count == 2
+
+    @pytest.mark.django_db
+    def test_missing_parent_is_404(self):
+        """Test that creating under an unknown parent is rejected."""
+        job = JobFactory()
+        Job.objects.filter(pk=job.pk).delete()
+        assert post("/runs", {"job_id": str(job.id)}).status_code == 404
+
+    @pytest.mark.django_db
+    def test_job_detail_includes_recipe(self):
+        """Test that a single job is returned with its recipe."""
+        job = JobFactory()
+        detail = get(f"/jobs/{job.id}").json()
+        assert detail["raw_yaml"] == job.raw_yaml
+        assert detail["parsed_yaml"] == job.parsed_yaml
+
+    @pytest.mark.django_db
+    def test_run_detail_includes_checkpoint(self):
+        """Test that a single run is returned with its checkpoint."""
+        run = RunFactory(checkpoint={"content_hash": "abc", "seq": 2})
+        detail = get(f"/runs/{run.id}").json()
+        assert detail["checkpoint"] == {"content_hash": "abc", "seq": 2}
+        assert detail["job"]["id"] == str(run.job_id)
+        assert get(f"/runs/{uuid.uuid4()}").status_code == 404
@@ -0,0 +1,203 @@
+import asyncio
+
+import pytest
+
+from scrapers.browser.pool import BrowserPool, BrowserPoolClosed
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage(self)
+
+    async def close(self):
+        self.closed = True
+        self.browser.open_contexts -= 1
+
+
+class FakeBrowser:
+    def __init__(self, number):
+        self.number = number
+        self.open_contexts = 0
+        self.closed = False
+        self.memory = 0
+
+    async def new_context(self, **options):
+        assert not self.closed
+        self.open_contexts += 1
+        return FakeContext(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeLauncher:
+    def __init__(self):
+        self.browsers = []
+
+    async def __call__(self):
+        await asyncio.sleep(0)
+        browser = FakeBrowser(len(self.browsers))
+        self.browsers.append(browser)
+        return browser
+
+
+async def fake_memory(browser):
+    return browser.memory
+
+
+def make_pool(**options):
+    return BrowserPool(launcher=FakeLauncher(), **options)
+
+
+@pytest.mark.unit
+class TestBrowserPool:
+    """Test cases for the warm browser pool."""
+
+    def test_browsers_are_reused(self):
+        """Test that sequential checkouts share one warm browser."""
+
+        async def scenario():
+            async with make_pool() as pool:
+                contexts = []
+                for _ in range(5):
+                    async with pool.context() as context:
+                        contexts.append(context)
+                return pool, contexts
+
+        pool, contexts = asyncio.run(scenario())
+        assert pool.stats.launches == 1
+        assert len({context.browser for context in contexts}) == 1
+        assert len(set(map(id, contexts))) == 5
+        assert all(context.closed for context in contexts)
+        assert pool.launcher.browsers[0].closed
+
+    def test_page_has_its_own_context(self):
+        """Test that every page is opened in a new context."""
+
+        async def scenario():
+            async with make_pool() as pool:
+                async with pool.page() as first, pool.page() as second:
+                    return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first.context is not second.context
+        assert first.context.closed and second.context.closed
+
+    def test_contexts_per_browser_are_capped(self):
+        """Test that a second browser is launched once the first is full."""
+
+        async def scenario():
+            async with make_pool(max_browsers=3, max_contexts=2) as pool:
+                async with pool.context() as a, pool.context() as b:
+                    async with pool.context() as c:
+                        return pool.browsers, [ctx.browser.number for ctx in (a, b, c)]
+
+        browsers, numbers = asyncio.run(scenario())
+        assert browsers == 2
+        assert numbers == [0, 0, 1]
+
+    def test_checkouts_wait_when_full(self):
+        """Test that checkouts beyond capacity queue until a context returns."""
+        peak = 0
+
+        async def task(pool):
+            nonlocal peak
+            async with pool.context():
+                peak = max(peak, pool.in_use)
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            async with make_pool(max_browsers=2, max_contexts=2) as pool:
+                await asyncio.gather(*(task(pool) for _ in range(10)))
+                return pool
+
+        pool = asyncio.run(scenario())
+        assert peak == pool.capacity == 4
+        assert pool.stats.launches == 2
+        assert pool.stats.checkouts == 10
+        assert pool.stats.waits >= 6
+
+    def test_recycle_after_max_pages(self):
+        """Test that a browser is replaced after serving ``max_pages`` contexts."""
+
+        async def scenario():
+            async with make_pool(max_pages=3) as pool:
+                for _ in range(7):
+                    async with pool.page():
+                        pass
+                return pool
+
+        pool = asyncio.run(scenario())
+        assert pool.stats.launches == 3
+        assert pool.stats.recycled == 2
+        assert [browser.closed for browser in pool.launcher.browsers] == [True] * 3
+
+    def test_retiring_browser_finishes_its_contexts(self):
+        """Test that a retiring browser is only closed after its last context."""
+
+        async def scenario():
+            async with make_pool(max_pages=1, max_contexts=2) as pool:
+                async with pool.context() as first:
+                    async with pool.context():
+                        pass
+                    browser = first.browser
+                    assert not browser.closed
+                    async with pool.context() as replacement:
+                        assert replacement.browser is not browser
+                assert browser.closed
+
+        asyncio.run(scenario())
+
+    def test_recycle_over_memory(self):
+        """Test that a browser using too much memory is replaced."""
+
+        async def scenario():
+            pool = make_pool(
+                max_memory=100, memory_usage=fake_memory, memory_check_every=1
+            )
+            async with pool:
+                async with pool.page() as page:
+                    page.context.browser.memory = 150
+                async with pool.page() as page:
+                    assert page.context.browser.number == 1
+                return pool
+
+        pool = asyncio.run(scenario())
+        assert pool.stats.recycled == 1
+
+    def test_context_released_on_error(self):
+        """Test that a failing checkout still returns its slot."""
+
+        async def scenario():
+            async with make_pool(max_browsers=1, max_contexts=1) as pool:
+                with pytest.raises(RuntimeError):
+                    async with pool.page():
+                        raise RuntimeError("navigation failed")
+                assert pool.in_use == 0
+                async with pool.page():
+                    pass
+                return pool
+
+        pool = asyncio.run(scenario())
+        assert pool.stats.launches == 1
+
+    def test_closed_pool_rejects_checkouts(self):
+        """Test that checking out from a closed pool fails."""
+
+        async def scenario():
+            pool = make_pool()
+            await pool.close()
+            async with pool.page():
+                pass
+
+        with pytest.raises(BrowserPoolClosed):
+            asyncio.run(scenario())
@@ -0,0 +1,194 @@
+import pytest
+from django.utils import timezone
+from scraper.models import PageDigest, Results, Run
+from scraper.tests.factories import CompletedRunFactory, JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.extract import items_hash
+from scrapers.runners.changes import CarriedItemsError, ChangeTracker, carried_items
+from scrapers.runners.executor import execute_run
+
+ITEMS = [{"name": "Wireless Headphones", "price": "$99.99"}]
+URL = "https://example.com/products"
+
+
+def track(run, items, url=URL):
+    with ChangeTracker(run) as changes:
+        return changes.changed(url, items)
+
+
+@pytest.mark.unit
+class TestItemsHash:
+    """Test cases for hashing extracted items."""
+
+    def test_key_order_does_not_matter(self):
+        """Test that the hash ignores key order within an item."""
+        assert items_hash([{"a": 1, "b": 2}]) == items_hash([{"b": 2, "a": 1}])
+
+    def test_content_and_item_order_matter(self):
+        """Test that different or reordered items hash differently."""
+        assert items_hash([{"a": 1}]) != items_hash([{"a": 2}])
+        assert items_hash([{"a": 1}, {"a": 2}]) != items_hash([{"a": 2}, {"a": 1}])
+
+
+@pytest.mark.unit
+@pytest.mark.models
+class TestChangeTracker:
+    """Test cases for detecting unchanged pages between runs."""
+
+    @pytest.mark.django_db
+    def test_first_run_stores_everything(self):
+        """Test that pages are stored when there is no previous run."""
+        run = RunFactory()
+        assert track(run, ITEMS)
+        digest = PageDigest.objects.get(run=run)
+        assert not digest.unchanged
+        assert digest.content_hash == items_hash(ITEMS)
+        assert digest.item_count == 1
+
+    @pytest.mark.django_db
+    def test_unchanged_page_points_at_source_run(self):
+        """Test that identical items are only recorded as a marker."""
+        first = CompletedRunFactory()
+        track(first, ITEMS)
+        second = CompletedRunFactory(job=first.job)
+        assert not track(second, ITEMS)
+        marker = PageDigest.objects.get(run=second)
+        assert marker.unchanged
+        assert marker.source_run_id == first.pk
+
+        third = RunFactory(job=first.job)
+        assert not track(third, ITEMS)
+        assert PageDigest.objects.get(run=third).source_run_id == first.pk
+
+    @pytest.mark.django_db
+    def test_digests_locate_items(self):
+        """Test that digests record where a page's items start in its run."""
+        first = CompletedRunFactory()
+        with ChangeTracker(first, first_item=5) as changes:
+            changes.changed(URL, ITEMS * 2)
+            changes.changed(f"{URL}?page=2", ITEMS)
+        assert list(
+            first.page_digests.order_by("id").values_list("first_item", flat=True)
+        ) == [5, 7]
+        second = RunFactory(job=first.job)
+        assert not track(second, ITEMS, f"{URL}?page=2")
+        assert PageDigest.objects.get(run=second).first_item == 7
+
+    @pytest.mark.django_db
+    def test_carried_items_span_chunks(self):
+        """Test reading a page's items back across the chunks holding them."""
+        source = CompletedRunFactory()
+        for n, items in enumerate([["a", "b"], ["c", "d"], ["e"]]):
+            Results.objects.create(
+                run=source,
+                payload={"items": [{"v": v} for v in items]},
+                chunk_index=n,
+                item_count=len(items),
+            )
+        run = RunFactory(job=source.job)
+        for url, first, count in [("/x", 1, 2), ("/y", 4, 1), ("/empty", 3, 0)]:
+            PageDigest.objects.create(
+                run=run,
+                url=url,
+                content_hash="h",
+                item_count=count,
+                unchanged=True,
+                source_run=source,
+                first_item=first,
+            )
+        assert [item["v"] for item in carried_items(run)] == ["b", "c", "e"]
+
+    @pytest.mark.django_db
+    def test_lost_items_raise(self):
+        """Test that unchanged pages whose items cannot be found are reported."""
+        run = RunFactory()
+        PageDigest.objects.create(
+            run=run, url=URL, content_hash="h", item_count=1, unchanged=True
+        )
+        with pytest.raises(CarriedItemsError):
+            list(carried_items(run))
+
+    @pytest.mark.django_db
+    def test_changed_page_is_stored(self):
+        """Test that different items are stored again."""
+        first = CompletedRunFactory()
+        track(first, ITEMS)
+        second = RunFactory(job=first.job)
+        assert track(second, [{"name": "Wireless Headphones", "price": "$89.99"}])
+        assert not PageDigest.objects.get(run=second).unchanged
+
+    @pytest.mark.django_db
+    def test_only_successful_runs_are_compared(self):
+        """Test that failed runs are not used as the baseline."""
+        failed = RunFactory(status="failure", started_at=timezone.now())
+        track(failed, ITEMS)
+        assert track(RunFactory(job=failed.job), ITEMS)
+
+    @pytest.mark.django_db
+    def test_not_modified_needs_previous_digest(self):
+        """Test carrying over a 304 page only when it was seen before."""
+        first = CompletedRunFactory()
+        track(first, ITEMS)
+        with ChangeTracker(RunFactory(job=first.job)) as changes:
+            assert changes.not_modified(URL)
+            assert not changes.not_modified("https://example.com/new")
+        assert changes.unchanged == 1
+
+    @pytest.mark.django_db
+    def test_digests_are_written_in_batches(self, django_assert_num_queries):
+        """Test that digests are bulk inserted rather than saved one by one."""
+        run = RunFactory()
+        changes = ChangeTracker(run, batch_size=100)
+        with django_assert_num_queries(1):
+            for n in range(50):
+                changes.changed(f"{URL}?page={n}", ITEMS)
+            changes.flush()
+        assert PageDigest.objects.filter(run=run).count() == 50
+
+
+@pytest.mark.integration
+class TestUnchangedRun:
+    """Test cases for recurring runs over unchanged content."""
+
+    @pytest.mark.django_db
+    def test_second_run_writes_no_results(self):
+        """Test that a run with the same content as the last one stores nothing."""
+        listing = '<ul><li class="product">Wireless Headphones</li></ul>'
+        with stub_server({"/p": (200, {}, listing)}) as server:
+            job = JobFactory(raw_yaml=f"url: {server.url('/p')}\nselector: .product")
+            first = RunFactory(job=job, status="running", started_at=timezone.now())
+            assert execute_run(first) == 1
+            Run.objects.filter(pk=first.pk).update(status="success")
+            second = RunFactory(job=job, status="running", started_at=timezone.now())
+            assert execute_run(second) == 0
+        assert Results.objects.filter(run=first).count() == 1
+        assert not Results.objects.filter(run=second).exists()
+        assert second.page_digests.get().unchanged
+
+    @pytest.mark.django_db
+    def test_unchanged_run_is_rebuilt_from_its_source(self, settings):
+        """Test reading every item of a fully unchanged run from earlier runs."""
+        settings.SCRAPER_HTTP_CACHE_DIR = None
+        pages = {
+            f"/p{n}": (200, {}, "".join(f"<b>{n}.{i}</b>" for i in range(n + 1)))
+            for n in range(3)
+        }
+        with stub_server(pages) as server:
+            urls = "".join(f"\n  - {server.url(path)}" for path in pages)
+            job = JobFactory(raw_yaml=f"items: b\nselector: b\nurls:{urls}")
+            runs = []
+            for _ in range(3):
+                run = RunFactory(job=job, status="running", started_at=timezone.now())
+                execute_run(run)
+                Run.objects.filter(pk=run.pk).update(status="success")
+                runs.append(run)
+        first, _, third = runs
+        assert not Results.objects.filter(run=third).exists()
+        stored = [
+            item
+            for results in Results.objects.filter(run=first).order_by("chunk_index")
+            for item in results.payload["items"]
+        ]
+        assert len(stored) == 6
+        assert list(carried_items(third)) == stored
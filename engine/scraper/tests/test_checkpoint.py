@@ -0,0 +1,236 @@
+import pytest
+from django.utils import timezone
+from scraper.models import PageDigest, Results, Run
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+from scraper.tests.test_api import post
+
+from scrapers.runners import executor
+from scrapers.runners.checkpoint import Checkpoint, resumable_run
+from scrapers.runners.executor import execute_run
+
+PAGES = {f"/p{n}": (200, {}, f"<h1>page {n}</h1>") for n in range(6)}
+
+
+class WorkerDied(Exception):
+    pass
+
+
+@pytest.fixture
+def checkpoints(settings, tmp_path, monkeypatch):
+    """Checkpoint after every round of two pages."""
+    settings.SCRAPER_CHECKPOINT_INTERVAL = 0
+    settings.SCRAPER_FRONTIER_DIR = tmp_path
+    monkeypatch.setattr(executor, "CRAWL_BATCH", 2)
+
+
+@pytest.fixture
+def crash(monkeypatch):
+    """Make the run die after the first page of round ``n``."""
+    real = executor.iter_pages
+
+    def arm(n):
+        rounds = []
+
+        def iter_pages(urls, **options):
+            rounds.append(urls)
+            pages = real(urls, **options)
+            if len(rounds) < n:
+                return pages
+
+            def dying():
+                yield next(pages)
+                pages.close()
+                raise WorkerDied()
+
+            return dying()
+
+        monkeypatch.setattr(executor, "iter_pages", iter_pages)
+
+    def disarm():
+        monkeypatch.setattr(executor, "iter_pages", real)
+
+    arm.disarm = disarm
+    return arm
+
+
+def items(run):
+    return sorted(
+        item["content"]
+        for result in Results.objects.filter(run=run)
+        for item in result.payload["items"]
+    )
+
+
+def fetched(server):
+    return sorted(path for path, _ in server.requests)
+
+
+def start(job):
+    return RunFactory(job=job, status="running", started_at=timezone.now())
+
+
+def fail(run):
+    Run.objects.filter(pk=run.pk).update(status="failure")
+    run.refresh_from_db()
+
+
+def url_list_job(server):
+    urls = "".join(f"\n  - {server.url(path)}" for path in PAGES)
+    return JobFactory(raw_yaml=f"selector: h1\nurls:{urls}")
+
+
+@pytest.mark.integration
+class TestResumeUrlList:
+    """Test cases for resuming runs over a recipe's URL list."""
+
+    @pytest.mark.django_db
+    def test_retry_resumes_the_same_run(self, checkpoints, crash):
+        """Test that a retried run skips the pages it had checkpointed."""
+        with stub_server(PAGES) as server:
+            run = start(url_list_job(server))
+            crash(3)
+            with pytest.raises(WorkerDied):
+                execute_run(run)
+            fail(run)
+            checkpoint = Checkpoint.of(run)
+            assert (checkpoint.seq, checkpoint.position, checkpoint.pages) == (2, 4, 4)
+            assert checkpoint.items == 4
+            crash.disarm()
+            assert execute_run(run) == 6
+        # The page of the crashed round stored after the checkpoint was
+        # dropped on resume and scraped again; nothing is duplicated.
+        assert items(run) == [f"page {n}" for n in range(6)]
+        assert PageDigest.objects.filter(run=run).count() == 6
+        assert [fetched(server).count(f"/p{n}") for n in range(4)] == [1] * 4
+        run.refresh_from_db()
+        assert run.checkpoint is None
+
+    @pytest.mark.django_db
+    def test_next_run_takes_over(self, checkpoints, crash):
+        """Test that the job's next run resumes a failed run's checkpoint."""
+        with stub_server(PAGES) as server:
+            job = url_list_job(server)
+            failed = start(job)
+            crash(2)
+            with pytest.raises(WorkerDied):
+                execute_run(failed)
+            fail(failed)
+            crash.disarm()
+            run = start(job)
+            assert execute_run(run) == 6
+        assert items(run) == [f"page {n}" for n in range(6)]
+        assert not Results.objects.filter(run=failed).exists()
+        failed.refresh_from_db()
+        assert failed.checkpoint is None
+        assert resumable_run(start(job), run.job.compiled_recipe.content_hash) is None
+
+    @pytest.mark.django_db
+    def test_changed_recipe_starts_over(self, checkpoints, crash):
+        """Test that a checkpoint is only resumed by the same recipe."""
+        with stub_server(PAGES) as server:
+            job = url_list_job(server)
+            failed = start(job)
+            crash(2)
+            with pytest.raises(WorkerDied):
+                execute_run(failed)
+            fail(failed)
+            crash.disarm()
+            job.raw_yaml += "\nname: changed"
+            job.save()
+            run = start(job)
+            assert execute_run(run) == 6
+        assert Results.objects.filter(run=failed).exists()
+        assert len(items(run)) == 6
+
+    @pytest.mark.django_db
+    def test_checkpoints_follow_the_interval(self, settings, crash):
+        """Test that without a checkpoint the run starts over."""
+        settings.SCRAPER_CHECKPOINT_INTERVAL = 3600
+        with stub_server(PAGES) as server:
+            job = url_list_job(server)
+            failed = start(job)
+            crash(1)
+            with pytest.raises(WorkerDied):
+                execute_run(failed)
+            fail(failed)
+            assert failed.checkpoint is None
+
+
+@pytest.mark.integration
+class TestResumeCrawl:
+    """Test cases for resuming crawls through their frontier."""
+
+    site = {
+        "/": (
+            200,
+            {},
+            "<h1>home</h1>" + "".join(f'<a href="/p{n}">p</a>' for n in range(5)),
+        ),
+        **PAGES,
+    }
+
+    @pytest.mark.django_db
+    def test_crawl_resumes_from_the_frontier(self, checkpoints, crash):
+        """Test that every page of an interrupted crawl is stored exactly once."""
+        with stub_server(self.site) as server:
+            job = JobFactory(
+                raw_yaml=f"url: {server.url('/')}\nselector: h1\nfollow: a"
+            )
+            failed = start(job)
+            crash(2)
+            with pytest.raises(WorkerDied):
+                execute_run(failed)
+            fail(failed)
+            crash.disarm()
+            run = start(job)
+            assert execute_run(run) == 6
+        assert items(run) == ["home"] + [f"page {n}" for n in range(5)]
+        # Only pages of the round that crashed were fetched twice.
+        assert fetched(server).count("/") == 1
+        assert len(server.requests) <= 8
+
+    @pytest.mark.django_db
+    def test_concurrent_crawls_keep_their_frontiers(self, settings, checkpoints, crash):
+        """Test that another run of the job leaves a crawl's frontier alone."""
+        with stub_server(self.site) as server:
+            job = JobFactory(
+                raw_yaml=f"url: {server.url('/')}\nselector: h1\nfollow: a"
+            )
+            interrupted = start(job)
+            crash(2)
+            with pytest.raises(WorkerDied):
+                execute_run(interrupted)
+            crash.disarm()
+            other = start(job)
+            assert execute_run(other) == 6
+            interrupted.refresh_from_db()
+            assert execute_run(interrupted) == 6
+        assert items(interrupted) == items(other)
+        assert not list(settings.SCRAPER_FRONTIER_DIR.iterdir())
+
+
+@pytest.mark.integration
+class TestRetryEndpoint:
+    """Test cases for retrying runs through the API."""
+
+    @pytest.mark.django_db
+    def test_failed_run_is_queued_again(self):
+        """Test that a failed run goes back to the queue with its checkpoint."""
+        run = RunFactory(
+            status="failure",
+            finished_at=timezone.now(),
+            checkpoint={"content_hash": "abc", "seq": 3},
+        )
+        response = post(f"/runs/{run.id}/retry", {})
+        assert response.status_code == 200
+        assert response.json()["status"] == "queued"
+        assert response.json()["checkpoint"]["seq"] == 3
+        run.refresh_from_db()
+        assert (run.status, run.finished_at) == ("queued", None)
+
+    @pytest.mark.django_db
+    def test_only_failed_runs(self):
+        """Test that other runs cannot be retried."""
+        run = RunFactory(status="running")
+        assert post(f"/runs/{run.id}/retry", {}).status_code == 409
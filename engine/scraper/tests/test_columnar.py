@@ -0,0 +1,208 @@
+import json
+
+import pyarrow as pa
+import pytest
+from django.utils import timezone
+from scraper import export
+from scraper.models import Results
+from scraper.tests.factories import JobFactory, RunFactory, RunningRunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core import columnar
+from scrapers.runners.executor import execute_run
+from scrapers.runners.results import ColumnarResultsWriter
+
+
+def make_items(count, start=0):
+    return [
+        {"name": f"Product {n}", "price": f"${n}.99", "tags": ["new"] if n % 2 else []}
+        for n in range(start, start + count)
+    ]
+
+
+def artifacts(run):
+    return [
+        results.artifacts
+        for results in Results.objects.filter(run=run).order_by("chunk_index")
+    ]
+
+
+@pytest.mark.unit
+class TestColumnarFiles:
+    """Test cases for writing and reading columnar files."""
+
+    @pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+    def test_round_trip(self, tmp_path, fmt):
+        """Test that items read back as written, in batches or as a table."""
+        items = make_items(250)
+        location = tmp_path / "items" / f"part{columnar.FORMATS[fmt]}"
+        with columnar.ColumnarFileWriter(location, fmt) as writer:
+            for start in range(0, 250, 100):
+                writer.write_batch(items[start : start + 100])
+            artifact = writer.close()
+
+        assert artifact["format"] == fmt
+        assert artifact["rows"] == 250
+        assert artifact["bytes"] == location.stat().st_size
+        assert artifact["schema"] == [
+            {"name": "name", "type": "string"},
+            {"name": "price", "type": "string"},
+            {"name": "tags", "type": "list<item: string>"},
+        ]
+        assert list(columnar.iter_items(artifact, batch_size=64)) == items
+        table = columnar.read_table(artifact, columns=["price"])
+        assert table.column_names == ["price"]
+        assert table.column("price").to_pylist()[-1] == "$249.99"
+
+    def test_null_columns_are_stored_as_strings(self, tmp_path):
+        """Test that a column first seen empty still accepts text later."""
+        with columnar.ColumnarFileWriter(tmp_path / "part.parquet") as writer:
+            writer.write_batch([{"name": None, "tags": []}])
+            writer.write_batch([{"name": "a", "tags": ["x"]}])
+            artifact = writer.close()
+        assert list(columnar.iter_items(artifact)) == [
+            {"name": None, "tags": []},
+            {"name": "a", "tags": ["x"]},
+        ]
+
+    def test_fields_of_every_item_are_kept(self, tmp_path):
+        """Test that fields missing from the first item are not dropped."""
+        with columnar.ColumnarFileWriter(tmp_path / "part.parquet") as writer:
+            writer.write_batch([{"name": "a"}, {"name": "b", "price": 2}])
+            with pytest.raises(pa.ArrowInvalid):
+                writer.write_batch([{"name": "c", "stock": 3}])
+            artifact = writer.close()
+        assert list(columnar.iter_items(artifact)) == [
+            {"name": "a", "price": None},
+            {"name": "b", "price": 2},
+        ]
+
+    def test_empty_file_has_no_artifact(self, tmp_path):
+        """Test that nothing is written when there are no items."""
+        writer = columnar.ColumnarFileWriter(tmp_path / "part.parquet")
+        writer.write_batch([])
+        assert writer.close() is None
+        assert not (tmp_path / "part.parquet").exists()
+
+    def test_smaller_than_json(self, tmp_path):
+        """Test that repetitive items take much less space than their JSON."""
+        items = make_items(20_000)
+        with columnar.ColumnarFileWriter(tmp_path / "part.parquet") as writer:
+            writer.write_batch(items)
+            artifact = writer.close()
+        assert artifact["bytes"] * 5 < len(json.dumps(items))
+
+    def test_unknown_format(self, tmp_path):
+        """Test that only Parquet and Arrow IPC are accepted."""
+        with pytest.raises(ValueError):
+            columnar.ColumnarFileWriter(tmp_path / "part.csv", "csv")
+
+
+@pytest.mark.integration
+class TestColumnarResultsWriter:
+    """Test cases for storing a run's items as columnar files."""
+
+    @pytest.mark.django_db
+    def test_files_are_recorded_in_results(self, tmp_path):
+        """Test that each file gets a Results row describing it."""
+        run = RunningRunFactory()
+        with ColumnarResultsWriter(
+            run, str(tmp_path), batch_size=100, rows_per_file=300
+        ) as writer:
+            writer.write_many(make_items(650))
+
+        stored = list(Results.objects.filter(run=run).order_by("chunk_index"))
+        assert [results.item_count for results in stored] == [300, 300, 50]
+        assert all(results.payload is None for results in stored)
+        first = stored[0].artifacts
+        assert first["location"] == str(
+            tmp_path / str(run.job_id) / str(run.id) / "part-00000.parquet"
+        )
+        assert first["rows"] == 300
+        items = [
+            item
+            for artifact in artifacts(run)
+            for item in columnar.iter_items(artifact)
+        ]
+        assert items == make_items(650)
+        assert writer.items_written == 650
+        assert writer.chunks_written == 3
+
+    @pytest.mark.django_db
+    def test_memory_is_bounded(self, tmp_path):
+        """Test that at most one batch of items is buffered."""
+        run = RunningRunFactory()
+        writer = ColumnarResultsWriter(run, str(tmp_path), batch_size=50)
+        peak = 0
+        for item in make_items(1000):
+            writer.write(item)
+            peak = max(peak, writer.buffered)
+        writer.close()
+        assert peak < 50
+        assert writer.items_written == 1000
+
+    @pytest.mark.django_db
+    def test_schema_change_starts_a_new_file(self, tmp_path):
+        """Test that items no longer fitting the schema go to a new file."""
+        run = RunningRunFactory()
+        with ColumnarResultsWriter(run, str(tmp_path), batch_size=2) as writer:
+            writer.write_many([{"price": 1.5}, {"price": 2.0}])
+            writer.write_many([{"price": "n/a"}, {"price": "$3"}])
+        schemas = [artifact["schema"] for artifact in artifacts(run)]
+        assert schemas == [
+            [{"name": "price", "type": "double"}],
+            [{"name": "price", "type": "string"}],
+        ]
+
+    @pytest.mark.django_db
+    def test_new_fields_widen_the_schema(self, tmp_path):
+        """Test that a batch with an extra field starts a wider file."""
+        run = RunningRunFactory()
+        with ColumnarResultsWriter(run, str(tmp_path), batch_size=2) as writer:
+            writer.write_many([{"name": "a"}, {"name": "b"}])
+            writer.write_many([{"name": "c", "price": 3.5}, {"name": "d"}])
+        schemas = [artifact["schema"] for artifact in artifacts(run)]
+        assert schemas == [
+            [{"name": "name", "type": "string"}],
+            [{"name": "name", "type": "string"}, {"name": "price", "type": "double"}],
+        ]
+        items = [
+            item
+            for artifact in artifacts(run)
+            for item in columnar.iter_items(artifact)
+        ]
+        assert items == [
+            {"name": "a"},
+            {"name": "b"},
+            {"name": "c", "price": 3.5},
+            {"name": "d", "price": None},
+        ]
+        assert writer.items_written == 4
+
+    @pytest.mark.django_db
+    def test_export_reads_files(self, tmp_path):
+        """Test that exports stream items stored as columnar files."""
+        job = JobFactory()
+        run = RunningRunFactory(job=job)
+        with ColumnarResultsWriter(run, str(tmp_path), fmt="arrow") as writer:
+            writer.write_many(make_items(3))
+        body = b"".join(export.iter_export(export.results_for_job(job), with_run=True))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        assert rows == [{"run_id": str(run.id), **item} for item in make_items(3)]
+
+    @pytest.mark.django_db
+    def test_execute_run(self, tmp_path, settings):
+        """Test that runs store their items as configured."""
+        settings.SCRAPER_RESULTS_FORMAT = "parquet"
+        settings.SCRAPER_RESULTS_STORE = tmp_path
+        listing = "<li class='p'><b>A</b></li><li class='p'><b>B</b></li>"
+        with stub_server({"/products": (200, {}, listing)}) as server:
+            job = JobFactory(
+                raw_yaml=f"url: {server.url('/products')}\nitems: .p\nselector: b"
+            )
+            run = RunFactory(job=job, status="running", started_at=timezone.now())
+            assert execute_run(run) == 2
+        (artifact,) = artifacts(run)
+        table = columnar.read_table(artifact)
+        assert isinstance(table, pa.Table)
+        assert table.num_rows == 2
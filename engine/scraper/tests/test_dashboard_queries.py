@@ -0,0 +1,95 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from scraper.management.commands.bench_dashboard import FULL_SCAN
+from scraper.models import Job, Project, Results, Run
+
+
+@pytest.mark.unit
+@pytest.mark.models
+class TestDashboardIndexes:
+    """Test cases for the indexes behind the dashboard queries."""
+
+    @pytest.mark.parametrize(
+        "model, fields",
+        [
+            (Job, ["project", "is_active"]),
+            (Run, ["job", "status"]),
+            (Run, ["job", "started_at"]),
+            (Run, ["status", "created_at"]),
+            (Results, ["run", "created_at"]),
+            (Project, ["created_at", "id"]),
+            (Job, ["created_at", "id"]),
+            (Run, ["created_at", "id"]),
+            (Run, ["job", "created_at", "id"]),
+            (Results, ["created_at", "id"]),
+        ],
+    )
+    def test_index_declared(self, model, fields):
+        """Test that the composite index exists on the model."""
+        assert fields in [list(index.fields) for index in model._meta.indexes]
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("model", [Project, Job, Run, Results])
+    def test_pages_are_read_in_index_order(self, model):
+        """Test that keyset pages are not sorted after a full read."""
+        page = model.objects.order_by("-created_at", "-id")[:51]
+        plan = page.explain()
+        assert "USING INDEX" in plan
+        assert "TEMP B-TREE" not in plan
+
+    @pytest.mark.parametrize(
+        "plan, table",
+        [
+            ("2 0 0 SCAN scraper_run", "scraper_run"),
+            (
+                "Seq Scan on scraper_results  (cost=0.00..1.00 rows=1)",
+                "scraper_results",
+            ),
+        ],
+    )
+    def test_full_scan_detection(self, plan, table):
+        """Test recognising full scans in SQLite and PostgreSQL plans."""
+        assert table in FULL_SCAN.search(plan).groups()
+
+    def test_index_scan_is_not_flagged(self):
+        """Test that index searches are not reported as full scans."""
+        plan = "3 0 0 SEARCH scraper_run USING INDEX run_job_status_idx (job_id=?)"
+        assert FULL_SCAN.search(plan) is None
+
+    @pytest.mark.slow
+    @pytest.mark.django_db
+    def test_dashboard_queries_use_indexes(self):
+        """Test that no dashboard query reads a table in full."""
+        out = StringIO()
+        call_command(
+            "bench_dashboard",
+            projects=3,
+            jobs=4,
+            runs=5,
+            results=2,
+            repeat=1,
+            fail_on_scan=True,
+            stdout=out,
+        )
+        assert "FULL SCAN" not in out.getvalue()
+        assert not Project.objects.filter(name__startswith="bench_dashboard").exists()
+
+    @pytest.mark.django_db
+    def test_seeded_runs_are_finished(self):
+        """Test that seeded runs give workers nothing to claim."""
+        call_command(
+            "bench_dashboard",
+            projects=1,
+            jobs=2,
+            runs=20,
+            results=0,
+            repeat=1,
+            keep=True,
+            stdout=StringIO(),
+        )
+        runs = Run.objects.filter(job__project__name__startswith="bench_dashboard")
+        assert runs.count() == 40
+        assert set(runs.values_list("status", flat=True)) <= {"success", "failure"}
+        assert not runs.filter(finished_at__isnull=True).exists()
@@ -0,0 +1,201 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import Client
+from scraper import export
+from scraper.models import PageDigest, Results, Run
+from scraper.tests.factories import JobFactory, RunFactory
+
+from scrapers.runners.results import ColumnarResultsWriter
+
+
+def download(path, **params):
+    """Fetch an export through the URLconf and read the whole body."""
+    response = Client().get(f"/api{path}", params)
+    if response.streaming:
+        return response, b"".join(response.streaming_content)
+    return response, response.content
+
+
+def store(run, *chunks):
+    Results.objects.bulk_create(
+        Results(run=run, payload={"items": items}, chunk_index=n, item_count=len(items))
+        for n, items in enumerate(chunks)
+    )
+
+
+def carry(run, source, url, first, count):
+    """Record a page of ``run`` as unchanged since ``source`` stored it."""
+    PageDigest.objects.create(
+        run=run,
+        url=url,
+        content_hash="h",
+        item_count=count,
+        unchanged=True,
+        source_run=source,
+        first_item=first,
+    )
+
+
+def ndjson(body):
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+@pytest.mark.integration
+class TestExport:
+    """Test cases for streaming result exports."""
+
+    @pytest.mark.django_db
+    def test_run_export_ndjson(self):
+        """Test exporting a run's items in chunk order."""
+        run = RunFactory()
+        store(run, [{"name": "a"}, {"name": "b"}], [{"name": "c"}])
+        response, body = download(f"/runs/{run.id}/export")
+        assert response.streaming
+        assert response["Content-Type"] == "application/x-ndjson"
+        assert f'filename="run-{run.id}.ndjson"' in response["Content-Disposition"]
+        assert ndjson(body) == [{"name": "a"}, {"name": "b"}, {"name": "c"}]
+
+    @pytest.mark.django_db
+    def test_run_export_csv(self):
+        """Test exporting as CSV, with nested values as JSON."""
+        run = RunFactory()
+        store(run, [{"name": "a", "tags": ["x", "y"]}, {"name": "b,c", "tags": []}])
+        _, body = download(f"/runs/{run.id}/export", format="csv")
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        assert rows == [
+            {"name": "a", "tags": '["x", "y"]'},
+            {"name": "b,c", "tags": "[]"},
+        ]
+
+    @pytest.mark.django_db
+    def test_csv_of_mixed_items(self, tmp_path):
+        """Test that the CSV header has the keys of every item of every run."""
+        job = JobFactory()
+        first, second = RunFactory(job=job), RunFactory(job=job)
+        store(first, [{"name": "a"}], [{"name": "b", "price": 2}])
+        with ColumnarResultsWriter(second, str(tmp_path)) as writer:
+            writer.write({"name": "c", "sku": "S"})
+        _, body = download(f"/jobs/{job.id}/export", format="csv")
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        assert [list(row.items()) for row in rows] == [
+            [("run_id", str(first.id)), ("name", "a"), ("price", ""), ("sku", "")],
+            [("run_id", str(first.id)), ("name", "b"), ("price", "2"), ("sku", "")],
+            [("run_id", str(second.id)), ("name", "c"), ("price", ""), ("sku", "S")],
+        ]
+
+    @pytest.mark.django_db
+    def test_gzip(self):
+        """Test that the gzip option compresses the stream."""
+        run = RunFactory()
+        store(run, [{"name": str(n)} for n in range(500)])
+        response, body = download(f"/runs/{run.id}/export", gzip=True)
+        assert response["Content-Type"] == "application/gzip"
+        assert len(ndjson(gzip.decompress(body))) == 500
+
+    @pytest.mark.django_db
+    def test_job_export_tags_items_with_run(self):
+        """Test exporting every run of a job."""
+        job = JobFactory()
+        first, second = RunFactory(job=job), RunFactory(job=job)
+        store(first, [{"name": "a"}])
+        store(second, [{"name": "b"}])
+        store(RunFactory(), [{"name": "other job"}])
+        _, body = download(f"/jobs/{job.id}/export")
+        assert sorted(
+            (item["run_id"], item["name"]) for item in ndjson(body)
+        ) == sorted([(str(first.id), "a"), (str(second.id), "b")])
+
+    @pytest.mark.django_db
+    def test_legacy_payloads(self):
+        """Test that unchunked results are exported as single items."""
+        run = RunFactory()
+        Results.objects.create(run=run, payload={"title": "old"})
+        _, body = download(f"/runs/{run.id}/export")
+        assert ndjson(body) == [{"title": "old"}]
+
+    @pytest.mark.django_db
+    def test_output_is_streamed_in_blocks(self, monkeypatch):
+        """Test that output is sent in bounded blocks while rows are read."""
+        monkeypatch.setattr(export, "BLOCK_SIZE", 256)
+        monkeypatch.setattr(export, "CHUNK_SIZE", 2)
+        run = RunFactory()
+        store(run, *[[{"name": "x" * 50}] * 5 for _ in range(10)])
+        blocks = list(export.iter_export(export.results_for_run(run)))
+        assert len(blocks) > 10
+        assert max(len(block) for block in blocks) < 256 + 100
+        assert len(ndjson(b"".join(blocks))) == 50
+
+    @pytest.mark.django_db
+    def test_async_stream_matches_sync(self):
+        """Test that the ASGI stream produces the same bytes."""
+        run = RunFactory()
+        store(run, [{"name": "a"}], [{"name": "b"}])
+
+        async def collect():
+            return [
+                block
+                async for block in export.aiter_export(
+                    export.results_for_run(run), "csv", True
+                )
+            ]
+
+        expected = b"".join(export.iter_export(export.results_for_run(run), "csv"))
+        assert gzip.decompress(b"".join(async_to_sync(collect)())) == expected
+
+    @pytest.mark.django_db
+    def test_errors(self):
+        """Test unknown runs and formats."""
+        run = RunFactory()
+        assert download(f"/runs/{run.id}/export", format="xml")[0].status_code == 422
+        Run.objects.filter(pk=run.pk).delete()
+        assert download(f"/runs/{run.id}/export")[0].status_code == 404
+
+    @pytest.mark.django_db
+    def test_unchanged_pages_are_exported(self):
+        """Test that a run's export holds the items of its unchanged pages."""
+        source = RunFactory(status="success")
+        store(source, [{"name": "a"}, {"name": "b"}], [{"name": "c", "sku": "S"}])
+        run = RunFactory(job=source.job)
+        store(run, [{"name": "new"}])
+        carry(run, source, "/b", 1, 2)
+        _, body = download(f"/runs/{run.id}/export")
+        assert ndjson(body) == [
+            {"name": "new"},
+            {"name": "b"},
+            {"name": "c", "sku": "S"},
+        ]
+        _, body = download(f"/runs/{run.id}/export", format="csv")
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        assert [row["sku"] for row in rows] == ["", "", "S"]
+
+    @pytest.mark.django_db
+    def test_unchanged_run_async_export(self):
+        """Test the ASGI export of a run that stored no items of its own."""
+        source = RunFactory(status="success")
+        store(source, [{"name": "a"}, {"name": "b"}])
+        run = RunFactory(job=source.job)
+        carry(run, source, "/a", 0, 2)
+
+        async def collect():
+            results = export.results_for_run(run)
+            return [block async for block in export.aiter_export(results, run=run)]
+
+        assert ndjson(b"".join(async_to_sync(collect)())) == [
+            {"name": "a"},
+            {"name": "b"},
+        ]
+
+    @pytest.mark.django_db
+    def test_lost_unchanged_pages_refuse_export(self):
+        """Test that a run whose carried items are gone is not half exported."""
+        run = RunFactory()
+        store(run, [{"name": "new"}])
+        carry(run, None, "/gone", None, 1)
+        response, body = download(f"/runs/{run.id}/export")
+        assert response.status_code == 409
+        assert b"/gone" in body
@@ -0,0 +1,184 @@
+import pytest
+
+from scrapers.core.extract import Extractor, extractor_for, parse_html
+from scrapers.core.recipe import compile_recipe
+
+LISTING = b"""
+<html><body>
+  <h1 class="page-title">Products</h1>
+  <ul>
+    <li class="product card">
+      <h2 class="product-title"> Wireless   Headphones </h2>
+      <span class="price">$99.99</span>
+      <span class="stock-status">In Stock</span>
+      <a class="product-link" href="/p/1">View</a>
+      <i class="tag">audio</i><i class="tag">wireless</i>
+      <div class="meta"><b>SKU-1</b></div>
+    </li>
+    <li class="product">
+      <h2 class="product-title">Bluetooth Speaker</h2>
+      <span class="price">$49.99</span>
+      <span class="stock-status">Limited Stock</span>
+      <a class="product-link" href="/p/2">View</a>
+    </li>
+    <li class="products-header"><span class="price">not an item</span></li>
+  </ul>
+  <aside><span class="price">$1.00</span></aside>
+</body></html>
+"""
+
+ITEM_RECIPE = """
+url: https://example-store.com/products
+items: .product
+selectors:
+  name: .product-title
+  price: .price
+  availability: .stock-status
+  link: {css: a.product-link, attr: href}
+  tags: {css: .tag, all: true}
+  sku: .meta b
+"""
+
+
+NESTED = b"""
+<div class="item"><b class="name">outer</b>
+  <div class="item"><b class="name">inner</b><i class="tag">x</i></div>
+  <i class="tag">y</i>
+</div>
+<div class="item"><b class="name">last</b></div>
+"""
+
+# An item block that is also a field of the item around it.
+OVERLAPPING = b"""
+<section class="card"><b class="name">outer</b>
+  <section class="card name"><i class="tag">x</i></section>
+  <i class="tag">y</i>
+</section>
+<section class="card name"><i class="tag">z</i></section>
+"""
+
+NESTED_RECIPE = """
+url: https://example.com
+items: {items}
+selectors:
+  name: .name
+  tags: {{css: .tag, all: true}}
+"""
+
+
+@pytest.mark.unit
+class TestExtractor:
+    """Test cases for the compiled extraction engine."""
+
+    def test_item_rows(self):
+        """Test extracting one tuple per repeated item block."""
+        extractor = Extractor(compile_recipe(ITEM_RECIPE))
+        assert extractor.columns == (
+            "name",
+            "price",
+            "availability",
+            "link",
+            "tags",
+            "sku",
+        )
+        assert extractor.extract(LISTING) == [
+            (
+                "Wireless Headphones",
+                "$99.99",
+                "In Stock",
+                "/p/1",
+                ["audio", "wireless"],
+                "SKU-1",
+            ),
+            ("Bluetooth Speaker", "$49.99", "Limited Stock", "/p/2", [], None),
+        ]
+
+    def test_nodes_outside_items_are_ignored(self):
+        """Test that field matches after the last item are not attributed to it."""
+        extractor = Extractor(compile_recipe(ITEM_RECIPE))
+        prices = [row[1] for row in extractor.extract(LISTING)]
+        assert prices == ["$99.99", "$49.99"]
+
+    def test_complex_item_selector(self):
+        """Test items matched by a selector that needs its own XPath."""
+        recipe = ITEM_RECIPE.replace("items: .product", "items: ul > li.product")
+        rows = Extractor(compile_recipe(recipe)).extract(LISTING)
+        assert [row[0] for row in rows] == ["Wireless Headphones", "Bluetooth Speaker"]
+
+    @pytest.mark.parametrize(
+        "items, page",
+        [
+            (".item", NESTED),
+            (".card", OVERLAPPING),
+            (".product", LISTING),
+            (".name", OVERLAPPING),
+        ],
+        ids=["nested", "overlapping", "flat", "items-are-fields"],
+    )
+    def test_single_pass_matches_per_item(self, items, page):
+        """Test that nested and overlapping items extract as item by item."""
+        extractor = Extractor(compile_recipe(NESTED_RECIPE.format(items=items)))
+        document = parse_html(page)
+        assert extractor.extract(document) == extractor._extract_items(document)
+
+    def test_nested_items(self):
+        """Test that a nested item's fields also belong to the outer item."""
+        recipe = compile_recipe(NESTED_RECIPE.format(items=".item"))
+        assert Extractor(recipe).extract(NESTED) == [
+            ("outer", ["x", "y"]),
+            ("inner", ["x"]),
+            ("last", []),
+        ]
+
+    def test_page_row(self):
+        """Test that a recipe without items yields a single row per page."""
+        recipe = """
+url: https://example.com
+selectors:
+  title: h1.page-title
+  first_price: .price
+  prices: {css: .price, all: true}
+  links: {xpath: "//a/@href", all: true}
+"""
+        rows = Extractor(compile_recipe(recipe)).extract(LISTING)
+        assert rows == [
+            (
+                "Products",
+                "$99.99",
+                ["$99.99", "$49.99", "not an item", "$1.00"],
+                ["/p/1", "/p/2"],
+            )
+        ]
+
+    def test_class_match_is_exact(self):
+        """Test that ``.product`` does not match ``products-header``."""
+        recipe = (
+            "url: https://example.com\nselectors: {items: {css: .product, all: true}}"
+        )
+        (row,) = Extractor(compile_recipe(recipe)).extract(LISTING)
+        assert len(row[0]) == 2
+
+    def test_attribute_selectors_and_quotes(self):
+        """Test attribute selectors, including values containing quotes."""
+        html = """<div><p data-x="it's">a</p><p data-x='say "hi"'>b</p><p>c</p></div>"""
+        recipe = """
+url: https://example.com
+selectors:
+  apostrophe: {css: "p[data-x=\\"it's\\"]"}
+  quoted: {css: "p[data-x='say \\"hi\\"']"}
+  any: {css: "p[data-x]", all: true}
+"""
+        (row,) = Extractor(compile_recipe(recipe)).extract(html)
+        assert row == ("a", "b", ["a", "b"])
+
+    def test_extract_dicts(self):
+        """Test the mapping form of the rows."""
+        extractor = Extractor(compile_recipe(ITEM_RECIPE))
+        rows = extractor.extract_dicts(parse_html(LISTING))
+        assert rows[1]["name"] == "Bluetooth Speaker"
+        assert rows[1]["link"] == "/p/2"
+
+    def test_extractor_is_shared_per_plan(self):
+        """Test that an extractor is built once per compiled plan."""
+        plan = compile_recipe(ITEM_RECIPE)
+        assert extractor_for(plan) is extractor_for(plan)
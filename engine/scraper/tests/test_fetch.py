@@ -0,0 +1,151 @@
+import asyncio
+from contextlib import aclosing
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from scrapers.core.fetch import Fetcher, FetchError
+
+
+class StubSite:
+    """Local HTTP server that records how many requests are in flight."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        app = web.Application()
+        app.router.add_get("/page/{n}", self.page)
+        self.server = TestServer(app)
+
+    async def page(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(float(request.query.get("delay", self.delay)))
+            return web.Response(text=f"<p>page {request.match_info['n']}</p>")
+        finally:
+            self.in_flight -= 1
+
+    def url(self, n):
+        return str(self.server.make_url(f"/page/{n}"))
+
+
+def run_against_site(coro_factory, **site_kwargs):
+    async def main():
+        site = StubSite(**site_kwargs)
+        await site.server.start_server()
+        try:
+            return site, await coro_factory(site)
+        finally:
+            await site.server.close()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.unit
+class TestFetcher:
+    """Test cases for the pooled async fetcher."""
+
+    def test_fetch_reads_body(self):
+        """Test fetching a single page."""
+
+        async def scenario(site):
+            async with Fetcher() as fetcher:
+                return await fetcher.fetch(site.url(1))
+
+        _, result = run_against_site(scenario)
+        assert result.ok
+        assert result.status == 200
+        assert result.text() == "<p>page 1</p>"
+        assert result.elapsed >= 0
+
+    def test_connections_are_reused(self):
+        """Test that sequential requests share one keep-alive connection."""
+
+        async def scenario(site):
+            async with Fetcher() as fetcher:
+                for n in range(20):
+                    await fetcher.fetch(site.url(n))
+                return fetcher.stats
+
+        _, stats = run_against_site(scenario)
+        assert stats.requests == 20
+        assert stats.connections_opened == 1
+        assert stats.connections_reused == 19
+
+    def test_per_host_limit(self):
+        """Test that no more than ``per_host`` requests hit one host at once."""
+
+        async def scenario(site):
+            async with Fetcher(per_host=3) as fetcher:
+                urls = [site.url(n) for n in range(12)]
+                return [result async for result in fetcher.fetch_many(urls)]
+
+        site, results = run_against_site(scenario, delay=0.02)
+        assert len(results) == 12
+        assert all(result.ok for result in results)
+        assert site.max_in_flight == 3
+
+    def test_stream_yields_chunks(self):
+        """Test reading a response body incrementally."""
+
+        async def scenario(site):
+            async with Fetcher() as fetcher:
+                async with fetcher.stream(site.url(7)) as response:
+                    chunks = [chunk async for chunk in response.iter_chunks(4)]
+                return response.status, chunks, fetcher.stats
+
+        _, (status, chunks, stats) = run_against_site(scenario)
+        assert status == 200
+        assert b"".join(chunks) == b"<p>page 7</p>"
+        assert all(len(chunk) <= 4 for chunk in chunks)
+        assert stats.bytes_received == len(b"<p>page 7</p>")
+
+    def test_fetch_many_reports_failures(self):
+        """Test that a failed request does not abort the batch."""
+
+        async def scenario(site):
+            async with Fetcher(timeout=2) as fetcher:
+                urls = [site.url(1), "http://127.0.0.1:1/unreachable"]
+                return [result async for result in fetcher.fetch_many(urls)]
+
+        _, results = run_against_site(scenario)
+        by_url = {result.url: result for result in results}
+        assert by_url["http://127.0.0.1:1/unreachable"].error
+        assert not by_url["http://127.0.0.1:1/unreachable"].ok
+        assert len([result for result in results if result.ok]) == 1
+
+    def test_closing_fetch_many_cancels_pending_requests(self):
+        """Test that a consumer stopping early leaves no requests running."""
+
+        def fetching():
+            return [
+                task
+                for task in asyncio.all_tasks()
+                if task.get_coro().__qualname__ == "Fetcher._fetch_or_error"
+            ]
+
+        async def scenario(site):
+            async with Fetcher() as fetcher:
+                slow = [f"{site.url(n)}?delay=2" for n in range(1, 5)]
+                results = fetcher.fetch_many([site.url(0), *slow])
+                async with aclosing(results):
+                    async for result in results:
+                        break
+                return result, fetching()
+
+        _, (first, left) = run_against_site(scenario)
+        assert first.url.endswith("/page/0")
+        assert left == []
+
+    def test_fetch_raises_fetch_error(self):
+        """Test that connection errors surface as FetchError."""
+
+        async def scenario():
+            async with Fetcher(timeout=2) as fetcher:
+                await fetcher.fetch("http://127.0.0.1:1/unreachable")
+
+        with pytest.raises(FetchError):
+            asyncio.run(scenario())
@@ -0,0 +1,294 @@
+import pytest
+from django.utils import timezone
+from scraper.models import Results
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.frontier import BloomFilter, Frontier, canonicalize, fingerprint
+from scrapers.core.recipe import RecipeError, RecipePlan, compile_recipe
+from scrapers.runners.executor import execute_run, run_frontier
+
+
+@pytest.mark.unit
+class TestCanonicalize:
+    """Test cases for URL canonicalisation."""
+
+    @pytest.mark.parametrize(
+        "url, expected",
+        [
+            ("HTTP://Example.COM:80/a/./b/../c#top", "http://example.com/a/c"),
+            ("https://example.com:443", "https://example.com/"),
+            ("https://example.com:8443/x", "https://example.com:8443/x"),
+            ("https://user:pw@example.com/x", "https://example.com/x"),
+            (
+                "https://example.com/?b=2&a=1&utm_source=mail",
+                "https://example.com/?a=1&b=2",
+            ),
+            ("https://example.com/%7euser/%2f", "https://example.com/~user/%2F"),
+            ("https://example.com/a b/ü", "https://example.com/a%20b/%C3%BC"),
+        ],
+    )
+    def test_equivalent_urls_agree(self, url, expected):
+        """Test that spelling variants of a URL canonicalise alike."""
+        assert canonicalize(url) == expected
+
+    def test_relative_links_resolve_against_base(self):
+        """Test resolving relative links."""
+        base = "https://example.com/shop/list?page=1"
+        assert canonicalize("../item/7", base) == "https://example.com/item/7"
+        assert canonicalize("?page=2", base) == "https://example.com/shop/list?page=2"
+
+    @pytest.mark.parametrize(
+        "url",
+        ["mailto:a@example.com", "javascript:void(0)", "/relative", "http://x:bad/"],
+    )
+    def test_uncrawlable_urls_are_rejected(self, url):
+        """Test that non-HTTP and malformed URLs have no canonical form."""
+        assert canonicalize(url) is None
+
+
+@pytest.mark.unit
+class TestBloomFilter:
+    """Test cases for the Bloom filter."""
+
+    def test_no_false_negatives(self):
+        """Test that every added fingerprint is reported as present."""
+        bloom = BloomFilter(capacity=1000)
+        fps = [fingerprint(f"https://example.com/{n}") for n in range(1000)]
+        for fp in fps:
+            bloom.add(fp)
+        assert all(fp in bloom for fp in fps)
+
+    def test_error_rate_and_size(self):
+        """Test that the false positive rate matches the sizing."""
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        for n in range(2000):
+            bloom.add(fingerprint(f"https://example.com/{n}"))
+        others = sum(
+            fingerprint(f"https://other.com/{n}") in bloom for n in range(20000)
+        )
+        assert others / 20000 < 0.02
+        assert 9 < bloom.bits_per_item < 10
+
+    def test_save_and_load(self, tmp_path):
+        """Test that a saved filter loads only into one of the same size."""
+        bloom = BloomFilter(capacity=100)
+        bloom.add(fingerprint("https://example.com/"))
+        bloom.save(tmp_path / "bloom.bin", tag=1)
+        loaded = BloomFilter(capacity=100)
+        assert loaded.load(tmp_path / "bloom.bin") == 1
+        assert fingerprint("https://example.com/") in loaded
+        assert BloomFilter(capacity=5000).load(tmp_path / "bloom.bin") is None
+        assert loaded.load(tmp_path / "missing.bin") is None
+
+
+@pytest.mark.unit
+class TestFrontier:
+    """Test cases for the persistent crawl frontier."""
+
+    def test_urls_are_queued_once(self, tmp_path):
+        """Test that seen URLs, in any spelling, are not queued again."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            assert (
+                frontier.add_many(["https://example.com/a", "https://example.com/b"])
+                == 2
+            )
+            assert not frontier.add("HTTPS://example.com/a#x")
+            assert (
+                frontier.add_many(
+                    ["/b", "/c", "/c", "mailto:x@y"], base="https://example.com/"
+                )
+                == 1
+            )
+            assert len(frontier) == 3
+            assert "https://example.com/c" in frontier
+            assert "https://example.com/d" not in frontier
+            assert frontier.stats.duplicates == 2
+            assert frontier.stats.rejected == 1
+
+    def test_done_urls_stay_seen(self, tmp_path):
+        """Test that crawled URLs are still deduplicated."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add("https://example.com/a")
+            frontier.done(frontier.pop())
+            assert len(frontier) == 0
+            assert not frontier.add("https://example.com/a")
+
+    def test_priority_then_depth_order(self, tmp_path):
+        """Test that entries pop by priority, then depth, then insertion."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add_many(
+                ["https://example.com/deep1", "https://example.com/deep2"], depth=2
+            )
+            frontier.add("https://example.com/shallow", depth=1)
+            frontier.add("https://example.com/urgent", depth=3, priority=5)
+            urls = [entry.url for entry in frontier.pop_many(10)]
+        assert urls == [
+            "https://example.com/urgent",
+            "https://example.com/shallow",
+            "https://example.com/deep1",
+            "https://example.com/deep2",
+        ]
+
+    def test_false_positives_are_checked_exactly(self, tmp_path):
+        """Test that a saturated Bloom filter never drops a new URL."""
+        with Frontier(tmp_path, capacity=1, error_rate=0.5) as frontier:
+            urls = [f"https://example.com/{n}" for n in range(200)]
+            assert frontier.add_many(urls[:100]) == 100
+            assert frontier.add_many(urls) == 100
+            assert frontier.stats.false_positives == 100
+
+    def test_reopening_resumes_leased_entries(self, tmp_path):
+        """Test that entries popped but never done are pending again."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add_many([f"https://example.com/{n}" for n in range(5)])
+            frontier.done_many(frontier.pop_many(2))
+            frontier.pop_many(2)
+            assert (len(frontier), frontier.leased) == (1, 2)
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            assert (len(frontier), frontier.leased) == (3, 0)
+            assert frontier.bloom.count == 5
+            assert frontier.stats.exact_lookups == 0
+            assert not frontier.add("https://example.com/0")
+
+    def test_stale_bloom_filter_is_rebuilt(self, tmp_path):
+        """Test that the filter is rebuilt from the store if it is out of date."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add("https://example.com/a")
+            bloom = frontier.bloom
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add("https://example.com/b")
+        bloom.save(tmp_path / "bloom.bin", tag=1)
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            assert fingerprint("https://example.com/b") in frontier.bloom
+            assert not frontier.add("https://example.com/b")
+
+    @pytest.mark.parametrize("committed, pending", [(None, 3), (1, 3), (2, 1)])
+    def test_prepared_entries_follow_the_commit(self, tmp_path, committed, pending):
+        """Test that recovery completes entries only under a committed number."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add_many([f"https://example.com/{n}" for n in range(3)])
+            frontier.prepare_done(frontier.pop_many(2), seq=2)
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            assert len(frontier) == 1
+            frontier.recover(committed)
+            assert (len(frontier), frontier.leased) == (pending, 0)
+
+    def test_commit_done(self, tmp_path):
+        """Test that committed entries are removed but stay seen."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add_many(["https://example.com/a", "https://example.com/b"])
+            frontier.prepare_done(frontier.pop_many(1), seq=1)
+            frontier.commit_done()
+            frontier.recover(0)
+            assert len(frontier) == 1
+            assert not frontier.add("https://example.com/a")
+
+    def test_clear(self, tmp_path):
+        """Test that clearing forgets seen and pending URLs."""
+        with Frontier(tmp_path, capacity=1000) as frontier:
+            frontier.add("https://example.com/a")
+            frontier.clear()
+            assert len(frontier) == 0
+            assert frontier.add("https://example.com/a")
+
+
+@pytest.mark.unit
+class TestFollowRecipe:
+    """Test cases for compiling the recipe's follow key."""
+
+    def test_shorthand(self):
+        """Test that a bare selector follows hrefs one level deep."""
+        plan = compile_recipe("url: https://example.com\nselector: h1\nfollow: a.next")
+        assert plan.follow.attr == "href"
+        assert plan.follow.all
+        assert plan.max_depth == 1
+        assert RecipePlan.from_dict(plan.to_dict()) == plan
+
+    def test_mapping(self):
+        """Test the links/max_depth form with an explicit attribute."""
+        plan = compile_recipe(
+            """
+url: https://example.com
+selector: h1
+follow:
+  links: {xpath: "//link[@rel='next']", attr: data-href}
+  max_depth: 4
+"""
+        )
+        assert plan.follow.attr == "data-href"
+        assert plan.max_depth == 4
+
+    @pytest.mark.parametrize(
+        "follow",
+        ["{max_depth: 2}", "{links: a, max_depth: 0}", "{links: a, max_depth: x}"],
+    )
+    def test_invalid_follow(self, follow):
+        """Test that follow needs links and a positive depth."""
+        with pytest.raises(RecipeError):
+            compile_recipe(f"url: https://example.com\nselector: h1\nfollow: {follow}")
+
+
+def page(title, *links):
+    anchors = "".join(f'<a class="next" href="{link}">more</a>' for link in links)
+    return 200, {}, f"<h1>{title}</h1>{anchors}"
+
+
+SITE = {
+    "/": page("home", "/a", "b", "https://elsewhere.example.com/x"),
+    "/a": page("a", "/", "/c"),
+    "/b": page("b", "/a#again", "/d"),
+    "/c": page("c", "/e"),
+    "/d": page("d"),
+}
+
+
+@pytest.mark.integration
+class TestCrawl:
+    """Test cases for runs that follow links."""
+
+    def run(self, server, max_depth=2):
+        job = JobFactory(
+            raw_yaml=f"url: {server.url('/')}\nselector: h1\n"
+            f"follow: {{links: a.next, max_depth: {max_depth}}}"
+        )
+        return RunFactory(job=job, status="running", started_at=timezone.now())
+
+    def titles(self, run):
+        return sorted(
+            item["content"]
+            for result in Results.objects.filter(run=run)
+            for item in result.payload["items"]
+        )
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("processes", [0, 1])
+    def test_links_are_followed_once_up_to_max_depth(
+        self, settings, tmp_path, processes
+    ):
+        """Test that every page within reach on the site is scraped once."""
+        settings.SCRAPER_FRONTIER_DIR = tmp_path
+        with stub_server(SITE) as server:
+            run = self.run(server)
+            assert execute_run(run, parse_processes=processes) == 5
+        assert self.titles(run) == ["a", "b", "c", "d", "home"]
+        assert sorted(path for path, _ in server.requests) == [
+            "/",
+            "/a",
+            "/b",
+            "/c",
+            "/d",
+        ]
+        assert not (tmp_path / str(run.pk)).exists()
+
+    @pytest.mark.django_db
+    def test_leftover_frontier_without_checkpoint_starts_over(self, settings, tmp_path):
+        """Test that a crawl nothing was checkpointed for restarts from the seeds."""
+        settings.SCRAPER_FRONTIER_DIR = tmp_path
+        with stub_server(SITE) as server:
+            run = self.run(server, max_depth=1)
+            with run_frontier(run.pk) as frontier:
+                frontier.add_many([server.url("/a"), server.url("/c")])
+                frontier.done(frontier.pop())
+            assert execute_run(run) == 3
+        assert self.titles(run) == ["a", "b", "home"]
@@ -0,0 +1,192 @@
+import asyncio
+
+import pytest
+from django.utils import timezone
+from scraper.models import Results, Run
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.fetch import Fetcher
+from scrapers.core.http_cache import ResponseCache, fingerprint, is_cacheable
+from scrapers.runners.executor import execute_run
+from scrapers.runners.logs import log_text
+
+LISTING = '<ul><li class="product">Wireless Headphones</li></ul>'
+
+
+def etag_route(body, etag='"v1"'):
+    """A route that honours ``If-None-Match`` for a fixed ETag."""
+
+    def respond(handler):
+        if handler.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag, "Content-Type": "text/html"}, body
+
+    return respond
+
+
+def fetch_twice(url, cache):
+    async def main():
+        async with Fetcher(cache=cache) as fetcher:
+            first = await fetcher.fetch(url)
+            second = await fetcher.fetch(url)
+            return first, second, fetcher.stats
+
+    return asyncio.run(main())
+
+
+@pytest.mark.unit
+class TestResponseCache:
+    """Test cases for the on-disk response cache."""
+
+    def test_round_trip(self, tmp_path):
+        """Test storing and reading back a response."""
+        cache = ResponseCache(tmp_path)
+        cache.put("ab12", "https://example.com/", 200, {"ETag": '"x"'}, b"<p>hi</p>")
+        entry = cache.get("ab12")
+        assert entry.body == b"<p>hi</p>"
+        assert entry.conditional_headers() == {"If-None-Match": '"x"'}
+        assert cache.get("cd34") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_least_recently_used_are_evicted(self, tmp_path):
+        """Test that the cache stays under its size bound, oldest first."""
+        cache = ResponseCache(tmp_path, max_bytes=1000)
+        for key in ("aa", "bb", "cc"):
+            cache.put(key, "u", 200, {}, b"x" * 250)
+        cache.get("aa")
+        cache.put("dd", "u", 200, {}, b"x" * 250)
+        assert cache.size <= 1000
+        assert cache.get("bb") is None
+        assert all(cache.get(key) for key in ("aa", "cc", "dd"))
+
+    def test_oversized_response_is_not_stored(self, tmp_path):
+        """Test that a body larger than the whole cache is skipped."""
+        cache = ResponseCache(tmp_path, max_bytes=100)
+        cache.put("aa", "u", 200, {}, b"x" * 200)
+        assert len(cache) == 0
+
+    def test_entries_survive_restart(self, tmp_path):
+        """Test that a new cache instance picks up existing entries."""
+        ResponseCache(tmp_path).put("aa", "u", 200, {}, b"body")
+        cache = ResponseCache(tmp_path)
+        assert len(cache) == 1
+        assert cache.size > 0
+        assert cache.get("aa").body == b"body"
+
+    def test_fingerprint(self):
+        """Test that only representation-selecting headers change the key."""
+        url = "https://example.com/"
+        assert fingerprint(url) == fingerprint(url, "get", {"User-Agent": "a"})
+        assert fingerprint(url) != fingerprint(url, headers={"Accept-Language": "es"})
+        assert fingerprint(url) != fingerprint(url + "?page=2")
+
+    @pytest.mark.parametrize(
+        "status, headers, expected",
+        [
+            (200, {"ETag": '"x"'}, True),
+            (200, {"Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}, True),
+            (200, {}, False),
+            (200, {"ETag": '"x"', "Cache-Control": "no-store"}, False),
+            (404, {"ETag": '"x"'}, False),
+        ],
+    )
+    def test_is_cacheable(self, status, headers, expected):
+        """Test which responses are kept for revalidation."""
+        assert is_cacheable(status, headers) is expected
+
+
+@pytest.mark.unit
+class TestConditionalFetch:
+    """Test cases for revalidating cached responses."""
+
+    def test_not_modified_reuses_cached_body(self, tmp_path):
+        """Test that a 304 answer returns the cached body."""
+        with stub_server({"/p": etag_route(LISTING)}) as server:
+            first, second, stats = fetch_twice(
+                server.url("/p"), ResponseCache(tmp_path)
+            )
+            sent = [headers.get("If-None-Match") for _, headers in server.requests]
+        assert not first.not_modified
+        assert second.not_modified
+        assert second.ok
+        assert second.body == first.body == LISTING.encode()
+        assert sent == [None, '"v1"']
+        assert stats.not_modified == 1
+
+    def test_last_modified_is_sent(self, tmp_path):
+        """Test revalidating with ``If-Modified-Since``."""
+        stamp = "Wed, 01 Jan 2025 00:00:00 GMT"
+        route = (200, {"Last-Modified": stamp}, LISTING)
+        with stub_server({"/p": route}) as server:
+            _, second, _ = fetch_twice(server.url("/p"), ResponseCache(tmp_path))
+            _, headers = server.requests[-1]
+        assert headers["If-Modified-Since"] == stamp
+        assert not second.not_modified
+
+    def test_responses_without_validators_are_not_cached(self, tmp_path):
+        """Test that responses that cannot be revalidated are not stored."""
+        cache = ResponseCache(tmp_path)
+        with stub_server({"/p": (200, {}, LISTING)}) as server:
+            fetch_twice(server.url("/p"), cache)
+            _, headers = server.requests[-1]
+        assert "If-None-Match" not in headers
+        assert len(cache) == 0
+
+
+@pytest.mark.integration
+class TestCachedRun:
+    """Test cases for recurring runs against unchanged pages."""
+
+    @pytest.mark.django_db
+    def test_unchanged_pages_are_not_extracted(self, tmp_path, settings):
+        """Test that a second run records 304 pages as unchanged."""
+        settings.SCRAPER_HTTP_CACHE_DIR = tmp_path
+        with stub_server({"/p": etag_route(LISTING)}) as server:
+            job = JobFactory(raw_yaml=f"url: {server.url('/p')}\nselector: .product")
+            first = RunFactory(job=job, status="running", started_at=timezone.now())
+            assert execute_run(first) == 1
+            Run.objects.filter(pk=first.pk).update(status="success")
+            second = RunFactory(job=job, status="running", started_at=timezone.now())
+            assert execute_run(second) == 0
+        assert Results.objects.filter(run=first).count() == 1
+        assert not Results.objects.filter(run=second).exists()
+        assert second.page_digests.get().source_run_id == first.pk
+        assert "1 pages unchanged" in log_text(second)
+
+    @pytest.mark.django_db
+    def test_not_modified_without_previous_run_is_extracted(self, tmp_path, settings):
+        """Test that a 304 page is extracted when no earlier run stored it."""
+        settings.SCRAPER_HTTP_CACHE_DIR = tmp_path
+        with stub_server({"/p": etag_route(LISTING)}) as server:
+            job = JobFactory(raw_yaml=f"url: {server.url('/p')}\nselector: .product")
+            for _ in range(2):
+                run = RunFactory(job=job, status="running", started_at=timezone.now())
+                assert execute_run(run) == 1
+
+    @pytest.mark.django_db
+    def test_crawl_follows_links_of_unchanged_pages(self, tmp_path, settings):
+        """Test that a 304 listing page still leads a crawl to its links."""
+        settings.SCRAPER_HTTP_CACHE_DIR = tmp_path / "cache"
+        settings.SCRAPER_FRONTIER_DIR = tmp_path / "frontier"
+        listing = '<h1>Listing</h1><a href="/item">item</a>'
+        routes = {
+            "/": etag_route(listing),
+            "/item": (200, {}, "<h1>Item</h1>"),
+        }
+        with stub_server(routes) as server:
+            job = JobFactory(
+                raw_yaml=f"url: {server.url('/')}\nselector: h1\nfollow: a"
+            )
+            for _ in range(2):
+                run = RunFactory(job=job, status="running", started_at=timezone.now())
+                execute_run(run)
+                Run.objects.filter(pk=run.pk).update(status="success")
+            paths = [path for path, _ in server.requests]
+        assert paths == ["/", "/item", "/", "/item"]
+        # The listing was carried over; the item page changed nothing either.
+        assert not Results.objects.filter(run=run).exists()
+        assert sorted(run.page_digests.values_list("unchanged", flat=True)) == [
+            True,
+            True,
+        ]
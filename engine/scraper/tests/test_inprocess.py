@@ -0,0 +1,147 @@
+import math
+import sys
+
+import pytest
+from django.core.management import CommandError, call_command
+from scraper.models import Results, Run
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.recipe import compile_recipe
+from scrapers.runners.executor import RunError
+from scrapers.runners.inprocess import (
+    ISOLATED,
+    WARM,
+    RunDispatcher,
+    execute_isolated,
+    recipe_complexity,
+)
+from scrapers.runners.worker import Worker
+
+PAGES = {f"/p{n}": (200, {}, f"<h1>page {n}</h1>") for n in range(3)}
+
+
+@pytest.fixture
+def site(settings):
+    settings.SCRAPER_DOMAIN_RATE = None
+    settings.SCRAPER_HTTP_CACHE_DIR = None
+    with stub_server(PAGES) as server:
+        yield server
+
+
+def job_for(server, *paths):
+    urls = "".join(f"\n  - {server.url(path)}" for path in paths)
+    return JobFactory(raw_yaml=f"selector: h1\nurls:{urls}")
+
+
+def items(run):
+    return sorted(
+        item["content"]
+        for result in Results.objects.filter(run=run)
+        for item in result.payload["items"]
+    )
+
+
+@pytest.mark.unit
+class TestRecipeComplexity:
+    """Test cases for sizing recipes."""
+
+    def test_pages_and_crawls(self):
+        """Test that URL lists count their pages and crawls are unbounded."""
+        assert recipe_complexity(compile_recipe("url: http://a/\nselector: h1")) == 1
+        urls = "urls: [http://a/1, http://a/2]\nselector: h1"
+        assert recipe_complexity(compile_recipe(urls)) == 2
+        crawl = "url: http://a/\nselector: h1\nfollow: a"
+        assert recipe_complexity(compile_recipe(crawl)) == math.inf
+
+
+@pytest.mark.integration
+class TestRunDispatcher:
+    """Test cases for choosing between the warm and isolated paths."""
+
+    @pytest.mark.django_db
+    def test_small_recipes_run_warm(self, site):
+        """Test that small runs share the warm runner and large ones do not."""
+        small = [RunFactory(job=job_for(site, f"/p{n}")) for n in range(2)]
+        large = RunFactory(job=job_for(site, "/p0", "/p1", "/p2"))
+        with RunDispatcher(max_pages=2) as dispatcher:
+            assert [dispatcher.mode(run) for run in (*small, large)] == [
+                WARM,
+                WARM,
+                ISOLATED,
+            ]
+            for run in (*small, large):
+                dispatcher(run)
+            # One fetcher, opened with the worker, served both small runs.
+            assert dispatcher.warm.fetcher.stats.requests == 2
+            assert dispatcher.warm.fetcher.is_open
+        assert dispatcher.executed == {WARM: 2, ISOLATED: 1}
+        assert [items(run) for run in small] == [["page 0"], ["page 1"]]
+        assert items(large) == ["page 0", "page 1", "page 2"]
+
+    @pytest.mark.django_db
+    def test_warm_failures_are_reported(self, site):
+        """Test that a failing page fails a warm run as it would a cold one."""
+        run = RunFactory(job=job_for(site, "/missing"))
+        with RunDispatcher() as dispatcher:
+            with pytest.raises(RunError):
+                dispatcher(run)
+
+    @pytest.mark.django_db
+    def test_worker_runs_through_the_dispatcher(self, site):
+        """Test that a worker marks runs of either path as done."""
+        runs = [
+            RunFactory(job=job_for(site, "/p0"), prefect_flow_run_id=None),
+            RunFactory(job=job_for(site, "/p0", "/p1"), prefect_flow_run_id=None),
+        ]
+        with RunDispatcher(max_pages=1) as dispatcher:
+            worker = Worker(dispatcher, worker_id="w")
+            worker.run(exit_when_empty=True)
+        assert worker.processed == 2
+        statuses = Run.objects.filter(pk__in=[run.pk for run in runs])
+        assert set(statuses.values_list("status", flat=True)) == {"success"}
+        assert dispatcher.executed == {WARM: 1, ISOLATED: 1}
+
+    @pytest.mark.django_db
+    def test_forced_isolated_mode_starts_no_runner(self):
+        """Test that a worker forced to run isolated keeps no warm pools."""
+        with RunDispatcher(mode=ISOLATED) as dispatcher:
+            assert dispatcher.warm is None
+            assert dispatcher.mode(RunFactory()) == ISOLATED
+
+
+@pytest.mark.integration
+class TestExecuteIsolated:
+    """Test cases for executing runs through an isolated command."""
+
+    @pytest.mark.django_db
+    def test_command_gets_the_run_id(self):
+        """Test that the run's id is substituted into the command."""
+        run = RunFactory()
+        check = f"import sys; sys.exit(sys.argv[1] != {str(run.pk)!r})"
+        execute_isolated(run, [sys.executable, "-c", check, "{run_id}"])
+
+    @pytest.mark.django_db
+    def test_exit_status_fails_the_run(self):
+        """Test that a non-zero exit status raises."""
+        with pytest.raises(RunError, match="status 3"):
+            execute_isolated(RunFactory(), [sys.executable, "-c", "exit(3)"])
+
+    @pytest.mark.django_db
+    def test_hanging_command_is_killed(self, settings):
+        """Test that a command running past the timeout fails the run."""
+        settings.SCRAPER_ISOLATED_TIMEOUT = 0.5
+        hang = [sys.executable, "-c", "import time; time.sleep(30)"]
+        with pytest.raises(RunError, match="killed after 0.5 seconds"):
+            execute_isolated(RunFactory(), hang)
+
+    @pytest.mark.django_db
+    def test_execute_run_command(self, site):
+        """Test the command an isolated worker runs."""
+        run = RunFactory(job=job_for(site, "/p2"))
+        call_command("execute_run", str(run.pk))
+        assert items(run) == ["page 2"]
+        with pytest.raises(CommandError):
+            call_command("execute_run", str(RunFactory(job=job_for(site, "/x")).pk))
+        with pytest.raises(CommandError):
+            call_command("execute_run", "not-a-run")
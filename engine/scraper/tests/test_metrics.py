@@ -0,0 +1,138 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings as django_settings
+from django.test import Client
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+from scraper.tests.test_browser_pool import make_pool
+
+from scrapers.core.metrics import RunMetrics
+from scrapers.core.telemetry import RunTelemetry
+from scrapers.runners.executor import execute_run
+
+PAGES = {f"/p{n}": (200, {}, f"<h1>page {n}</h1>") for n in range(3)}
+
+# Records into the metrics the way a worker does, in a process of its own.
+WORKER = """
+from scrapers.core.metrics import BROWSERS, COUNTERS, process_exited
+COUNTERS["pages"].inc(5)
+BROWSERS.inc(2)
+if {exits}:
+    process_exited()
+"""
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def scrape(**headers):
+    return Client().get("/metrics", headers=headers)
+
+
+@pytest.mark.unit
+class TestRunMetrics:
+    """Test cases for recording runs' telemetry as Prometheus metrics."""
+
+    def test_telemetry_is_recorded(self):
+        """Test that phases and counters reach the process's metrics."""
+        before = sample("scraper_run_phase_seconds_count", phase="parse")
+        pages = sample("scraper_pages_total")
+        telemetry = RunTelemetry(sink=RunMetrics())
+        telemetry.observe("parse", 0.01)
+        telemetry.observe("parse", 0.02)
+        telemetry.count("pages", 3)
+        assert sample("scraper_run_phase_seconds_count", phase="parse") == before + 2
+        assert sample("scraper_pages_total") == pages + 3
+
+    def test_browser_pool_utilisation(self):
+        """Test that open pools report their capacity and checkouts."""
+        capacity = sample("scraper_browser_contexts", state="capacity")
+        in_use = sample("scraper_browser_contexts", state="in_use")
+        browsers = sample("scraper_browsers")
+
+        async def scenario():
+            async with make_pool(max_browsers=2, max_contexts=3) as pool:
+                async with pool.context(), pool.context():
+                    return (
+                        sample("scraper_browser_contexts", state="capacity"),
+                        sample("scraper_browser_contexts", state="in_use"),
+                        sample("scraper_browsers"),
+                    )
+
+        assert asyncio.run(scenario()) == (capacity + 6, in_use + 2, browsers + 1)
+        assert sample("scraper_browser_contexts", state="capacity") == capacity
+        assert sample("scraper_browser_contexts", state="in_use") == in_use
+        assert sample("scraper_browsers") == browsers
+
+
+@pytest.mark.integration
+class TestMetricsEndpoint:
+    """Test cases for the /metrics endpoint."""
+
+    @pytest.mark.django_db
+    def test_runs_are_recorded(self, settings):
+        """Test that executing a run records its pages and database writes."""
+        settings.SCRAPER_DOMAIN_RATE = None
+        settings.SCRAPER_HTTP_CACHE_DIR = None
+        settings.SCRAPER_CHECKPOINT_INTERVAL = 0
+        pages = sample("scraper_pages_total")
+        writes = sample("scraper_db_write_seconds_count", table="results")
+        fetches = sample("scraper_run_phase_seconds_count", phase="fetch")
+        with stub_server(PAGES) as server:
+            urls = "".join(f"\n  - {server.url(path)}" for path in PAGES)
+            job = JobFactory(raw_yaml=f"selector: h1\nurls:{urls}")
+            execute_run(
+                RunFactory(job=job, status="running", started_at=timezone.now())
+            )
+        assert sample("scraper_pages_total") == pages + 3
+        assert sample("scraper_run_phase_seconds_count", phase="fetch") == fetches + 3
+        assert sample("scraper_db_write_seconds_count", table="results") > writes
+        assert "scraper_db_write_seconds_bucket{le=" in scrape().content.decode()
+
+    @pytest.mark.django_db
+    def test_queue_depth_and_active_runs(self):
+        """Test that queued and running runs are counted when scraped."""
+        RunFactory.create_batch(3, status="queued", prefect_flow_run_id=None)
+        # Waiting on Prefect, not in the queue.
+        RunFactory(status="queued")
+        RunFactory(status="running")
+        RunFactory(status="success")
+        response = scrape()
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        text = response.content.decode()
+        assert 'scraper_runs{status="queued"} 3.0' in text
+        assert 'scraper_runs{status="running"} 1.0' in text
+        assert "scraper_pages_total" in text
+
+    @pytest.mark.django_db
+    def test_openmetrics(self):
+        """Test answering in the OpenMetrics format when asked to."""
+        response = scrape(Accept="application/openmetrics-text; version=1.0.0")
+        assert response["Content-Type"].startswith("application/openmetrics-text")
+        assert response.content.decode().endswith("# EOF\n")
+
+    @pytest.mark.django_db
+    def test_processes_are_aggregated(self, tmp_path, monkeypatch):
+        """Test that the metrics of every process sharing a directory add up."""
+        env = {
+            **os.environ,
+            "PROMETHEUS_MULTIPROC_DIR": str(tmp_path),
+            "PYTHONPATH": str(django_settings.REPO_DIR),
+        }
+        for exits in (False, False, True):
+            code = WORKER.format(exits=exits)
+            subprocess.run([sys.executable, "-c", code], env=env, check=True)
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        text = scrape().content.decode()
+        assert "scraper_pages_total 15.0" in text
+        # The process that exited cleanly no longer counts its browsers.
+        assert "scraper_browsers 4.0" in text
+        assert 'scraper_runs{status="queued"} 0.0' in text
@@ -84,10 +84,10 @@ class TestJobModel:
     @pytest.mark.django_db
     def test_job_yaml_fields(self):
         """Test job YAML fields."""
-        raw_yaml = "name: test\nurl: https://example.com"
-        parsed_yaml = {"name": "test", "url": "https://example.com"}
+        raw_yaml = "name: test\nurl: https://example.com\nselector: h1"
+        parsed_yaml = {"name": "test", "url": "https://example.com", "selector": "h1"}
 
-        job = JobFactory(raw_yaml=raw_yaml, parsed_yaml=parsed_yaml)
+        job = JobFactory(raw_yaml=raw_yaml, parsed_yaml=None)
         assert job.raw_yaml == raw_yaml
         assert job.parsed_yaml == parsed_yaml
 
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+from django.utils import timezone
+from scraper.models import Results
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.extract import Extractor
+from scrapers.core.recipe import compile_recipe
+from scrapers.runners.executor import RunError, execute_run
+from scrapers.runners.parse_pool import ParsePool
+
+RECIPE = """
+url: https://example.com/products
+items: .product
+selectors:
+  name: .title
+  link: {css: a, attr: href}
+"""
+
+
+def listing(products):
+    rows = "".join(
+        f'<li class="product"><h2 class="title">Product {n}</h2>'
+        f'<a href="/p/{n}">View</a></li>'
+        for n in range(products)
+    )
+    return f"<ul>{rows}</ul>".encode()
+
+
+def shared_blocks():
+    try:
+        return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+    except FileNotFoundError:
+        return set()
+
+
+@pytest.fixture(scope="module")
+def plan():
+    return compile_recipe(RECIPE)
+
+
+@pytest.mark.slow
+@pytest.mark.unit
+class TestParsePool:
+    """Test cases for parsing pages in worker processes."""
+
+    def test_rows_match_inline_extraction(self, plan):
+        """Test that small and shared-memory bodies extract like in-process."""
+        pages = {"small": listing(3), "large": listing(2000)}
+        before = shared_blocks()
+        with ParsePool(plan, processes=2, shared_memory_threshold=1024) as pool:
+            parsed = {
+                page.key: page
+                for page in pool.imap(
+                    (key, body, "https://example.com/") for key, body in pages.items()
+                )
+            }
+        extractor = Extractor(plan)
+        for key, body in pages.items():
+            assert parsed[key].error is None
+            assert parsed[key].rows == extractor.extract(body, "https://example.com/")
+            assert set(parsed[key].timings) == {"parse", "extract"}
+        assert len(parsed["large"].rows) == 2000
+        assert shared_blocks() <= before
+
+    def test_input_is_consumed_lazily(self, plan):
+        """Test that no more than ``max_pending`` pages are read ahead."""
+        pulled = 0
+        ahead = []
+
+        def pages():
+            nonlocal pulled
+            for n in range(20):
+                pulled += 1
+                yield n, listing(5), None
+
+        with ParsePool(plan, processes=1, max_pending=3) as pool:
+            for done, _ in enumerate(pool.imap(pages()), start=1):
+                ahead.append(pulled - done)
+        assert pulled == 20
+        assert max(ahead) < 3
+
+    def test_errors_are_reported_per_page(self, plan):
+        """Test that a page that cannot be parsed does not stop the others."""
+        pages = [("bad", b"", None), ("good", listing(1), None)]
+        with ParsePool(plan, processes=1) as pool:
+            parsed = {page.key: page for page in pool.imap(pages)}
+        assert parsed["bad"].error and parsed["bad"].rows == []
+        assert parsed["good"].error is None
+        assert len(parsed["good"].rows) == 1
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+class TestExecuteRunWithParsePool:
+    """Test cases for running a recipe with a parse pool."""
+
+    @pytest.mark.django_db
+    def test_execute_run(self):
+        """Test that pooled parsing stores the same items and reports failures."""
+        with stub_server({"/a": (200, {}, listing(3)), "/b": (200, {}, b"")}) as s:
+            job = JobFactory(
+                raw_yaml=f'urls: ["{s.url("/a")}", "{s.url("/b")}"]\n'
+                "items: .product\nselector: .title\n"
+            )
+            run = RunFactory(job=job, status="running", started_at=timezone.now())
+            with pytest.raises(RunError, match="1 of 2 pages failed"):
+                execute_run(run, parse_processes=2)
+        items = Results.objects.get(run=run).payload["items"]
+        assert items == [{"content": f"Product {n}"} for n in range(3)]
@@ -0,0 +1,267 @@
+import asyncio
+import threading
+from email.utils import formatdate
+
+import pytest
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.fetch import Fetcher
+from scrapers.core.politeness import (
+    MemoryBackend,
+    PolitenessScheduler,
+    SQLiteBackend,
+    retry_after,
+)
+
+URL = "https://shop.example.com/products?page=1"
+
+
+class FakeTime:
+    """A clock that only moves when someone sleeps on it."""
+
+    def __init__(self, advance=True):
+        self.now = 1_000_000.0
+        self.advance = advance
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        if self.advance:
+            self.now += seconds
+
+
+def scheduler(fake, **kwargs):
+    kwargs.setdefault("rate", 2.0)
+    kwargs.setdefault("burst", 4)
+    return PolitenessScheduler(clock=fake.clock, sleep=fake.sleep, **kwargs)
+
+
+def acquire(scheduler, url=URL, times=1):
+    async def main():
+        for _ in range(times):
+            await scheduler.acquire(url)
+
+    asyncio.run(main())
+
+
+def record(scheduler, status, headers=None, url=URL):
+    return asyncio.run(scheduler.record(url, status, headers))
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """Test cases for per-domain request rates."""
+
+    def test_burst_then_rate(self):
+        """Test that a burst goes out at once and the rest at the rate."""
+        fake = FakeTime()
+        acquire(scheduler(fake), times=10)
+        assert fake.sleeps == [0.5] * 6
+        assert fake.now == 1_000_003.0
+
+    def test_concurrent_callers_queue_in_order(self):
+        """Test that callers finding the bucket empty reserve later slots."""
+        fake = FakeTime(advance=False)
+        polite = scheduler(fake, horizon=5.0)
+
+        async def main():
+            await asyncio.gather(*(polite.acquire(URL) for _ in range(7)))
+
+        asyncio.run(main())
+        assert sorted(fake.sleeps) == [0.5, 1.0, 1.5]
+        assert polite.stats.delayed == 3
+
+    def test_bucket_refills(self):
+        """Test that a quiet period restores the burst, but no more."""
+        fake = FakeTime()
+        polite = scheduler(fake)
+        acquire(polite, times=4)
+        fake.now += 60
+        acquire(polite, times=4)
+        assert fake.sleeps == []
+
+    def test_domains_are_independent(self):
+        """Test that each domain has its own bucket and ceiling."""
+        fake = FakeTime()
+        polite = scheduler(fake, burst=1, rates={"slow.example.com": 0.25})
+        acquire(polite, "https://slow.example.com/a", times=2)
+        acquire(polite, "https://SHOP.example.com/b", times=2)
+        assert fake.sleeps == [4.0, 0.5]
+
+    def test_backend_is_shared(self):
+        """Test that schedulers on one backend, like concurrent runs, share limits."""
+        fake = FakeTime()
+        backend = MemoryBackend()
+        first = scheduler(fake, backend=backend)
+        second = scheduler(fake, backend=backend)
+        acquire(first, times=4)
+        acquire(second, times=2)
+        assert fake.sleeps == [0.5, 0.5]
+
+    def test_invalid_limits(self):
+        """Test that rates and bursts must be positive."""
+        with pytest.raises(ValueError):
+            PolitenessScheduler(rate=0)
+        with pytest.raises(ValueError):
+            PolitenessScheduler(burst=0)
+
+
+@pytest.mark.unit
+class TestBackoff:
+    """Test cases for adapting to throttling responses."""
+
+    def test_retry_after_seconds_is_honoured(self):
+        """Test that a 429 blocks the domain for Retry-After and halves the rate."""
+        fake = FakeTime()
+        polite = scheduler(fake)
+        assert record(polite, 429, {"Retry-After": "7"}) == 7.0
+        assert polite.state("shop.example.com").rate == 1.0
+        acquire(polite)
+        assert fake.now == pytest.approx(1_000_008.0)
+
+    def test_retry_after_date(self):
+        """Test Retry-After given as an HTTP date."""
+        now = 1_000_000.0
+        assert (
+            retry_after({"retry-after": formatdate(now + 30, usegmt=True)}, now) == 30
+        )
+        assert retry_after({"Retry-After": "soon"}, now) is None
+        assert retry_after({}, now) is None
+
+    def test_backoff_grows_without_retry_after(self):
+        """Test that repeated 503s back off exponentially, with jitter."""
+        fake = FakeTime()
+        polite = scheduler(fake, base_backoff=2.0, max_backoff=5.0)
+        delays = []
+        for _ in range(4):
+            delays.append(record(polite, 503))
+            fake.now += delays[-1]
+        assert 1.0 <= delays[0] <= 2.0
+        assert 2.0 <= delays[1] <= 4.0
+        assert 2.5 <= delays[2] <= 5.0
+        assert 2.5 <= delays[3] <= 5.0
+
+    def test_rate_recovers_up_to_the_ceiling(self):
+        """Test additive increase after multiplicative decrease."""
+        polite = scheduler(FakeTime(), rate=2.0, increase=0.125)
+        record(polite, 429, {"Retry-After": "0"})
+        record(polite, 429, {"Retry-After": "0"})
+        assert polite.state("shop.example.com").rate == 0.5
+        # Each success adds increase * ceiling / rate: 0.5, 0.25, then 0.2.
+        for _ in range(3):
+            record(polite, 200)
+        assert polite.state("shop.example.com").rate == pytest.approx(1.45)
+        for _ in range(10):
+            record(polite, 404)
+        state = polite.state("shop.example.com")
+        assert state.rate == 2.0
+        assert state.strikes == 0
+
+    def test_throttles_during_a_block_cut_once(self):
+        """Test that answers to requests already in flight do not cut again."""
+        fake = FakeTime()
+        polite = scheduler(fake, rate=8.0)
+        for _ in range(5):
+            record(polite, 429, {"Retry-After": "3"})
+        assert polite.state("shop.example.com").rate == 4.0
+        record(polite, 200)
+        assert polite.state("shop.example.com").rate == 4.0
+        fake.now += 3
+        record(polite, 429)
+        assert polite.state("shop.example.com").rate == 2.0
+
+    def test_sleepers_wait_for_a_new_block(self):
+        """Test that a caller already waiting respects a throttle set meanwhile."""
+        fake = FakeTime()
+        polite = scheduler(fake, burst=1)
+        acquire(polite)
+
+        async def throttled_sleep(seconds):
+            fake.sleeps.append(seconds)
+            fake.now += seconds
+            if len(fake.sleeps) == 1:
+                await polite.record(URL, 429, {"Retry-After": "10"})
+
+        polite._sleep = throttled_sleep
+        acquire(polite)
+        assert fake.sleeps[0] == 0.5
+        assert sum(fake.sleeps) >= 10.5
+
+
+@pytest.mark.unit
+class TestSQLiteBackend:
+    """Test cases for sharing domain limits between processes."""
+
+    def test_state_is_shared_through_the_file(self, tmp_path):
+        """Test that two backends on one file act as one bucket."""
+        fake = FakeTime()
+        first = scheduler(fake, backend=SQLiteBackend(tmp_path / "polite.db"))
+        second = scheduler(fake, backend=SQLiteBackend(tmp_path / "polite.db"))
+        acquire(first, times=3)
+        acquire(second, times=3)
+        assert fake.sleeps == [0.5, 0.5]
+        record(first, 429, {"Retry-After": "5"})
+        assert second.state("shop.example.com").rate == 1.0
+
+    def test_concurrent_updates_are_serialized(self, tmp_path):
+        """Test that no reservation is lost when threads race on the file."""
+        path = tmp_path / "polite.db"
+        SQLiteBackend(path)
+        fake = FakeTime(advance=False)
+
+        def worker():
+            polite = scheduler(fake, backend=SQLiteBackend(path), burst=1, horizon=60)
+            acquire(polite, times=5)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 20 reservations at one instant: every slot 0.5s apart is taken once.
+        assert sorted(fake.sleeps) == [n * 0.5 for n in range(1, 20)]
+
+
+@pytest.mark.integration
+class TestPoliteFetcher:
+    """Test cases for fetching through the politeness scheduler."""
+
+    def test_throttled_requests_are_retried(self):
+        """Test that a 429 is retried after its Retry-After."""
+        answers = iter([(429, {"Retry-After": "0"}, b"slow down")])
+
+        def page(handler):
+            return next(answers, (200, {}, b"<p>ok</p>"))
+
+        polite = PolitenessScheduler(rate=100.0)
+        with stub_server({"/page": page}) as server:
+
+            async def main():
+                async with Fetcher(politeness=polite) as fetcher:
+                    return await fetcher.fetch(server.url("/page")), fetcher.stats
+
+            result, stats = asyncio.run(main())
+        assert result.status == 200
+        assert result.retries == 1
+        assert stats.requests == 2
+        assert stats.throttled == 1
+        assert polite.stats.throttled == 1
+        assert polite.state("127.0.0.1").rate == 50.0 + polite.increase * 100 / 50
+
+    def test_retries_are_bounded(self):
+        """Test that a domain that keeps throttling fails the page."""
+        polite = PolitenessScheduler(rate=100.0)
+        with stub_server({"/page": (503, {"Retry-After": "0"}, b"")}) as server:
+
+            async def main():
+                async with Fetcher(politeness=polite, throttle_retries=1) as fetcher:
+                    return await fetcher.fetch(server.url("/page")), fetcher.stats
+
+            result, stats = asyncio.run(main())
+        assert result.status == 503
+        assert result.retries == 1
+        assert not result.ok
+        assert stats.requests == 2
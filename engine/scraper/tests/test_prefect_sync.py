@@ -0,0 +1,205 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from scraper.models import Run
+from scraper.tests.factories import RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.prefect import PrefectClient, PrefectError
+from scrapers.runners.prefect_sync import PrefectSync
+
+STARTED = datetime(2026, 5, 4, 12, 0, tzinfo=timezone.utc)
+ENDED = datetime(2026, 5, 4, 12, 5, tzinfo=timezone.utc)
+
+
+def flow_run(state_type, name=None, start=None, end=None):
+    return {
+        "id": str(uuid.uuid4()),
+        "state": {"type": state_type, "name": name or state_type.title()},
+        "start_time": start and start.isoformat(),
+        "end_time": end and end.isoformat(),
+    }
+
+
+class FakePrefect:
+    """Answers ``POST /api/flow_runs/filter`` from a dict of flow runs."""
+
+    def __init__(self):
+        self.flow_runs = {}
+        self.pages = []
+        self.status = 200
+
+    def add(self, data):
+        self.flow_runs[data["id"]] = data
+        return data["id"]
+
+    def __call__(self, handler):
+        if self.status != 200:
+            return self.status, {}, "unavailable"
+        query = json.loads(handler.body)
+        ids = query["flow_runs"]["id"]["any_"]
+        self.pages.append(ids)
+        found = [self.flow_runs[id] for id in ids if id in self.flow_runs]
+        body = json.dumps(found[: query["limit"]])
+        return 200, {"Content-Type": "application/json"}, body
+
+
+@pytest.fixture
+def prefect(settings):
+    fake = FakePrefect()
+    with stub_server({"/api/flow_runs/filter": fake}) as server:
+        settings.PREFECT_API_URL = server.url("/api")
+        settings.PREFECT_API_KEY = "secret"
+        fake.server = server
+        yield fake
+
+
+def run_for(prefect, state, **fields):
+    return RunFactory(prefect_flow_run_id=prefect.add(state), **fields)
+
+
+def sync(**options):
+    with PrefectSync(**options) as prefect_sync:
+        return prefect_sync.tick()
+
+
+@pytest.mark.integration
+class TestPrefectSync:
+    """Test cases for syncing runs with their Prefect flow runs."""
+
+    @pytest.mark.django_db
+    def test_runs_follow_their_flow_runs(self, prefect):
+        """Test that status, state and times are copied from Prefect."""
+        started = run_for(prefect, flow_run("RUNNING", start=STARTED))
+        done = run_for(
+            prefect,
+            flow_run("COMPLETED", start=STARTED, end=ENDED),
+            status="running",
+        )
+        crashed = run_for(prefect, flow_run("CRASHED", end=ENDED), status="running")
+        retrying = run_for(
+            prefect, flow_run("SCHEDULED", "AwaitingRetry"), status="running"
+        )
+        assert sync() == 4
+        for run in (started, done, crashed, retrying):
+            run.refresh_from_db()
+        assert (started.status, started.prefect_state) == ("running", "Running")
+        assert (started.started_at, started.finished_at) == (STARTED, None)
+        assert (done.status, done.started_at, done.finished_at) == (
+            "success",
+            STARTED,
+            ENDED,
+        )
+        assert (crashed.status, crashed.finished_at) == ("failure", ENDED)
+        assert (retrying.status, retrying.prefect_state) == ("queued", "AwaitingRetry")
+
+    @pytest.mark.django_db
+    def test_paused_flow_runs_keep_their_status(self, prefect):
+        """Test that states without a matching status only update the state."""
+        run = run_for(prefect, flow_run("PAUSED"), status="running")
+        assert sync() == 1
+        run.refresh_from_db()
+        assert (run.status, run.prefect_state) == ("running", "Paused")
+
+    @pytest.mark.django_db
+    def test_claimed_runs_are_not_queued_again(self, prefect):
+        """Test that a run a worker claimed stays running while Prefect is pending."""
+        run = run_for(
+            prefect,
+            flow_run("PENDING"),
+            status="running",
+            prefect_state="Running",
+            claimed_by="worker-1",
+        )
+        assert sync() == 1
+        run.refresh_from_db()
+        assert (run.status, run.prefect_state) == ("running", "Pending")
+
+    @pytest.mark.django_db
+    def test_only_changed_unfinished_runs_are_written(self, prefect):
+        """Test that finished, unchanged and unknown runs are left alone."""
+        unchanged = run_for(
+            prefect, flow_run("PENDING"), status="queued", prefect_state="Pending"
+        )
+        finished = run_for(prefect, flow_run("RUNNING"), status="success")
+        unknown = RunFactory(status="running")
+        local = RunFactory(status="queued", prefect_flow_run_id=None)
+        assert sync() == 0
+        asked = [unchanged.prefect_flow_run_id, unknown.prefect_flow_run_id]
+        assert [sorted(page) for page in prefect.pages] == [sorted(asked)]
+        for run in (finished, unknown, local):
+            status = run.status
+            run.refresh_from_db()
+            assert run.status == status
+
+    @pytest.mark.django_db
+    def test_one_bulk_update_per_batch(self, prefect):
+        """Test that each batch is read in bulk and written with one update."""
+        runs = [
+            run_for(prefect, flow_run("RUNNING", start=STARTED), status="queued")
+            for _ in range(7)
+        ]
+        with PrefectSync(batch_size=3) as prefect_sync:
+            prefect_sync.client.page_size = 2
+            with CaptureQueriesContext(connection) as queries:
+                assert prefect_sync.tick() == 7
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        selects = [q for q in queries if q["sql"].startswith("SELECT")]
+        assert (len(updates), len(selects)) == (3, 3)
+        # Batches of 3, 3 and 1 runs, asked for 2 flow runs at a time.
+        assert sorted(len(page) for page in prefect.pages) == [1, 1, 1, 2, 2]
+        assert (
+            Run.objects.filter(
+                pk__in=[run.pk for run in runs], status="running"
+            ).count()
+            == 7
+        )
+
+    @pytest.mark.django_db
+    def test_api_key_is_sent(self, prefect):
+        """Test that requests carry the configured API key."""
+        run_for(prefect, flow_run("RUNNING"))
+        sync()
+        assert prefect.server.requests[0][1]["Authorization"] == "Bearer secret"
+
+    @pytest.mark.django_db
+    def test_api_errors_leave_runs_untouched(self, prefect):
+        """Test that a failing Prefect API raises without writing anything."""
+        run = run_for(prefect, flow_run("COMPLETED"), status="running")
+        prefect.status = 503
+        with pytest.raises(PrefectError):
+            sync()
+        run.refresh_from_db()
+        assert run.status == "running"
+
+    @pytest.mark.django_db
+    def test_command(self, prefect, settings):
+        """Test the sync_prefect command's single pass."""
+        run = run_for(prefect, flow_run("FAILED", end=ENDED), status="running")
+        call_command("sync_prefect", "--once")
+        run.refresh_from_db()
+        assert run.status == "failure"
+        settings.PREFECT_API_URL = None
+        with pytest.raises(CommandError):
+            call_command("sync_prefect", "--once")
+
+
+@pytest.mark.unit
+class TestPrefectClient:
+    """Test cases for the Prefect API client."""
+
+    def test_unreachable_api(self):
+        """Test that connection errors surface as PrefectError."""
+
+        async def read():
+            async with PrefectClient("http://127.0.0.1:9", timeout=2) as client:
+                await client.read_flow_runs(["a"])
+
+        with pytest.raises(PrefectError):
+            asyncio.run(read())
@@ -0,0 +1,242 @@
+import marshal
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+from django.utils import timezone
+from scraper.models import Results
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+from scraper.tests.test_api import get, post
+from scraper.tests.test_export import download
+
+from scrapers.core.profiling import (
+    CallProfiler,
+    SamplingProfiler,
+    flamegraph_svg,
+    profiler_for,
+    stats_stacks,
+)
+from scrapers.runners.checkpoint import resume
+from scrapers.runners.executor import RunError, execute_run
+from scrapers.runners.profiling import PROFILE_KIND, profiles_of, read_profile
+
+PAGES = {f"/p{n}": (200, {}, f"<h1>page {n}</h1>") for n in range(3)}
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+@pytest.mark.unit
+class TestProfilers:
+    """Test cases for the profilers."""
+
+    def test_sampling_profiler(self):
+        """Test that the stacks of every thread are sampled."""
+        with SamplingProfiler(interval=0.002) as profiler:
+            worker = threading.Thread(target=spin, args=(0.1,), name="spinner")
+            worker.start()
+            spin(0.1)
+            worker.join()
+        assert profiler.samples > 5
+        lines = profiler.folded().splitlines()
+        assert any(
+            line.startswith("thread spinner;") and ";spin (" in line for line in lines
+        )
+        assert any(line.startswith("thread MainThread;") for line in lines)
+        assert not any("sampling-profiler" in line for line in lines)
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_call_profiler(self):
+        """Test cProfile stacks and raw statistics."""
+        with CallProfiler() as profiler:
+            spin(0.02)
+        folded = profiler.folded()
+        assert "spin (" in folded
+        assert "<built-in method builtins.sum>" in folded
+        assert any(key[2] == "spin" for key in marshal.loads(profiler.pstats()))
+
+    def test_stats_stacks_share_time_among_callers(self):
+        """Test splitting a function's time by the callers that called it."""
+        a, b, c = ("m.py", 1, "a"), ("m.py", 2, "b"), ("m.py", 3, "c")
+        stats = {
+            a: (1, 1, 0.1, 1.0, {}),
+            b: (2, 2, 0.1, 0.9, {a: (2, 2, 0.1, 0.9), c: (1, 1, 0.0, 0.0)}),
+            # c calls b back; the cycle is not followed.
+            c: (3, 3, 0.8, 0.8, {b: (3, 3, 0.8, 0.8)}),
+        }
+        stacks = {
+            ";".join(stack): weight for stack, weight in stats_stacks(stats).items()
+        }
+        assert stacks == {
+            "a (m.py:1)": 100000,
+            "a (m.py:1);b (m.py:2)": 100000,
+            "a (m.py:1);b (m.py:2);c (m.py:3)": 800000,
+        }
+
+    def test_unknown_mode(self):
+        """Test that only known modes are accepted."""
+        assert isinstance(profiler_for("sample", 0.5), SamplingProfiler)
+        with pytest.raises(ValueError):
+            profiler_for("strace")
+
+
+@pytest.mark.unit
+class TestFlamegraph:
+    """Test cases for drawing folded stacks."""
+
+    def test_frames_are_as_wide_as_their_weight(self):
+        """Test the layout and labels of a flamegraph."""
+        folded = "main;parse <x> 30\nmain;fetch 10\nmain 0\n"
+        svg = ET.fromstring(flamegraph_svg(folded, title="Run & co"))
+        frames = {
+            group.find("{*}title").text.split(" (")[0]: group.find("{*}rect")
+            for group in svg.iter("{http://www.w3.org/2000/svg}g")
+        }
+        assert set(frames) == {"main", "parse <x>", "fetch"}
+        assert float(frames["main"].get("width")) == 1200
+        assert float(frames["parse <x>"].get("width")) == 900
+        assert float(frames["fetch"].get("y")) < float(frames["main"].get("y"))
+
+    def test_top_level_frames_do_not_overlap(self):
+        """Test that the roots of separate stacks are drawn side by side."""
+        folded = "thread a;work 30\nthread b;wait 10\n"
+        svg = ET.fromstring(flamegraph_svg(folded))
+        spans = sorted(
+            (float(rect.get("x")), float(rect.get("x")) + float(rect.get("width")))
+            for group in svg.iter("{http://www.w3.org/2000/svg}g")
+            if group.find("{*}title").text.startswith("thread ")
+            for rect in group.iter("{http://www.w3.org/2000/svg}rect")
+        )
+        assert spans == [(0, 900), (900, 1200)]
+
+    def test_empty_profile(self):
+        """Test that a profile without samples still draws."""
+        assert ET.fromstring(flamegraph_svg("")).tag.endswith("svg")
+
+
+@pytest.fixture
+def site(settings, tmp_path):
+    settings.SCRAPER_DOMAIN_RATE = None
+    settings.SCRAPER_HTTP_CACHE_DIR = None
+    settings.SCRAPER_CHECKPOINT_INTERVAL = 0
+    settings.SCRAPER_RESULTS_STORE = tmp_path
+    settings.SCRAPER_PROFILE_INTERVAL = 0.001
+    with stub_server(PAGES) as server:
+        yield server
+
+
+def run_for(server, *paths, job_profile=None, **fields):
+    urls = "".join(f"\n  - {server.url(path)}" for path in paths)
+    job = JobFactory(raw_yaml=f"selector: h1\nurls:{urls}", profile=job_profile)
+    return RunFactory(job=job, status="running", started_at=timezone.now(), **fields)
+
+
+@pytest.mark.integration
+class TestRunProfiles:
+    """Test cases for profiling runs."""
+
+    @pytest.mark.django_db
+    def test_runs_are_not_profiled_by_default(self, site, mocker):
+        """Test that nothing is profiled or stored unless asked for."""
+        profiler_for = mocker.patch("scrapers.runners.profiling.profiler_for")
+        run = run_for(site, "/p0")
+        execute_run(run)
+        profiler_for.assert_not_called()
+        assert not profiles_of(run.pk).exists()
+
+    @pytest.mark.django_db
+    def test_sampled_profile_of_a_job(self, site, tmp_path):
+        """Test that a job's runs are profiled and the profile stored."""
+        run = run_for(site, "/p0", "/p1", job_profile="sample")
+        assert execute_run(run) == 2
+        (profile,) = profiles_of(run.pk)
+        artifact = profile.artifacts
+        assert artifact["kind"] == PROFILE_KIND
+        assert artifact["mode"] == "sample"
+        assert artifact["location"].startswith(str(tmp_path))
+        assert profile.item_count == 0
+        folded = read_profile(artifact).decode()
+        assert len(folded) == artifact["bytes"]
+        assert "execute_run (scrapers/runners/executor.py:" in folded
+        # The profile holds no items of the run.
+        _, body = download(f"/runs/{run.pk}/export")
+        assert len(body.splitlines()) == 2
+
+    @pytest.mark.django_db
+    def test_run_overrides_its_job(self, site):
+        """Test profiling one run of a job with cProfile."""
+        run = run_for(site, "/p0", job_profile="sample", profile="cprofile")
+        execute_run(run)
+        artifact = profiles_of(run.pk).get().artifacts
+        assert artifact["mode"] == "cprofile"
+        assert artifact["unit"] == "microseconds"
+        assert marshal.loads(read_profile(artifact, "pstats"))
+
+    @pytest.mark.django_db
+    def test_failed_runs_are_profiled(self, site):
+        """Test that a run's profile is stored however it ends."""
+        run = run_for(site, "/p0", "/missing", profile="sample")
+        with pytest.raises(RunError):
+            execute_run(run)
+        assert profiles_of(run.pk).count() == 1
+
+    @pytest.mark.django_db
+    def test_profile_stays_with_a_resumed_run(self):
+        """Test that resuming a failed run does not move or drop its profile."""
+        failed = RunFactory(
+            status="failure", checkpoint={"content_hash": "abc", "next_chunk": 1}
+        )
+        for chunk_index in range(2):
+            Results.objects.create(
+                run=failed, payload={"items": [{}]}, chunk_index=chunk_index
+            )
+        Results.objects.create(run=failed, artifacts={"kind": PROFILE_KIND})
+        retry = RunFactory(job=failed.job)
+        assert resume(retry, "abc").next_chunk == 1
+        assert profiles_of(failed.pk).count() == 1
+        assert Results.objects.filter(run=failed).count() == 1
+        assert Results.objects.filter(run=retry).get().chunk_index == 0
+
+
+@pytest.mark.integration
+class TestProfileApi:
+    """Test cases for requesting and viewing profiles through the API."""
+
+    @pytest.mark.django_db
+    def test_queue_a_profiled_run(self):
+        """Test asking for a run to be profiled when queueing it."""
+        job = JobFactory()
+        response = post("/runs", {"job_id": str(job.pk), "profile": "cprofile"})
+        assert response.status_code == 201
+        assert response.json()["profile"] == "cprofile"
+        response = post("/runs", {"job_id": str(job.pk), "profile": "strace"})
+        assert response.status_code == 422
+
+    @pytest.mark.django_db
+    def test_view_profile(self, site):
+        """Test the flamegraph and downloads of a run's profile."""
+        run = run_for(site, "/p0", profile="cprofile")
+        execute_run(run)
+        response = get(f"/runs/{run.pk}/profile")
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/svg+xml"
+        assert "_execute (scrapers/runners/executor.py:" in response.content.decode()
+        assert ET.fromstring(response.content).tag.endswith("svg")
+        folded = get(f"/runs/{run.pk}/profile", format="folded")
+        assert folded["Content-Type"] == "text/plain"
+        assert "attachment" in folded["Content-Disposition"]
+        pstats = get(f"/runs/{run.pk}/profile", format="pstats")
+        assert marshal.loads(pstats.content)
+
+    @pytest.mark.django_db
+    def test_missing_profiles(self, site):
+        """Test asking for profiles a run does not have."""
+        run = run_for(site, "/p0", profile="sample")
+        assert get(f"/runs/{run.pk}/profile").status_code == 404
+        execute_run(run)
+        assert get(f"/runs/{run.pk}/profile", format="pstats").status_code == 404
@@ -0,0 +1,164 @@
+import pytest
+from django.utils import timezone
+from scraper import recipes
+from scraper.models import CompiledRecipe
+from scraper.recipes import get_recipe_plan
+from scraper.tests.factories import JobFactory
+
+from scrapers.core.recipe import (
+    RecipeCache,
+    RecipeError,
+    RecipePlan,
+    compile_recipe,
+    recipe_hash,
+)
+
+PRODUCT_RECIPE = """
+name: Product Listings Scraper
+url: https://example-store.com/products
+selectors:
+  - name: .product-title
+  - price: .price
+  - link: {css: a.product, attr: href}
+  - sku: {xpath: "//span[@itemprop='sku']"}
+"""
+
+
+@pytest.mark.unit
+class TestCompileRecipe:
+    """Test cases for recipe compilation."""
+
+    def test_compile_list_selectors(self):
+        """Test compiling the list-of-mappings selectors form."""
+        plan = compile_recipe(PRODUCT_RECIPE)
+        assert plan.name == "Product Listings Scraper"
+        assert plan.urls == ("https://example-store.com/products",)
+        assert plan.field_names == ("name", "price", "link", "sku")
+        assert plan.fields[2].attr == "href"
+        assert plan.fields[3].xpath == "//span[@itemprop='sku']"
+        assert plan.content_hash == recipe_hash(PRODUCT_RECIPE)
+
+    def test_compile_single_selector(self):
+        """Test the single ``selector`` shorthand."""
+        plan = compile_recipe("url: https://example.com\nselector: .content\n")
+        assert plan.field_names == ("content",)
+
+    def test_compile_parsed_mapping(self):
+        """Test compiling an already parsed recipe."""
+        plan = compile_recipe(
+            {"urls": ["https://a.example", "https://b.example"], "selector": "p"}
+        )
+        assert plan.urls == ("https://a.example", "https://b.example")
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            "url: [unclosed",
+            "- just a list",
+            "selector: .content",
+            "url: ftp://example.com\nselector: p",
+            "url: https://example.com",
+            "url: https://example.com\nselector: 'p >'",
+            "url: https://example.com\nselectors: {a: {css: p, xpath: //p}}",
+        ],
+    )
+    def test_invalid_recipes(self, source):
+        """Test that invalid recipes raise RecipeError."""
+        with pytest.raises(RecipeError):
+            compile_recipe(source)
+
+    def test_plan_round_trip(self):
+        """Test that a persisted plan rebuilds an equal plan."""
+        plan = compile_recipe(PRODUCT_RECIPE)
+        restored = RecipePlan.from_dict(plan.to_dict())
+        assert restored == plan
+        assert restored.fields[0].compiled is not None
+
+    def test_plan_from_other_version_rejected(self):
+        """Test that plans from another compiler version are not reused."""
+        data = compile_recipe(PRODUCT_RECIPE).to_dict()
+        data["version"] = -1
+        with pytest.raises(RecipeError):
+            RecipePlan.from_dict(data)
+
+
+@pytest.mark.unit
+class TestRecipeCache:
+    """Test cases for the in-process recipe LRU."""
+
+    def test_get_or_compile_caches(self):
+        """Test that the same source is only compiled once."""
+        cache = RecipeCache()
+        first = cache.get_or_compile(PRODUCT_RECIPE)
+        second = cache.get_or_compile(PRODUCT_RECIPE)
+        assert first is second
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_lru_eviction(self):
+        """Test that the least recently used plan is evicted."""
+        cache = RecipeCache(maxsize=2)
+        sources = [f"url: https://example.com/{n}\nselector: p" for n in range(3)]
+        plans = [cache.get_or_compile(source) for source in sources[:2]]
+        cache.get(plans[0].content_hash)
+        cache.get_or_compile(sources[2])
+        assert len(cache) == 2
+        assert cache.get(plans[0].content_hash) is plans[0]
+        assert cache.get(plans[1].content_hash) is None
+
+
+@pytest.mark.unit
+class TestJobRecipePlan:
+    """Test cases for compiling and persisting a job's recipe."""
+
+    @pytest.mark.django_db
+    def test_plan_is_persisted(self):
+        """Test that the first lookup persists the compiled plan."""
+        job = JobFactory(raw_yaml=PRODUCT_RECIPE)
+        plan = get_recipe_plan(job, cache=RecipeCache())
+        persisted = CompiledRecipe.objects.get(job=job)
+        assert persisted.content_hash == plan.content_hash
+        assert persisted.job_updated_at == job.updated_at
+        assert persisted.plan == plan.to_dict()
+
+    @pytest.mark.django_db
+    def test_persisted_plan_is_reused(self, mocker):
+        """Test that a fresh process reuses the persisted plan."""
+        job = JobFactory(raw_yaml=PRODUCT_RECIPE)
+        get_recipe_plan(job, cache=RecipeCache())
+        compile_spy = mocker.patch.object(recipes, "compile_recipe")
+        plan = get_recipe_plan(job, cache=RecipeCache())
+        compile_spy.assert_not_called()
+        assert plan.field_names == ("name", "price", "link", "sku")
+
+    @pytest.mark.django_db
+    def test_updated_job_is_recompiled(self, mocker):
+        """Test that a change to ``updated_at`` invalidates the persisted plan."""
+        job = JobFactory(raw_yaml=PRODUCT_RECIPE)
+        get_recipe_plan(job, cache=RecipeCache())
+        job.updated_at = timezone.now() + timezone.timedelta(minutes=1)
+        compile_spy = mocker.spy(recipes, "compile_recipe")
+        get_recipe_plan(job, cache=RecipeCache())
+        assert compile_spy.call_count == 1
+        persisted = CompiledRecipe.objects.get(job=job)
+        assert persisted.job_updated_at == job.updated_at
+
+    @pytest.mark.django_db
+    def test_changed_yaml_is_recompiled(self):
+        """Test that editing the recipe produces a new plan."""
+        cache = RecipeCache()
+        job = JobFactory(raw_yaml=PRODUCT_RECIPE)
+        first = get_recipe_plan(job, cache=cache)
+        job.raw_yaml = "url: https://example.com\nselector: h1\n"
+        job.save()
+        second = get_recipe_plan(job, cache=cache)
+        assert second.content_hash != first.content_hash
+        assert second.field_names == ("content",)
+        assert CompiledRecipe.objects.get(job=job).content_hash == second.content_hash
+
+    @pytest.mark.django_db
+    def test_job_without_raw_yaml_uses_parsed_yaml(self):
+        """Test falling back to ``parsed_yaml`` when there is no YAML."""
+        job = JobFactory(raw_yaml=None)
+        plan = get_recipe_plan(job, cache=RecipeCache())
+        assert plan.urls == ("https://example.com",)
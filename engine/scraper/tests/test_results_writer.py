@@ -0,0 +1,81 @@
+import pytest
+from scraper.models import Results
+from scraper.tests.factories import RunningRunFactory
+
+from scrapers.runners.results import ResultsWriter
+
+
+def make_items(count):
+    return ({"name": f"Product {n}", "price": f"${n}.99"} for n in range(count))
+
+
+@pytest.mark.unit
+@pytest.mark.models
+class TestResultsWriter:
+    """Test cases for chunked, bulk-inserted results."""
+
+    @pytest.mark.django_db
+    def test_items_are_split_into_chunks(self):
+        """Test that items end up in ordered, fixed-size Results rows."""
+        run = RunningRunFactory()
+        with ResultsWriter(run, chunk_size=10, chunks_per_insert=2) as writer:
+            writer.write_many(make_items(35))
+
+        chunks = list(Results.objects.filter(run=run).order_by("chunk_index"))
+        assert [chunk.chunk_index for chunk in chunks] == [0, 1, 2, 3]
+        assert [chunk.item_count for chunk in chunks] == [10, 10, 10, 5]
+        assert chunks[3].payload["items"][-1] == {
+            "name": "Product 34",
+            "price": "$34.99",
+        }
+        assert writer.items_written == 35
+        assert writer.chunks_written == 4
+
+    @pytest.mark.django_db
+    def test_chunks_are_bulk_inserted(self, django_assert_num_queries):
+        """Test that several chunks are written per INSERT."""
+        run = RunningRunFactory()
+        writer = ResultsWriter(run, chunk_size=10, chunks_per_insert=5)
+        with django_assert_num_queries(2):
+            writer.write_many(make_items(100))
+        with django_assert_num_queries(0):
+            writer.flush()
+        assert Results.objects.filter(run=run).count() == 10
+
+    @pytest.mark.django_db
+    def test_memory_is_bounded(self):
+        """Test that the buffer never exceeds one insert's worth of items."""
+        run = RunningRunFactory()
+        writer = ResultsWriter(run, chunk_size=50, chunks_per_insert=3)
+        peak = 0
+        for item in make_items(5000):
+            writer.write(item)
+            peak = max(peak, writer.buffered)
+        writer.close()
+        assert peak < 50 * 3
+        assert writer.buffered == 0
+        assert writer.items_written == 5000
+
+    @pytest.mark.django_db
+    def test_buffer_is_flushed_on_error(self):
+        """Test that items written before a failure are kept."""
+        run = RunningRunFactory()
+        with pytest.raises(RuntimeError):
+            with ResultsWriter(run, chunk_size=100) as writer:
+                writer.write_many(make_items(7))
+                raise RuntimeError("scraper crashed")
+        assert Results.objects.get(run=run).item_count == 7
+
+    @pytest.mark.django_db
+    def test_start_chunk(self):
+        """Test continuing the chunk numbering of an earlier writer."""
+        run = RunningRunFactory()
+        with ResultsWriter(run, chunk_size=5, start_chunk=3) as writer:
+            writer.write_many(make_items(6))
+        indexes = Results.objects.filter(run=run).values_list("chunk_index", flat=True)
+        assert sorted(indexes) == [3, 4]
+
+    def test_invalid_sizes(self):
+        """Test that chunk sizes must be positive."""
+        with pytest.raises(ValueError):
+            ResultsWriter(run=None, chunk_size=0)
@@ -0,0 +1,139 @@
+import logging
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from scraper.models import RunLogChunk
+from scraper.tests.factories import RunFactory
+
+from scrapers.runners.logs import (
+    RunLogHandler,
+    RunLogWriter,
+    log_text,
+    read_log,
+    tail_log,
+)
+
+
+def write_lines(run, count, **options):
+    with RunLogWriter(run, **options) as log:
+        for n in range(count):
+            log.write(f"line {n}")
+
+
+@pytest.mark.unit
+@pytest.mark.models
+class TestRunLogWriter:
+    """Test cases for batched run log writes."""
+
+    @pytest.mark.django_db
+    def test_lines_are_flushed_in_batches(self):
+        """Test that one chunk is written per ``flush_lines`` lines."""
+        run = RunFactory()
+        write_lines(run, 25, flush_lines=10, flush_interval=60)
+        chunks = list(run.log_chunks.order_by("seq"))
+        assert [chunk.seq for chunk in chunks] == [0, 1, 2]
+        assert [chunk.line_count for chunk in chunks] == [10, 10, 5]
+        assert chunks[0].content.splitlines()[0].endswith(" line 0")
+
+    @pytest.mark.django_db
+    def test_flush_is_a_single_insert(self, django_assert_num_queries):
+        """Test that appending costs one INSERT, however long the log already is."""
+        queries = []
+        for lines in (0, 100):
+            run = RunFactory()
+            write_lines(run, lines, flush_lines=10, flush_interval=60)
+            log = RunLogWriter(run, flush_lines=1000, flush_interval=60)
+            log.write("one more\nand another")
+            with CaptureQueriesContext(connection) as flush:
+                log.flush()
+            queries.append([query["sql"].split()[0] for query in flush])
+            with django_assert_num_queries(0):
+                log.flush()
+        assert queries[0] == queries[1]
+        assert queries[0].count("INSERT") == 1
+
+    @pytest.mark.django_db
+    def test_concurrent_writers(self):
+        """Test that writers opened side by side do not reuse a chunk's seq."""
+        run = RunFactory()
+        first = RunLogWriter(run, flush_lines=1)
+        second = RunLogWriter(run, flush_lines=1)
+        first.write("worker")
+        second.write("reaper")
+        first.write("worker again")
+        assert list(run.log_chunks.values_list("seq", flat=True)) == [0, 1, 2]
+        lines = [line.split(" ", 1)[1] for line in log_text(run).splitlines()]
+        assert lines == ["worker", "reaper", "worker again"]
+
+    @pytest.mark.django_db
+    def test_interval_triggers_flush(self):
+        """Test that a line arriving after ``flush_interval`` flushes the buffer."""
+        run = RunFactory()
+        log = RunLogWriter(run, flush_lines=1000, flush_interval=0)
+        log.write("immediately visible")
+        assert RunLogChunk.objects.filter(run=run).count() == 1
+
+    @pytest.mark.django_db
+    def test_new_writer_continues_sequence(self):
+        """Test that a second writer appends after the existing chunks."""
+        run = RunFactory()
+        write_lines(run, 3, flush_lines=1)
+        write_lines(run, 2, flush_lines=1)
+        assert list(run.log_chunks.values_list("seq", flat=True)) == [0, 1, 2, 3, 4]
+
+    @pytest.mark.django_db
+    def test_logging_handler(self):
+        """Test routing standard logging records into the run log."""
+        run = RunFactory()
+        logger = logging.getLogger("scraper.tests.run_logs")
+        logger.setLevel(logging.INFO)
+        with RunLogWriter(run) as writer:
+            handler = RunLogHandler(writer)
+            logger.addHandler(handler)
+            try:
+                logger.info("fetched %d pages", 3)
+                logger.debug("not recorded")
+            finally:
+                logger.removeHandler(handler)
+        assert "fetched 3 pages" in log_text(run)
+        assert "not recorded" not in log_text(run)
+
+
+@pytest.mark.unit
+@pytest.mark.models
+class TestReadLog:
+    """Test cases for reading run logs."""
+
+    @pytest.mark.django_db
+    def test_pagination(self):
+        """Test paging through chunks with ``after``."""
+        run = RunFactory()
+        write_lines(run, 5, flush_lines=1)
+        first = read_log(run, limit=2)
+        second = read_log(run, after=first[-1].seq, limit=2)
+        rest = read_log(run, after=second[-1].seq)
+        assert [chunk.seq for chunk in first + second + rest] == [0, 1, 2, 3, 4]
+        assert read_log(run, after=4) == []
+
+    @pytest.mark.django_db
+    def test_tail(self):
+        """Test returning only the last lines of a long log."""
+        run = RunFactory()
+        write_lines(run, 50, flush_lines=7)
+        tail = tail_log(run, lines=3).splitlines()
+        assert [line.split(" ", 1)[1] for line in tail] == [
+            "line 47",
+            "line 48",
+            "line 49",
+        ]
+        assert tail_log(run, lines=0) == ""
+
+    @pytest.mark.django_db
+    def test_log_text_includes_legacy_logs(self):
+        """Test that text stored in ``Run.logs`` comes before the chunks."""
+        run = RunFactory(logs="started")
+        write_lines(run, 1)
+        lines = log_text(run).splitlines()
+        assert lines[0] == "started"
+        assert lines[1].endswith(" line 0")
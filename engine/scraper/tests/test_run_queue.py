@@ -0,0 +1,253 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from scraper.models import Job, Results, Run
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.runners import run_queue
+from scrapers.runners.checkpoint import resumable_run
+from scrapers.runners.executor import RunError, execute_run
+from scrapers.runners.logs import log_text
+from scrapers.runners.run_queue import (
+    claim_runs,
+    heartbeat,
+    queue_depth,
+    reap_stale_runs,
+)
+from scrapers.runners.scheduler import Scheduler
+from scrapers.runners.worker import Worker
+
+LISTING = """
+<ul>
+  <li class="product"><h2 class="title">Wireless Headphones</h2><b class="price">$99.99</b></li>
+  <li class="product"><h2 class="title">Bluetooth Speaker</h2><b class="price">$49.99</b></li>
+</ul>
+"""
+
+
+def queued_runs(count):
+    job = JobFactory()
+    return [RunFactory(job=job, prefect_flow_run_id=None) for _ in range(count)]
+
+
+@pytest.mark.unit
+@pytest.mark.models
+class TestClaimRuns:
+    """Test cases for claiming queued runs."""
+
+    @pytest.mark.django_db
+    def test_claims_oldest_first(self):
+        """Test that runs are claimed in queue order, up to the limit."""
+        runs = queued_runs(5)
+        claimed = claim_runs("worker-1", limit=3)
+        assert [run.pk for run in claimed] == [run.pk for run in runs[:3]]
+        for run in claimed:
+            assert run.status == "running"
+            assert run.claimed_by == "worker-1"
+            assert run.started_at is not None
+        assert queue_depth() == 2
+
+    @pytest.mark.django_db
+    def test_runs_are_claimed_once(self):
+        """Test that consecutive claims never hand out the same run."""
+        queued_runs(5)
+        first = claim_runs("worker-1", limit=3)
+        second = claim_runs("worker-2", limit=3)
+        third = claim_runs("worker-3", limit=3)
+        assert len(first) == 3
+        assert len(second) == 2
+        assert third == []
+        assert not {run.pk for run in first} & {run.pk for run in second}
+
+    @pytest.mark.django_db
+    def test_only_queued_runs_are_claimed(self):
+        """Test that running, finished and Prefect's runs are left alone."""
+        job = JobFactory()
+        RunFactory(job=job, status="running")
+        RunFactory(job=job, status="success")
+        RunFactory(job=job, prefect_flow_run_id="flow-run-1")
+        queued = RunFactory(job=job, prefect_flow_run_id=None)
+        assert [run.pk for run in claim_runs("worker-1")] == [queued.pk]
+        assert queue_depth() == 0
+
+    @pytest.mark.django_db
+    def test_skip_locked_path(self, mocker):
+        """Test the SELECT ... FOR UPDATE SKIP LOCKED branch."""
+        mocker.patch.object(run_queue, "_supports_skip_locked", return_value=True)
+        runs = queued_runs(3)
+        claimed = claim_runs("worker-1", limit=2)
+        assert [run.pk for run in claimed] == [run.pk for run in runs[:2]]
+        assert queue_depth() == 1
+
+    @pytest.mark.django_db
+    def test_lost_race_is_retried(self, mocker):
+        """Test that the fallback retries when another worker won the race."""
+        runs = queued_runs(2)
+        real_queued = run_queue._queued
+        calls = []
+
+        def queued_with_race(using):
+            # Another worker claims the first candidates right after we read them.
+            if not calls:
+                calls.append(True)
+                ids = list(real_queued(using).values_list("id", flat=True))
+                Run.objects.filter(id=ids[0]).update(status="running")
+            return real_queued(using)
+
+        mocker.patch.object(run_queue, "_queued", side_effect=queued_with_race)
+        claimed = claim_runs("worker-1", limit=1)
+        assert [run.pk for run in claimed] == [runs[1].pk]
+
+
+@pytest.mark.unit
+class TestWorker:
+    """Test cases for the queue worker."""
+
+    @pytest.mark.django_db
+    def test_successful_runs(self):
+        """Test that executed runs are marked as successful."""
+        runs = queued_runs(3)
+        executed = []
+        worker = Worker(executed.append, worker_id="w")
+        worker.run(exit_when_empty=True)
+        assert [run.pk for run in executed] == [run.pk for run in runs]
+        assert worker.processed == 3
+        for run in runs:
+            run.refresh_from_db()
+            assert run.status == "success"
+            assert run.finished_at is not None
+
+    @pytest.mark.django_db
+    def test_runs_are_claimed_one_at_a_time(self):
+        """Test that runs wait in the queue until the worker can execute them."""
+        queued_runs(3)
+        waiting = []
+
+        def execute(run):
+            waiting.append(Run.objects.filter(status="queued").count())
+
+        Worker(execute, worker_id="w").run(exit_when_empty=True)
+        assert waiting == [2, 1, 0]
+
+    @pytest.mark.django_db
+    def test_failed_run(self):
+        """Test that an exception marks the run as failed with its traceback."""
+        (run,) = queued_runs(1)
+
+        def execute(run):
+            raise ValueError("selector matched nothing")
+
+        Worker(execute, worker_id="w").run_once()
+        run.refresh_from_db()
+        assert run.status == "failure"
+        assert "selector matched nothing" in log_text(run)
+
+
+@pytest.mark.unit
+class TestLeases:
+    """Test cases for renewing claims and reaping runs of dead workers."""
+
+    @pytest.mark.django_db
+    def test_dead_worker_runs_are_reaped(self):
+        """Test that a run whose worker died fails and becomes resumable."""
+        (run,) = queued_runs(1)
+        (claimed,) = claim_runs("dead-worker")
+        Run.objects.filter(pk=run.pk).update(checkpoint={"content_hash": "abc"})
+        now = claimed.heartbeat_at
+        assert reap_stale_runs(now + timedelta(seconds=299), lease=300) == []
+        (reaped,) = reap_stale_runs(now + timedelta(seconds=301), lease=300)
+        assert reaped.pk == run.pk
+        run.refresh_from_db()
+        assert run.status == "failure"
+        assert "dead-worker stopped renewing its claim" in log_text(run)
+        next_run = RunFactory(job=run.job)
+        assert resumable_run(next_run, "abc").pk == run.pk
+
+    @pytest.mark.django_db
+    def test_heartbeat_keeps_claims(self):
+        """Test that the runs of a live worker are not reaped."""
+        queued_runs(2)
+        claimed = claim_runs("live-worker")
+        later = claimed[0].heartbeat_at + timedelta(seconds=400)
+        assert heartbeat("live-worker", now=later) == 2
+        assert reap_stale_runs(later + timedelta(seconds=10), lease=300) == []
+
+    @pytest.mark.django_db
+    def test_unclaimed_and_prefect_runs_are_left_alone(self):
+        """Test that only runs claimed by queue workers are reaped."""
+        long_ago = timezone.now() - timedelta(days=1)
+        RunFactory(status="running", started_at=long_ago, prefect_flow_run_id=None)
+        RunFactory(
+            status="running",
+            started_at=long_ago,
+            claimed_by="w",
+            prefect_flow_run_id="flow-1",
+        )
+        legacy = RunFactory(
+            status="running",
+            started_at=long_ago,
+            claimed_by="w",
+            prefect_flow_run_id=None,
+        )
+        assert [run.pk for run in reap_stale_runs()] == [legacy.pk]
+
+    @pytest.mark.django_db
+    def test_scheduler_reaps(self):
+        """Test that the scheduler reaps stale runs on every tick."""
+        long_ago = timezone.now() - timedelta(days=1)
+        RunFactory(
+            status="running",
+            heartbeat_at=long_ago,
+            claimed_by="w",
+            prefect_flow_run_id=None,
+        )
+        scheduler = Scheduler()
+        scheduler.tick()
+        assert scheduler.reaped == 1
+
+
+@pytest.mark.integration
+class TestExecuteRun:
+    """Test cases for executing a recipe end to end."""
+
+    @pytest.mark.django_db
+    def test_execute_run_writes_results(self):
+        """Test fetching, extracting and storing a recipe's pages."""
+        with stub_server({"/products": (200, {}, LISTING)}) as server:
+            job = JobFactory(
+                raw_yaml=f"""
+url: {server.url("/products")}
+items: .product
+selectors:
+  name: .title
+  price: .price
+"""
+            )
+            run = RunFactory(job=job, status="running", started_at=timezone.now())
+            assert execute_run(run) == 2
+        assert "Stored 2 items, 0 pages unchanged" in log_text(run)
+
+        (results,) = Results.objects.filter(run=run)
+        assert results.payload["items"] == [
+            {"name": "Wireless Headphones", "price": "$99.99"},
+            {"name": "Bluetooth Speaker", "price": "$49.99"},
+        ]
+        assert Job.objects.get(pk=job.pk).last_run_at is not None
+
+    @pytest.mark.django_db
+    def test_failed_pages_fail_the_run(self):
+        """Test that pages that could not be fetched are reported."""
+        with stub_server({"/ok": (200, {}, LISTING)}) as server:
+            job = JobFactory(
+                raw_yaml=f"""
+urls: ["{server.url("/ok")}", "{server.url("/missing")}"]
+items: .product
+selector: .title
+"""
+            )
+            run = RunFactory(job=job, status="running")
+            with pytest.raises(RunError, match="1 of 2 pages failed"):
+                execute_run(run)
+        assert Results.objects.get(run=run).item_count == 2
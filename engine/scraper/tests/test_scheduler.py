@@ -0,0 +1,305 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from scraper.models import Job, Run
+from scraper.tests.factories import JobFactory, ProjectFactory, RunFactory
+from scraper.tests.test_api import post
+
+from scrapers.core.cron import CronError, next_due, parse_cron
+from scrapers.runners.scheduler import Scheduler, schedule_due_runs
+
+UTC = timezone.utc
+NOW = datetime(2026, 3, 27, 10, 7, 30, tzinfo=UTC)  # a Friday
+
+
+def in_utc(times):
+    # Repeated local times never compare equal to times in another zone.
+    return [t.astimezone(UTC) for t in times]
+
+
+def fires(expression, after=NOW, count=3, tz=UTC):
+    schedule = parse_cron(expression)
+    times = []
+    for _ in range(count):
+        after = schedule.next_after(after, tz)
+        times.append(after)
+    return times
+
+
+@pytest.mark.unit
+class TestCron:
+    """Test cases for cron expressions."""
+
+    def test_steps_and_ranges(self):
+        """Test steps, ranges and lists."""
+        assert [t.minute for t in fires("*/15 * * * *")] == [15, 30, 45]
+        assert [t.hour for t in fires("0 9-17/4 * * *")] == [13, 17, 9]
+        assert [t.minute for t in fires("5,50 * * * *")] == [50, 5, 50]
+
+    def test_names_and_macros(self):
+        """Test month and weekday names and the @ shorthands."""
+        assert fires("0 8 * * mon-wed", count=1)[0] == datetime(
+            2026, 3, 30, 8, tzinfo=UTC
+        )
+        assert fires("0 0 1 jan *", count=1)[0] == datetime(2027, 1, 1, tzinfo=UTC)
+        assert fires("@hourly", count=1)[0] == datetime(2026, 3, 27, 11, tzinfo=UTC)
+        assert fires("@weekly", count=1)[0] == datetime(2026, 3, 29, tzinfo=UTC)
+        assert parse_cron("0 0 * * 7").weekdays == {0}
+
+    def test_day_or_weekday(self):
+        """Test that a restricted day and weekday match either one."""
+        days = [t.day for t in fires("0 0 13 * fri", count=4)]
+        assert days == [3, 10, 13, 17]
+
+    def test_rare_dates(self):
+        """Test schedules that only fire in leap years."""
+        assert fires("0 0 29 feb *", count=1)[0] == datetime(2028, 2, 29, tzinfo=UTC)
+
+    def test_local_time_across_dst(self):
+        """Test that fire times follow the schedule's time zone."""
+        paris = ZoneInfo("Europe/Paris")
+        before, after = fires("0 9 * * *", count=3, tz=paris)[1:]
+        # Clocks went forward on 29 March 2026.
+        assert (before.astimezone(UTC).hour, after.astimezone(UTC).hour) == (7, 7)
+        assert fires("0 9 * * *", count=1, tz=paris)[0].astimezone(UTC).hour == 8
+
+    def test_clocks_going_back(self):
+        """Test that fire times never go back when a local hour repeats."""
+        paris = ZoneInfo("Europe/Paris")
+        # 2:00-3:00 local happens twice on 25 October 2026, from 00:00 UTC.
+        during = datetime(2026, 10, 25, 1, 10, tzinfo=UTC)
+        assert in_utc(fires("30 2 * * *", during, count=1, tz=paris)) == [
+            datetime(2026, 10, 26, 1, 30, tzinfo=UTC)
+        ]
+        before = datetime(2026, 10, 24, 12, tzinfo=UTC)
+        assert in_utc(fires("30 2 * * *", before, count=2, tz=paris)) == [
+            datetime(2026, 10, 25, 0, 30, tzinfo=UTC),
+            datetime(2026, 10, 26, 1, 30, tzinfo=UTC),
+        ]
+        # Hourly schedules fire in both occurrences of the hour.
+        times = fires("30 * * * *", datetime(2026, 10, 24, 23, tzinfo=UTC), 4, paris)
+        assert [t.astimezone(UTC).hour for t in times] == [23, 0, 1, 2]
+        minutes = fires(
+            "* * * * *", datetime(2026, 10, 25, 0, 58, tzinfo=UTC), 3, paris
+        )
+        assert [t.astimezone(UTC).minute for t in minutes] == [59, 0, 1]
+
+    def test_clocks_going_forward(self):
+        """Test that local times skipped by the gap fire once, after it."""
+        paris = ZoneInfo("Europe/Paris")
+        # 2:00-3:00 local does not exist on 29 March 2026, at 01:00 UTC.
+        before = datetime(2026, 3, 28, 12, tzinfo=UTC)
+        assert in_utc(fires("30 2 * * *", before, count=2, tz=paris)) == [
+            datetime(2026, 3, 29, 1, 30, tzinfo=UTC),
+            datetime(2026, 3, 30, 0, 30, tzinfo=UTC),
+        ]
+        times = fires("30 * * * *", datetime(2026, 3, 29, tzinfo=UTC), 3, paris)
+        assert [t.astimezone(UTC).hour for t in times] == [0, 1, 2]
+
+    def test_offset_across_dst(self):
+        """Test that offsets are added to the instant, not the local time."""
+        after = datetime(2026, 10, 25, 0, 45, tzinfo=UTC)
+        due = next_due("30 * * * *", "Europe/Paris", after, offset=900)
+        assert due == datetime(2026, 10, 25, 1, 45, tzinfo=UTC)
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            "* * * *",
+            "60 * * * *",
+            "* 24 * * *",
+            "*/0 * * * *",
+            "1-x * * * *",
+            "0 0 31 2 *",
+        ],
+    )
+    def test_invalid(self, expression):
+        """Test that malformed or impossible schedules are rejected."""
+        with pytest.raises(CronError):
+            fires(expression, count=1)
+
+    def test_offset_shifts_every_fire(self):
+        """Test that an offset keeps the period of the schedule."""
+        first = next_due("0 * * * *", "UTC", NOW, offset=120)
+        assert first == datetime(2026, 3, 27, 11, 2, tzinfo=UTC)
+        assert next_due("0 * * * *", "UTC", first, offset=120) == first + timedelta(
+            hours=1
+        )
+        # Due at 10:02, which is before NOW: the next one is 11:02.
+        assert next_due("0 * * * *", "UTC", NOW - timedelta(minutes=6), 120) == (
+            datetime(2026, 3, 27, 10, 2, tzinfo=UTC)
+        )
+
+
+@pytest.mark.models
+class TestJobSchedule:
+    """Test cases for a job's next scheduled run."""
+
+    @pytest.mark.django_db
+    def test_save_schedules_the_job(self, settings):
+        """Test that saving a scheduled job sets next_run_at within the jitter."""
+        settings.SCRAPER_SCHEDULE_JITTER = 600
+        job = JobFactory(schedule="0 * * * *")
+        assert 0 <= job.schedule_offset <= 600
+        assert job.next_run_at.minute * 60 + job.next_run_at.second == (
+            job.schedule_offset
+        )
+        job.schedule = None
+        job.save(update_fields=["schedule"])
+        job.refresh_from_db()
+        assert job.next_run_at is None
+
+    @pytest.mark.django_db
+    def test_only_schedule_changes_reschedule(self):
+        """Test that saving other fields keeps a due job due."""
+        job = JobFactory(schedule="0 * * * *")
+        due = NOW - timedelta(minutes=5)
+        Job.objects.filter(pk=job.pk).update(next_run_at=due)
+        job = Job.objects.get(pk=job.pk)
+        job.name = "renamed"
+        job.save()
+        job.refresh_from_db()
+        assert job.next_run_at == due
+        job.schedule_timezone = "Europe/Paris"
+        job.save()
+        job.refresh_from_db()
+        assert job.next_run_at > due
+
+    @pytest.mark.django_db
+    def test_offsets_spread_jobs(self, settings):
+        """Test that jobs on one schedule get different, stable offsets."""
+        settings.SCRAPER_SCHEDULE_JITTER = 300
+        jobs = [JobFactory(schedule="@hourly") for _ in range(20)]
+        assert len({job.next_run_at for job in jobs}) > 10
+        assert [job.schedule_offset for job in jobs] == [
+            Job.objects.get(pk=job.pk).schedule_offset for job in jobs
+        ]
+
+
+def due_job(project=None, minutes_ago=1, **fields):
+    job = JobFactory(
+        project=project or ProjectFactory(), schedule="* * * * *", **fields
+    )
+    Job.objects.filter(pk=job.pk).update(
+        next_run_at=NOW - timedelta(minutes=minutes_ago)
+    )
+    return job
+
+
+@pytest.mark.integration
+class TestScheduleDueRuns:
+    """Test cases for queueing due jobs."""
+
+    @pytest.mark.django_db
+    def test_due_jobs_are_queued_and_rescheduled(self, settings):
+        """Test that only due, active jobs get a run, and move on."""
+        settings.SCRAPER_SCHEDULE_JITTER = 0
+        due = due_job()
+        overdue = due_job(minutes_ago=600)
+        later = due_job(minutes_ago=-5)
+        due_job(is_active=False)
+        JobFactory()
+        runs = schedule_due_runs(NOW)
+        assert {run.job_id for run in runs} == {due.pk, overdue.pk}
+        assert Run.objects.filter(status="queued").count() == 2
+        for job in (due, overdue):
+            job.refresh_from_db()
+            assert job.next_run_at == datetime(2026, 3, 27, 10, 8, tzinfo=UTC)
+        later.refresh_from_db()
+        assert later.next_run_at == NOW + timedelta(minutes=5)
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("count", [10, 50])
+    def test_queries_do_not_grow_with_jobs(self, count, django_assert_num_queries):
+        """Test that a tick is a fixed number of queries with one bulk insert."""
+        project = ProjectFactory()
+        for _ in range(count):
+            due_job(project)
+        # Queued counts, due jobs, waiting runs, the insert and the update,
+        # each inside the tick's transaction (savepoint and release).
+        with django_assert_num_queries(7):
+            runs = schedule_due_runs(NOW, max_queued=1000)
+        assert len(runs) == count
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("status", ["queued", "running"])
+    def test_job_with_an_unfinished_run_is_skipped(self, status):
+        """Test that a job still queued or running is not queued again."""
+        job = due_job()
+        RunFactory(job=job, status=status)
+        assert schedule_due_runs(NOW) == []
+        job.refresh_from_db()
+        assert job.next_run_at > NOW
+
+    @pytest.mark.django_db
+    def test_projects_are_capped(self):
+        """Test that due jobs of a project at its cap wait for the queue."""
+        project = ProjectFactory()
+        RunFactory(job=JobFactory(project=project), status="queued")
+        jobs = [due_job(project) for _ in range(3)]
+        other = due_job()
+        runs = schedule_due_runs(NOW, max_queued=2)
+        assert len([run for run in runs if run.job.project_id == project.pk]) == 1
+        assert any(run.job_id == other.pk for run in runs)
+        still_due = Job.objects.filter(
+            pk__in=[job.pk for job in jobs], next_run_at__lte=NOW
+        )
+        assert still_due.count() == 2
+        assert schedule_due_runs(NOW, max_queued=2) == []
+
+    @pytest.mark.django_db
+    def test_batches_are_bounded(self):
+        """Test that one tick queues at most a batch, earliest first."""
+        jobs = [due_job(minutes_ago=n) for n in range(1, 6)]
+        runs = schedule_due_runs(NOW, batch_size=2)
+        assert [run.job_id for run in runs] == [jobs[4].pk, jobs[3].pk]
+
+    @pytest.mark.django_db
+    def test_scheduler_tick(self, settings):
+        """Test the scheduler loop's unit of work."""
+        settings.SCRAPER_SCHEDULE_JITTER = 0
+        job = JobFactory(schedule="* * * * *")
+        Job.objects.filter(pk=job.pk).update(
+            next_run_at=job.next_run_at - timedelta(minutes=2)
+        )
+        scheduler = Scheduler()
+        assert scheduler.tick() == 1
+        assert scheduler.tick() == 0
+        assert scheduler.queued == 1
+
+
+@pytest.mark.integration
+class TestScheduleApi:
+    """Test cases for scheduling jobs through the API."""
+
+    @pytest.mark.django_db
+    def test_create_scheduled_job(self):
+        """Test that a created job is scheduled straight away."""
+        project = ProjectFactory()
+        response = post(
+            "/jobs",
+            {
+                "project_id": str(project.id),
+                "name": "nightly",
+                "schedule": "30 2 * * *",
+                "schedule_timezone": "Europe/Berlin",
+            },
+        )
+        assert response.status_code == 201
+        assert response.json()["next_run_at"] is not None
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "fields",
+        [
+            {"schedule": "every day"},
+            {"schedule": "0 0 30 2 *"},
+            {"schedule_timezone": "Mars/Olympus"},
+        ],
+    )
+    def test_invalid_schedule(self, fields):
+        """Test that invalid schedules and time zones are rejected."""
+        project = ProjectFactory()
+        data = {"project_id": str(project.id), "name": "job", **fields}
+        assert post("/jobs", data).status_code == 422
@@ -0,0 +1,345 @@
+import threading
+import time
+
+import pytest
+from django.utils import timezone
+from scraper.models import PageDigest, Results
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+
+from scrapers.core.recipe import RecipeError, RecipePlan, compile_recipe
+from scrapers.core.steps import StepGraph
+from scrapers.runners import executor
+from scrapers.runners.checkpoint import Checkpoint
+from scrapers.runners.executor import RunError, execute_run
+
+STEPS_RECIPE = """
+concurrency: 2
+steps:
+  - name: list
+    url: https://shop.example/list?page={page}
+    pages: 2
+    items: li
+    selectors: {link: {css: a, attr: href}}
+  - name: about
+    urls: [https://shop.example/about]
+    selector: h1
+  - name: details
+    urls: {from: list.link}
+    selector: h1
+  - name: summary
+    after: [about, details]
+    url: https://shop.example/stats
+    selector: h1
+"""
+
+
+def steps(*bodies):
+    return "steps:\n" + "".join(
+        "\n".join(("  - " if i == 0 else "    ") + line for i, line in enumerate(body))
+        + "\n"
+        for body in bodies
+    )
+
+
+@pytest.mark.unit
+class TestCompileSteps:
+    """Test cases for compiling multi-step recipes."""
+
+    def test_compile_steps(self):
+        """Test the plans, dependencies and URLs of each step."""
+        plan = compile_recipe(STEPS_RECIPE)
+        assert plan.concurrency == 2
+        assert [step.name for step in plan.steps] == [
+            "list",
+            "about",
+            "details",
+            "summary",
+        ]
+        listing, about, details, summary = plan.steps
+        assert listing.plan.urls == (
+            "https://shop.example/list?page=1",
+            "https://shop.example/list?page=2",
+        )
+        assert listing.plan.items is not None
+        assert details.source == ("list", "link")
+        assert details.after == ("list",)
+        assert summary.after == ("about", "details")
+        # The plan's own URLs are every URL known before the run starts.
+        assert plan.urls == (*listing.plan.urls, *about.plan.urls, *summary.plan.urls)
+
+    def test_page_ranges(self):
+        """Test the forms of ``pages``."""
+        url = "url: http://a/?p={page}\nselector: h1\n"
+        assert len(compile_recipe(url + "pages: 3").urls) == 3
+        assert compile_recipe(url + "pages: [5, 6]").urls == (
+            "http://a/?p=5",
+            "http://a/?p=6",
+        )
+        ranged = compile_recipe(url + "pages: {start: 0, stop: 90, step: 30}")
+        assert [u.rsplit("=", 1)[1] for u in ranged.urls] == ["0", "30", "60", "90"]
+
+    @pytest.mark.parametrize(
+        "source, message",
+        [
+            ("url: http://a/\nselector: h1\npages: 2", "page"),
+            ("url: http://a/{page}\nselector: h1\npages: 0", "page"),
+            ("url: http://a/\nselector: h1\nconcurrency: 0", "concurrency"),
+            (
+                steps(["name: a", "url: http://a/", "selector: h1", "after: [b]"]),
+                "unknown step 'b'",
+            ),
+            (
+                steps(
+                    ["name: a", "url: http://a/", "selector: h1"],
+                    ["name: a", "url: http://b/", "selector: h1"],
+                ),
+                "Duplicate",
+            ),
+            (
+                steps(
+                    ["name: a", "url: http://a/", "selector: h1", "after: [b]"],
+                    ["name: b", "url: http://b/", "selector: h1", "after: [a]"],
+                ),
+                "cycle",
+            ),
+            (
+                steps(
+                    ["name: a", "url: http://a/", "selector: h1"],
+                    ["name: b", "urls: {from: a.link}", "selector: h1"],
+                ),
+                "field",
+            ),
+            (
+                steps(["name: a", "url: http://a/", "selector: h1", "follow: a"]),
+                "follow",
+            ),
+            ("url: http://a/\nselector: h1\n" + steps(["name: a"]), "steps"),
+        ],
+    )
+    def test_invalid_steps(self, source, message):
+        """Test that broken step graphs are rejected with a useful message."""
+        with pytest.raises(RecipeError, match=message):
+            compile_recipe(source)
+
+    def test_plan_round_trip(self):
+        """Test that a persisted multi-step plan rebuilds an equal plan."""
+        plan = compile_recipe(STEPS_RECIPE)
+        assert RecipePlan.from_dict(plan.to_dict()) == plan
+
+
+@pytest.mark.unit
+class TestStepGraph:
+    """Test cases for scheduling steps in rounds."""
+
+    def test_rounds_follow_dependencies(self):
+        """Test that independent steps share rounds and dependents wait."""
+        graph = StepGraph(compile_recipe(STEPS_RECIPE))
+        first = graph.next_round(10)
+        assert first == {
+            "https://shop.example/list?page=1": ["list"],
+            "https://shop.example/about": ["about"],
+            "https://shop.example/list?page=2": ["list"],
+        }
+        graph.collect(
+            "list",
+            "https://shop.example/list?page=1",
+            [{"link": "/item/1"}, {"link": "/item/2"}, {"link": None}],
+        )
+        graph.collect("list", "https://shop.example/list?page=2", [{"link": "/item/1"}])
+        graph.complete()
+        assert graph.next_round(10) == {
+            "https://shop.example/item/1": ["details"],
+            "https://shop.example/item/2": ["details"],
+        }
+        graph.complete()
+        assert graph.next_round(10) == {"https://shop.example/stats": ["summary"]}
+        graph.complete()
+        assert graph.next_round(10) == {}
+
+    def test_round_robin_within_the_round_size(self):
+        """Test that a large step does not hold back a small one."""
+        graph = StepGraph(
+            compile_recipe(
+                steps(
+                    ["name: big", "url: http://a/{page}", "pages: 5", "selector: h1"],
+                    ["name: small", "url: http://b/", "selector: h1"],
+                )
+            )
+        )
+        assert list(graph.next_round(3).items()) == [
+            ("http://a/1", ["big"]),
+            ("http://b/", ["small"]),
+            ("http://a/2", ["big"]),
+        ]
+        graph.complete()
+        assert list(graph.next_round(3)) == ["http://a/3", "http://a/4", "http://a/5"]
+
+    def test_state_round_trip(self):
+        """Test that a graph rebuilt from its state continues where it was."""
+        plan = compile_recipe(STEPS_RECIPE)
+        graph = StepGraph(plan)
+        graph.next_round(10)
+        graph.collect("list", "https://shop.example/", [{"link": "/item/1"}])
+        graph.complete()
+        graph.next_round(10)
+        restored = StepGraph(plan, graph.state())
+        assert restored.next_round(10) == {"https://shop.example/item/1": ["details"]}
+
+    def test_empty_source_completes_its_step(self):
+        """Test that a step whose source found no URLs does not stall."""
+        graph = StepGraph(compile_recipe(STEPS_RECIPE))
+        graph.next_round(10)
+        graph.complete()
+        assert graph.next_round(10) == {"https://shop.example/stats": ["summary"]}
+
+
+SITE = {
+    "/list/1": (
+        200,
+        {},
+        '<li><a href="/item/1">1</a></li><li><a href="/item/2">2</a></li>',
+    ),
+    "/list/2": (200, {}, '<li><a href="/item/2">2</a></li>'),
+    "/about": (200, {}, "<h1>about</h1>"),
+    "/item/1": (200, {}, "<h1>item 1</h1>"),
+    "/item/2": (200, {}, "<h1>item 2</h1>"),
+    "/stats": (200, {}, "<h1>stats</h1>"),
+}
+
+
+def site_recipe(server):
+    return f"""
+steps:
+  - name: list
+    url: {server.url("/list/{page}")}
+    pages: 2
+    items: li
+    selectors: {{link: {{css: a, attr: href}}}}
+  - name: about
+    url: {server.url("/about")}
+    selector: h1
+  - name: details
+    urls: {{from: list.link}}
+    selector: h1
+  - name: summary
+    after: [about, details]
+    url: {server.url("/stats")}
+    selector: h1
+"""
+
+
+def stored(run):
+    return sorted(
+        (item["step"], item.get("content") or item.get("link"))
+        for result in Results.objects.filter(run=run)
+        for item in result.payload["items"]
+    )
+
+
+def start(job):
+    return RunFactory(job=job, status="running", started_at=timezone.now())
+
+
+@pytest.fixture
+def site(settings):
+    settings.SCRAPER_DOMAIN_RATE = None
+    settings.SCRAPER_HTTP_CACHE_DIR = None
+    with stub_server(SITE) as server:
+        yield server
+
+
+@pytest.mark.integration
+class TestExecuteSteps:
+    """Test cases for executing multi-step recipes."""
+
+    @pytest.mark.django_db
+    def test_steps_run_in_dependency_order(self, site):
+        """Test that every step is scraped once, after its dependencies."""
+        run = start(JobFactory(raw_yaml=site_recipe(site)))
+        assert execute_run(run) == 7
+        assert stored(run) == [
+            ("about", "about"),
+            ("details", "item 1"),
+            ("details", "item 2"),
+            ("list", "/item/1"),
+            ("list", "/item/2"),
+            ("list", "/item/2"),
+            ("summary", "stats"),
+        ]
+        paths = [path for path, _ in site.requests]
+        assert sorted(paths) == sorted(SITE)
+        assert paths.index("/stats") > max(
+            paths.index("/item/1"), paths.index("/about")
+        )
+        assert PageDigest.objects.filter(run=run).count() == 6
+
+    @pytest.mark.django_db
+    def test_resume_keeps_collected_urls(self, site, settings, monkeypatch):
+        """Test that a resumed run continues with the URLs found before."""
+        settings.SCRAPER_CHECKPOINT_INTERVAL = 0
+        real = executor.iter_pages
+        calls = []
+
+        def iter_pages(urls, **options):
+            calls.append(list(urls))
+            if len(calls) == 2:
+                raise ConnectionError("worker lost")
+            return real(urls, **options)
+
+        monkeypatch.setattr(executor, "iter_pages", iter_pages)
+        run = start(JobFactory(raw_yaml=site_recipe(site)))
+        with pytest.raises(ConnectionError):
+            execute_run(run)
+        run.refresh_from_db()
+        state = Checkpoint.of(run).steps
+        assert sorted(state["collected"]["list.link"]) == [
+            site.url("/item/1"),
+            site.url("/item/2"),
+        ]
+        monkeypatch.setattr(executor, "iter_pages", real)
+        assert execute_run(run) == 7
+        # The first round was not fetched again.
+        assert [path for path, _ in site.requests].count("/about") == 1
+
+    @pytest.mark.django_db
+    def test_failed_step_pages_fail_the_run(self, site):
+        """Test that a missing page fails the run but not the other steps."""
+        recipe = site_recipe(site).replace("/about", "/missing")
+        run = start(JobFactory(raw_yaml=recipe))
+        with pytest.raises(RunError, match="1 of 6 pages failed"):
+            execute_run(run)
+        assert ("summary", "stats") in stored(run)
+
+
+@pytest.mark.integration
+class TestConcurrencyCap:
+    """Test cases for a recipe's cap on concurrent fetches."""
+
+    @pytest.mark.django_db
+    def test_recipe_concurrency_caps_requests(self, settings):
+        """Test that no more than ``concurrency`` pages are fetched at once."""
+        settings.SCRAPER_DOMAIN_RATE = None
+        settings.SCRAPER_HTTP_CACHE_DIR = None
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def slow(handler):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return 200, {}, "<h1>page</h1>"
+
+        routes = {f"/p{n}": slow for n in range(6)}
+        with stub_server(routes) as server:
+            recipe = f"url: {server.url('/p{page}')}\npages: [0, 5]\nselector: h1\n"
+            run = start(JobFactory(raw_yaml=recipe + "concurrency: 2"))
+            assert execute_run(run) == 6
+            assert peak[0] == 2
+            peak[0] = 0
+            run = start(JobFactory(raw_yaml=recipe))
+            assert execute_run(run) == 6
+            assert peak[0] > 2
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+from django.utils import timezone
+from scraper.models import Run
+from scraper.tests.factories import JobFactory, RunFactory
+from scraper.tests.stub_server import stub_server
+from scraper.tests.test_api import get
+
+from scrapers.core.fetch import Fetcher, FetchResult
+from scrapers.core.telemetry import BUCKETS, Histogram, RunTelemetry
+from scrapers.runners.executor import RunError, execute_run
+
+PAGES = {f"/p{n}": (200, {}, f"<h1>page {n}</h1>") for n in range(4)}
+
+
+def page(url="http://a/", status=200, body=b"<p>x</p>", **fields):
+    return FetchResult(
+        url=url, status=status, headers={}, body=body, elapsed=0.02, **fields
+    )
+
+
+@pytest.mark.unit
+class TestHistogram:
+    """Test cases for phase histograms."""
+
+    def test_buckets_and_quantiles(self):
+        """Test counting durations into buckets and estimating quantiles."""
+        histogram = Histogram()
+        for seconds in [0.0002] * 90 + [0.04] * 9 + [120.0]:
+            histogram.observe(seconds)
+        summary = histogram.to_dict()
+        assert summary["count"] == 100
+        assert summary["max"] == 120.0
+        assert summary["p50"] == BUCKETS[0]
+        assert summary["p95"] == 0.05
+        assert summary["buckets"][0] == 90
+        assert summary["buckets"][BUCKETS.index(0.05)] == 9
+        assert len(summary["buckets"]) == len(BUCKETS) + 1
+
+    def test_trailing_empty_buckets_are_dropped(self):
+        """Test that summaries stay compact."""
+        histogram = Histogram()
+        histogram.observe(0.003)
+        assert histogram.to_dict()["buckets"] == [0, 0, 0, 1]
+        assert histogram.to_dict()["p95"] == 0.003
+        assert Histogram().to_dict()["buckets"] == []
+
+
+@pytest.mark.unit
+class TestRunTelemetry:
+    """Test cases for collecting a run's telemetry."""
+
+    def test_pages_are_counted(self):
+        """Test the counters kept for fetched pages."""
+        telemetry = RunTelemetry()
+        pages = [
+            page(body=b"12345", timings={"dns": 0.001, "connect": 0.002}),
+            page(body=b"cached body", not_modified=True, status=304),
+            page(status=503, body=b"", retries=2),
+        ]
+        assert list(telemetry.fetched(pages)) == pages
+        summary = telemetry.summary()
+        assert summary["counters"] == {
+            "bytes": 5,
+            "failures": 1,
+            "not_modified": 1,
+            "pages": 3,
+            "requests": 5,
+            "retries": 2,
+        }
+        assert summary["phases"]["fetch"]["count"] == 3
+        assert summary["phases"]["dns"]["count"] == 1
+        assert summary["phases"]["connect"]["total"] == 0.002
+        memory = summary["memory"]
+        assert memory["rss_start"] > 0
+        assert memory["process_peak"] >= memory["rss_end"] > 0
+        assert memory["peak_growth"] >= 0
+
+    def test_memory_of_the_run(self):
+        """Test that memory is measured at the start and end of the run."""
+        telemetry = RunTelemetry()
+        held = b"x" * (64 << 20)
+        memory = telemetry.summary()["memory"]
+        assert memory["rss_end"] - memory["rss_start"] >= len(held) // 2
+
+    def test_phase_timer(self):
+        """Test timing a block as a phase, even when it raises."""
+        telemetry = RunTelemetry()
+        with telemetry.phase("store"):
+            pass
+        with pytest.raises(ValueError):
+            with telemetry.phase("store"):
+                raise ValueError()
+        assert telemetry.summary()["phases"]["store"]["count"] == 2
+
+
+@pytest.mark.integration
+class TestFetchTimings:
+    """Test cases for the timings fetch results carry."""
+
+    def test_dns_and_connect_timings(self):
+        """Test that requests time resolving and connecting when they do it."""
+        with stub_server(PAGES) as server:
+            url = server.url("/p0").replace("127.0.0.1", "localhost")
+
+            async def main():
+                async with Fetcher() as fetcher:
+                    return [await fetcher.fetch(url) for _ in range(2)]
+
+            first, second = asyncio.run(main())
+        assert set(first.timings) == {"dns", "connect"}
+        assert first.timings["connect"] > 0
+        # The stub server closes every connection; the host stays resolved.
+        assert set(second.timings) == {"connect"}
+
+
+@pytest.fixture
+def site(settings):
+    settings.SCRAPER_DOMAIN_RATE = None
+    settings.SCRAPER_HTTP_CACHE_DIR = None
+    settings.SCRAPER_CHECKPOINT_INTERVAL = 0
+    with stub_server(PAGES) as server:
+        yield server
+
+
+def run_for(server, *paths):
+    urls = "".join(f"\n  - {server.url(path)}" for path in paths)
+    job = JobFactory(raw_yaml=f"selector: h1\nurls:{urls}")
+    return RunFactory(job=job, status="running", started_at=timezone.now())
+
+
+@pytest.mark.integration
+class TestRunMetrics:
+    """Test cases for the metrics stored with runs."""
+
+    @pytest.mark.django_db
+    def test_run_stores_its_metrics(self, site):
+        """Test that a run's phases and counters are saved on it."""
+        run = run_for(site, "/p0", "/p1", "/p2")
+        execute_run(run)
+        metrics = Run.objects.get(pk=run.pk).metrics
+        assert metrics["counters"]["pages"] == 3
+        assert metrics["counters"]["bytes"] == sum(
+            len(PAGES[f"/p{n}"][2]) for n in range(3)
+        )
+        phases = metrics["phases"]
+        assert {"fetch", "parse", "extract", "store", "checkpoint"} <= set(phases)
+        assert phases["parse"]["count"] == phases["extract"]["count"] == 3
+        assert metrics["duration"] > 0
+
+    @pytest.mark.django_db
+    def test_failed_run_stores_its_metrics(self, site):
+        """Test that metrics are saved however the run ends."""
+        run = run_for(site, "/p0", "/missing")
+        with pytest.raises(RunError):
+            execute_run(run)
+        metrics = Run.objects.get(pk=run.pk).metrics
+        assert metrics["counters"]["failures"] == 1
+        assert metrics["counters"]["pages"] == 2
+
+    @pytest.mark.django_db
+    def test_metrics_are_listed_per_job(self, site):
+        """Test finding a job's runs with their metrics through the API."""
+        run = run_for(site, "/p3")
+        execute_run(run)
+        RunFactory()
+        response = get("/runs", job=str(run.job_id))
+        (listed,) = response.json()["items"]
+        assert listed["metrics"]["counters"]["pages"] == 1
@@ -0,0 +1,213 @@
+import pytest
+from django.core.management import CommandError, call_command
+from scraper.models import Job
+from scraper.tests.factories import JobFactory, ProjectFactory
+from scraper.tests.test_api import post
+
+from scrapers.core.recipe import compile_recipe
+from scrapers.core.validation import (
+    RecipeValidationError,
+    recipe_validator,
+    validate_recipe,
+)
+
+VALID = "name: Products\nurl: https://example.com\nselector: h1\n"
+
+INVALID = """
+name: Products
+url: https://example.com
+selectors:
+  title: h1
+  price: {css: .price, atr: content}
+follow: {links: a.next, max_depth: 0}
+"""
+
+
+def issues(source):
+    with pytest.raises(RecipeValidationError) as excinfo:
+        validate_recipe(source)
+    return [(issue.line, issue.path, issue.message) for issue in excinfo.value.issues]
+
+
+@pytest.mark.unit
+class TestValidateRecipe:
+    """Test cases for validating recipes against the schema."""
+
+    def test_valid_recipe_returns_its_data(self):
+        """Test that a valid recipe is parsed."""
+        assert validate_recipe(VALID) == {
+            "name": "Products",
+            "url": "https://example.com",
+            "selector": "h1",
+        }
+
+    def test_errors_have_line_numbers(self):
+        """Test that every problem is reported on its line, in order."""
+        assert issues(INVALID) == [
+            (
+                6,
+                "selectors.price",
+                "Additional properties are not allowed ('atr' was unexpected)",
+            ),
+            (7, "follow.max_depth", "0 is less than the minimum of 1"),
+        ]
+
+    @pytest.mark.parametrize(
+        "source, expected",
+        [
+            ("name: a\n url: b\nselector: h1", (2, "", "Invalid YAML")),
+            ("- a list", (1, "", "Recipe must be a mapping")),
+            ("url: https://a\nselecter: h1", (1, "", "'selecter' was unexpected")),
+            ("url: ftp://a\nselector: h1", (1, "url", "does not match")),
+            ("url: https://a/{page}\nselector: h1\npages: [1]", (3, "pages", "short")),
+            (
+                "steps:\n  - name: a\n    url: https://a\n    selector: h1\nurl: https://b",
+                (5, "url", "'url' is not allowed here"),
+            ),
+            (
+                "steps:\n  - name: b\n    urls: {from: a}\n    selector: h1",
+                (3, "steps.0.urls.from", "does not match"),
+            ),
+        ],
+    )
+    def test_invalid_recipes(self, source, expected):
+        """Test the first problem reported for broken recipes."""
+        line, path, message = issues(source)[0]
+        assert (line, path) == expected[:2]
+        assert expected[2] in message
+
+    def test_recipes_the_compiler_accepts_are_valid(self):
+        """Test that the schema accepts every form of the recipe format."""
+        recipe = """
+concurrency: 4
+steps:
+  - name: list
+    url: https://a/list?page={page}
+    pages: {start: 0, stop: 40, step: 20}
+    items: {xpath: //li}
+    selectors:
+      - link: {css: a, attr: href, all: true}
+  - name: details
+    urls: {from: list.link}
+    after: list
+    selector: h1
+"""
+        assert validate_recipe(recipe)["concurrency"] == 4
+        compile_recipe(recipe)
+        crawl = "urls: [https://a]\nselector: h1\nfollow: a.next\nitems: .p"
+        validate_recipe(crawl)
+
+    def test_validator_is_built_once(self):
+        """Test that the schema is compiled into a validator only once."""
+        assert recipe_validator() is recipe_validator()
+
+
+@pytest.mark.models
+class TestJobValidation:
+    """Test cases for validating recipes when jobs are saved."""
+
+    @pytest.mark.django_db
+    def test_save_fills_parsed_yaml(self):
+        """Test that saving a job parses its YAML."""
+        job = JobFactory(raw_yaml=VALID, parsed_yaml=None)
+        assert Job.objects.get(pk=job.pk).parsed_yaml["selector"] == "h1"
+        job.raw_yaml = VALID.replace("h1", "h2")
+        job.save(update_fields=["raw_yaml"])
+        assert Job.objects.get(pk=job.pk).parsed_yaml["selector"] == "h2"
+
+    @pytest.mark.django_db
+    def test_invalid_recipe_is_not_saved(self):
+        """Test that a job with an invalid recipe cannot be saved."""
+        with pytest.raises(RecipeValidationError, match="line 7"):
+            JobFactory(raw_yaml=INVALID)
+        assert not Job.objects.exists()
+
+    @pytest.mark.django_db
+    def test_other_updates_skip_validation(self, mocker):
+        """Test that updating other fields does not validate again."""
+        job = JobFactory()
+        validate = mocker.patch("scraper.models.validate_recipe")
+        job.is_active = False
+        job.save(update_fields=["is_active"])
+        validate.assert_not_called()
+
+
+@pytest.mark.integration
+class TestValidationApi:
+    """Test cases for validating recipes through the API."""
+
+    @pytest.mark.django_db
+    def test_invalid_job_is_rejected(self):
+        """Test that creating a job with an invalid recipe returns its errors."""
+        response = post(
+            "/jobs",
+            {"project_id": str(ProjectFactory().pk), "name": "x", "raw_yaml": INVALID},
+        )
+        assert response.status_code == 422
+        assert [error["line"] for error in response.json()["errors"]] == [6, 7]
+        assert not Job.objects.exists()
+
+    @pytest.mark.django_db
+    def test_batch_validation(self):
+        """Test validating many recipes in one request."""
+        response = post("/recipes/validate", {"recipes": [VALID, INVALID, "- a"]})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [result["valid"] for result in results] == [True, False, False]
+        assert results[0]["parsed_yaml"]["name"] == "Products"
+        assert results[1]["errors"][1]["path"] == "follow.max_depth"
+        assert results[2]["errors"][0]["message"] == "Recipe must be a mapping"
+
+
+@pytest.mark.integration
+class TestImportRecipes:
+    """Test cases for the import_recipes command."""
+
+    @pytest.fixture
+    def recipes(self, tmp_path):
+        for n in range(20):
+            (tmp_path / f"recipe{n:02}.yaml").write_text(
+                VALID.replace("Products", f"Products {n}")
+            )
+        (tmp_path / "nested").mkdir()
+        (tmp_path / "nested" / "unnamed.yml").write_text(VALID.split("\n", 1)[1])
+        (tmp_path / "notes.txt").write_text("not a recipe")
+        return tmp_path
+
+    @pytest.mark.django_db
+    def test_import_creates_every_job(self, recipes, django_assert_max_num_queries):
+        """Test that valid recipes are created in bulk in one transaction."""
+        project = ProjectFactory()
+        # The project lookup, the savepoint and its release, one INSERT.
+        with django_assert_max_num_queries(4):
+            call_command(
+                "import_recipes", str(recipes), project=str(project.pk), batch_size=50
+            )
+        jobs = Job.objects.filter(project=project)
+        assert jobs.count() == 21
+        assert jobs.get(name="unnamed").parsed_yaml["selector"] == "h1"
+        assert jobs.get(name="Products 3").raw_yaml.startswith("name: Products 3")
+
+    @pytest.mark.django_db
+    def test_one_invalid_recipe_imports_nothing(self, recipes, capsys):
+        """Test that nothing is created when any recipe is invalid."""
+        (recipes / "broken.yaml").write_text(INVALID)
+        with pytest.raises(CommandError, match="1 of 22 recipes are invalid"):
+            call_command("import_recipes", str(recipes))
+        assert not Job.objects.exists()
+        assert (
+            f"{recipes / 'broken.yaml'}:7: follow.max_depth" in capsys.readouterr().err
+        )
+
+    @pytest.mark.django_db
+    def test_validate_only(self, recipes, capsys):
+        """Test checking recipes without creating jobs."""
+        call_command("import_recipes", str(recipes), validate_only=True)
+        assert "21 recipes are valid" in capsys.readouterr().out
+        assert not Job.objects.exists()
+
+    @pytest.mark.django_db
+    def test_unknown_project(self, recipes):
+        """Test that an unknown project is reported."""
+        with pytest.raises(CommandError, match="Unknown project"):
+            call_command("import_recipes", str(recipes), project="nope")
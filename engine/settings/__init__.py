@@ -9,7 +9,32 @@ from .base import (
     INSTALLED_APPS,
     LANGUAGE_CODE,
     MIDDLEWARE,
+    PREFECT_API_KEY,
+    PREFECT_API_URL,
+    REPO_DIR,
     ROOT_URLCONF,
+    SCRAPER_CHECKPOINT_INTERVAL,
+    SCRAPER_DOMAIN_BURST,
+    SCRAPER_DOMAIN_RATE,
+    SCRAPER_DOMAIN_RATES,
+    SCRAPER_FRONTIER_DIR,
+    SCRAPER_HEARTBEAT_INTERVAL,
+    SCRAPER_HTTP_CACHE_DIR,
+    SCRAPER_HTTP_CACHE_MAX_BYTES,
+    SCRAPER_INPROCESS_MAX_PAGES,
+    SCRAPER_ISOLATED_COMMAND,
+    SCRAPER_ISOLATED_TIMEOUT,
+    SCRAPER_MAX_QUEUED_PER_PROJECT,
+    SCRAPER_PARSE_PROCESSES,
+    SCRAPER_POLITENESS_DB,
+    SCRAPER_PREFECT_SYNC_BATCH,
+    SCRAPER_PREFECT_SYNC_INTERVAL,
+    SCRAPER_PROFILE_INTERVAL,
+    SCRAPER_RESULTS_FORMAT,
+    SCRAPER_RESULTS_STORE,
+    SCRAPER_RUN_LEASE,
+    SCRAPER_SCHEDULE_BATCH,
+    SCRAPER_SCHEDULE_JITTER,
     SECRET_KEY,
     STATIC_URL,
     TEMPLATES,
@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The scraper implementations live next to the Django project, in the
+# repository-level ``scrapers`` package.
+REPO_DIR = BASE_DIR.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.append(str(REPO_DIR))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -124,3 +131,82 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Scraper runtime
+
+# Responses with ETag/Last-Modified validators are kept here so recurring
+# runs can revalidate them instead of downloading and extracting them again.
+# Set to None to disable the cache.
+SCRAPER_HTTP_CACHE_DIR = BASE_DIR / "cache" / "http"
+SCRAPER_HTTP_CACHE_MAX_BYTES = 1024**3
+
+# Worker processes parsing pages during a run; 0 parses in the runner itself.
+SCRAPER_PARSE_PROCESSES = 0
+
+# How runs store their items: "json" chunks in Results.payload, or "parquet" /
+# "arrow" files under SCRAPER_RESULTS_STORE (a directory or an object store
+# URI such as s3://bucket/results) referenced from Results.artifacts.
+SCRAPER_RESULTS_FORMAT = "json"
+SCRAPER_RESULTS_STORE = BASE_DIR / "results"
+
+# Seconds between the stacks sampled from runs profiled in "sample" mode
+# (Job.profile / Run.profile). Profiles are stored under SCRAPER_RESULTS_STORE.
+SCRAPER_PROFILE_INTERVAL = 0.01
+
+# Requests per second allowed to each domain across every run in the process,
+# or in every worker process on the host when SCRAPER_POLITENESS_DB names a
+# shared SQLite file. The rate backs off on 429/503 and recovers up to this
+# ceiling; SCRAPER_DOMAIN_RATES overrides it per domain. None disables it.
+SCRAPER_DOMAIN_RATE = 2.0
+SCRAPER_DOMAIN_BURST = 4
+SCRAPER_DOMAIN_RATES = {}
+SCRAPER_POLITENESS_DB = None
+
+# Recipes that follow links keep each job's crawl frontier (URLs seen and
+# still to visit) in a subdirectory named after the job, so an interrupted
+# crawl resumes with the job's next run.
+SCRAPER_FRONTIER_DIR = BASE_DIR / "frontier"
+
+# Seconds between checkpoints of a running run's progress (stored results,
+# pages done, frontier position). A retry of a failed run, or the job's next
+# run, resumes from its last checkpoint. 0 checkpoints after every batch of
+# pages.
+SCRAPER_CHECKPOINT_INTERVAL = 60.0
+
+# Scheduled jobs are spread over this many seconds after their cron time,
+# each at a fixed offset derived from its id, so that jobs on the same
+# schedule do not all queue at :00.
+SCRAPER_SCHEDULE_JITTER = 300
+# Jobs the scheduler queues per tick, and at most this many queued runs per
+# project (None for no cap); due jobs of a project at its cap wait.
+SCRAPER_SCHEDULE_BATCH = 1000
+SCRAPER_MAX_QUEUED_PER_PROJECT = 50
+
+# Prefect API (e.g. http://prefect:4200/api) whose flow runs back runs with a
+# prefect_flow_run_id, and its API key for Prefect Cloud. The sync_prefect
+# command reads their states in batches of SCRAPER_PREFECT_SYNC_BATCH runs
+# every SCRAPER_PREFECT_SYNC_INTERVAL seconds.
+PREFECT_API_URL = None
+PREFECT_API_KEY = None
+SCRAPER_PREFECT_SYNC_BATCH = 500
+SCRAPER_PREFECT_SYNC_INTERVAL = 10.0
+
+# Runs of recipes fetching at most this many pages (and not following links)
+# execute in the worker process, on modules and connection pools kept warm
+# between runs. Larger runs execute isolated: through SCRAPER_ISOLATED_COMMAND,
+# an argv with a {run_id} field such as
+# ["docker", "run", "--rm", "scraper", "python", "manage.py", "execute_run",
+# "{run_id}"], or, when it is None, in the worker with pools of their own.
+# A command still running after SCRAPER_ISOLATED_TIMEOUT seconds is killed and
+# its run fails.
+SCRAPER_INPROCESS_MAX_PAGES = 5
+SCRAPER_ISOLATED_COMMAND = None
+SCRAPER_ISOLATED_TIMEOUT = 6 * 3600.0
+
+# Workers renew the claims on their runs every SCRAPER_HEARTBEAT_INTERVAL
+# seconds. The scheduler marks running runs without a heartbeat for
+# SCRAPER_RUN_LEASE seconds as failed (their worker died), so that a retry or
+# the job's next run resumes them from their last checkpoint.
+SCRAPER_HEARTBEAT_INTERVAL = 30.0
+SCRAPER_RUN_LEASE = 300.0
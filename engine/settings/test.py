@@ -6,7 +6,30 @@ from .base import (
     INSTALLED_APPS,
     LANGUAGE_CODE,
     MIDDLEWARE,
+    PREFECT_API_KEY,
+    PREFECT_API_URL,
+    REPO_DIR,
     ROOT_URLCONF,
+    SCRAPER_CHECKPOINT_INTERVAL,
+    SCRAPER_DOMAIN_BURST,
+    SCRAPER_DOMAIN_RATES,
+    SCRAPER_FRONTIER_DIR,
+    SCRAPER_HEARTBEAT_INTERVAL,
+    SCRAPER_HTTP_CACHE_MAX_BYTES,
+    SCRAPER_INPROCESS_MAX_PAGES,
+    SCRAPER_ISOLATED_COMMAND,
+    SCRAPER_ISOLATED_TIMEOUT,
+    SCRAPER_MAX_QUEUED_PER_PROJECT,
+    SCRAPER_PARSE_PROCESSES,
+    SCRAPER_POLITENESS_DB,
+    SCRAPER_PREFECT_SYNC_BATCH,
+    SCRAPER_PREFECT_SYNC_INTERVAL,
+    SCRAPER_PROFILE_INTERVAL,
+    SCRAPER_RESULTS_FORMAT,
+    SCRAPER_RESULTS_STORE,
+    SCRAPER_RUN_LEASE,
+    SCRAPER_SCHEDULE_BATCH,
+    SCRAPER_SCHEDULE_JITTER,
     STATIC_URL,
     TEMPLATES,
     TIME_ZONE,
@@ -65,3 +88,9 @@ CACHES = {
 SECRET_KEY = "test-secret-key-not-for-production"
 DEBUG = True
 ALLOWED_HOSTS = ["*"]
+
+# Tests that use the HTTP response cache create their own in a temporary directory
+SCRAPER_HTTP_CACHE_DIR = None
+
+# Tests hammer local stub servers; politeness tests build their own scheduler
+SCRAPER_DOMAIN_RATE = None
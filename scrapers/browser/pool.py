@@ -0,0 +1,269 @@
+"""A pool of warm headless browsers handing out isolated contexts.
+
+Launching a browser costs hundreds of milliseconds and a large amount of
+memory, while opening a new context in a running browser is cheap and gives
+the same isolation (cookies, storage and cache are per context). A
+:class:`BrowserPool` therefore keeps up to ``max_browsers`` browsers running
+and opens a fresh context for every checkout::
+
+    async with BrowserPool() as pool:
+        async with pool.page() as page:
+            await page.goto(url)
+
+Each browser serves at most ``max_contexts`` contexts at a time; checkouts
+beyond the pool's capacity wait until a context is returned. A browser is
+retired once it has served ``max_pages`` contexts or its processes use more
+than ``max_memory`` bytes, and is closed as soon as its last context is
+returned, so long-running workers do not accumulate leaked renderer memory.
+
+The pool drives Playwright by default but only needs a ``launcher``: an async
+callable returning an object with ``new_context()`` and ``close()``
+coroutines, which keeps it usable with other drivers and in tests.
+
+Open pools add their capacity, checked out contexts and running browsers to
+the process's metrics (see :mod:`scrapers.core.metrics`).
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from scrapers.core.metrics import BROWSER_CONTEXTS, BROWSERS
+
+DEFAULT_MAX_BROWSERS = 2
+DEFAULT_MAX_CONTEXTS = 4
+DEFAULT_MAX_PAGES = 200
+# Checking memory needs a round trip to the browser, so only every few pages.
+DEFAULT_MEMORY_CHECK_EVERY = 20
+
+
+class BrowserPoolClosed(Exception):
+    """Raised when checking out from a pool that has been closed."""
+
+
+@dataclass
+class PoolStats:
+    """Counters describing how a pool used its browsers."""
+
+    launches: int = 0
+    recycled: int = 0
+    checkouts: int = 0
+    waits: int = 0
+
+
+class PlaywrightLauncher:
+    """Launches browsers through a single Playwright driver process."""
+
+    def __init__(self, browser_type="chromium", **launch_options):
+        self.browser_type = browser_type
+        self.launch_options = launch_options
+        self._playwright = None
+
+    async def __call__(self):
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+        browser_type = getattr(self._playwright, self.browser_type)
+        return await browser_type.launch(**self.launch_options)
+
+    async def close(self):
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+def _rss(pid):
+    """Resident set size of a process in bytes, or 0 if it is gone."""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+async def chromium_memory(browser):
+    """Total RSS of a Chromium browser's processes, or ``None`` if unknown.
+
+    Uses the DevTools ``SystemInfo`` domain to list the browser's processes
+    and reads their sizes from ``/proc``, so it only works for Chromium on
+    Linux.
+    """
+    try:
+        session = await browser.new_browser_cdp_session()
+        info = await session.send("SystemInfo.getProcessInfo")
+        await session.detach()
+    except Exception:
+        return None
+    return sum(_rss(process["id"]) for process in info.get("processInfo", []))
+
+
+class _Slot:
+    """A running browser and its bookkeeping."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.active = 0
+        self.served = 0
+        self.retiring = False
+
+
+class BrowserPool:
+    """Keeps warm browsers and hands out fresh contexts from them."""
+
+    def __init__(
+        self,
+        launcher=None,
+        max_browsers=DEFAULT_MAX_BROWSERS,
+        max_contexts=DEFAULT_MAX_CONTEXTS,
+        max_pages=DEFAULT_MAX_PAGES,
+        max_memory=None,
+        memory_usage=chromium_memory,
+        memory_check_every=DEFAULT_MEMORY_CHECK_EVERY,
+    ):
+        self.launcher = launcher or PlaywrightLauncher()
+        self.max_browsers = max_browsers
+        self.max_contexts = max_contexts
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.memory_usage = memory_usage
+        self.memory_check_every = memory_check_every
+        self.stats = PoolStats()
+        self._slots = []
+        self._launching = 0
+        self._closed = False
+        self._changed = asyncio.Condition()
+        BROWSER_CONTEXTS.labels("capacity").inc(self.capacity)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def capacity(self):
+        """Number of contexts the pool can have checked out at once."""
+        return self.max_browsers * self.max_contexts
+
+    @property
+    def in_use(self):
+        """Number of contexts currently checked out."""
+        return sum(slot.active for slot in self._slots)
+
+    @property
+    def browsers(self):
+        """Number of running browsers, including ones being retired."""
+        return len(self._slots)
+
+    @asynccontextmanager
+    async def context(self, **context_options):
+        """Check out a new browser context, closing it on exit."""
+        slot = await self._acquire()
+        try:
+            context = await slot.browser.new_context(**context_options)
+        except BaseException:
+            await self._release(slot)
+            raise
+        try:
+            yield context
+        finally:
+            try:
+                await context.close()
+            finally:
+                await self._release(slot)
+
+    @asynccontextmanager
+    async def page(self, **context_options):
+        """Check out a page in its own new context."""
+        async with self.context(**context_options) as context:
+            yield await context.new_page()
+
+    async def close(self):
+        """Close every browser; checkouts still in progress fail afterwards."""
+        async with self._changed:
+            if not self._closed:
+                BROWSER_CONTEXTS.labels("capacity").dec(self.capacity)
+            self._closed = True
+            slots, self._slots = self._slots, []
+            BROWSERS.dec(len(slots))
+            self._changed.notify_all()
+        for slot in slots:
+            await slot.browser.close()
+        close_launcher = getattr(self.launcher, "close", None)
+        if close_launcher is not None:
+            await close_launcher()
+
+    def _free_slot(self):
+        available = [
+            slot
+            for slot in self._slots
+            if not slot.retiring and slot.active < self.max_contexts
+        ]
+        # Fill the busiest browser first so idle ones can be recycled.
+        return max(available, key=lambda slot: slot.active, default=None)
+
+    async def _acquire(self):
+        waited = False
+        async with self._changed:
+            while True:
+                if self._closed:
+                    raise BrowserPoolClosed("the browser pool is closed")
+                slot = self._free_slot()
+                if slot is not None:
+                    break
+                if len(self._slots) + self._launching < self.max_browsers:
+                    slot = await self._launch()
+                    break
+                waited = True
+                await self._changed.wait()
+            slot.active += 1
+            BROWSER_CONTEXTS.labels("in_use").inc()
+            self.stats.checkouts += 1
+            self.stats.waits += waited
+            return slot
+
+    async def _launch(self):
+        # Called with the condition held; released while the browser starts
+        # so that other checkouts can still be served by running browsers.
+        self._launching += 1
+        self._changed.release()
+        try:
+            browser = await self.launcher()
+        finally:
+            await self._changed.acquire()
+            self._launching -= 1
+            self._changed.notify_all()
+        self.stats.launches += 1
+        if self._closed:
+            await browser.close()
+            raise BrowserPoolClosed("the browser pool is closed")
+        slot = _Slot(browser)
+        self._slots.append(slot)
+        BROWSERS.inc()
+        return slot
+
+    async def _over_memory(self, slot):
+        if self.max_memory is None or slot.served % self.memory_check_every:
+            return False
+        usage = await self.memory_usage(slot.browser)
+        return usage is not None and usage > self.max_memory
+
+    async def _release(self, slot):
+        slot.served += 1
+        if not slot.retiring and (
+            slot.served >= self.max_pages or await self._over_memory(slot)
+        ):
+            slot.retiring = True
+        async with self._changed:
+            slot.active -= 1
+            BROWSER_CONTEXTS.labels("in_use").dec()
+            retire = slot.retiring and slot.active == 0 and slot in self._slots
+            if retire:
+                self._slots.remove(slot)
+                BROWSERS.dec()
+                self.stats.recycled += 1
+            self._changed.notify_all()
+        if retire:
+            await slot.browser.close()
@@ -0,0 +1,197 @@
+"""Columnar storage of scraped items as Parquet or Arrow IPC files.
+
+JSON chunks in the database repeat every field name in every item and are
+slow to scan. A :class:`ColumnarFileWriter` writes items as record batches
+to a Parquet (``parquet``) or Arrow IPC (``arrow``) file, compressed per
+column, on the local disk or any object store :mod:`pyarrow.fs` understands
+(``s3://bucket/prefix``, ``gs://...``). Only one batch of items is in memory
+at a time.
+
+The writer describes the finished file as an *artifact*, a small JSON-able
+dict with its format, location, row count, size and schema, which is all
+:func:`read_table` and :func:`iter_batches` need to read it back. Local
+files are memory-mapped, so reading a few columns of a large file touches
+only those pages.
+"""
+
+import os
+import posixpath
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+from pyarrow import ipc
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+DEFAULT_FORMAT = "parquet"
+DEFAULT_COMPRESSION = "zstd"
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def resolve(location):
+    """Return the ``(filesystem, path)`` for a local path or store URI."""
+    if "://" not in str(location):
+        location = os.path.abspath(location)
+    return pafs.FileSystem.from_uri(str(location))
+
+
+def join(root, *parts):
+    """Join ``parts`` onto a local path or store URI."""
+    return posixpath.join(str(root), *parts)
+
+
+def _storable(data_type):
+    """The type to store a column as; columns seen only as nulls are strings."""
+    if pa.types.is_null(data_type):
+        return pa.string()
+    if pa.types.is_list(data_type) and pa.types.is_null(data_type.value_type):
+        return pa.list_(pa.string())
+    return data_type
+
+
+def _keys(items):
+    """Every key of ``items``, in the order they are first seen."""
+    return dict.fromkeys(key for item in items for key in item)
+
+
+def infer_schema(items):
+    """Infer a schema from ``items``, with every key any of them has."""
+    columns = {key: [item.get(key) for item in items] for key in _keys(items)}
+    inferred = pa.Table.from_pydict(columns).schema
+    return pa.schema(pa.field(field.name, _storable(field.type)) for field in inferred)
+
+
+def widen_schema(schema, items):
+    """``schema`` with the fields of ``items`` it lacks appended.
+
+    Returns ``None`` when ``items`` have a field of another type.
+    """
+    try:
+        return pa.unify_schemas([schema, infer_schema(items)])
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+
+def describe_schema(schema):
+    return [{"name": field.name, "type": str(field.type)} for field in schema]
+
+
+class ColumnarFileWriter:
+    """Writes items to one Parquet or Arrow IPC file.
+
+    The schema is inferred from the first batch unless given. Later batches
+    are converted to it; :meth:`write_batch` raises :class:`pyarrow.ArrowInvalid`
+    or :class:`pyarrow.ArrowTypeError` for items that do not fit, including
+    items with fields the schema lacks, leaving the file as it was.
+    """
+
+    def __init__(
+        self,
+        location,
+        fmt=DEFAULT_FORMAT,
+        schema=None,
+        compression=DEFAULT_COMPRESSION,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown columnar format: {fmt!r}")
+        self.location = str(location)
+        self.fmt = fmt
+        self.schema = schema
+        self.compression = compression
+        self.rows = 0
+        self._filesystem, self._path = resolve(self.location)
+        self._sink = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open(self):
+        self._filesystem.create_dir(posixpath.dirname(self._path), recursive=True)
+        self._sink = self._filesystem.open_output_stream(self._path)
+        if self.fmt == "parquet":
+            self._writer = pq.ParquetWriter(
+                self._sink, self.schema, compression=self.compression
+            )
+        else:
+            options = ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = ipc.new_file(self._sink, self.schema, options=options)
+
+    def write_batch(self, items):
+        """Append ``items`` (a list of dicts) as one row group/record batch."""
+        if not items:
+            return
+        if self.schema is None:
+            self.schema = infer_schema(items)
+        extra = _keys(items).keys() - set(self.schema.names)
+        if extra:
+            # from_pylist would silently drop them.
+            raise pa.ArrowInvalid(f"Fields not in the schema: {sorted(extra)}")
+        table = pa.Table.from_pylist(items, schema=self.schema)
+        if self._writer is None:
+            self._open()
+        self._writer.write_table(table)
+        self.rows += len(items)
+
+    def close(self):
+        """Finish the file and return its artifact, or ``None`` if it is empty."""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._sink.close()
+        self._writer = self._sink = None
+        return {
+            "format": self.fmt,
+            "location": self.location,
+            "rows": self.rows,
+            "bytes": self._filesystem.get_file_info(self._path).size,
+            "compression": self.compression,
+            "schema": describe_schema(self.schema),
+        }
+
+
+def _open_input(location):
+    filesystem, path = resolve(location)
+    if isinstance(filesystem, pafs.LocalFileSystem):
+        return pa.memory_map(path)
+    return filesystem.open_input_file(path)
+
+
+def read_table(artifact, columns=None):
+    """Read the file described by ``artifact`` as a :class:`pyarrow.Table`.
+
+    Local files are memory-mapped; uncompressed Arrow IPC files are then read
+    without copying.
+    """
+    source = _open_input(artifact["location"])
+    if artifact["format"] == "parquet":
+        return pq.read_table(source, columns=columns, memory_map=True)
+    table = ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+
+def iter_batches(artifact, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the file described by ``artifact`` as record batches."""
+    with _open_input(artifact["location"]) as source:
+        if artifact["format"] == "parquet":
+            yield from pq.ParquetFile(source).iter_batches(
+                batch_size=batch_size, columns=columns
+            )
+            return
+        reader = ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            yield batch.select(columns) if columns else batch
+
+
+def iter_items(artifact, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the rows of the file described by ``artifact`` as dicts."""
+    for batch in iter_batches(artifact, columns, batch_size):
+        yield from batch.to_pylist()
+
+
+def is_columnar(artifact):
+    return isinstance(artifact, dict) and artifact.get("format") in FORMATS
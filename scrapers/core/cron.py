@@ -0,0 +1,213 @@
+"""Cron expressions and the times they fire.
+
+Schedules use the classic five fields, ``minute hour day month weekday``,
+each a ``*``, a value, a range ``a-b``, a step ``*/n`` or ``a-b/n``, or a
+comma separated list of those. Months and weekdays may be given by name
+(``jan``, ``mon``); weekday 0 and 7 are both Sunday. ``@hourly``,
+``@daily`` (``@midnight``), ``@weekly``, ``@monthly`` and ``@yearly``
+(``@annually``) are accepted as shorthands. As in cron, when both the day
+and the weekday are restricted a day matching either one fires.
+
+Times are computed in the schedule's time zone and returned as aware
+datetimes, so ``0 9 * * mon-fri`` in ``Europe/Paris`` stays at 9:00 local
+time across daylight saving changes. Candidates are compared as instants,
+in UTC. A local time skipped when clocks go forward fires as late as the
+gap is long (2:30 becomes 3:30); a local time repeated when clocks go back
+fires once, at its first occurrence, unless the schedule fires every hour,
+in which case it fires at both.
+"""
+
+import functools
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTHS = {
+    name: number
+    for number, name in enumerate(
+        "jan feb mar apr may jun jul aug sep oct nov dec".split(), start=1
+    )
+}
+WEEKDAYS = {
+    name: number for number, name in enumerate("sun mon tue wed thu fri sat".split())
+}
+# (name, lowest value, highest value, names)
+FIELDS = (
+    ("minute", 0, 59, {}),
+    ("hour", 0, 23, {}),
+    ("day", 1, 31, {}),
+    ("month", 1, 12, MONTHS),
+    ("weekday", 0, 7, WEEKDAYS),
+)
+# How far ahead to look for a matching day (covers 29 February).
+SEARCH_DAYS = 366 * 8
+
+
+class CronError(ValueError):
+    """Raised for an invalid cron expression or time zone."""
+
+
+def _value(text, names, field):
+    text = text.strip().lower()
+    if text in names:
+        return names[text]
+    if not text.isdigit():
+        raise CronError(f"Invalid {field} value {text!r}")
+    return int(text)
+
+
+def _parse_field(text, field, low, high, names):
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) < 1:
+                raise CronError(f"Invalid {field} step {step_text!r}")
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            first, last = part.split("-", 1)
+            start, end = _value(first, names, field), _value(last, names, field)
+        else:
+            start = _value(part, names, field)
+            # "5/15" means every 15 starting at 5.
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise CronError(f"{field} {part!r} is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+@dataclass(frozen=True)
+class CronSchedule:
+    """A parsed cron expression."""
+
+    expression: str
+    minutes: tuple
+    hours: tuple
+    days: frozenset
+    months: frozenset
+    weekdays: frozenset
+    # Cron ORs day and weekday when both are restricted.
+    any_day: bool
+    any_weekday: bool
+
+    def matches_date(self, date):
+        if date.month not in self.months:
+            return False
+        day = date.day in self.days
+        weekday = date.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def _times(self, start=time.min):
+        """Yield the matching times of a day from ``start`` on."""
+        for hour in self.hours:
+            if hour < start.hour:
+                continue
+            for minute in self.minutes:
+                if hour == start.hour and minute < start.minute:
+                    continue
+                yield time(hour, minute)
+
+    def _instants(self, local, tz):
+        """When the naive local time ``local`` fires in ``tz``, in UTC.
+
+        Returns the instant of its first occurrence and, for a time repeated
+        when clocks went back, of its second if the schedule fires hourly
+        (``None`` otherwise). For a time skipped when clocks went forward,
+        fold=0 takes the offset from before the gap, which moves it later.
+        """
+        first = local.replace(tzinfo=tz).astimezone(timezone.utc)
+        second = local.replace(tzinfo=tz, fold=1).astimezone(timezone.utc)
+        if first < second and len(self.hours) == 24:
+            return first, second
+        return first, None
+
+    def _fires(self, start, tz):
+        """Yield :meth:`_instants` of every fire time from naive ``start`` on."""
+        date, times = start.date(), self._times(start.time())
+        for _ in range(SEARCH_DAYS + 1):
+            if self.matches_date(date):
+                for at in times:
+                    yield self._instants(datetime.combine(date, at), tz)
+            date, times = date + timedelta(days=1), self._times()
+
+    def next_after(self, moment, tz=timezone.utc):
+        """The first time strictly after ``moment`` the schedule fires."""
+        moment = moment.astimezone(timezone.utc)
+        local = moment.astimezone(tz).replace(tzinfo=None)
+        # Right after clocks went back, later instants have earlier local
+        # times: start from the first occurrence of the current one.
+        start = local - _repeated(local, tz)
+        # First and second occurrences each come in order, but second ones
+        # come after first ones of later local times.
+        repeat = None
+        for first, second in self._fires(start, tz):
+            if repeat is None and second is not None and second > moment:
+                repeat = second
+            if first > moment:
+                return min(first, repeat or first).astimezone(tz)
+        raise CronError(f"{self.expression!r} never fires")
+
+
+def _repeated(local, tz):
+    """How long before its last occurrence the naive ``local`` first occurred."""
+    first = local.replace(tzinfo=tz).utcoffset()
+    last = local.replace(tzinfo=tz, fold=1).utcoffset()
+    return max(first - last, timedelta(0))
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_cron(expression):
+    """Parse a cron expression into a :class:`CronSchedule`."""
+    text = MACROS.get(expression.strip().lower(), expression)
+    parts = text.split()
+    if len(parts) != len(FIELDS):
+        raise CronError(f"Cron expression needs {len(FIELDS)} fields: {expression!r}")
+    minutes, hours, days, months, weekdays = (
+        _parse_field(part, *spec) for part, spec in zip(parts, FIELDS)
+    )
+    weekdays = {day % 7 for day in weekdays}
+    return CronSchedule(
+        expression=expression,
+        minutes=tuple(sorted(minutes)),
+        hours=tuple(sorted(hours)),
+        days=frozenset(days),
+        months=frozenset(months),
+        weekdays=frozenset(weekdays),
+        any_day=parts[2].startswith("*"),
+        any_weekday=parts[4].startswith("*"),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as exc:
+        raise CronError(f"Unknown time zone {name!r}") from exc
+
+
+def next_due(expression, tz_name, after, offset=0):
+    """The first time after ``after`` that is a fire time plus ``offset`` seconds.
+
+    ``offset`` shifts every fire time by the same amount, which spreads jobs
+    sharing a schedule without changing their period.
+    """
+    shift = timedelta(seconds=offset)
+    fire = parse_cron(expression).next_after(after - shift, get_timezone(tz_name))
+    # Shifted in UTC: arithmetic on local times ignores DST changes.
+    return fire.astimezone(timezone.utc) + shift
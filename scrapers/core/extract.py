@@ -0,0 +1,268 @@
+"""Field extraction from parsed HTML using a compiled recipe plan.
+
+An :class:`Extractor` is built once per :class:`~scrapers.core.recipe.RecipePlan`
+(see :func:`extractor_for`) and reused for every page of every run.
+
+Fields whose selector is a single compound CSS selector ("simple" fields, see
+``CompiledField.match``) are found together. Their conditions are OR-ed into a
+single, deliberately loose XPath that libxml2 evaluates in one walk of the
+document; each candidate node is then matched exactly in Python and assigned
+to its field. When the item selector is simple too, item blocks are found in
+the same walk, so a whole product listing is extracted in one pass; pages
+where item blocks nest, or where an item block also matches a field, are
+extracted item by item instead, as for any other item selector. Any other
+selector is evaluated on its own compiled XPath.
+
+Rows are plain tuples in ``Extractor.columns`` order; no per-node dicts are
+built.
+"""
+
+import functools
+import hashlib
+import json
+
+from lxml import etree
+
+_html_parser = etree.HTMLParser()
+
+
+def parse_html(body, base_url=None):
+    """Parse an HTML document from bytes or text."""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return etree.fromstring(body, _html_parser, base_url=base_url)
+
+
+def _text(node):
+    return " ".join("".join(node.itertext()).split())
+
+
+def _value(node, attr):
+    # XPath selectors may return strings (text() or @attr) rather than elements.
+    if isinstance(node, str):
+        return node.strip()
+    if not isinstance(node, etree._Element):
+        return node
+    if attr:
+        return node.get(attr)
+    return _text(node)
+
+
+def _literal(value):
+    """Quote ``value`` as an XPath 1.0 string literal."""
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    parts = ', "\'", '.join(f"'{part}'" for part in value.split("'"))
+    return f"concat({parts})"
+
+
+def _prefilter(match):
+    """Return a cheap XPath condition accepting every node ``match`` accepts.
+
+    Class tests only use ``contains()``; the exact token match is left to
+    :func:`_matcher`, which is much cheaper than the normalize-space/concat
+    dance in libxml2.
+    """
+    conditions = []
+    if match["tag"] is not None:
+        conditions.append(f"self::{match['tag']}")
+    if match["id"] is not None:
+        conditions.append(f"@id={_literal(match['id'])}")
+    for class_name in match["classes"]:
+        conditions.append(f"contains(@class, {_literal(class_name)})")
+    for name, value in match["attrs"]:
+        conditions.append(f"@{name}" if value is None else f"@{name}={_literal(value)}")
+    return "(" + " and ".join(conditions or ["true()"]) + ")"
+
+
+def _matcher(match):
+    """Build an exact predicate over an element from a ``CompiledField.match``."""
+    tag = match["tag"]
+    element_id = match["id"]
+    classes = frozenset(match["classes"])
+    attrs = tuple(match["attrs"])
+
+    def matches(node):
+        if tag is not None and node.tag != tag:
+            return False
+        if element_id is not None and node.get("id") != element_id:
+            return False
+        if classes and not classes.issubset((node.get("class") or "").split()):
+            return False
+        for name, value in attrs:
+            actual = node.get(name)
+            if actual is None or (value is not None and actual != value):
+                return False
+        return True
+
+    return matches
+
+
+def _inside(node, ancestor):
+    for parent in node.iterancestors():
+        if parent is ancestor:
+            return True
+    return False
+
+
+class Extractor:
+    """Extracts every field of a plan from a document in a single pass."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.columns = plan.field_names
+        self._multi = tuple(f.all for f in plan.fields)
+        self._complex = tuple(
+            (index, f) for index, f in enumerate(plan.fields) if f.match is None
+        )
+        simple = [(index, f) for index, f in enumerate(plan.fields) if f.match]
+        self._simple = tuple((index, _matcher(f.match), f.attr) for index, f in simple)
+        conditions = [_prefilter(f.match) for _, f in simple]
+
+        items = plan.items
+        self._items = items.compiled if items else None
+        self._is_item = None
+        # ``_scan`` finds field nodes in a page without items, or items and
+        # field nodes in one walk; ``_item_scan`` finds field nodes in an item.
+        self._scan = self._item_scan = None
+        if items is None:
+            if conditions:
+                self._scan = self._xpath("descendant-or-self", conditions)
+        else:
+            if conditions:
+                self._item_scan = self._xpath("descendant", conditions)
+            if items.match is not None:
+                self._is_item = _matcher(items.match)
+                self._scan = self._xpath(
+                    "descendant-or-self", [_prefilter(items.match)] + conditions
+                )
+        self._follow = plan.follow
+
+    @staticmethod
+    def _xpath(axis, conditions):
+        return etree.XPath(f"{axis}::*[{' or '.join(conditions)}]")
+
+    def extract(self, document, base_url=None):
+        """Return the rows found in ``document``.
+
+        ``document`` is raw HTML (bytes or text) or an already parsed tree.
+        Without an ``items`` selector the page yields exactly one row.
+        """
+        if isinstance(document, (bytes, str)):
+            document = parse_html(document, base_url=base_url)
+        if self._items is None:
+            values = self._new_values()
+            if self._scan is not None:
+                self._assign(self._scan(document), values)
+            return [self._finish(document, values)]
+        if self._is_item is not None:
+            rows = self._extract_items_single_pass(document)
+            if rows is not None:
+                return rows
+        return self._extract_items(document)
+
+    def links(self, document):
+        """Return the values of the plan's ``follow`` selector in ``document``."""
+        if self._follow is None:
+            return []
+        found = self._follow.compiled(document)
+        if not isinstance(found, list):
+            return []
+        links = (_value(node, self._follow.attr) for node in found)
+        return [link for link in links if link]
+
+    def extract_page(self, document, base_url=None):
+        """Return ``(rows, links)`` for ``document``, parsing it only once."""
+        if isinstance(document, (bytes, str)):
+            document = parse_html(document, base_url=base_url)
+        return self.extract(document), self.links(document)
+
+    def extract_dicts(self, document, base_url=None):
+        """Like :meth:`extract`, but returns one mapping per row."""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.extract(document, base_url)]
+
+    def _new_values(self):
+        return [[] if is_multi else None for is_multi in self._multi]
+
+    def _finish(self, context, values):
+        multi = self._multi
+        for index, f in self._complex:
+            found = f.compiled(context)
+            if not isinstance(found, list):
+                values[index] = found
+            elif multi[index]:
+                values[index] = [_value(node, f.attr) for node in found]
+            elif found:
+                values[index] = _value(found[0], f.attr)
+        return tuple(values)
+
+    def _assign(self, nodes, values):
+        multi = self._multi
+        pending = list(self._simple)
+        for node in nodes:
+            for entry in tuple(pending):
+                index, matches, attr = entry
+                if not matches(node):
+                    continue
+                if multi[index]:
+                    values[index].append(_value(node, attr))
+                else:
+                    values[index] = _value(node, attr)
+                    pending.remove(entry)
+            if not pending:
+                break
+
+    def _extract_items(self, document):
+        rows = []
+        for item in self._items(document):
+            values = self._new_values()
+            if self._item_scan is not None:
+                self._assign(self._item_scan(item), values)
+            rows.append(self._finish(item, values))
+        return rows
+
+    def _extract_items_single_pass(self, document):
+        # The scan yields nodes in document order, so every field node that
+        # belongs to an item comes after the item and before the next one,
+        # unless items nest. Returns None when they do, or when an item
+        # matches a field, for _extract_items to do it item by item.
+        rows = []
+        is_item = self._is_item
+        item, nodes = None, []
+        for node in self._scan(document):
+            if is_item(node):
+                if item is not None and _inside(node, item):
+                    return None
+                if any(matches(node) for _, matches, _ in self._simple):
+                    return None
+                if item is not None:
+                    rows.append(self._item_row(item, nodes))
+                item, nodes = node, []
+            elif item is not None and _inside(node, item):
+                nodes.append(node)
+        if item is not None:
+            rows.append(self._item_row(item, nodes))
+        return rows
+
+    def _item_row(self, item, nodes):
+        values = self._new_values()
+        self._assign(nodes, values)
+        return self._finish(item, values)
+
+
+@functools.lru_cache(maxsize=256)
+def extractor_for(plan):
+    """Return the shared extractor for ``plan``."""
+    return Extractor(plan)
+
+
+def items_hash(items):
+    """Return a stable content hash of a page's extracted items.
+
+    Key order within an item does not matter; item order does.
+    """
+    data = json.dumps(items, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
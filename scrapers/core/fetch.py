@@ -0,0 +1,329 @@
+"""Asynchronous HTTP fetching over a shared, keep-alive connection pool.
+
+A single :class:`Fetcher` is meant to be opened once per worker (or per run)
+and reused for every request it makes. Connections are pooled by aiohttp's
+connector and kept alive between requests, so fetching thousands of pages from
+the same site only pays for a handful of TCP/TLS handshakes.
+
+Given a :class:`~scrapers.core.http_cache.ResponseCache`, GET requests are
+revalidated with ``If-None-Match``/``If-Modified-Since`` and a ``304`` answer
+is returned with the cached body and ``not_modified`` set, so callers can
+skip re-processing pages that did not change.
+
+Concurrency is bounded twice: ``concurrency`` caps the number of requests in
+flight overall and ``per_host`` caps the number of requests in flight against
+any one host. Requests over either limit wait for a free connection. Given a
+:class:`~scrapers.core.politeness.PolitenessScheduler`, every request also
+waits for its domain's rate limit, which may be shared with other fetchers,
+and requests answered with ``429``/``503`` are retried once the domain's
+backoff has passed, up to ``throttle_retries`` times.
+
+Every result carries the ``timings`` of the request behind it: the seconds
+spent resolving its host (``dns``) and opening its connection (``connect``),
+when it needed to, and how many times it was ``retries``.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from typing import AsyncIterator, Iterable, Mapping, Optional
+
+import aiohttp
+
+from scrapers.core.http_cache import ResponseCache, fingerprint, is_cacheable
+from scrapers.core.politeness import THROTTLE_STATUSES, PolitenessScheduler
+
+DEFAULT_CONCURRENCY = 100
+DEFAULT_PER_HOST = 8
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_KEEPALIVE_TIMEOUT = 30.0
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_USER_AGENT = "scraper-engine/0.1"
+DEFAULT_THROTTLE_RETRIES = 2
+
+
+def _add_timing(context, name, start):
+    """Add the seconds since ``start`` to the request's ``name`` timing."""
+    timings = context.trace_request_ctx
+    if isinstance(timings, dict):
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+class FetchError(Exception):
+    """Raised when a request could not be completed."""
+
+    def __init__(self, url, message):
+        super().__init__(f"{url}: {message}")
+        self.url = url
+
+
+@dataclass(frozen=True)
+class FetchResult:
+    """A fully read response."""
+
+    url: str
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+    elapsed: float
+    error: Optional[str] = None
+    not_modified: bool = False
+    timings: Mapping[str, float] = field(default_factory=dict)
+    retries: int = 0
+
+    @property
+    def ok(self):
+        return self.error is None and 200 <= self.status < 400
+
+    def text(self, encoding="utf-8"):
+        return self.body.decode(encoding, errors="replace")
+
+
+@dataclass
+class FetchStats:
+    """Counters describing how a fetcher used its connection pool."""
+
+    requests: int = 0
+    failures: int = 0
+    bytes_received: int = 0
+    connections_opened: int = 0
+    connections_reused: int = 0
+    not_modified: int = 0
+    throttled: int = 0
+
+
+class StreamingResponse:
+    """A response whose body has not been read yet.
+
+    Wraps the underlying aiohttp response so callers never depend on the
+    transport library directly.
+    """
+
+    def __init__(self, url, response, stats, timings=None):
+        self.url = url
+        self.timings = timings if timings is not None else {}
+        self._response = response
+        self._stats = stats
+
+    @property
+    def status(self):
+        return self._response.status
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    async def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield the body in chunks of at most ``chunk_size`` bytes."""
+        async for chunk in self._response.content.iter_chunked(chunk_size):
+            self._stats.bytes_received += len(chunk)
+            yield chunk
+
+    async def read(self):
+        body = await self._response.read()
+        self._stats.bytes_received += len(body)
+        return body
+
+
+@dataclass
+class Fetcher:
+    """Pooled asynchronous HTTP client.
+
+    Use it as an async context manager::
+
+        async with Fetcher(per_host=4) as fetcher:
+            result = await fetcher.fetch("https://example.com")
+    """
+
+    concurrency: int = DEFAULT_CONCURRENCY
+    per_host: int = DEFAULT_PER_HOST
+    timeout: float = DEFAULT_TIMEOUT
+    keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT
+    headers: Mapping[str, str] = field(default_factory=dict)
+    cache: Optional[ResponseCache] = None
+    politeness: Optional[PolitenessScheduler] = None
+    throttle_retries: int = DEFAULT_THROTTLE_RETRIES
+    stats: FetchStats = field(default_factory=FetchStats, init=False)
+
+    def __post_init__(self):
+        self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def is_open(self):
+        return self._session is not None and not self._session.closed
+
+    async def open(self):
+        if self.is_open:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": DEFAULT_USER_AGENT, **self.headers},
+            trace_configs=[self._trace_config()],
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_dns_resolvehost_start(session, context, params):
+            context.dns_start = time.perf_counter()
+
+        async def on_dns_resolvehost_end(session, context, params):
+            _add_timing(context, "dns", context.dns_start)
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            self.stats.connections_opened += 1
+            _add_timing(context, "connect", context.connect_start)
+
+        async def on_connection_reuseconn(session, context, params):
+            self.stats.connections_reused += 1
+
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    @asynccontextmanager
+    async def stream(
+        self, url, *, method="GET", headers=None, **kwargs
+    ) -> AsyncIterator[StreamingResponse]:
+        """Send a request and yield the response before its body is read.
+
+        The connection goes back to the pool when the context exits.
+        """
+        if not self.is_open:
+            raise RuntimeError("Fetcher is not open")
+        self.stats.requests += 1
+        timings = {}
+        try:
+            async with self._session.request(
+                method, url, headers=headers, trace_request_ctx=timings, **kwargs
+            ) as response:
+                yield StreamingResponse(url, response, self.stats, timings)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            self.stats.failures += 1
+            raise FetchError(url, str(exc) or type(exc).__name__) from exc
+
+    async def fetch(self, url, *, method="GET", headers=None, **kwargs):
+        """Fetch ``url`` and read the whole body into memory."""
+        if self.politeness is None:
+            return await self._fetch(url, method, headers, kwargs)
+        for attempt in range(self.throttle_retries + 1):
+            await self.politeness.acquire(url)
+            result = await self._fetch(url, method, headers, kwargs)
+            await self.politeness.record(url, result.status, result.headers)
+            if result.status not in THROTTLE_STATUSES:
+                break
+            self.stats.throttled += 1
+        return replace(result, retries=attempt) if attempt else result
+
+    async def _fetch(self, url, method, headers, kwargs):
+        start = time.perf_counter()
+        key = cached = None
+        if self.cache is not None and method == "GET":
+            key = fingerprint(url, method, {**self.headers, **(headers or {})})
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                headers = {**cached.conditional_headers(), **(headers or {})}
+        async with self.stream(url, method=method, headers=headers, **kwargs) as r:
+            if cached is not None and r.status == 304:
+                self.stats.not_modified += 1
+                return FetchResult(
+                    url=url,
+                    status=r.status,
+                    headers={**cached.headers, **r.headers},
+                    body=cached.body,
+                    elapsed=time.perf_counter() - start,
+                    not_modified=True,
+                    timings=r.timings,
+                )
+            result = FetchResult(
+                url=url,
+                status=r.status,
+                headers=dict(r.headers),
+                body=await r.read(),
+                elapsed=time.perf_counter() - start,
+                timings=r.timings,
+            )
+        if key is not None:
+            await asyncio.to_thread(self._update_cache, key, cached, result)
+        return result
+
+    def _update_cache(self, key, cached, result):
+        if is_cacheable(result.status, result.headers):
+            self.cache.put(key, result.url, result.status, result.headers, result.body)
+        elif cached is not None and result.status not in THROTTLE_STATUSES:
+            # A throttled answer says nothing about the cached representation.
+            self.cache.delete(key)
+
+    async def fetch_many(self, urls: Iterable[str], limit=None, **kwargs):
+        """Fetch ``urls`` concurrently, yielding results as they complete.
+
+        At most ``limit`` (by default ``concurrency``) requests are scheduled
+        at a time, so the URL iterable may be arbitrarily long. Failed
+        requests are yielded as results with ``error`` set instead of
+        aborting the batch. Requests still in flight when the generator is
+        closed are cancelled.
+        """
+        urls = iter(urls)
+        limit = min(limit or self.concurrency, self.concurrency)
+        pending = set()
+
+        def schedule():
+            for url in urls:
+                pending.add(asyncio.ensure_future(self._fetch_or_error(url, kwargs)))
+                if len(pending) >= limit:
+                    return
+
+        schedule()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+                schedule()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _fetch_or_error(self, url, kwargs):
+        start = time.perf_counter()
+        try:
+            return await self.fetch(url, **kwargs)
+        except FetchError as exc:
+            return FetchResult(
+                url=url,
+                status=0,
+                headers={},
+                body=b"",
+                elapsed=time.perf_counter() - start,
+                error=str(exc),
+            )
@@ -0,0 +1,448 @@
+"""A persistent, deduplicating crawl frontier.
+
+Crawls that follow links must not fetch a URL twice, and a job may discover
+tens of millions of them, far too many for a Python ``set`` of strings. A
+:class:`Frontier` keeps only a Bloom filter in memory and everything else in
+a SQLite database in its directory:
+
+- URLs are canonicalised (:func:`canonicalize`) and identified by a 16-byte
+  fingerprint.
+- The Bloom filter answers "definitely not seen" for most new URLs without
+  touching the disk; only a "maybe seen" answer is checked against the exact
+  ``seen`` table, so false positives never drop a URL.
+- Pending URLs wait in a ``queue`` table ordered by priority (higher first),
+  then depth (shallower first), then discovery order.
+
+Popped entries are *leased* until :meth:`Frontier.done` is called for them.
+When a frontier is reopened, say by the next run of a job after a crash,
+leased entries go back to the queue, so nothing popped but unfinished is
+lost.
+
+When completing entries has to agree with a commit elsewhere (a run's
+checkpoint in the database), :meth:`Frontier.prepare_done` marks them first
+under a sequence number and :meth:`Frontier.commit_done` removes them once
+the other side has committed. After a crash in between, :meth:`Frontier.recover`
+is told the last sequence number the other side committed and either
+completes the prepared entries or returns them to the queue.
+
+Memory per URL is the Bloom filter's ``bits_per_item`` (about 9.6 bits, 1.2
+bytes, at the default 1% error rate) plus SQLite's page cache, which is
+capped by ``cache_kib`` rather than growing with the number of URLs: a
+million URLs grow the process by about 11 bytes each, against ~145 bytes
+each for a ``set`` of the URL strings. On disk a pending URL costs its
+length plus about 50 bytes. ``python -m benchmarks.bench_frontier``
+measures all of these.
+"""
+
+import hashlib
+import math
+import re
+import sqlite3
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, quote, urlencode, urljoin, urlsplit, urlunsplit
+
+DEFAULT_CAPACITY = 10_000_000
+DEFAULT_ERROR_RATE = 0.01
+# SQLite page cache per frontier, in KiB.
+DEFAULT_CACHE_KIB = 8 * 1024
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|msclkid|mc_cid|mc_eid)$", re.I)
+
+_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+_UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+_PATH_SAFE = "/%:@!$&'()*+,;=~"
+
+
+def _normalize_escapes(text):
+    def fix(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in _UNRESERVED else "%" + match.group(1).upper()
+
+    return _ESCAPE.sub(fix, text)
+
+
+def _remove_dot_segments(path):
+    output = []
+    for segment in path.split("/"):
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if path.endswith(("/.", "/..")):
+        output.append("")
+    return "/".join(output) or "/"
+
+
+def canonicalize(url, base=None):
+    """Return the canonical form of ``url``, or ``None`` if it is not crawlable.
+
+    Relative URLs are resolved against ``base``. The scheme and host are
+    lowercased, default ports, credentials and fragments dropped, dot
+    segments resolved, percent escapes normalised, tracking parameters
+    (``utm_*``, ``gclid``, ...) removed and the query sorted.
+    """
+    if base is not None:
+        url = urljoin(base, url)
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+    path = quote(_remove_dot_segments(parts.path or "/"), safe=_PATH_SAFE)
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not TRACKING_PARAMS.match(name)
+        )
+    )
+    return urlunsplit((scheme, netloc, _normalize_escapes(path), query, ""))
+
+
+def fingerprint(canonical_url):
+    return hashlib.blake2b(canonical_url.encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """A Bloom filter over 16-byte fingerprints.
+
+    Sized for ``capacity`` items at ``error_rate`` false positives; it keeps
+    working past its capacity, with a growing false positive rate.
+    """
+
+    _HEADER = struct.Struct("<QQQ")
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def bits_per_item(self):
+        return self.size / self.capacity
+
+    @property
+    def nbytes(self):
+        return len(self._bits)
+
+    def _positions(self, fp):
+        # Double hashing over the two halves of the fingerprint.
+        first = int.from_bytes(fp[:8], "little")
+        second = int.from_bytes(fp[8:16], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, fp):
+        bits = self._bits
+        for position in self._positions(fp):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, fp):
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(fp)
+        )
+
+    def save(self, path, tag=0):
+        """Write the filter to ``path``; ``tag`` is returned by :meth:`load`."""
+        path = Path(path)
+        partial = path.with_suffix(".partial")
+        with open(partial, "wb") as file:
+            file.write(self._HEADER.pack(self.size, self.hashes, tag))
+            file.write(self._bits)
+        partial.replace(path)
+
+    def load(self, path):
+        """Read a filter saved with the same sizing; return its tag or ``None``."""
+        try:
+            with open(path, "rb") as file:
+                size, hashes, tag = self._HEADER.unpack(file.read(self._HEADER.size))
+                if (size, hashes) != (self.size, self.hashes):
+                    return None
+                bits = file.read()
+        except (OSError, struct.error):
+            return None
+        if len(bits) != len(self._bits):
+            return None
+        self._bits[:] = bits
+        return tag
+
+
+@dataclass(frozen=True)
+class FrontierEntry:
+    """A URL taken from the frontier."""
+
+    id: int
+    url: str
+    depth: int
+    priority: int
+
+
+@dataclass
+class FrontierStats:
+    """Counters describing how duplicate checks were answered."""
+
+    added: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    bloom_negatives: int = 0
+    exact_lookups: int = 0
+    false_positives: int = 0
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (fingerprint BLOB PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    -- 0: pending, 1: leased, 2: prepared to be done
+    leased INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS queue_order ON queue (leased, priority DESC, depth, id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+class Frontier:
+    """URLs to crawl and URLs already seen, stored in ``directory``.
+
+    Use it as a context manager so the Bloom filter is saved on exit::
+
+        with Frontier(path) as frontier:
+            frontier.add_many(seed_urls)
+            while entries := frontier.pop_many(100):
+                ...
+                frontier.done_many(entries)
+    """
+
+    def __init__(
+        self,
+        directory,
+        capacity=DEFAULT_CAPACITY,
+        error_rate=DEFAULT_ERROR_RATE,
+        cache_kib=DEFAULT_CACHE_KIB,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.stats = FrontierStats()
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._db = sqlite3.connect(self.directory / "frontier.db", isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+        self._db.executescript(_SCHEMA)
+        # Entries leased by a previous, unfinished crawl are pending again.
+        self._db.execute("UPDATE queue SET leased = 0 WHERE leased = 1")
+        self._load_bloom()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def _bloom_path(self):
+        return self.directory / "bloom.bin"
+
+    def _seen_count(self):
+        return self._meta("seen") or 0
+
+    def _load_bloom(self):
+        seen = self._seen_count()
+        if self.bloom.load(self._bloom_path) == seen:
+            self.bloom.count = seen
+            return
+        # Missing, stale or differently sized: rebuild from the exact store.
+        self.bloom = BloomFilter(self.bloom.capacity, self.bloom.error_rate)
+        for (fp,) in self._db.execute("SELECT fingerprint FROM seen"):
+            self.bloom.add(fp)
+
+    def close(self):
+        if self._db is None:
+            return
+        self.bloom.save(self._bloom_path, tag=self._seen_count())
+        self._db.close()
+        self._db = None
+
+    def __len__(self):
+        """Number of pending (not leased) URLs."""
+        return self._db.execute(
+            "SELECT count(*) FROM queue WHERE leased = 0"
+        ).fetchone()[0]
+
+    @property
+    def leased(self):
+        return self._db.execute(
+            "SELECT count(*) FROM queue WHERE leased = 1"
+        ).fetchone()[0]
+
+    def __contains__(self, url):
+        canonical = canonicalize(url)
+        if canonical is None:
+            return False
+        fp = fingerprint(canonical)
+        return fp in self.bloom and self._exact_seen([fp]) == {fp}
+
+    def _exact_seen(self, fps):
+        self.stats.exact_lookups += len(fps)
+        found = set()
+        for start in range(0, len(fps), 500):
+            batch = fps[start : start + 500]
+            marks = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT fingerprint FROM seen WHERE fingerprint IN ({marks})", batch
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def _new(self, urls, base):
+        """Map the fingerprints of the unseen URLs among ``urls`` to their URLs."""
+        candidates = {}
+        for url in urls:
+            canonical = canonicalize(url, base)
+            if canonical is None:
+                self.stats.rejected += 1
+                continue
+            candidates.setdefault(fingerprint(canonical), canonical)
+        maybe_seen = [fp for fp in candidates if fp in self.bloom]
+        self.stats.bloom_negatives += len(candidates) - len(maybe_seen)
+        seen = self._exact_seen(maybe_seen) if maybe_seen else set()
+        self.stats.false_positives += len(maybe_seen) - len(seen)
+        self.stats.duplicates += len(seen)
+        return {fp: url for fp, url in candidates.items() if fp not in seen}
+
+    def add_many(self, urls, depth=0, priority=0, base=None):
+        """Queue the URLs not seen before; return how many were queued.
+
+        All of them are checked and inserted in one transaction.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            new = self._new(urls, base)
+            self._db.executemany(
+                "INSERT INTO seen (fingerprint) VALUES (?)", ((fp,) for fp in new)
+            )
+            self._db.executemany(
+                "INSERT INTO queue (url, depth, priority) VALUES (?, ?, ?)",
+                ((url, depth, priority) for url in new.values()),
+            )
+            self._db.execute(
+                "INSERT INTO meta (key, value) VALUES ('seen', ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (len(new),),
+            )
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        for fp in new:
+            self.bloom.add(fp)
+        self.stats.added += len(new)
+        return len(new)
+
+    def add(self, url, depth=0, priority=0, base=None):
+        """Queue ``url`` unless it was seen before; return whether it was."""
+        return self.add_many([url], depth, priority, base) == 1
+
+    def pop_many(self, count):
+        """Lease up to ``count`` pending entries, best first."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute(
+                "SELECT id, url, depth, priority FROM queue WHERE leased = 0"
+                " ORDER BY priority DESC, depth, id LIMIT ?",
+                (count,),
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE queue SET leased = 1 WHERE id = ?", ((row[0],) for row in rows)
+            )
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return [FrontierEntry(*row) for row in rows]
+
+    def pop(self) -> Optional[FrontierEntry]:
+        entries = self.pop_many(1)
+        return entries[0] if entries else None
+
+    def done_many(self, entries):
+        """Remove leased entries for good; their URLs stay seen."""
+        self._db.executemany(
+            "DELETE FROM queue WHERE id = ?", ((entry.id,) for entry in entries)
+        )
+
+    def done(self, entry):
+        self.done_many([entry])
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,))
+        row = row.fetchone()
+        return row[0] if row else None
+
+    def prepare_done(self, entries, seq):
+        """Mark leased entries as done once sequence number ``seq`` commits.
+
+        They are neither pending nor removed until :meth:`commit_done`, or
+        :meth:`recover` after a crash, decides.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.executemany(
+                "UPDATE queue SET leased = 2 WHERE id = ?",
+                ((entry.id,) for entry in entries),
+            )
+            self._db.execute(
+                "INSERT INTO meta (key, value) VALUES ('prepared', ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (seq,),
+            )
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def commit_done(self):
+        """Remove the prepared entries for good."""
+        self._db.execute("DELETE FROM queue WHERE leased = 2")
+
+    def recover(self, committed):
+        """Settle entries prepared before a crash.
+
+        ``committed`` is the last sequence number the other side committed
+        (``None`` if it never did). Entries prepared under it are done; any
+        prepared later go back to the queue.
+        """
+        prepared = self._meta("prepared")
+        if prepared is not None and committed is not None and prepared <= committed:
+            self.commit_done()
+        else:
+            self._db.execute("UPDATE queue SET leased = 0 WHERE leased = 2")
+
+    def clear(self):
+        """Forget every URL, seen or pending."""
+        self._db.executescript(
+            "BEGIN; DELETE FROM queue; DELETE FROM seen; DELETE FROM meta; COMMIT;"
+        )
+        self.bloom = BloomFilter(self.bloom.capacity, self.bloom.error_rate)
@@ -0,0 +1,204 @@
+"""A size-bounded, disk-backed cache of HTTP responses for revalidation.
+
+Recurring jobs fetch the same URLs over and over. When a response carried an
+``ETag`` or ``Last-Modified`` validator, :class:`ResponseCache` keeps it on
+disk so the next fetch can send ``If-None-Match``/``If-Modified-Since`` and,
+on ``304 Not Modified``, reuse the stored body without downloading it again.
+
+Entries are keyed by a fingerprint of the method, URL and the request headers
+that can change the response. Each entry is a single file (a JSON header line
+followed by the raw body) written atomically, so several processes may share
+a cache directory. The total size is bounded by ``max_bytes``; the least
+recently used entries are evicted first, using file modification times as the
+recency order so it survives restarts.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Mapping, Optional
+
+DEFAULT_MAX_BYTES = 1024**3
+
+# Request headers that select a different representation of the same URL.
+VARY_HEADERS = (
+    "accept",
+    "accept-encoding",
+    "accept-language",
+    "authorization",
+    "cookie",
+)
+
+_SUFFIX = ".resp"
+
+
+def fingerprint(url, method="GET", headers=None):
+    """Return the cache key for a request."""
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    varying = sorted((name, headers[name]) for name in VARY_HEADERS if name in headers)
+    raw = json.dumps([method.upper(), url, varying], separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def is_cacheable(status, headers):
+    """Whether a response can be stored for later revalidation."""
+    if status != 200:
+        return False
+    headers = {name.lower(): value for name, value in headers.items()}
+    if "no-store" in headers.get("cache-control", "").lower():
+        return False
+    return "etag" in headers or "last-modified" in headers
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A stored response and the validators to revalidate it with."""
+
+    url: str
+    status: int
+    headers: Mapping[str, str]
+    body: bytes = field(repr=False)
+    stored_at: float
+
+    def _header(self, name):
+        for key, value in self.headers.items():
+            if key.lower() == name:
+                return value
+        return None
+
+    @property
+    def etag(self):
+        return self._header("etag")
+
+    @property
+    def last_modified(self):
+        return self._header("last-modified")
+
+    def conditional_headers(self):
+        """Request headers asking the server to revalidate this response."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """Stores revalidatable responses under ``directory``."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()
+        self._total = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    @property
+    def size(self):
+        """Total bytes of the entries this process knows about."""
+        return self._total
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}{_SUFFIX}"
+
+    def _load(self):
+        entries = []
+        for path in self.directory.glob(f"*/*{_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path.name[: -len(_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._remember(key, size)
+
+    def get(self, key) -> Optional[CachedResponse]:
+        """Return the entry stored under ``key`` and mark it recently used."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                line = f.readline()
+                body = f.read()
+            header = json.loads(line)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+                self._forget(key)
+            return None
+        with self._lock:
+            self.hits += 1
+            self._remember(key, len(line) + len(body))
+        return CachedResponse(body=body, **header)
+
+    def put(self, key, url, status, headers, body):
+        """Store a response, evicting old entries to stay under ``max_bytes``."""
+        header = json.dumps(
+            {
+                "url": url,
+                "status": status,
+                "headers": dict(headers),
+                "stored_at": time.time(),
+            }
+        ).encode()
+        size = len(header) + 1 + len(body)
+        if size > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header + b"\n")
+                f.write(body)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            self._remember(key, size)
+            evicted = self._evict()
+        for old in evicted:
+            self._path(old).unlink(missing_ok=True)
+
+    def delete(self, key):
+        with self._lock:
+            self._forget(key)
+        self._path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            keys, self._sizes = list(self._sizes), OrderedDict()
+            self._total = 0
+        for key in keys:
+            self._path(key).unlink(missing_ok=True)
+
+    def _remember(self, key, size):
+        self._total += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        self._sizes.move_to_end(key)
+
+    def _forget(self, key):
+        self._total -= self._sizes.pop(key, 0)
+
+    def _evict(self):
+        evicted = []
+        while self._total > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            evicted.append(key)
+        return evicted
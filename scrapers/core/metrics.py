@@ -0,0 +1,126 @@
+"""Prometheus metrics shared by every process of the scraper.
+
+The metrics are defined once, here, in ``prometheus_client``'s default
+registry, so runners, workers and the Django app all record into and expose
+the same ones. Each increment or observation is a few arithmetic operations
+on the process's own values; nothing is sent anywhere until ``/metrics`` is
+scraped.
+
+Workers, the runs they execute in processes of their own and the app's
+server processes are aggregated through ``prometheus_client``'s
+multiprocess mode: when ``PROMETHEUS_MULTIPROC_DIR`` names a directory in
+the environment of every process (before it starts), each one keeps its
+values in memory-mapped files there, and serving ``/metrics`` merges the
+files of all of them. The directory should be emptied when the deployment
+starts. Without it, ``/metrics`` shows the values of the process serving it.
+
+Metrics recorded here:
+
+``scraper_pages_total``, ``scraper_requests_total`` and friends
+    what runs fetched (see :class:`RunMetrics`); pages per second is
+    ``rate(scraper_pages_total[1m])``;
+``scraper_run_phase_seconds{phase}``
+    the durations of the phases of runs described in
+    :mod:`scrapers.core.telemetry`; ``phase="fetch"`` is fetch latency;
+``scraper_db_write_seconds{table}``
+    the time taken by the runner's batched database writes;
+``scraper_browser_contexts{state}``, ``scraper_browsers``
+    checked out (``in_use``) and available (``capacity``) contexts of the
+    browser pools (:class:`~scrapers.browser.pool.BrowserPool`) and their
+    running browsers; utilisation is ``in_use`` over ``capacity``.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client import multiprocess as _multiprocess
+
+from scrapers.core.telemetry import BUCKETS
+
+PHASE_SECONDS = Histogram(
+    "scraper_run_phase_seconds",
+    "Time spent in each phase of runs.",
+    ["phase"],
+    buckets=BUCKETS,
+)
+DB_WRITE_SECONDS = Histogram(
+    "scraper_db_write_seconds",
+    "Time taken by the runner's batched database writes.",
+    ["table"],
+    buckets=BUCKETS,
+)
+BROWSER_CONTEXTS = Gauge(
+    "scraper_browser_contexts",
+    "Browser contexts of the browser pools, checked out or available.",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+BROWSERS = Gauge(
+    "scraper_browsers",
+    "Browsers running in the browser pools.",
+    multiprocess_mode="livesum",
+)
+
+# RunTelemetry counter names and the metrics they are added to.
+COUNTERS = {
+    "pages": Counter("scraper_pages", "Pages fetched by runs."),
+    "requests": Counter("scraper_requests", "HTTP requests sent by runs."),
+    "retries": Counter("scraper_retries", "Requests retried by runs."),
+    "failures": Counter("scraper_page_failures", "Pages runs failed to fetch."),
+    "not_modified": Counter(
+        "scraper_pages_not_modified", "Pages the server reported unchanged."
+    ),
+    "bytes": Counter("scraper_fetched_bytes", "Bytes of page bodies fetched."),
+}
+
+
+class RunMetrics:
+    """A :class:`~scrapers.core.telemetry.RunTelemetry` sink recording into
+    the process's metrics."""
+
+    def __init__(self):
+        self._phases = {}
+
+    def observe(self, phase, seconds):
+        histogram = self._phases.get(phase)
+        if histogram is None:
+            histogram = self._phases[phase] = PHASE_SECONDS.labels(phase)
+        histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        counter = COUNTERS.get(name)
+        if counter is not None:
+            counter.inc(n)
+
+
+@lru_cache(maxsize=None)
+def run_metrics():
+    """The process's :class:`RunMetrics`, shared by the runs it executes."""
+    return RunMetrics()
+
+
+@contextmanager
+def db_write(table):
+    """Time the body of the ``with`` block as a write to ``table``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_WRITE_SECONDS.labels(table).observe(time.perf_counter() - start)
+
+
+def multiprocess_dir():
+    """The directory processes share their metrics in, or ``None``."""
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def process_exited(pid=None):
+    """Drop the live gauges of a process (default: this one) that is exiting.
+
+    Its counters and histograms stay in the totals.
+    """
+    if multiprocess_dir() is not None:
+        _multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,335 @@
+"""Per-domain rate limiting shared by every run that fetches from a domain.
+
+Jobs in a project often hit the same site at the same time. Limiting each
+:class:`~scrapers.core.fetch.Fetcher` on its own would let them add up to
+far more than the site tolerates, so a :class:`PolitenessScheduler` keeps
+one token bucket per domain in a *backend* that all fetchers share: a
+:class:`MemoryBackend` for the runs of one process, or a
+:class:`SQLiteBackend` file for every worker process on a host. Anything
+that can atomically read-modify-write one record per domain (a database row
+locked with ``SELECT ... FOR UPDATE``, a Redis script) can implement the same
+two-method interface.
+
+A request takes a token before it is sent. Tokens are *reserved*: a caller
+that finds the bucket empty takes a token from the future and sleeps until
+it is due, so concurrent callers queue in order instead of polling. Slots
+are only reserved up to ``horizon`` seconds ahead, so that the queue follows
+changes of the rate; callers further back sleep until a slot comes within
+reach, with jitter so that they do not all come back at once.
+
+The rate adapts to the server (additive increase, multiplicative decrease).
+A ``429`` or ``503`` halves the domain's rate and blocks the domain, for
+the ``Retry-After`` the server asked for or else for an exponentially
+growing, jittered backoff. Responses to requests that were already in flight
+when the block began do not cut the rate again, so one overload costs one
+halving. Other answers let the rate recover linearly, by ``increase`` times
+the ceiling per second, back up to the ceiling itself.
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 4
+DEFAULT_MIN_RATE = 0.05
+# Fraction of the ceiling the rate recovers per second of successful requests.
+DEFAULT_INCREASE = 0.05
+DEFAULT_DECREASE = 0.5
+DEFAULT_BASE_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 300.0
+# How far ahead a caller may reserve a slot, in seconds.
+DEFAULT_HORIZON = 1.0
+
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+@dataclass
+class DomainState:
+    """The shared state of one domain's bucket."""
+
+    tokens: float
+    updated: float
+    rate: float
+    blocked_until: float = 0.0
+    strikes: int = 0
+    # Bumped by every throttle; slots reserved in an earlier epoch are void.
+    epoch: int = 0
+
+
+class MemoryBackend:
+    """Domain states shared by every fetcher in this process."""
+
+    blocking = False
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, domain, change):
+        """Atomically replace ``domain``'s state with ``change(state)[0]``.
+
+        ``state`` is ``None`` for a domain not seen before. Returns
+        ``change(state)[1]``.
+        """
+        with self._lock:
+            state, result = change(self._states.get(domain))
+            self._states[domain] = state
+            return result
+
+    def get(self, domain):
+        with self._lock:
+            return self._states.get(domain)
+
+
+class SQLiteBackend:
+    """Domain states in a SQLite file shared by several processes.
+
+    Each update runs in a ``BEGIN IMMEDIATE`` transaction, which holds the
+    database's write lock, so concurrent updates from any process are
+    serialized.
+    """
+
+    blocking = True
+
+    def __init__(self, path, timeout=30.0):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS domain_state"
+            " (domain TEXT PRIMARY KEY, state TEXT NOT NULL)"
+        )
+
+    def _connection(self):
+        # sqlite3 connections may not be shared between threads.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            self._local.connection = connection
+        return connection
+
+    def _read(self, connection, domain):
+        row = connection.execute(
+            "SELECT state FROM domain_state WHERE domain = ?", (domain,)
+        ).fetchone()
+        return DomainState(**json.loads(row[0])) if row else None
+
+    def update(self, domain, change):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            state, result = change(self._read(connection, domain))
+            connection.execute(
+                "INSERT INTO domain_state (domain, state) VALUES (?, ?)"
+                " ON CONFLICT(domain) DO UPDATE SET state = excluded.state",
+                (domain, json.dumps(asdict(state))),
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def get(self, domain):
+        return self._read(self._connection(), domain)
+
+
+def domain_of(url):
+    return (urlsplit(url).hostname or "").lower()
+
+
+def retry_after(headers, now):
+    """Seconds the ``Retry-After`` header asks to wait, or ``None``."""
+    value = next(
+        (value for name, value in headers.items() if name.lower() == "retry-after"),
+        None,
+    )
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class PolitenessStats:
+    """Counters describing how one scheduler delayed requests."""
+
+    requests: int = 0
+    delayed: int = 0
+    seconds_waited: float = 0.0
+    throttled: int = 0
+
+
+class PolitenessScheduler:
+    """Hands out per-domain request slots from a shared backend.
+
+    ``rate`` is the ceiling in requests per second for every domain, unless
+    ``rates`` gives one for the domain; ``burst`` requests may be sent at
+    once after a quiet period. Use it around every request::
+
+        await scheduler.acquire(url)
+        response = ...
+        await scheduler.record(url, response.status, response.headers)
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        rates=None,
+        min_rate=DEFAULT_MIN_RATE,
+        increase=DEFAULT_INCREASE,
+        decrease=DEFAULT_DECREASE,
+        base_backoff=DEFAULT_BASE_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        horizon=DEFAULT_HORIZON,
+        clock=time.time,
+        sleep=asyncio.sleep,
+    ):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate and burst must be positive")
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.rate = rate
+        self.burst = burst
+        self.rates = dict(rates or {})
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.horizon = horizon
+        self.stats = PolitenessStats()
+        # Wall-clock time, so that processes sharing a backend agree on it.
+        self._clock = clock
+        self._sleep = sleep
+
+    def ceiling(self, domain):
+        return self.rates.get(domain, self.rate)
+
+    def _new_state(self, domain, now):
+        return DomainState(tokens=self.burst, updated=now, rate=self.ceiling(domain))
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _update(self, domain, change):
+        return await self._call(self.backend.update, domain, change)
+
+    def _reserve(self, domain, now):
+        def change(state):
+            state = state or self._new_state(domain, now)
+            # While the domain is blocked ``updated`` is in the future and
+            # the bucket does not refill.
+            elapsed = max(0.0, now - state.updated)
+            state.tokens = min(self.burst, state.tokens + elapsed * state.rate)
+            state.updated = max(now, state.updated)
+            wait = state.updated - now + max(0.0, 1 - state.tokens) / state.rate
+            # The next slot can always be reserved, however slow the rate.
+            if wait > max(self.horizon, 1 / state.rate):
+                return state, (wait, None)
+            state.tokens -= 1
+            return state, (wait, state.epoch)
+
+        return change
+
+    async def acquire(self, url):
+        """Wait until a request to ``url``'s domain may be sent."""
+        domain = domain_of(url)
+        self.stats.requests += 1
+        delayed = False
+        while True:
+            now = self._clock()
+            wait, epoch = await self._update(domain, self._reserve(domain, now))
+            if wait <= 0:
+                return
+            if not delayed:
+                self.stats.delayed += 1
+                delayed = True
+            if epoch is None:
+                # Too far back in the queue to hold a slot at today's rate;
+                # come back, spread out, when one is within reach.
+                wait -= random.uniform(0.0, self.horizon)
+            self.stats.seconds_waited += wait
+            await self._sleep(wait)
+            # A throttle while we slept voids the slot: take a new one.
+            if epoch is not None:
+                state = await self._call(self.backend.get, domain)
+                if state.epoch == epoch:
+                    return
+
+    def _backoff(self, strikes):
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (strikes - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _throttle(self, domain, now, delay):
+        def change(state):
+            state = state or self._new_state(domain, now)
+            if now >= state.blocked_until or not state.strikes:
+                state.strikes += 1
+                state.rate = max(self.min_rate, state.rate * self.decrease)
+            pause = self._backoff(state.strikes) if delay is None else delay
+            pause = min(self.max_backoff, pause)
+            if now + pause > state.blocked_until:
+                # Void the slots handed out so far and empty the bucket; it
+                # starts refilling when the block ends.
+                state.blocked_until = now + pause
+                state.epoch += 1
+                state.tokens = 0.0
+                state.updated = max(state.updated, state.blocked_until)
+            return state, pause
+
+        return change
+
+    def _recover(self, domain, now):
+        def change(state):
+            state = state or self._new_state(domain, now)
+            if now < state.blocked_until:
+                # Sent before the block; it says nothing about the new rate.
+                return state, None
+            ceiling = self.ceiling(domain)
+            state.strikes = 0
+            # Each success adds a share, so the recovery per second does not
+            # depend on how many requests a second are being sent.
+            step = self.increase * ceiling / state.rate
+            state.rate = min(ceiling, state.rate + step)
+            return state, None
+
+        return change
+
+    async def record(self, url, status, headers=None):
+        """Adapt ``url``'s domain to the status of a response from it.
+
+        Returns the seconds the domain is now blocked for after a throttling
+        response, otherwise ``None``.
+        """
+        domain = domain_of(url)
+        now = self._clock()
+        if status in THROTTLE_STATUSES:
+            self.stats.throttled += 1
+            delay = retry_after(headers or {}, now)
+            return await self._update(domain, self._throttle(domain, now, delay))
+        if 0 < status < 500:
+            await self._update(domain, self._recover(domain, now))
+        return None
+
+    def state(self, domain) -> Optional[DomainState]:
+        """The current shared state of ``domain``, for inspection."""
+        return self.backend.get(domain)
@@ -0,0 +1,298 @@
+"""Profiling runs and drawing their profiles as flamegraphs.
+
+Two profilers, both producing *folded stacks*: one line per distinct stack,
+its frames from the outermost in, separated by ``;`` and followed by a
+weight. That is the input of ``flamegraph.pl`` and speedscope, and of
+:func:`flamegraph_svg`.
+
+:class:`SamplingProfiler`
+    a thread that records the stack of every other thread of the process
+    every ``interval`` seconds. It costs the profiled code little however
+    much it calls and suits runs of any length; the weights are samples,
+    each standing for ``interval`` seconds of wall-clock time, so threads
+    waiting on I/O show up as well.
+:class:`CallProfiler`
+    :mod:`cProfile`, recording every call of the thread that starts it.
+    Exact but costly per call, so meant for short runs; the stacks are
+    estimated from its caller graph and weighted in microseconds.
+"""
+
+import cProfile
+import html
+import marshal
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+DEFAULT_INTERVAL = 0.01
+
+FRAME_HEIGHT = 16
+SVG_WIDTH = 1200
+# Frames narrower than this many pixels are left out, with their callees.
+MIN_FRAME_WIDTH = 0.3
+# Call paths carrying less than this share of the total are dropped when
+# turning cProfile's caller graph into stacks.
+MIN_CALL_SHARE = 1e-4
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename):
+    """``filename`` relative to the ``sys.path`` entry it is under, if any."""
+    best = ""
+    for entry in sys.path:
+        entry = os.path.join(os.path.abspath(entry or "."), "")
+        if filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    return filename[len(best) :]
+
+
+def frame_label(filename, line, name):
+    """How a function is named in folded stacks."""
+    label = f"{name} ({_short_path(filename)}:{line})"
+    return label.replace(";", ",")
+
+
+def _code_label(code):
+    return frame_label(code.co_filename, code.co_firstlineno, code.co_qualname)
+
+
+def _lines(stacks):
+    return "".join(
+        f"{';'.join(stack)} {weight}\n"
+        for stack, weight in sorted(stacks.items())
+        if weight > 0
+    )
+
+
+class SamplingProfiler:
+    """Samples the stacks of the process's threads from a thread of its own."""
+
+    mode = "sample"
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.duration = 0.0
+        self._stacks = Counter()
+        self._names = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self._start
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self._stacks[self._thread_name(ident), tuple(codes)] += 1
+            self.samples += 1
+
+    def _thread_name(self, ident):
+        if ident not in self._names:
+            self._names.update((t.ident, t.name) for t in threading.enumerate())
+        return self._names.get(ident, str(ident))
+
+    def folded(self):
+        """The samples taken so far as folded stacks, one line each."""
+        stacks = Counter()
+        for (thread, codes), count in self._stacks.items():
+            labels = tuple(map(_code_label, reversed(codes)))
+            stacks[(f"thread {thread}",) + labels] += count
+        return _lines(stacks)
+
+
+class CallProfiler:
+    """Profiles the thread that starts it with :mod:`cProfile`."""
+
+    mode = "cprofile"
+
+    def __init__(self):
+        self.duration = 0.0
+        self._profile = cProfile.Profile()
+        self._start = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._profile.enable()
+
+    def stop(self):
+        if self._start is None:
+            return
+        self._profile.disable()
+        self.duration = time.perf_counter() - self._start
+        self._start = None
+
+    @property
+    def stats(self):
+        """The raw statistics, as :mod:`pstats` reads them."""
+        self._profile.create_stats()
+        return self._profile.stats
+
+    def pstats(self):
+        """The statistics in the file format of :meth:`pstats.Stats.dump_stats`."""
+        return marshal.dumps(self.stats)
+
+    def folded(self):
+        """Estimated stacks in microseconds, as folded stacks.
+
+        cProfile only records which function called which, and for how long
+        in total. Each function's time is shared out among the paths leading
+        to it in proportion to the time its callers spent calling it.
+        """
+        return _lines(stats_stacks(self.stats))
+
+
+def stats_stacks(stats):
+    """Estimate folded stacks, weighted in microseconds, from cProfile stats."""
+    callees = defaultdict(dict)
+    for function, (*_, callers) in stats.items():
+        for caller, (*_, cumulative) in callers.items():
+            callees[caller][function] = cumulative
+    total = sum(entry[3] for entry in stats.values() if not entry[4])
+    floor = total * MIN_CALL_SHARE
+    stacks = Counter()
+    pending = [
+        ((function,), entry[3]) for function, entry in stats.items() if not entry[4]
+    ]
+    while pending:
+        path, share = pending.pop()
+        _, _, own, cumulative, _ = stats[path[-1]]
+        if cumulative <= 0 or share < floor:
+            continue
+        scale = share / cumulative
+        stacks[tuple(frame_label(*function) for function in path)] += round(
+            own * scale * 1e6
+        )
+        for callee, time_in_callee in callees[path[-1]].items():
+            if callee not in path:
+                pending.append((path + (callee,), time_in_callee * scale))
+    return stacks
+
+
+MODES = (SamplingProfiler.mode, CallProfiler.mode)
+
+
+def profiler_for(mode, interval=DEFAULT_INTERVAL):
+    """A new profiler of the given ``mode``, one of :data:`MODES`."""
+    if mode == SamplingProfiler.mode:
+        return SamplingProfiler(interval)
+    if mode == CallProfiler.mode:
+        return CallProfiler()
+    raise ValueError(f"Unknown profiling mode: {mode!r}")
+
+
+def _tree(folded):
+    root = {"value": 0, "children": {}}
+    for line in folded.splitlines():
+        stack, _, weight = line.rpartition(" ")
+        if not stack or not weight.isdigit():
+            continue
+        root["value"] += int(weight)
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"value": 0, "children": {}})
+            node["value"] += int(weight)
+    return root
+
+
+def _color(name):
+    # Warm colours as flamegraph.pl draws them, stable for each function.
+    digest = zlib.crc32(name.encode())
+    red = 205 + digest % 50
+    green = (digest >> 8) % 230
+    blue = (digest >> 16) % 55
+    return f"rgb({red},{green},{blue})"
+
+
+def _frames(root, scale):
+    """Yield ``(name, value, x, depth)`` for the frames wide enough to draw."""
+    pending = list(_children(root, 0.0, 0, scale))
+    while pending:
+        name, node, x, depth = pending.pop()
+        if node["value"] * scale < MIN_FRAME_WIDTH:
+            continue
+        yield name, node["value"], x, depth
+        pending.extend(_children(node, x, depth + 1, scale))
+
+
+def _children(node, x, depth, scale):
+    """Yield ``(name, child, x, depth)`` for ``node``'s children, side by side."""
+    for name, child in node["children"].items():
+        yield name, child, x, depth
+        x += child["value"] * scale
+
+
+def flamegraph_svg(folded, title="Flame graph", unit="samples"):
+    """Draw folded stacks as a standalone SVG flamegraph.
+
+    Callers are drawn below their callees, each frame as wide as its share
+    of the total; hovering a frame shows its name and weight.
+    """
+    root = _tree(folded)
+    total = root["value"] or 1
+    scale = SVG_WIDTH / total
+    frames = list(_frames(root, scale))
+    depth = max((frame[3] for frame in frames), default=0) + 1
+    height = depth * FRAME_HEIGHT + 2 * FRAME_HEIGHT
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}"'
+        f' height="{height}" font-family="Verdana, sans-serif" font-size="11">',
+        f'<text x="{SVG_WIDTH / 2}" y="{FRAME_HEIGHT - 3}" text-anchor="middle"'
+        f' font-size="13">{html.escape(title)}</text>',
+    ]
+    for name, value, x, level in frames:
+        width = value * scale
+        y = height - (level + 1) * FRAME_HEIGHT
+        text = name if width > 7 * len(name) else name[: int(width / 7) - 2] + ".."
+        parts.append(
+            f"<g><title>{html.escape(name)} ({value} {unit},"
+            f" {100 * value / total:.2f}%)</title>"
+            f'<rect x="{x:.2f}" y="{y}" width="{width:.2f}"'
+            f' height="{FRAME_HEIGHT - 1}" fill="{_color(name)}" rx="2"/>'
+        )
+        if width > 21:
+            parts.append(
+                f'<text x="{x + 3:.2f}" y="{y + FRAME_HEIGHT - 4}">'
+                f"{html.escape(text)}</text>"
+            )
+        parts.append("</g>")
+    parts.append("</svg>\n")
+    return "\n".join(parts)
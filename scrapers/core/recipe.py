@@ -0,0 +1,551 @@
+"""Recipe parsing, validation and compilation.
+
+A recipe is the YAML document stored in ``Job.raw_yaml``. Turning it into
+something executable means parsing the YAML, validating its structure and
+translating every CSS selector into XPath. None of that changes between runs
+of the same recipe, so the result is a :class:`RecipePlan` that is cached by
+the content hash of the source and can be serialised with
+:meth:`RecipePlan.to_dict` for persistence.
+
+Recognised keys::
+
+    name: Product Listings Scraper
+    url: https://example-store.com/products     # or urls: [...]
+    items: .product                             # optional repeated block
+    selectors:                                  # or selector: .content
+      name: .product-title                      # CSS
+      link: {css: a.product, attr: href}        # attribute value
+      sku: {xpath: ".//span[@itemprop='sku']"}  # XPath
+      tags: {css: .tag, all: true}              # every match, as a list
+    follow:                                     # optional: crawl links
+      links: a.next-page                        # selector of the links
+      max_depth: 3                              # hops from the recipe's URLs
+
+With ``items`` every selector is evaluated relative to each item block
+(XPath selectors should then start with ``.``) and yields one row per block;
+without it the whole page yields a single row.
+
+With ``follow`` the ``href`` of every element the ``links`` selector matches
+(or its ``attr``) is crawled too, up to ``max_depth`` links away from the
+recipe's URLs and only on their hosts; ``follow: a.next`` is short for
+``links: a.next`` with ``max_depth: 1``.
+
+A ``url`` containing ``{page}`` together with ``pages`` stands for a list of
+URLs, one per page number: ``pages: 20`` is pages 1 to 20, ``pages: [5, 9]``
+pages 5 to 9 and ``pages: {start: 0, stop: 90, step: 30}`` pages 0, 30, 60
+and 90. ``concurrency`` caps the pages of the recipe fetched at once.
+
+A multi-step recipe lists ``steps`` instead, each a recipe of its own with a
+unique ``name`` (``follow`` is not supported in steps)::
+
+    concurrency: 8
+    steps:
+      - name: shoes
+        url: https://example-store.com/shoes?page={page}
+        pages: 10
+        items: .product
+        selectors: {name: .title, link: {css: a, attr: href}}
+      - name: bags
+        urls: [https://example-store.com/bags]
+        selector: h1
+      - name: details                           # the pages shoes linked to
+        urls: {from: shoes.link}
+        selectors: {price: .price}
+      - name: summary
+        after: [bags, details]                  # only once both are done
+        url: https://example-store.com/stats
+        selector: .total
+
+A step runs once every step it depends on, through ``after`` or ``from``,
+is done; steps that do not depend on each other run at the same time.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import cssselect
+import yaml
+from cssselect import HTMLTranslator, SelectorError
+from cssselect.parser import Attrib, Class, Element, Hash
+from lxml import etree
+
+# Bump whenever the plan format or the compiler's output changes, so plans
+# persisted by an older version are recompiled instead of reused.
+PLAN_VERSION = 4
+
+DEFAULT_FIELD = "content"
+DEFAULT_MAX_DEPTH = 1
+PAGE_FIELD = "{page}"
+# Most URLs a page range may generate.
+MAX_PAGES = 100_000
+
+_translator = HTMLTranslator()
+
+
+class RecipeError(ValueError):
+    """Raised when a recipe cannot be parsed, validated or compiled."""
+
+
+def recipe_hash(source):
+    """Return the content hash identifying a recipe source.
+
+    ``source`` is the raw YAML text or, for jobs that only have
+    ``parsed_yaml``, the already parsed mapping.
+    """
+    if isinstance(source, str):
+        data = source.encode("utf-8")
+    else:
+        data = json.dumps(source, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass(frozen=True)
+class CompiledField:
+    """A named selector, translated to XPath and compiled by libxml2.
+
+    Selectors made of a single compound CSS selector (tag, ``#id``,
+    ``.class`` and ``[attr]``/``[attr=value]`` only) also carry ``match``,
+    the selector described as plain data. The extractor uses it to find all
+    such fields in one pass over the tree.
+    """
+
+    name: str
+    xpath: str
+    attr: Optional[str] = None
+    all: bool = False
+    match: Optional[dict] = field(default=None, compare=False)
+    compiled: etree.XPath = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        try:
+            compiled = etree.XPath(self.xpath)
+        except etree.XPathSyntaxError as exc:
+            raise RecipeError(f"Invalid XPath for {self.name!r}: {exc}") from exc
+        object.__setattr__(self, "compiled", compiled)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "xpath": self.xpath,
+            "attr": self.attr,
+            "all": self.all,
+            "match": self.match,
+        }
+
+
+@dataclass(frozen=True)
+class RecipePlan:
+    """The executable form of a recipe."""
+
+    content_hash: str
+    name: str
+    urls: tuple
+    fields: tuple
+    config: dict = field(compare=False)
+    items: Optional[CompiledField] = None
+    follow: Optional[CompiledField] = None
+    max_depth: int = 0
+    steps: tuple = ()
+    concurrency: Optional[int] = None
+
+    @property
+    def field_names(self):
+        return tuple(f.name for f in self.fields)
+
+    def to_dict(self):
+        return {
+            "version": PLAN_VERSION,
+            "content_hash": self.content_hash,
+            "name": self.name,
+            "urls": list(self.urls),
+            "fields": [f.to_dict() for f in self.fields],
+            "items": self.items.to_dict() if self.items else None,
+            "follow": self.follow.to_dict() if self.follow else None,
+            "max_depth": self.max_depth,
+            "steps": [step.to_dict() for step in self.steps],
+            "concurrency": self.concurrency,
+            "config": self.config,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a plan persisted with :meth:`to_dict`.
+
+        Only the XPath objects are compiled again; YAML parsing and CSS
+        translation are skipped entirely.
+        """
+        if data.get("version") != PLAN_VERSION:
+            raise RecipeError("Persisted plan was built by another compiler")
+        return cls(
+            content_hash=data["content_hash"],
+            name=data["name"],
+            urls=tuple(data["urls"]),
+            fields=tuple(CompiledField(**f) for f in data["fields"]),
+            items=CompiledField(**data["items"]) if data["items"] else None,
+            follow=CompiledField(**data["follow"]) if data["follow"] else None,
+            max_depth=data["max_depth"],
+            steps=tuple(StepPlan.from_dict(step) for step in data["steps"]),
+            concurrency=data["concurrency"],
+            config=data["config"],
+        )
+
+
+@dataclass(frozen=True)
+class StepPlan:
+    """One step of a multi-step recipe.
+
+    ``plan`` is the step's own recipe; its ``urls`` are empty when they come
+    from the ``source`` step's field, a ``(step, field)`` pair. ``after``
+    names every step that has to be done first, the source included.
+    """
+
+    name: str
+    plan: RecipePlan
+    after: tuple = ()
+    source: Optional[tuple] = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "plan": self.plan.to_dict(),
+            "after": list(self.after),
+            "source": list(self.source) if self.source else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            name=data["name"],
+            plan=RecipePlan.from_dict(data["plan"]),
+            after=tuple(data["after"]),
+            source=tuple(data["source"]) if data["source"] else None,
+        )
+
+
+def parse_recipe(source):
+    """Parse recipe YAML (or accept an already parsed mapping)."""
+    if isinstance(source, str):
+        try:
+            data = yaml.safe_load(source)
+        except yaml.YAMLError as exc:
+            raise RecipeError(f"Invalid YAML: {exc}") from exc
+    else:
+        data = source
+    if not isinstance(data, dict):
+        raise RecipeError("Recipe must be a mapping")
+    return data
+
+
+def _page_numbers(pages):
+    if isinstance(pages, dict):
+        bounds = (pages.get("start", 1), pages.get("stop"), pages.get("step", 1))
+    elif isinstance(pages, list) and len(pages) == 2:
+        bounds = (*pages, 1)
+    else:
+        bounds = (1, pages, 1)
+    if not all(isinstance(n, int) and not isinstance(n, bool) for n in bounds):
+        raise RecipeError(
+            "'pages' must be a count, a [first, last] pair or a start/stop/step mapping"
+        )
+    start, stop, step = bounds
+    numbers = range(start, stop + 1, step) if step > 0 else range(0)
+    if not 0 < len(numbers) <= MAX_PAGES:
+        raise RecipeError(f"'pages' must give between 1 and {MAX_PAGES} pages")
+    return numbers
+
+
+def _normalize_urls(data):
+    if "url" in data and "urls" in data:
+        raise RecipeError("Use either 'url' or 'urls', not both")
+    if "pages" in data:
+        url = data.get("url")
+        if not isinstance(url, str) or PAGE_FIELD not in url:
+            raise RecipeError(f"'pages' needs a 'url' containing {PAGE_FIELD}")
+        urls = [url.replace(PAGE_FIELD, str(n)) for n in _page_numbers(data["pages"])]
+    else:
+        urls = data.get("urls", [data["url"]] if "url" in data else [])
+    if not isinstance(urls, list) or not urls:
+        raise RecipeError("Recipe needs a 'url' or a non-empty 'urls' list")
+    for url in urls:
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            raise RecipeError(f"Invalid URL: {url!r}")
+    return urls
+
+
+def _normalize_selectors(data):
+    if "selector" in data:
+        selectors = {DEFAULT_FIELD: data["selector"]}
+    else:
+        selectors = data.get("selectors")
+    # The list form ("- price: .price") is accepted as an ordered mapping.
+    if isinstance(selectors, list):
+        merged = {}
+        for entry in selectors:
+            if not isinstance(entry, dict) or len(entry) != 1:
+                raise RecipeError("Each selectors entry must be a single mapping")
+            merged.update(entry)
+        selectors = merged
+    if not isinstance(selectors, dict) or not selectors:
+        raise RecipeError("Recipe needs a 'selector' or a 'selectors' mapping")
+    return selectors
+
+
+def _simple_match(css):
+    """Describe ``css`` as plain data if it is a single compound selector."""
+    selectors = cssselect.parse(css)
+    if len(selectors) != 1 or selectors[0].pseudo_element is not None:
+        return None
+    node = selectors[0].parsed_tree
+    match = {"tag": None, "id": None, "classes": [], "attrs": []}
+    while not isinstance(node, Element):
+        if isinstance(node, Class):
+            match["classes"].append(node.class_name)
+        elif isinstance(node, Hash) and match["id"] is None:
+            match["id"] = node.id
+        elif (
+            isinstance(node, Attrib)
+            and node.namespace is None
+            and node.operator in ("exists", "=")
+        ):
+            value = node.value.value if node.value is not None else None
+            match["attrs"].append([node.attrib.lower(), value])
+        else:
+            return None
+        node = node.selector
+    if node.namespace is not None:
+        return None
+    if node.element not in (None, "*"):
+        match["tag"] = node.element.lower()
+    return match
+
+
+def compile_selector(name, spec, relative=False):
+    """Compile one selector spec (CSS string or css/xpath mapping).
+
+    ``relative`` selectors are evaluated against an item block rather than
+    the document, so CSS is translated to search the block's descendants.
+    """
+    if isinstance(spec, str):
+        spec = {"css": spec}
+    if not isinstance(spec, dict) or len({"css", "xpath"} & spec.keys()) != 1:
+        raise RecipeError(f"Selector {name!r} needs exactly one of 'css' or 'xpath'")
+    options = {"attr": spec.get("attr"), "all": bool(spec.get("all", False))}
+    if "xpath" in spec:
+        return CompiledField(name=str(name), xpath=spec["xpath"], **options)
+    css = spec["css"]
+    prefix = "descendant::" if relative else "descendant-or-self::"
+    try:
+        xpath = _translator.css_to_xpath(css, prefix=prefix)
+        match = _simple_match(css)
+    except SelectorError as exc:
+        raise RecipeError(f"Invalid CSS selector for {name!r}: {exc}") from exc
+    return CompiledField(name=str(name), xpath=xpath, match=match, **options)
+
+
+def _compile_follow(data):
+    """Return the ``(links selector, max_depth)`` of the recipe's ``follow``."""
+    follow = data.get("follow")
+    if follow is None:
+        return None, 0
+    if not isinstance(follow, dict):
+        follow = {"links": follow}
+    if "links" not in follow:
+        raise RecipeError("'follow' needs a 'links' selector")
+    max_depth = follow.get("max_depth", DEFAULT_MAX_DEPTH)
+    if not isinstance(max_depth, int) or isinstance(max_depth, bool) or max_depth < 1:
+        raise RecipeError("'follow.max_depth' must be a positive integer")
+    spec = follow["links"]
+    if isinstance(spec, str):
+        spec = {"css": spec}
+    if isinstance(spec, dict):
+        spec = {"attr": "href", **spec, "all": True}
+    return compile_selector("links", spec), max_depth
+
+
+def _compile_concurrency(data):
+    concurrency = data.get("concurrency")
+    if concurrency is None:
+        return None
+    if (
+        not isinstance(concurrency, int)
+        or isinstance(concurrency, bool)
+        or concurrency < 1
+    ):
+        raise RecipeError("'concurrency' must be a positive integer")
+    return concurrency
+
+
+def _compile_plan(data, content_hash, urls):
+    selectors = _normalize_selectors(data)
+    items = data.get("items")
+    relative = items is not None
+    follow, max_depth = _compile_follow(data)
+    return RecipePlan(
+        content_hash=content_hash,
+        name=str(data.get("name", "")),
+        urls=tuple(urls),
+        fields=tuple(compile_selector(n, s, relative) for n, s in selectors.items()),
+        items=compile_selector("items", items) if relative else None,
+        follow=follow,
+        max_depth=max_depth,
+        concurrency=_compile_concurrency(data),
+        config=data,
+    )
+
+
+def _step_names(value, name):
+    names = [value] if isinstance(value, str) else value
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        raise RecipeError(f"Step {name!r}: 'after' must be a step name or a list")
+    return names
+
+
+def _compile_step(data, content_hash):
+    if not isinstance(data, dict):
+        raise RecipeError("Each step must be a mapping")
+    name = data.get("name")
+    if not isinstance(name, str) or not name:
+        raise RecipeError("Each step needs a 'name'")
+    if "follow" in data:
+        raise RecipeError(f"Step {name!r}: 'follow' is not supported in steps")
+    after = _step_names(data.get("after", []), name)
+    source = None
+    urls = data.get("urls")
+    if isinstance(urls, dict):
+        reference = urls.get("from")
+        if not isinstance(reference, str) or reference.count(".") != 1:
+            raise RecipeError(f"Step {name!r}: 'urls.from' must be 'step.field'")
+        source = tuple(reference.split("."))
+        after.append(source[0])
+        urls = []
+    else:
+        try:
+            urls = _normalize_urls(data)
+        except RecipeError as exc:
+            raise RecipeError(f"Step {name!r}: {exc}") from exc
+    plan = _compile_plan(data, f"{content_hash}:{name}", urls)
+    return StepPlan(name, plan, after=tuple(dict.fromkeys(after)), source=source)
+
+
+def _check_references(steps):
+    by_name = {}
+    for step in steps:
+        if step.name in by_name:
+            raise RecipeError(f"Duplicate step name {step.name!r}")
+        by_name[step.name] = step
+    for step in steps:
+        for name in step.after:
+            if name not in by_name or name == step.name:
+                raise RecipeError(
+                    f"Step {step.name!r} depends on unknown step {name!r}"
+                )
+        if step.source:
+            source, field_name = step.source
+            if field_name not in by_name[source].plan.field_names:
+                raise RecipeError(
+                    f"Step {step.name!r} reads URLs from unknown field"
+                    f" {source}.{field_name}"
+                )
+    return by_name
+
+
+def _check_graph(steps):
+    """Check the steps' references and that they form no cycle."""
+    by_name = _check_references(steps)
+    done, visiting = set(), []
+
+    def visit(step):
+        if step.name in done:
+            return
+        if step.name in visiting:
+            cycle = visiting[visiting.index(step.name) :] + [step.name]
+            raise RecipeError(f"Steps form a cycle: {' -> '.join(cycle)}")
+        visiting.append(step.name)
+        for name in step.after:
+            visit(by_name[name])
+        visiting.pop()
+        done.add(step.name)
+
+    for step in steps:
+        visit(step)
+
+
+def _compile_steps(data, content_hash):
+    steps = data["steps"]
+    if not isinstance(steps, list) or not steps:
+        raise RecipeError("'steps' must be a non-empty list")
+    for key in ("url", "urls", "selector", "selectors", "items", "follow"):
+        if key in data:
+            raise RecipeError(f"'{key}' belongs in a step of a recipe with 'steps'")
+    steps = tuple(_compile_step(step, content_hash) for step in steps)
+    _check_graph(steps)
+    urls = {url: None for step in steps for url in step.plan.urls}
+    return RecipePlan(
+        content_hash=content_hash,
+        name=str(data.get("name", "")),
+        urls=tuple(urls),
+        fields=(),
+        steps=steps,
+        concurrency=_compile_concurrency(data),
+        config=data,
+    )
+
+
+def compile_recipe(source, content_hash=None):
+    """Parse, validate and compile a recipe into a :class:`RecipePlan`."""
+    data = parse_recipe(source)
+    content_hash = content_hash or recipe_hash(source)
+    if "steps" in data:
+        return _compile_steps(data, content_hash)
+    return _compile_plan(data, content_hash, _normalize_urls(data))
+
+
+class RecipeCache:
+    """Thread-safe LRU of compiled plans keyed by recipe content hash."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._plans)
+
+    def get(self, content_hash):
+        with self._lock:
+            plan = self._plans.get(content_hash)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(content_hash)
+            self.hits += 1
+            return plan
+
+    def put(self, plan):
+        with self._lock:
+            self._plans[plan.content_hash] = plan
+            self._plans.move_to_end(plan.content_hash)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+
+    def get_or_compile(self, source):
+        content_hash = recipe_hash(source)
+        plan = self.get(content_hash)
+        if plan is None:
+            plan = compile_recipe(source, content_hash)
+            self.put(plan)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+# Shared by everything running in this process.
+recipe_cache = RecipeCache()
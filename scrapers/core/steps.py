@@ -0,0 +1,133 @@
+"""Scheduling the steps of a multi-step recipe.
+
+The steps of a plan (see :class:`~scrapers.core.recipe.StepPlan`) form a
+dependency graph. A :class:`StepGraph` hands out the URLs to fetch in
+rounds: every round takes pending URLs from all the steps that are ready,
+those whose dependencies are done, in turn, so independent steps are fetched
+together and a small step is not queued behind a large one. A step becomes
+ready as soon as the round that finished its last dependency is complete.
+
+Steps that read their URLs from another step's field get them from the
+values that step extracted, collected with :meth:`StepGraph.collect` and
+resolved against the page they were found on.
+
+:meth:`StepGraph.state` is plain data; a graph built from it continues where
+the one that produced it stopped.
+"""
+
+from itertools import islice
+
+from scrapers.core.frontier import canonicalize
+
+
+def _interleave(pending):
+    """Yield ``(step, url)`` taking one URL of each step in turn."""
+    for index in range(max(len(urls) for _, urls in pending)):
+        for name, urls in pending:
+            if index < len(urls):
+                yield name, urls[index]
+
+
+class StepGraph:
+    """The progress of a run through the steps of ``plan``."""
+
+    def __init__(self, plan, state=None):
+        state = state or {}
+        self.steps = {step.name: step for step in plan.steps}
+        # Fields of each step that other steps read URLs from.
+        self.sources = {}
+        for step in plan.steps:
+            if step.source:
+                self.sources.setdefault(step.source[0], set()).add(step.source[1])
+        self.urls = {
+            name: list(step.plan.urls)
+            for name, step in self.steps.items()
+            if not step.source
+        }
+        self.urls.update(state.get("urls", {}))
+        self.done = dict.fromkeys(self.steps, 0)
+        self.done.update(state.get("done", {}))
+        self.collected = {
+            f"{name}.{field}": {}
+            for name, fields in self.sources.items()
+            for field in fields
+        }
+        for key, values in state.get("collected", {}).items():
+            self.collected[key] = dict.fromkeys(values)
+        self._taken = {}
+
+    def is_done(self, name):
+        urls = self.urls.get(name)
+        return urls is not None and self.done[name] >= len(urls)
+
+    def ready(self):
+        """The steps not done whose dependencies all are."""
+        return [
+            step
+            for step in self.steps.values()
+            if not self.is_done(step.name)
+            and all(self.is_done(name) for name in step.after)
+        ]
+
+    def _resolve(self, step):
+        if step.name not in self.urls:
+            self.urls[step.name] = list(self.collected[".".join(step.source)])
+
+    def next_round(self, size):
+        """Map up to ``size`` URLs to fetch next to the steps that need them.
+
+        Returns an empty mapping once every step is done. Call
+        :meth:`complete` when the round has been processed.
+        """
+        while True:
+            ready = self.ready()
+            if not ready:
+                return {}
+            for step in ready:
+                self._resolve(step)
+            pending = [
+                (step.name, self.urls[step.name][self.done[step.name] :])
+                for step in ready
+            ]
+            pending = [(name, urls) for name, urls in pending if urls]
+            if pending:
+                break
+            # Steps whose source yielded no URLs are done already.
+        batch, self._taken = {}, {}
+        for name, url in islice(_interleave(pending), size):
+            names = batch.setdefault(url, [])
+            if name not in names:
+                names.append(name)
+            self._taken[name] = self._taken.get(name, 0) + 1
+        return batch
+
+    def complete(self):
+        """Mark the URLs of the last round as done."""
+        for name, count in self._taken.items():
+            self.done[name] += count
+        self._taken = {}
+
+    def collect(self, name, url, items):
+        """Keep the URLs other steps read from the ``items`` of step ``name``."""
+        for field in self.sources.get(name, ()):
+            collected = self.collected[f"{name}.{field}"]
+            for item in items:
+                values = item.get(field)
+                if not isinstance(values, list):
+                    values = [values]
+                for value in values:
+                    if isinstance(value, str) and value:
+                        link = canonicalize(value, url)
+                        if link:
+                            collected[link] = None
+
+    def state(self):
+        return {
+            "urls": {
+                name: urls
+                for name, urls in self.urls.items()
+                if self.steps[name].source
+            },
+            "done": dict(self.done),
+            "collected": {key: list(values) for key, values in self.collected.items()},
+        }
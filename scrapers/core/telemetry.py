@@ -0,0 +1,219 @@
+"""Lightweight performance telemetry for a single run.
+
+A :class:`RunTelemetry` collects, while a run executes, a histogram of the
+seconds spent in each phase of it and counters of what it fetched. Phases
+the runner records:
+
+``dns``, ``connect``
+    resolving a host and opening a connection (TLS included), for the
+    requests that needed to;
+``fetch``
+    sending the request that produced a page and reading its body;
+``parse``, ``extract``
+    parsing a page's HTML and evaluating the recipe's selectors on it;
+``store``
+    comparing a page's items with the last run's and handing them to the
+    results writer;
+``checkpoint``
+    flushing buffered results and saving a checkpoint.
+
+Histograms share the fixed, roughly logarithmic :data:`BUCKETS`, so
+recording is a bisect and an increment and summaries of different runs can
+be compared bucket by bucket. :meth:`RunTelemetry.summary` is compact plain
+data meant to be stored with the run; its ``memory`` is the process's
+resident memory when the run started and ended, how far the run raised the
+process's peak, and that peak, which covers the whole life of a process
+that may have executed other runs before. A ``sink`` (such as
+:class:`scrapers.core.metrics.RunMetrics`) is handed every observation and
+count as well, to aggregate them beyond the run.
+"""
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+# Bump whenever the layout of summaries changes.
+SUMMARY_VERSION = 2
+
+# Upper bounds, in seconds, of the histogram buckets; one more bucket holds
+# everything slower.
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def rss():
+    """The memory this process has resident now, in bytes, or ``None``."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_peak_rss():
+    """The most memory this process has had resident so far, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Histogram:
+    """Counts of observed durations per bucket of :data:`BUCKETS`."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """An upper bound of the ``q`` quantile: the bound of its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        counts = list(self.counts)
+        while counts and not counts[-1]:
+            counts.pop()
+        return {
+            "count": self.count,
+            "total": round(self.total, 6),
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "buckets": counts,
+        }
+
+
+class RunTelemetry:
+    """Phase histograms and counters of one run; safe to use from any thread."""
+
+    def __init__(self, sink=None):
+        self.phases = {}
+        self.counters = Counter()
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._rss_start = rss()
+        self._peak_start = process_peak_rss()
+
+    def observe(self, phase, seconds):
+        """Record that ``phase`` took ``seconds`` once."""
+        with self._lock:
+            histogram = self.phases.get(phase)
+            if histogram is None:
+                histogram = self.phases[phase] = Histogram()
+            histogram.observe(seconds)
+        if self.sink is not None:
+            self.sink.observe(phase, seconds)
+
+    def observe_all(self, timings):
+        """Record a mapping of phase names to seconds, if any."""
+        for phase, seconds in (timings or {}).items():
+            self.observe(phase, seconds)
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of the ``with`` block as one ``name`` phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+        if self.sink is not None:
+            self.sink.count(name, n)
+
+    def record_page(self, page):
+        """Record a :class:`~scrapers.core.fetch.FetchResult`."""
+        self.observe("fetch", page.elapsed)
+        self.observe_all(page.timings)
+        counts = {"pages": 1, "requests": 1 + page.retries, "retries": page.retries}
+        if not page.ok:
+            counts["failures"] = 1
+        if page.not_modified:
+            counts["not_modified"] = 1
+        else:
+            counts["bytes"] = len(page.body)
+        with self._lock:
+            self.counters.update(counts)
+        if self.sink is not None:
+            for name, n in counts.items():
+                self.sink.count(name, n)
+
+    def fetched(self, pages):
+        """Yield ``pages`` unchanged, recording each with :meth:`record_page`."""
+        for page in pages:
+            self.record_page(page)
+            yield page
+
+    def _memory(self):
+        peak = process_peak_rss()
+        growth = None
+        if peak is not None and self._peak_start is not None:
+            growth = peak - self._peak_start
+        return {
+            "rss_start": self._rss_start,
+            "rss_end": rss(),
+            "peak_growth": growth,
+            "process_peak": peak,
+        }
+
+    def summary(self):
+        """Compact plain data describing the run so far."""
+        with self._lock:
+            return {
+                "version": SUMMARY_VERSION,
+                "duration": round(time.perf_counter() - self._start, 6),
+                "memory": self._memory(),
+                "counters": dict(sorted(self.counters.items())),
+                "phases": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(self.phases.items())
+                },
+                "buckets": list(BUCKETS),
+            }
@@ -0,0 +1,174 @@
+"""Validating recipe YAML against the recipe JSON schema.
+
+The schema (``recipes/schemas/recipe.schema.json``) describes the structure
+:func:`~scrapers.core.recipe.compile_recipe` accepts; selectors, generated
+page URLs and step references are still checked when a recipe is compiled.
+Checking the schema and resolving its references happens once per process
+(see :func:`recipe_validator`); validating a recipe then only walks it.
+
+Errors point at the line of the recipe they were found on: the YAML is
+composed into nodes first, which keep their position, and each schema error
+is mapped back through its path to the node it is about.
+"""
+
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
+from jsonschema import Draft202012Validator
+
+from scrapers.core.recipe import RecipeError
+
+# libyaml's loader when PyYAML was built with it; its nodes keep lines too.
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+SCHEMA_PATH = (
+    Path(__file__).resolve().parents[2] / "recipes" / "schemas" / "recipe.schema.json"
+)
+
+
+@dataclass(frozen=True)
+class RecipeIssue:
+    """One problem found in a recipe; ``line`` is 1-based, if known."""
+
+    message: str
+    line: int = None
+    path: str = ""
+
+    def __str__(self):
+        where = f"line {self.line}: " if self.line else ""
+        path = f"{self.path}: " if self.path else ""
+        return f"{where}{path}{self.message}"
+
+    def to_dict(self):
+        return {"line": self.line, "path": self.path, "message": self.message}
+
+
+class RecipeValidationError(RecipeError):
+    """Raised with every :class:`RecipeIssue` a recipe failed validation on."""
+
+    def __init__(self, issues):
+        self.issues = list(issues)
+        super().__init__("; ".join(str(issue) for issue in self.issues))
+
+
+@lru_cache(maxsize=None)
+def recipe_validator():
+    """The validator for the recipe schema, checked and built once."""
+    schema = json.loads(SCHEMA_PATH.read_text())
+    Draft202012Validator.check_schema(schema)
+    return Draft202012Validator(schema)
+
+
+def _compose(source):
+    """Return the recipe's data and its node tree."""
+    loader = Loader(source)
+    try:
+        node = loader.get_single_node()
+        data = loader.construct_document(node) if node is not None else None
+    except yaml.MarkedYAMLError as exc:
+        mark = exc.problem_mark or exc.context_mark
+        raise RecipeValidationError(
+            [RecipeIssue(f"Invalid YAML: {exc.problem}", mark and mark.line + 1)]
+        ) from exc
+    except yaml.YAMLError as exc:
+        raise RecipeValidationError([RecipeIssue(f"Invalid YAML: {exc}")]) from exc
+    finally:
+        loader.dispose()
+    return data, node
+
+
+def _node_at(node, path):
+    """The deepest node along ``path`` (keys and indices) below ``node``."""
+    for key in path:
+        if isinstance(node, yaml.MappingNode):
+            child = next(
+                (value for name, value in node.value if name.value == str(key)),
+                None,
+            )
+        elif isinstance(node, yaml.SequenceNode) and key < len(node.value):
+            child = node.value[key]
+        else:
+            child = None
+        if child is None:
+            break
+        node = child
+    return node
+
+
+def _mistyped(error):
+    """Whether ``error`` only says the instance has the wrong type."""
+    if error.context:
+        return all(_mistyped(cause) for cause in error.context)
+    return error.validator == "type" and not error.relative_path
+
+
+def _depth(error):
+    """How far into the instance ``error``, or any of its causes, got."""
+    return max([len(error.absolute_path), *map(_depth, error.context)])
+
+
+def _causes(error):
+    """Yield the errors explaining ``error``.
+
+    An instance matching none of a ``oneOf``/``anyOf`` is explained by the
+    errors of the alternative it came closest to matching: one meant for its
+    type, and of those the one that got deepest into it. If no alternative
+    is meant for its type, ``error`` itself is the explanation.
+    """
+    if not error.context:
+        yield error
+        return
+    branches = {}
+    for cause in error.context:
+        branches.setdefault(cause.relative_schema_path[0], []).append(cause)
+    candidates = {
+        branch: causes
+        for branch, causes in branches.items()
+        if not all(map(_mistyped, causes))
+    }
+    if not candidates:
+        yield error
+        return
+    branch = max(candidates, key=lambda branch: max(map(_depth, candidates[branch])))
+    for cause in candidates[branch]:
+        yield from _causes(cause)
+
+
+def _message(error):
+    if error.validator == "not" and error.validator_value == {}:
+        return f"{error.absolute_path[-1]!r} is not allowed here"
+    return error.message
+
+
+def _issue(error, node):
+    path = list(error.absolute_path)
+    at = _node_at(node, path) if node is not None else None
+    return RecipeIssue(
+        _message(error),
+        at.start_mark.line + 1 if at is not None else None,
+        ".".join(str(key) for key in path),
+    )
+
+
+def validate_recipe(source):
+    """Validate recipe YAML against the schema and return its data.
+
+    Raises :class:`RecipeValidationError` listing every problem found, in
+    the order they appear in the recipe.
+    """
+    data, node = _compose(source)
+    if not isinstance(data, dict):
+        line = node.start_mark.line + 1 if node is not None else None
+        raise RecipeValidationError([RecipeIssue("Recipe must be a mapping", line)])
+    issues = [
+        _issue(cause, node)
+        for error in recipe_validator().iter_errors(data)
+        for cause in _causes(error)
+    ]
+    if issues:
+        issues.sort(key=lambda issue: (issue.line or 0, issue.path))
+        raise RecipeValidationError(issues)
+    return data
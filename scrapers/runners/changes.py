@@ -0,0 +1,206 @@
+"""Change detection between consecutive runs of a job.
+
+Scheduled jobs mostly see the same content as last time. A
+:class:`ChangeTracker` hashes the items extracted from each page and compares
+them with the job's last successful run: a page whose items did not change is
+recorded as an ``unchanged`` :class:`~scraper.models.PageDigest` pointing at
+the run that holds its items, instead of being written to ``Results`` again.
+
+Every digest also records where the page's items start among the items its
+run stored, so :func:`carried_items` can read the items of a run's
+unchanged pages back from the runs that stored them.
+"""
+
+from collections import deque
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Q
+from scraper.models import PageDigest, Results, Run
+
+from scrapers.core.extract import items_hash
+from scrapers.core.metrics import db_write
+from scrapers.runners.results import stored_batches
+
+DIGEST_BATCH_SIZE = 500
+
+
+class CarriedItemsError(Exception):
+    """Raised when the items of an unchanged page can no longer be found."""
+
+
+def last_successful_run(run):
+    """The most recent successful run of the same job, other than ``run``."""
+    return (
+        Run.objects.filter(job_id=run.job_id, status="success")
+        .exclude(pk=run.pk)
+        .order_by("-started_at", "-created_at")
+        .first()
+    )
+
+
+class ChangeTracker:
+    """Records a digest per page and tells which pages need storing.
+
+    The items of every page :meth:`changed` says to store must be written
+    right away, in that order, after the ``first_item`` items the run has
+    already stored (when it resumes a checkpoint).
+    """
+
+    def __init__(self, run, batch_size=DIGEST_BATCH_SIZE, first_item=0):
+        self.run = run
+        self.batch_size = batch_size
+        self.unchanged = 0
+        self.next_item = first_item
+        self._pending = []
+        self._previous = {}
+        previous = last_successful_run(run)
+        if previous is not None:
+            digests = previous.page_digests.values_list(
+                "url",
+                "content_hash",
+                "item_count",
+                "unchanged",
+                "source_run_id",
+                "first_item",
+            )
+            for (
+                url,
+                content_hash,
+                count,
+                unchanged,
+                source,
+                first,
+            ) in digests.iterator():
+                self._previous[url] = (
+                    content_hash,
+                    count,
+                    source if unchanged else previous.pk,
+                    first,
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def not_modified(self, url):
+        """Record a page the server reported as not modified.
+
+        Returns ``False`` when there is no previous digest to carry over, in
+        which case the page has to be extracted after all.
+        """
+        if url not in self._previous:
+            return False
+        self._record_unchanged(url, *self._previous[url])
+        return True
+
+    def changed(self, url, items):
+        """Record a page's items; return whether they need to be stored."""
+        content_hash = items_hash(items)
+        previous = self._previous.get(url)
+        if previous is not None and previous[0] == content_hash:
+            self._record_unchanged(url, *previous)
+            return False
+        self._add(
+            PageDigest(
+                run=self.run,
+                url=url,
+                content_hash=content_hash,
+                item_count=len(items),
+                first_item=self.next_item,
+            )
+        )
+        self.next_item += len(items)
+        return True
+
+    def _record_unchanged(self, url, content_hash, count, source, first):
+        self.unchanged += 1
+        self._add(
+            PageDigest(
+                run=self.run,
+                url=url,
+                content_hash=content_hash,
+                item_count=count,
+                unchanged=True,
+                source_run_id=source,
+                first_item=first,
+            )
+        )
+
+    def _add(self, digest):
+        self._pending.append(digest)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with db_write("page_digests"):
+                PageDigest.objects.bulk_create(self._pending)
+            self._pending = []
+
+
+def lost_pages(run):
+    """The unchanged pages of ``run`` whose items can no longer be found."""
+    return PageDigest.objects.filter(
+        Q(source_run__isnull=True) | Q(first_item__isnull=True),
+        run_id=run.pk,
+        unchanged=True,
+        item_count__gt=0,
+    )
+
+
+def carried_items(run):
+    """Yield the items of the pages ``run`` found unchanged.
+
+    They are read from the runs that stored them, a run at a time, in the
+    order those runs stored them. Raises :class:`CarriedItemsError` when
+    they cannot be: the source run was deleted, or the digest predates
+    item positions.
+    """
+    digests = (
+        PageDigest.objects.filter(run_id=run.pk, unchanged=True, item_count__gt=0)
+        .order_by("source_run_id", "first_item")
+        .values_list("source_run_id", "first_item", "item_count", "url")
+    )
+    for source, pages in groupby(digests.iterator(), key=itemgetter(0)):
+        pages = list(pages)
+        missing = [url for _, first, _, url in pages if source is None or first is None]
+        if missing:
+            raise CarriedItemsError(
+                f"Items of {len(missing)} unchanged pages of run {run.pk} are"
+                f" lost, such as {missing[0]}"
+            )
+        yield from _slices(
+            source, [(first, first + count) for _, first, count, _ in pages]
+        )
+
+
+def _slices(source, spans):
+    """Yield the items of run ``source`` within the sorted ``(start, end)`` spans."""
+    spans = deque(spans)
+    position = 0
+    rows = (
+        Results.objects.filter(run_id=source)
+        .order_by("chunk_index", "created_at")
+        .values("payload", "artifacts", "item_count")
+    )
+    for row in rows.iterator():
+        while spans and spans[0][1] <= position:
+            spans.popleft()
+        if not spans:
+            return
+        if row["item_count"] and position + row["item_count"] <= spans[0][0]:
+            # No span starts in this row: skip it without reading its items.
+            position += row["item_count"]
+            continue
+        for items in stored_batches(row):
+            for item in items:
+                while spans and spans[0][1] <= position:
+                    spans.popleft()
+                if spans and spans[0][0] <= position:
+                    yield item
+                position += 1
+    if any(end > position for _, end in spans):
+        raise CarriedItemsError(f"Run {source} holds only {position} items")
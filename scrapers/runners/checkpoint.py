@@ -0,0 +1,214 @@
+"""Checkpointing a run's progress so that an interrupted run can resume.
+
+A run that dies part way through (a crashed worker, a deploy) should not
+start over. While it executes, a :class:`Checkpointer` periodically saves a
+:class:`Checkpoint` in ``Run.checkpoint``: how far through the recipe's URL
+list it is, how many pages and items are done and where its ``Results``
+chunks and page digests end. Buffered results and digests are flushed in the
+same transaction, so everything up to a checkpoint is stored and nothing
+after it is counted.
+
+Crawls additionally complete their frontier entries in two phases around
+that transaction (see :meth:`~scrapers.core.frontier.Frontier.prepare_done`),
+so the frontier and the checkpoint never disagree about which pages are done.
+
+:func:`resume` picks the checkpoint up again, either on a retry of the same
+run or in the job's next run. Whatever was stored after the checkpoint is
+deleted first; in the second case the failed run's results and digests are
+moved to the new run, which then holds the complete output.
+"""
+
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from scraper.models import PageDigest, Results, Run
+
+from scrapers.core.metrics import db_write
+from scrapers.runners.profiling import PROFILE_KIND
+
+
+@dataclass
+class Checkpoint:
+    """What a run had durably done at its last checkpoint."""
+
+    content_hash: str
+    seq: int = 0
+    # URLs of the recipe's list that are done; crawls use their frontier
+    # and multi-step recipes the state of their StepGraph in ``steps``.
+    position: int = 0
+    pages: int = 0
+    failed: int = 0
+    items: int = 0
+    next_chunk: int = 0
+    last_digest_id: int = 0
+    saved_at: Optional[str] = None
+    steps: Optional[dict] = None
+    # The run whose frontier a crawl uses: the one that started it.
+    frontier: Optional[str] = None
+
+    @classmethod
+    def of(cls, run):
+        return cls(**run.checkpoint) if run.checkpoint else None
+
+
+def resumable_run(run, content_hash):
+    """The run whose checkpoint ``run`` should resume, if any.
+
+    That is ``run`` itself when it is a retry, or else the job's latest
+    finished run if it failed with a checkpoint of the same recipe.
+    """
+    checkpoint = Checkpoint.of(run)
+    if checkpoint is not None:
+        return run if checkpoint.content_hash == content_hash else None
+    previous = (
+        Run.objects.filter(job_id=run.job_id, status__in=("success", "failure"))
+        .exclude(pk=run.pk)
+        .order_by("-created_at")
+        .only("id", "status", "checkpoint")
+        .first()
+    )
+    if previous is None or previous.status != "failure":
+        return None
+    checkpoint = Checkpoint.of(previous)
+    if checkpoint is None or checkpoint.content_hash != content_hash:
+        return None
+    return previous
+
+
+def resume(run, content_hash, log=None):
+    """Return the checkpoint ``run`` starts from, resuming one if possible.
+
+    Without a checkpoint to resume this is an empty one.
+    """
+    source = resumable_run(run, content_hash)
+    if source is None:
+        return Checkpoint(content_hash)
+    checkpoint = Checkpoint.of(source)
+    with transaction.atomic():
+        if source.pk != run.pk:
+            # Whichever run clears the checkpoint first takes it over.
+            taken = Run.objects.filter(pk=source.pk, checkpoint__isnull=False).update(
+                checkpoint=None
+            )
+            if not taken:
+                return Checkpoint(content_hash)
+        # Profiles stay with the run they were taken of.
+        results = Results.objects.filter(run_id=source.pk).exclude(
+            artifacts__kind=PROFILE_KIND
+        )
+        results.filter(chunk_index__gte=checkpoint.next_chunk).delete()
+        PageDigest.objects.filter(
+            run_id=source.pk, id__gt=checkpoint.last_digest_id
+        ).delete()
+        if source.pk != run.pk:
+            results.update(run=run)
+            PageDigest.objects.filter(run_id=source.pk).update(run=run)
+            Run.objects.filter(pk=run.pk).update(checkpoint=asdict(checkpoint))
+    if log is not None:
+        origin = "" if source.pk == run.pk else f" of run {source.pk}"
+        log.write(
+            f"Resuming from checkpoint {checkpoint.seq}{origin}:"
+            f" {checkpoint.pages} pages and {checkpoint.items} items done"
+        )
+    return checkpoint
+
+
+class Checkpointer:
+    """Saves the progress of ``run`` at most every ``interval`` seconds.
+
+    Call :meth:`advance` after each batch of pages has been processed, and
+    :meth:`save` once more at the end.
+    """
+
+    def __init__(
+        self,
+        run,
+        checkpoint,
+        writer,
+        changes,
+        frontier=None,
+        interval=0.0,
+        telemetry=None,
+    ):
+        self.run = run
+        self.checkpoint = checkpoint
+        self.writer = writer
+        self.changes = changes
+        self.frontier = frontier
+        self.interval = interval
+        self.telemetry = telemetry
+        self._items = checkpoint.items
+        self._position = checkpoint.position
+        self._pages = checkpoint.pages
+        self._failed = checkpoint.failed
+        self._entries = []
+        self._steps = checkpoint.steps
+        self._saved = time.monotonic()
+
+    @property
+    def pages(self):
+        """Pages processed so far, checkpointed or not."""
+        return self._pages
+
+    def advance(self, pages, failed, position=0, entries=(), steps=None):
+        """Record a processed batch; checkpoint if the interval has passed.
+
+        ``failed`` is how many of its ``pages`` failed, ``position`` where
+        it ended in the recipe's URL list, ``entries`` the frontier entries
+        it took and ``steps`` the state of the recipe's steps after it.
+        """
+        self._pages += pages
+        self._failed += failed
+        self._position = max(self._position, position)
+        self._entries.extend(entries)
+        if steps is not None:
+            self._steps = steps
+        if time.monotonic() - self._saved >= self.interval:
+            self.save()
+
+    def save(self):
+        """Store everything processed so far and checkpoint it.
+
+        With ``telemetry``, the time this takes is recorded as a
+        ``checkpoint`` phase and the run's metrics so far are saved with it.
+        """
+        start = time.perf_counter()
+        checkpoint = self.checkpoint
+        seq = checkpoint.seq + 1
+        if self.frontier is not None:
+            self.frontier.prepare_done(self._entries, seq)
+        with transaction.atomic():
+            self.writer.flush()
+            self.changes.flush()
+            last_digest_id = PageDigest.objects.filter(run_id=self.run.pk).aggregate(
+                last=Max("id")
+            )["last"]
+            checkpoint.seq = seq
+            checkpoint.position = self._position
+            checkpoint.steps = self._steps
+            checkpoint.pages = self._pages
+            checkpoint.failed = self._failed
+            checkpoint.items = self._items + self.writer.items_written
+            checkpoint.next_chunk = self.writer.next_chunk
+            checkpoint.last_digest_id = last_digest_id or 0
+            checkpoint.saved_at = timezone.now().isoformat()
+            fields = {"checkpoint": asdict(checkpoint)}
+            if self.telemetry is not None:
+                fields["metrics"] = self.telemetry.summary()
+            with db_write("runs"):
+                Run.objects.filter(pk=self.run.pk).update(**fields)
+        if self.frontier is not None:
+            self.frontier.commit_done()
+        self._entries = []
+        self._saved = time.monotonic()
+        if self.telemetry is not None:
+            self.telemetry.observe("checkpoint", time.perf_counter() - start)
+        return checkpoint
+
+    def finish(self):
+        """Forget the checkpoint of a run that got to the end."""
+        Run.objects.filter(pk=self.run.pk).update(checkpoint=None)
@@ -0,0 +1,478 @@
+"""Executing a single run: fetch the recipe's pages, extract, store results.
+
+Fetching happens on an asyncio event loop in a background thread while the
+calling thread parses pages and writes results, since the Django ORM may not
+be used from inside a running event loop. The two sides are connected by a
+bounded queue, so a slow consumer throttles the fetcher instead of piling up
+response bodies in memory.
+
+Pages are fetched in rounds of at most ``CRAWL_BATCH`` URLs: slices of the
+recipe's URL list; for recipes that ``follow`` links, batches popped from
+the crawl's :class:`~scrapers.core.frontier.Frontier`, where the links found
+are queued for later rounds; for multi-step recipes, the pending URLs of
+their ready steps. Between rounds the run's progress is checkpointed (see
+:mod:`scrapers.runners.checkpoint`), so an interrupted run resumes from its
+last checkpoint instead of starting over.
+"""
+
+import asyncio
+import queue
+import shutil
+import threading
+from contextlib import aclosing, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from scraper.models import Job, Run
+from scraper.recipes import get_recipe_plan
+
+from scrapers.core.extract import extractor_for
+from scrapers.core.fetch import Fetcher
+from scrapers.core.frontier import Frontier, canonicalize
+from scrapers.core.http_cache import ResponseCache
+from scrapers.core.metrics import db_write, run_metrics
+from scrapers.core.politeness import (
+    MemoryBackend,
+    PolitenessScheduler,
+    SQLiteBackend,
+    domain_of,
+)
+from scrapers.core.steps import StepGraph
+from scrapers.core.telemetry import RunTelemetry
+from scrapers.runners.changes import ChangeTracker
+from scrapers.runners.checkpoint import Checkpointer, resume
+from scrapers.runners.logs import RunLogWriter
+from scrapers.runners.parse_pool import ParsedPage, ParsePool, extract_timed
+from scrapers.runners.profiling import run_profiler, save_profile
+from scrapers.runners.results import ColumnarResultsWriter, ResultsWriter
+
+# Fetched pages waiting to be extracted.
+PAGE_BUFFER = 32
+# URLs taken from the frontier per crawl round.
+CRAWL_BATCH = 500
+
+_DONE = object()
+
+
+class RunError(Exception):
+    """Raised when a run finished but could not scrape everything."""
+
+
+class BackgroundFetch:
+    """Fetches URLs on an event loop thread, handing pages to a sync consumer.
+
+    By default a thread running a new event loop and ``Fetcher`` is started
+    for each iteration. Given an open ``fetcher`` and the ``loop`` it lives
+    on, the URLs are fetched there instead, reusing its connections.
+    ``limit`` caps the requests in flight below the fetcher's concurrency.
+    """
+
+    def __init__(
+        self,
+        urls,
+        buffer=PAGE_BUFFER,
+        fetcher=None,
+        loop=None,
+        limit=None,
+        **fetcher_options,
+    ):
+        self.urls = urls
+        self.fetcher = fetcher
+        self.loop = loop
+        self.limit = limit
+        self.fetcher_options = fetcher_options
+        self._pages = queue.Queue(maxsize=buffer)
+        self._stop = threading.Event()
+
+    def __iter__(self):
+        if self.loop is None:
+            thread = threading.Thread(target=self._produce, name="fetch", daemon=True)
+            thread.start()
+            wait = thread.join
+        else:
+            future = asyncio.run_coroutine_threadsafe(
+                self._produce_on_loop(), self.loop
+            )
+            wait = future.result
+        try:
+            while True:
+                item = self._pages.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self._stop.set()
+            wait()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    async def _fetch_all(self):
+        loop = asyncio.get_running_loop()
+        if self.fetcher is not None:
+            session = nullcontext(self.fetcher)
+        else:
+            session = Fetcher(**self.fetcher_options)
+        async with session as fetcher:
+            results = fetcher.fetch_many(self.urls, limit=self.limit)
+            # Closed on the way out, so that stopping cancels what is in flight.
+            async with aclosing(results):
+                async for result in results:
+                    if self._stop.is_set():
+                        return
+                    await loop.run_in_executor(None, self._put, result)
+
+    def _produce(self):
+        try:
+            asyncio.run(self._fetch_all())
+        except BaseException as exc:
+            self._put(exc)
+        finally:
+            self._put(_DONE)
+
+    async def _produce_on_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await self._fetch_all()
+        except Exception as exc:
+            await loop.run_in_executor(None, self._put, exc)
+        finally:
+            await loop.run_in_executor(None, self._put, _DONE)
+
+
+def iter_pages(urls, **fetcher_options):
+    """Fetch ``urls`` concurrently, yielding results in the calling thread.
+
+    See :class:`BackgroundFetch` for the options.
+    """
+    return iter(BackgroundFetch(urls, **fetcher_options))
+
+
+@lru_cache(maxsize=None)
+def _response_cache(directory, max_bytes):
+    return ResponseCache(directory, max_bytes=max_bytes)
+
+
+def response_cache():
+    """The process-wide HTTP response cache, or ``None`` if it is disabled."""
+    if not settings.SCRAPER_HTTP_CACHE_DIR:
+        return None
+    return _response_cache(
+        str(settings.SCRAPER_HTTP_CACHE_DIR), settings.SCRAPER_HTTP_CACHE_MAX_BYTES
+    )
+
+
+@lru_cache(maxsize=None)
+def _politeness(rate, burst, rates, database):
+    backend = SQLiteBackend(database) if database else MemoryBackend()
+    return PolitenessScheduler(backend, rate=rate, burst=burst, rates=dict(rates))
+
+
+def politeness():
+    """The process-wide per-domain rate limiter, or ``None`` if it is disabled.
+
+    Every run in the process shares it, so concurrent runs against one domain
+    are limited together.
+    """
+    if not settings.SCRAPER_DOMAIN_RATE:
+        return None
+    return _politeness(
+        settings.SCRAPER_DOMAIN_RATE,
+        settings.SCRAPER_DOMAIN_BURST,
+        tuple(sorted(settings.SCRAPER_DOMAIN_RATES.items())),
+        str(settings.SCRAPER_POLITENESS_DB or ""),
+    )
+
+
+def results_writer(run, start_chunk=0):
+    """A writer storing the run's items as ``settings.SCRAPER_RESULTS_FORMAT``."""
+    fmt = settings.SCRAPER_RESULTS_FORMAT
+    if fmt == "json":
+        return ResultsWriter(run, start_chunk=start_chunk)
+    return ColumnarResultsWriter(
+        run, str(settings.SCRAPER_RESULTS_STORE), fmt, start_chunk=start_chunk
+    )
+
+
+def run_frontier(run_id):
+    """Open the crawl frontier of run ``run_id`` under ``settings.SCRAPER_FRONTIER_DIR``."""
+    return Frontier(Path(settings.SCRAPER_FRONTIER_DIR) / str(run_id))
+
+
+def _crawl_frontier(run, plan, checkpoint):
+    """The frontier ``run`` crawls through, if its recipe follows links.
+
+    A crawl keeps the frontier of the run that started it, which the
+    checkpoint names, so a run resuming another's checkpoint continues in
+    that frontier while concurrent runs of a job each have their own.
+    """
+    if not plan.follow:
+        return nullcontext()
+    if checkpoint.frontier is None:
+        checkpoint.frontier = str(run.pk)
+    return run_frontier(checkpoint.frontier)
+
+
+@dataclass
+class Round:
+    """URLs fetched together: their depths, and where they came from."""
+
+    depths: dict
+    position: int = 0
+    entries: list = field(default_factory=list)
+
+
+def _rounds(plan, frontier, checkpoint, log):
+    """Yield the rounds of URLs to fetch, starting from ``checkpoint``.
+
+    Without a frontier the rounds are slices of the recipe's URLs. A crawl
+    resumed from a checkpoint continues with what its frontier has pending;
+    otherwise it starts over from the recipe's URLs.
+    """
+    if frontier is None:
+        for start in range(checkpoint.position, len(plan.urls), CRAWL_BATCH):
+            urls = plan.urls[start : start + CRAWL_BATCH]
+            yield Round(dict.fromkeys(urls, 0), position=start + len(urls))
+        return
+    if checkpoint.seq:
+        frontier.recover(checkpoint.seq)
+        log.write(f"Resuming crawl with {len(frontier)} pending pages")
+    else:
+        frontier.clear()
+        frontier.add_many(plan.urls)
+    while entries := frontier.pop_many(CRAWL_BATCH):
+        yield Round({entry.url: entry.depth for entry in entries}, entries=entries)
+
+
+def _follow(frontier, hosts, parsed, depth):
+    """Queue the links of a page found at ``depth`` that stay on ``hosts``."""
+    urls = (canonicalize(link, parsed.key) for link in parsed.links)
+    frontier.add_many(
+        [url for url in urls if url and domain_of(url) in hosts], depth=depth + 1
+    )
+
+
+def _to_extract(pages, changes, failed, log, carried=None):
+    """Yield ``(url, body, base_url)`` for the fetched pages that need parsing.
+
+    Failed pages are recorded and dropped. Pages carried over from the
+    previous run are recorded as unchanged and dropped too, unless
+    ``carried`` is given: crawls still need their links, so their URLs are
+    added to it and the cached bodies parsed, for the caller to follow but
+    not store.
+    """
+    for page in pages:
+        if not page.ok:
+            failed.append(page.error or f"{page.url}: HTTP {page.status}")
+            log.write(f"Failed {failed[-1]}")
+        elif not (page.not_modified and changes.not_modified(page.url)):
+            yield page.url, page.body, page.url
+        elif carried is not None:
+            carried.add(page.url)
+            yield page.url, page.body, page.url
+
+
+def _extract_inline(extractor, pages):
+    for key, body, base_url in pages:
+        try:
+            rows, links, timings = extract_timed(extractor, body, base_url)
+            yield ParsedPage(key, rows, links=tuple(links), timings=timings)
+        except Exception as exc:
+            yield ParsedPage(key, [], error=f"{type(exc).__name__}: {exc}")
+
+
+@contextmanager
+def _parser(extractor, processes):
+    """Yield a function mapping pages to :class:`ParsedPage` results."""
+    if not processes:
+        yield partial(_extract_inline, extractor)
+        return
+    with ParsePool(extractor.plan, processes=processes) as pool:
+        yield pool.imap
+
+
+def _scrape_pages(plan, checkpoint, frontier, progress, log, processes, options):
+    """Scrape the rounds of a single-step recipe; return the failures."""
+    extractor = extractor_for(plan)
+    columns = extractor.columns
+    hosts = {domain_of(url) for url in plan.urls}
+    writer, changes, telemetry = progress.writer, progress.changes, progress.telemetry
+    failed = []
+    # Unchanged pages of a crawl, parsed only for their links.
+    carried = set() if plan.follow else None
+    with _parser(extractor, processes) as parse:
+        for batch in _rounds(plan, frontier, checkpoint, log):
+            log.write(f"Fetching {len(batch.depths)} pages")
+            already_failed = len(failed)
+            pages = telemetry.fetched(iter_pages(batch.depths, **options))
+            for parsed in parse(_to_extract(pages, changes, failed, log, carried)):
+                telemetry.observe_all(parsed.timings)
+                if parsed.error:
+                    failed.append(f"{parsed.key}: {parsed.error}")
+                    log.write(f"Failed {failed[-1]}")
+                    continue
+                depth = batch.depths[parsed.key]
+                if parsed.links and depth < plan.max_depth:
+                    _follow(frontier, hosts, parsed, depth)
+                if carried and parsed.key in carried:
+                    carried.discard(parsed.key)
+                    continue
+                items = [dict(zip(columns, row)) for row in parsed.rows]
+                with telemetry.phase("store"):
+                    if changes.changed(parsed.key, items):
+                        writer.write_many(items)
+            progress.advance(
+                len(batch.depths),
+                len(failed) - already_failed,
+                batch.position,
+                batch.entries,
+            )
+    return failed
+
+
+def _extract_step(graph, name, page, progress):
+    """Store the items step ``name`` extracts from ``page``; return an error."""
+    # Digests are kept per step, as steps may extract from the same page.
+    key = f"{name} {page.url}"
+    changes = progress.changes
+    if page.not_modified and name not in graph.sources and changes.not_modified(key):
+        return None
+    extractor = extractor_for(graph.steps[name].plan)
+    try:
+        rows, _, timings = extract_timed(extractor, page.body, page.url)
+    except Exception as exc:
+        return f"{key}: {type(exc).__name__}: {exc}"
+    progress.telemetry.observe_all(timings)
+    items = [{"step": name, **dict(zip(extractor.columns, row))} for row in rows]
+    graph.collect(name, page.url, items)
+    with progress.telemetry.phase("store"):
+        if changes.changed(key, items):
+            progress.writer.write_many(items)
+    return None
+
+
+def _scrape_steps(plan, checkpoint, progress, log, options):
+    """Scrape the steps of a multi-step recipe; return the failures.
+
+    Each round fetches the pending URLs of every ready step together; a page
+    several steps need is fetched once and extracted by each of them.
+    """
+    graph = StepGraph(plan, checkpoint.steps)
+    failed = []
+    while batch := graph.next_round(CRAWL_BATCH):
+        names = sorted({name for names in batch.values() for name in names})
+        log.write(f"Fetching {len(batch)} pages of {', '.join(names)}")
+        already_failed = len(failed)
+        for page in progress.telemetry.fetched(iter_pages(batch, **options)):
+            if not page.ok:
+                failed.append(page.error or f"{page.url}: HTTP {page.status}")
+                log.write(f"Failed {failed[-1]}")
+                continue
+            for name in batch[page.url]:
+                error = _extract_step(graph, name, page, progress)
+                if error:
+                    failed.append(error)
+                    log.write(f"Failed {error}")
+        graph.complete()
+        progress.advance(len(batch), len(failed) - already_failed, steps=graph.state())
+    return failed
+
+
+def execute_run(run, parse_processes=None, **fetcher_options):
+    """Scrape every URL of the run's recipe into ``Results`` rows.
+
+    Items are stored as configured by ``SCRAPER_RESULTS_FORMAT`` (see
+    :func:`results_writer`).
+
+    Recipes that ``follow`` links crawl them through a frontier of their own
+    (see :func:`run_frontier`), removed once the crawl is complete. The steps of multi-step recipes run as their
+    dependencies allow (see :class:`~scrapers.core.steps.StepGraph`); their
+    items carry the name of the ``step`` that extracted them, and their pages
+    are parsed in this thread. Progress is checkpointed every
+    ``settings.SCRAPER_CHECKPOINT_INTERVAL`` seconds; a retry of a failed
+    run, or the job's next run, resumes from its last checkpoint (see
+    :func:`~scrapers.runners.checkpoint.resume`).
+
+    Pages whose items are the same as in the job's last successful run
+    (including pages the server reports as not modified) are only recorded as
+    unchanged digests. With ``parse_processes`` (default:
+    ``settings.SCRAPER_PARSE_PROCESSES``) pages are parsed in a
+    :class:`~scrapers.runners.parse_pool.ParsePool` instead of in this thread.
+
+    ``fetcher_options`` are passed to :class:`BackgroundFetch`; an open
+    ``fetcher`` and its ``loop`` make the run reuse their connections. The
+    recipe's ``concurrency`` caps the pages fetched at once.
+
+    The run's :class:`~scrapers.core.telemetry.RunTelemetry` summary is saved
+    in ``Run.metrics`` with every checkpoint and once more when the run ends,
+    however it ends.
+
+    Runs whose ``profile`` (or job's) is set are profiled as they execute
+    (see :mod:`scrapers.runners.profiling`).
+    """
+    if parse_processes is None:
+        parse_processes = settings.SCRAPER_PARSE_PROCESSES
+    telemetry = RunTelemetry(sink=run_metrics())
+    profiler = run_profiler(run)
+    try:
+        with profiler or nullcontext():
+            return _execute(run, parse_processes, telemetry, fetcher_options)
+    finally:
+        with db_write("runs"):
+            Run.objects.filter(pk=run.pk).update(metrics=telemetry.summary())
+        if profiler is not None:
+            save_profile(run, profiler)
+
+
+def _execute(run, parse_processes, telemetry, fetcher_options):
+    plan = get_recipe_plan(run.job)
+    fetcher_options.setdefault("cache", response_cache())
+    fetcher_options.setdefault("politeness", politeness())
+    fetcher_options.setdefault("limit", plan.concurrency)
+    with RunLogWriter(run) as log:
+        checkpoint = resume(run, plan.content_hash, log)
+        with (
+            results_writer(run, checkpoint.next_chunk) as writer,
+            ChangeTracker(run, first_item=checkpoint.items) as changes,
+            _crawl_frontier(run, plan, checkpoint) as frontier,
+        ):
+            progress = Checkpointer(
+                run,
+                checkpoint,
+                writer,
+                changes,
+                frontier,
+                interval=settings.SCRAPER_CHECKPOINT_INTERVAL,
+                telemetry=telemetry,
+            )
+            if plan.steps:
+                failed = _scrape_steps(plan, checkpoint, progress, log, fetcher_options)
+            else:
+                failed = _scrape_pages(
+                    plan,
+                    checkpoint,
+                    frontier,
+                    progress,
+                    log,
+                    parse_processes,
+                    fetcher_options,
+                )
+            done = progress.save()
+            progress.finish()
+        if frontier is not None:
+            shutil.rmtree(frontier.directory, ignore_errors=True)
+        log.write(f"Stored {done.items} items, {changes.unchanged} pages unchanged")
+    Job.objects.filter(pk=run.job_id).update(last_run_at=timezone.now())
+    if done.failed:
+        raise RunError(f"{done.failed} of {done.pages} pages failed: {failed}")
+    return done.items
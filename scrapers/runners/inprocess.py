@@ -0,0 +1,169 @@
+"""Running small recipes in-process, on warm pools.
+
+Most of the time spent on a run of a one-page recipe is not the scrape: it
+is starting an interpreter, importing Django, lxml and the scraper modules,
+and opening connections, which a run on an isolated process (such as a
+container) pays every time. A :class:`WarmRunner` pays that once: it is
+created when the worker starts, imports the modules runs need and keeps an
+event loop thread with an open :class:`~scrapers.core.fetch.Fetcher`, whose
+keep-alive connections, DNS cache, response cache and rate limiter every
+run shares.
+
+A :class:`RunDispatcher` picks the path per run. Recipes whose
+:func:`recipe_complexity` is at most ``settings.SCRAPER_INPROCESS_MAX_PAGES``
+run on the warm runner; larger ones run isolated, through
+``settings.SCRAPER_ISOLATED_COMMAND`` (for example ``docker run ... python
+manage.py execute_run {run_id}``) or, when that is not set, through
+:func:`~scrapers.runners.executor.execute_run` with pools of their own.
+
+The ``bench_runner`` management command compares the end-to-end latency of
+the paths.
+"""
+
+import asyncio
+import importlib
+import logging
+import math
+import subprocess
+import threading
+from collections import Counter
+
+from django.conf import settings
+from scraper.recipes import get_recipe_plan
+
+from scrapers.core.fetch import Fetcher
+from scrapers.runners.executor import (
+    RunError,
+    execute_run,
+    politeness,
+    response_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+WARM = "warm"
+ISOLATED = "isolated"
+# Imported by the warm runner up front, so no run pays for them.
+WARM_MODULES = (
+    "cssselect",
+    "lxml.html",
+    "yaml",
+    "scrapers.core.extract",
+    "scrapers.runners.parse_pool",
+    "scrapers.runners.results",
+)
+
+
+def recipe_complexity(plan):
+    """The number of pages a run of ``plan`` fetches.
+
+    Crawls, and steps reading their URLs from other steps, are unbounded.
+    """
+    if plan.follow is not None or any(step.source for step in plan.steps):
+        return math.inf
+    return len(plan.urls)
+
+
+class WarmRunner:
+    """Executes runs in this process, on an event loop and pools kept open.
+
+    Create one per worker process and :meth:`close` it when the worker stops.
+    Runs are executed one at a time.
+    """
+
+    def __init__(self, **fetcher_options):
+        for name in WARM_MODULES:
+            importlib.import_module(name)
+        fetcher_options.setdefault("cache", response_cache())
+        fetcher_options.setdefault("politeness", politeness())
+        self.fetcher = Fetcher(**fetcher_options)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="warm-fetch", daemon=True
+        )
+        self._thread.start()
+        self._call(self.fetcher.open())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def execute(self, run):
+        return execute_run(run, parse_processes=0, fetcher=self.fetcher, loop=self.loop)
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        self._call(self.fetcher.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def execute_isolated(run, command=None, timeout=None):
+    """Execute ``run`` through ``command``, an argv with a ``{run_id}`` field.
+
+    ``command`` defaults to ``settings.SCRAPER_ISOLATED_COMMAND``; without one
+    the run is executed here, with pools of its own. The command is killed
+    after ``timeout`` seconds (default: ``settings.SCRAPER_ISOLATED_TIMEOUT``).
+    """
+    command = command or settings.SCRAPER_ISOLATED_COMMAND
+    if not command:
+        return execute_run(run)
+    if timeout is None:
+        timeout = settings.SCRAPER_ISOLATED_TIMEOUT
+    argv = [part.format(run_id=run.pk) for part in command]
+    try:
+        completed = subprocess.run(argv, stdin=subprocess.DEVNULL, timeout=timeout)
+    except subprocess.TimeoutExpired as exc:
+        raise RunError(f"{argv[0]} was killed after {timeout:g} seconds") from exc
+    if completed.returncode:
+        raise RunError(f"{argv[0]} exited with status {completed.returncode}")
+
+
+class RunDispatcher:
+    """Executes each run on the warm runner or isolated, by recipe complexity.
+
+    ``mode`` forces one path for every run. The warm runner is started with
+    the dispatcher, so the first run finds it ready. Use the dispatcher as a
+    worker's ``execute``, and close it when the worker stops.
+    """
+
+    def __init__(self, mode=None, max_pages=None, isolated_command=None):
+        if max_pages is None:
+            max_pages = settings.SCRAPER_INPROCESS_MAX_PAGES
+        self.forced_mode = mode
+        self.max_pages = max_pages
+        self.isolated_command = isolated_command
+        self.executed = Counter()
+        self.warm = WarmRunner() if mode != ISOLATED else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def mode(self, run):
+        if self.forced_mode:
+            return self.forced_mode
+        complexity = recipe_complexity(get_recipe_plan(run.job))
+        return WARM if complexity <= self.max_pages else ISOLATED
+
+    def __call__(self, run):
+        mode = self.mode(run)
+        logger.debug("Executing run %s %s", run.pk, mode)
+        self.executed[mode] += 1
+        if mode == WARM:
+            return self.warm.execute(run)
+        return execute_isolated(run, self.isolated_command)
+
+    def close(self):
+        if self.warm is not None:
+            self.warm.close()
+            self.warm = None
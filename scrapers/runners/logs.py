@@ -0,0 +1,146 @@
+"""Incremental run logs stored as append-only ``RunLogChunk`` rows.
+
+Appending to ``Run.logs`` rewrites the whole text every time, which makes a
+long run's logging quadratic in bytes written. Instead, :class:`RunLogWriter`
+buffers lines and inserts one chunk per flush, and readers fetch only the
+chunks they have not seen yet (:func:`read_log`) or the last few lines
+(:func:`tail_log`).
+
+A run can have more than one writer, such as the reaper's next to a dying
+worker's, so a chunk's ``seq`` is allocated when it is inserted, and
+allocated again if another writer took it first.
+"""
+
+import logging
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from scraper.models import RunLogChunk
+
+from scrapers.core.metrics import db_write
+
+DEFAULT_FLUSH_LINES = 200
+DEFAULT_FLUSH_INTERVAL = 2.0
+# Inserts of a chunk tried before giving up on a free ``seq``.
+SEQ_ATTEMPTS = 5
+
+
+class RunLogWriter:
+    """Buffers log lines for one run and appends them in chunks.
+
+    A chunk is written when ``flush_lines`` lines are buffered or when a
+    line arrives ``flush_interval`` seconds or more after the last flush.
+    """
+
+    def __init__(
+        self,
+        run,
+        flush_lines=DEFAULT_FLUSH_LINES,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+    ):
+        self.run = run
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self._lines = []
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, message):
+        """Append a timestamped message (which may span several lines)."""
+        stamp = timezone.now().isoformat(timespec="seconds")
+        self._lines.extend(f"{stamp} {line}" for line in str(message).splitlines())
+        if (
+            len(self._lines) >= self.flush_lines
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._lines:
+            return
+        chunk = RunLogChunk(
+            run=self.run,
+            content="\n".join(self._lines) + "\n",
+            line_count=len(self._lines),
+        )
+        with db_write("run_log_chunks"):
+            for attempt in range(1, SEQ_ATTEMPTS + 1):
+                try:
+                    self._insert(chunk)
+                    break
+                except IntegrityError:
+                    if attempt == SEQ_ATTEMPTS:
+                        raise
+        self._lines = []
+
+    def _insert(self, chunk):
+        # A savepoint, so that a taken ``seq`` does not break an enclosing
+        # transaction.
+        with transaction.atomic():
+            chunks = RunLogChunk.objects.filter(run_id=self.run.pk)
+            last = chunks.aggregate(seq=Max("seq"))["seq"]
+            chunk.pk = None
+            chunk.seq = 0 if last is None else last + 1
+            chunk.save(force_insert=True)
+
+    def close(self):
+        self.flush()
+
+
+class RunLogHandler(logging.Handler):
+    """Sends log records to a :class:`RunLogWriter`."""
+
+    def __init__(self, writer, level=logging.INFO):
+        super().__init__(level)
+        self.writer = writer
+
+    def emit(self, record):
+        try:
+            self.writer.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def read_log(run, after=None, limit=50):
+    """Return up to ``limit`` chunks written after chunk ``after``.
+
+    Pass the ``seq`` of the last chunk received as ``after`` to page through
+    the log or to poll a live run for new output.
+    """
+    chunks = RunLogChunk.objects.filter(run=run).order_by("seq")
+    if after is not None:
+        chunks = chunks.filter(seq__gt=after)
+    return list(chunks[:limit])
+
+
+def tail_log(run, lines=100):
+    """Return the last ``lines`` lines of a run's log."""
+    collected = []
+    needed = lines
+    chunks = RunLogChunk.objects.filter(run=run).order_by("-seq")
+    for chunk in chunks.only("content", "line_count").iterator(chunk_size=20):
+        collected.append(chunk.content)
+        needed -= chunk.line_count
+        if needed <= 0:
+            break
+    text = "".join(reversed(collected))
+    return "\n".join(text.splitlines()[-lines:]) if lines else ""
+
+
+def log_text(run):
+    """Return a run's whole log, including anything in the legacy ``Run.logs``."""
+    chunks = RunLogChunk.objects.filter(run=run).order_by("seq")
+    legacy = run.logs or ""
+    if legacy and not legacy.endswith("\n"):
+        legacy += "\n"
+    parts = [legacy]
+    parts.extend(chunks.values_list("content", flat=True).iterator())
+    return "".join(parts)
@@ -0,0 +1,167 @@
+"""Parsing and extraction in a pool of worker processes.
+
+HTML parsing and selector evaluation are CPU bound, so a single process tops
+out at one core however fast pages arrive. A :class:`ParsePool` runs the
+recipe's :class:`~scrapers.core.extract.Extractor` in worker processes, each
+compiled once when the worker starts. Workers are spawned rather than forked,
+so they never inherit the runner's threads or database connections.
+
+Large bodies are not pickled through the pool's pipe: they are copied once
+into a :mod:`multiprocessing.shared_memory` block that the worker reads
+directly, and only the block's name travels with the task. Workers send back
+the compact row tuples, not dicts. At most ``max_pending`` pages are in
+flight; :meth:`ParsePool.imap` stops pulling from its input while the pool
+is saturated, which in turn stops the fetcher feeding it.
+"""
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Optional
+
+from scrapers.core.extract import Extractor, parse_html
+from scrapers.core.recipe import RecipePlan
+
+# Bodies smaller than this are cheaper to pickle than to map.
+SHARED_MEMORY_THRESHOLD = 64 * 1024
+
+_extractor = None
+
+
+@dataclass(frozen=True)
+class ParsedPage:
+    """The rows and links extracted from one page, or the error that prevented it.
+
+    ``links`` are the raw values of the recipe's ``follow`` selector and
+    ``timings`` the seconds spent parsing and extracting the page.
+    """
+
+    key: Any
+    rows: list
+    error: Optional[str] = None
+    links: tuple = ()
+    timings: Optional[dict] = None
+
+
+def extract_timed(extractor, body, base_url):
+    """Return ``(rows, links, timings)`` extracted from ``body``."""
+    start = time.perf_counter()
+    document = parse_html(body, base_url)
+    parsed = time.perf_counter()
+    rows, links = extractor.extract_page(document, base_url)
+    timings = {"parse": parsed - start, "extract": time.perf_counter() - parsed}
+    return rows, links, timings
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 always registers with the tracker.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(plan):
+    global _extractor
+    _extractor = Extractor(RecipePlan.from_dict(plan))
+
+
+def _parse(body, shm_name, size, base_url):
+    if shm_name is not None:
+        block = _attach(shm_name)
+        try:
+            body = bytes(block.buf[:size])
+        finally:
+            block.close()
+    return extract_timed(_extractor, body, base_url)
+
+
+class ParsePool:
+    """Extracts rows from page bodies in ``processes`` worker processes."""
+
+    def __init__(
+        self,
+        plan,
+        processes=None,
+        max_pending=None,
+        shared_memory_threshold=SHARED_MEMORY_THRESHOLD,
+    ):
+        self.plan = plan
+        self.columns = plan.field_names
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.processes
+        self.shared_memory_threshold = shared_memory_threshold
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_init_worker,
+            initargs=(plan.to_dict(),),
+            # Workers must not inherit the fetch thread or database connections.
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def _submit(self, body, base_url):
+        if len(body) < self.shared_memory_threshold:
+            return self._executor.submit(_parse, body, None, 0, base_url), None
+        block = shared_memory.SharedMemory(create=True, size=len(body))
+        block.buf[: len(body)] = body
+        try:
+            future = self._executor.submit(
+                _parse, None, block.name, len(body), base_url
+            )
+        except BaseException:
+            self._release(block)
+            raise
+        return future, block
+
+    @staticmethod
+    def _release(block):
+        if block is not None:
+            block.close()
+            block.unlink()
+
+    def _collect(self, key, future, block):
+        try:
+            rows, links, timings = future.result()
+            return ParsedPage(key, rows, links=tuple(links), timings=timings)
+        except Exception as exc:
+            return ParsedPage(key, [], error=f"{type(exc).__name__}: {exc}")
+        finally:
+            self._release(block)
+
+    def imap(self, pages):
+        """Extract ``(key, body, base_url)`` pages, yielding :class:`ParsedPage`.
+
+        Results come back in completion order. The input is consumed lazily:
+        no more than ``max_pending`` pages are read ahead of the results.
+        """
+        pending = deque()
+        try:
+            for key, body, base_url in pages:
+                future, block = self._submit(body, base_url)
+                pending.append((key, future, block))
+                if len(pending) >= self.max_pending:
+                    yield from self._completed(pending)
+            while pending:
+                yield from self._completed(pending)
+        finally:
+            for _, future, block in pending:
+                future.cancel()
+                self._release(block)
+
+    def _completed(self, pending):
+        wait([future for _, future, _ in pending], return_when=FIRST_COMPLETED)
+        for entry in [entry for entry in pending if entry[1].done()]:
+            pending.remove(entry)
+            yield self._collect(*entry)
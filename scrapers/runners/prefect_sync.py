@@ -0,0 +1,147 @@
+"""Keeping runs in step with the Prefect flow runs that execute them.
+
+Runs with a ``prefect_flow_run_id`` that are still queued or running are
+read from the database ``batch_size`` at a time, in primary key order. The
+states of a batch's flow runs are fetched from Prefect in bulk (see
+:class:`~scrapers.core.prefect.PrefectClient`) and every run whose
+``status``, ``prefect_state``, ``started_at`` or ``finished_at`` changed is
+written back with a single ``bulk_update``. A tick therefore costs one select,
+a few API requests and at most one update per batch, however many runs are in
+flight, where polling each flow run would cost a request and a write per run.
+
+Prefect is the source of truth for these runs: their status follows the flow
+run's state type, and runs whose flow run Prefect does not know are left
+alone. Paused and cancelling flow runs only update ``prefect_state``, and
+runs a worker claimed are never moved back to ``queued``.
+"""
+
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, router
+from django.utils import timezone
+from scraper.models import Run
+
+from scrapers.core.prefect import PrefectClient, PrefectError
+
+logger = logging.getLogger(__name__)
+
+STATUS_BY_STATE_TYPE = {
+    "SCHEDULED": "queued",
+    "PENDING": "queued",
+    "RUNNING": "running",
+    "COMPLETED": "success",
+    "FAILED": "failure",
+    "CRASHED": "failure",
+    "CANCELLED": "failure",
+}
+FINAL_STATE_TYPES = {"COMPLETED", "FAILED", "CRASHED", "CANCELLED"}
+SYNC_FIELDS = ["status", "prefect_state", "started_at", "finished_at"]
+
+
+def _unfinished(using, after, limit):
+    runs = (
+        Run.objects.using(using)
+        .filter(status__in=["queued", "running"], prefect_flow_run_id__isnull=False)
+        .order_by("pk")
+        .only("id", "prefect_flow_run_id", "claimed_by", *SYNC_FIELDS)
+    )
+    if after is not None:
+        runs = runs.filter(pk__gt=after)
+    return list(runs[:limit])
+
+
+def apply_state(run, state):
+    """Copy a flow run's ``state`` onto ``run``; return whether it changed."""
+    before = [getattr(run, name) for name in SYNC_FIELDS]
+    if state.state_name:
+        run.prefect_state = state.state_name[:100]
+    status = STATUS_BY_STATE_TYPE.get(state.state_type, run.status)
+    if status != "queued" or not run.claimed_by:
+        run.status = status
+    if state.start_time:
+        run.started_at = state.start_time
+    if state.state_type in FINAL_STATE_TYPES:
+        run.finished_at = state.end_time or run.finished_at or timezone.now()
+    return [getattr(run, name) for name in SYNC_FIELDS] != before
+
+
+class PrefectSync:
+    """Syncs runs with their flow runs every ``interval`` seconds until stopped.
+
+    The client's session lives on an event loop owned by the sync, so it is
+    reused by every tick; use the sync as a context manager, or call
+    :meth:`close` when done.
+    """
+
+    def __init__(self, client=None, batch_size=None, interval=None):
+        self.client = client or PrefectClient(
+            settings.PREFECT_API_URL, api_key=settings.PREFECT_API_KEY
+        )
+        self.batch_size = batch_size or settings.SCRAPER_PREFECT_SYNC_BATCH
+        if interval is None:
+            interval = settings.SCRAPER_PREFECT_SYNC_INTERVAL
+        self.interval = interval
+        self.updated = 0
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self.client.open())
+        self._stopping = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if not self._loop.is_closed():
+            self._loop.run_until_complete(self.client.close())
+            self._loop.close()
+
+    def stop(self):
+        self._stopping = True
+
+    def sync_batch(self, runs):
+        """Update ``runs`` from their flow runs; return how many changed."""
+        states = self._loop.run_until_complete(
+            self.client.read_flow_runs(run.prefect_flow_run_id for run in runs)
+        )
+        changed = []
+        for run in runs:
+            state = states.get(run.prefect_flow_run_id)
+            if state is None:
+                logger.debug(
+                    "Flow run %s of run %s not found", run.prefect_flow_run_id, run.pk
+                )
+            elif apply_state(run, state):
+                changed.append(run)
+        if changed:
+            using = router.db_for_write(Run)
+            Run.objects.using(using).bulk_update(changed, SYNC_FIELDS)
+        return len(changed)
+
+    def tick(self):
+        """Sync every unfinished run once; return how many changed."""
+        close_old_connections()
+        using = router.db_for_read(Run)
+        updated, after = 0, None
+        while True:
+            runs = _unfinished(using, after, self.batch_size)
+            if not runs:
+                break
+            updated += self.sync_batch(runs)
+            after = runs[-1].pk
+            if len(runs) < self.batch_size:
+                break
+        self.updated += updated
+        return updated
+
+    def run(self):
+        while not self._stopping:
+            try:
+                self.tick()
+            except (PrefectError, DatabaseError):
+                logger.exception("Could not sync runs with Prefect")
+            time.sleep(self.interval)
@@ -0,0 +1,105 @@
+"""Opt-in profiling of runs, to find out why a recipe got slow.
+
+A run is profiled when its ``profile`` field, or failing that its job's,
+names a mode of :mod:`scrapers.core.profiling`: ``sample`` (a stack sampled
+every ``settings.SCRAPER_PROFILE_INTERVAL`` seconds, for runs of any length)
+or ``cprofile`` (every call of the runner's thread, for short runs). For
+runs that are not profiled nothing is started at all.
+
+When the run ends, however it ends, its profile is written as folded stacks
+next to its results, to ``<SCRAPER_RESULTS_STORE>/<job id>/<run id>/
+profile-<id>.folded`` (plus the raw ``.pstats`` for cProfile), and a
+``Results`` row without items references it from ``artifacts``.
+``GET /api/runs/<run id>/profile`` draws the latest one as a flamegraph.
+"""
+
+import logging
+import posixpath
+import uuid
+
+from django.conf import settings
+from scraper.models import Results
+
+from scrapers.core import columnar
+from scrapers.core.metrics import db_write
+from scrapers.core.profiling import CallProfiler, profiler_for
+
+logger = logging.getLogger(__name__)
+
+# ``artifacts["kind"]`` of the Results rows referencing profiles.
+PROFILE_KIND = "profile"
+
+
+def profile_mode(run):
+    """How ``run`` should be profiled, or ``None``."""
+    if run.profile:
+        return run.profile
+    return run.job.profile if run.job_id else None
+
+
+def run_profiler(run):
+    """A profiler for ``run``, not yet started, or ``None``."""
+    mode = profile_mode(run)
+    if not mode:
+        return None
+    return profiler_for(mode, settings.SCRAPER_PROFILE_INTERVAL)
+
+
+def _write(location, data):
+    filesystem, path = columnar.resolve(location)
+    filesystem.create_dir(posixpath.dirname(path), recursive=True)
+    with filesystem.open_output_stream(path) as stream:
+        stream.write(data)
+
+
+def read_profile(artifact, key="location"):
+    """The bytes of a profile file an ``artifact`` references."""
+    filesystem, path = columnar.resolve(artifact[key])
+    with filesystem.open_input_stream(path) as stream:
+        return stream.readall()
+
+
+def save_profile(run, profiler):
+    """Store a stopped profiler's profile of ``run`` and return its artifact.
+
+    Profiles are diagnostics: failing to store one is logged, not raised.
+    """
+    results_id = uuid.uuid4()
+    base = columnar.join(
+        settings.SCRAPER_RESULTS_STORE,
+        str(run.job_id),
+        str(run.pk),
+        f"profile-{results_id}",
+    )
+    folded = profiler.folded().encode()
+    artifact = {
+        "kind": PROFILE_KIND,
+        "mode": profiler.mode,
+        "format": "folded",
+        "location": f"{base}.folded",
+        "bytes": len(folded),
+        "duration": round(profiler.duration, 6),
+    }
+    if isinstance(profiler, CallProfiler):
+        artifact.update(unit="microseconds", pstats=f"{base}.pstats")
+    else:
+        artifact.update(
+            unit="samples", samples=profiler.samples, interval=profiler.interval
+        )
+    try:
+        _write(artifact["location"], folded)
+        if "pstats" in artifact:
+            _write(artifact["pstats"], profiler.pstats())
+    except OSError:
+        logger.exception("Could not store the profile of run %s", run.pk)
+        return None
+    with db_write("results"):
+        Results.objects.create(id=results_id, run=run, artifacts=artifact)
+    return artifact
+
+
+def profiles_of(run_id):
+    """The ``Results`` referencing profiles of a run, latest first."""
+    return Results.objects.filter(run_id=run_id, artifacts__kind=PROFILE_KIND).order_by(
+        "-created_at"
+    )
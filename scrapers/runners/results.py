@@ -0,0 +1,230 @@
+"""Streaming storage of scraped items as chunked ``Results`` rows.
+
+A run that scrapes hundreds of thousands of items must not keep them all in
+memory or write them as one enormous JSON value. :class:`ResultsWriter`
+accepts items one at a time, groups them into chunks of ``chunk_size`` items
+(one ``Results`` row each) and inserts ``chunks_per_insert`` chunks per
+``bulk_create``. At most ``chunk_size * chunks_per_insert`` items are held in
+memory, however many the run produces.
+
+For large runs :class:`ColumnarResultsWriter` writes the items to Parquet or
+Arrow IPC files instead (see :mod:`scrapers.core.columnar`); each file gets a
+``Results`` row with no payload whose ``artifacts`` describe the file.
+"""
+
+import pyarrow as pa
+from scraper.models import Results
+
+from scrapers.core import columnar
+from scrapers.core.metrics import db_write
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CHUNKS_PER_INSERT = 4
+DEFAULT_ROWS_PER_FILE = 1_000_000
+
+
+def stored_batches(row):
+    """Yield the items of a ``Results`` row in lists, one per stored batch.
+
+    ``row`` maps at least ``payload`` and ``artifacts`` to their values, as
+    ``Results.objects.values()`` returns them.
+    """
+    if columnar.is_columnar(row["artifacts"]):
+        for batch in columnar.iter_batches(row["artifacts"]):
+            yield batch.to_pylist()
+        return
+    payload = row["payload"]
+    items = payload.get("items") if isinstance(payload, dict) else None
+    if items is None:
+        # Rows written before results were chunked hold a single item.
+        items = [] if payload is None else [payload]
+    yield items
+
+
+class ResultsWriter:
+    """Buffers items for one run and writes them in bulk.
+
+    Use it as a context manager so buffered items are flushed even when the
+    scraper fails part way through::
+
+        with ResultsWriter(run) as writer:
+            for item in scrape():
+                writer.write(item)
+    """
+
+    def __init__(
+        self,
+        run,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        chunks_per_insert=DEFAULT_CHUNKS_PER_INSERT,
+        start_chunk=0,
+    ):
+        if chunk_size < 1 or chunks_per_insert < 1:
+            raise ValueError("chunk_size and chunks_per_insert must be positive")
+        self.run = run
+        self.chunk_size = chunk_size
+        self.chunks_per_insert = chunks_per_insert
+        self.next_chunk = start_chunk
+        self.items_written = 0
+        self.chunks_written = 0
+        self._items = []
+        self._chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def buffered(self):
+        """Number of items accepted but not yet written."""
+        return len(self._items) + sum(chunk.item_count for chunk in self._chunks)
+
+    def write(self, item):
+        self._items.append(item)
+        if len(self._items) >= self.chunk_size:
+            self._seal_chunk()
+
+    def write_many(self, items):
+        for item in items:
+            self.write(item)
+
+    def _seal_chunk(self):
+        self._chunks.append(
+            Results(
+                run=self.run,
+                payload={"items": self._items},
+                chunk_index=self.next_chunk,
+                item_count=len(self._items),
+            )
+        )
+        self.next_chunk += 1
+        self._items = []
+        if len(self._chunks) >= self.chunks_per_insert:
+            self._insert()
+
+    def _insert(self):
+        if not self._chunks:
+            return
+        with db_write("results"):
+            Results.objects.bulk_create(self._chunks)
+        self.chunks_written += len(self._chunks)
+        self.items_written += sum(chunk.item_count for chunk in self._chunks)
+        self._chunks = []
+
+    def flush(self):
+        """Write everything buffered, including a partially filled chunk."""
+        if self._items:
+            self._seal_chunk()
+        self._insert()
+
+    def close(self):
+        self.flush()
+
+
+class ColumnarResultsWriter:
+    """Writes a run's items to columnar files under ``root``.
+
+    Items are buffered ``batch_size`` at a time and appended to the current
+    file as one row group. A file is finished, and its ``Results`` row
+    created, after ``rows_per_file`` rows, on :meth:`flush`, or when a batch
+    no longer fits the file's schema. The next file then gets the schema
+    widened with the batch's new fields or, when a field changed type, the
+    batch's own. Files are stored as ``<root>/<job id>/<run id>/part-<n>.<format>``;
+    ``root`` may be a local directory or an object store URI.
+    """
+
+    def __init__(
+        self,
+        run,
+        root,
+        fmt=columnar.DEFAULT_FORMAT,
+        batch_size=columnar.DEFAULT_BATCH_SIZE,
+        rows_per_file=DEFAULT_ROWS_PER_FILE,
+        start_chunk=0,
+        compression=columnar.DEFAULT_COMPRESSION,
+    ):
+        if batch_size < 1 or rows_per_file < 1:
+            raise ValueError("batch_size and rows_per_file must be positive")
+        self.run = run
+        self.root = root
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.rows_per_file = rows_per_file
+        self.compression = compression
+        self.next_chunk = start_chunk
+        self.items_written = 0
+        self.chunks_written = 0
+        self._items = []
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def buffered(self):
+        """Number of items accepted but not yet written to a file."""
+        return len(self._items)
+
+    def write(self, item):
+        self._items.append(item)
+        if len(self._items) >= self.batch_size:
+            self._write_batch()
+
+    def write_many(self, items):
+        for item in items:
+            self.write(item)
+
+    def _location(self):
+        name = f"part-{self.next_chunk:05d}{columnar.FORMATS[self.fmt]}"
+        return columnar.join(self.root, str(self.run.job_id), str(self.run.id), name)
+
+    def _write_batch(self, schema=None):
+        items, self._items = self._items, []
+        if not items:
+            return
+        if self._file is None:
+            self._file = columnar.ColumnarFileWriter(
+                self._location(), self.fmt, schema, compression=self.compression
+            )
+        try:
+            self._file.write_batch(items)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if not self._file.rows:
+                raise
+            schema = columnar.widen_schema(self._file.schema, items)
+            self._finish_file()
+            self._items = items
+            self._write_batch(schema)
+            return
+        if self._file.rows >= self.rows_per_file:
+            self._finish_file()
+
+    def _finish_file(self):
+        artifact, self._file = self._file.close(), None
+        if artifact is None:
+            return
+        with db_write("results"):
+            Results.objects.create(
+                run=self.run,
+                payload=None,
+                artifacts=artifact,
+                chunk_index=self.next_chunk,
+                item_count=artifact["rows"],
+            )
+        self.next_chunk += 1
+        self.chunks_written += 1
+        self.items_written += artifact["rows"]
+
+    def flush(self):
+        """Write everything buffered and finish the current file."""
+        self._write_batch()
+        if self._file is not None:
+            self._finish_file()
+
+    def close(self):
+        self.flush()
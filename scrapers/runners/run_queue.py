@@ -0,0 +1,181 @@
+"""Claiming queued runs from the database.
+
+Any number of worker processes, on any number of nodes, can call
+:func:`claim_runs` concurrently; every queued run is handed to exactly one of
+them.
+
+On databases that support it (PostgreSQL, MySQL 8, Oracle) the batch is
+selected with ``SELECT ... FOR UPDATE SKIP LOCKED`` inside a short
+transaction: workers skip rows another worker is claiming instead of queueing
+behind its locks, so there are no lock convoys. Elsewhere (SQLite) the batch
+is claimed with a conditional ``UPDATE ... WHERE status = 'queued'``, which
+SQLite serialises; rows that another worker won in the meantime are simply
+not updated.
+
+Runs with a ``prefect_flow_run_id`` are executed by Prefect and kept in step
+by :mod:`scrapers.runners.prefect_sync`; they are neither claimed nor
+counted in the queue.
+
+A claim is a lease: the worker renews ``heartbeat_at`` on its running runs
+(see :class:`Heartbeat`), and :func:`reap_stale_runs` fails the running
+runs whose worker stopped doing so, say because it crashed. Their
+checkpoints are then resumed by a retry or by the job's next run.
+"""
+
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from scraper.models import Run
+
+from scrapers.runners.logs import RunLogWriter
+
+logger = logging.getLogger(__name__)
+
+# Attempts made by the fallback claim when every candidate was taken by
+# another worker before this one could update it.
+FALLBACK_ATTEMPTS = 3
+
+
+def _supports_skip_locked(using):
+    return connections[using].features.has_select_for_update_skip_locked
+
+
+def _queued(using):
+    # Runs with a flow run are executed by Prefect, not claimed by workers.
+    return (
+        Run.objects.using(using)
+        .filter(status="queued", prefect_flow_run_id__isnull=True)
+        .order_by("created_at")
+    )
+
+
+def claim_runs(worker_id, limit=10):
+    """Atomically claim up to ``limit`` queued runs, oldest first.
+
+    Claimed runs are moved to ``running`` and returned with their job loaded.
+    """
+    using = router.db_for_write(Run)
+    token = uuid.uuid4()
+    now = timezone.now()
+    claim = {
+        "status": "running",
+        "claimed_by": worker_id,
+        "claim_token": token,
+        "started_at": now,
+        "heartbeat_at": now,
+    }
+    if _supports_skip_locked(using):
+        with transaction.atomic(using=using):
+            ids = list(
+                _queued(using)
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)[:limit]
+            )
+            Run.objects.using(using).filter(id__in=ids).update(**claim)
+    else:
+        for _ in range(FALLBACK_ATTEMPTS):
+            ids = list(_queued(using).values_list("id", flat=True)[:limit])
+            if not ids:
+                break
+            updated = (
+                Run.objects.using(using)
+                .filter(id__in=ids, status="queued")
+                .update(**claim)
+            )
+            if updated:
+                break
+    return list(
+        Run.objects.using(using)
+        .filter(claim_token=token)
+        .select_related("job")
+        .order_by("created_at")
+    )
+
+
+def finish_run(run, status):
+    """Record the outcome of a claimed run."""
+    fields = {"status": status, "finished_at": timezone.now()}
+    Run.objects.filter(pk=run.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(run, name, value)
+
+
+def heartbeat(worker_id, now=None):
+    """Renew the claims of a worker on its running runs; return how many."""
+    return Run.objects.filter(claimed_by=worker_id, status="running").update(
+        heartbeat_at=now or timezone.now()
+    )
+
+
+class Heartbeat:
+    """Calls :func:`heartbeat` every ``interval`` seconds from a thread."""
+
+    def __init__(self, worker_id, interval=None):
+        self.worker_id = worker_id
+        self.interval = interval or settings.SCRAPER_HEARTBEAT_INTERVAL
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    heartbeat(self.worker_id)
+                except DatabaseError:
+                    logger.exception("Worker %s could not renew claims", self.worker_id)
+        finally:
+            connection.close()
+
+
+def reap_stale_runs(now=None, lease=None):
+    """Fail the claimed runs whose worker stopped renewing its claim.
+
+    ``lease`` defaults to ``settings.SCRAPER_RUN_LEASE`` seconds. Runs that
+    Prefect executes are left to its state sync. Returns the runs reaped.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(
+        seconds=settings.SCRAPER_RUN_LEASE if lease is None else lease
+    )
+    stale = list(
+        Run.objects.filter(
+            Q(heartbeat_at__lt=cutoff)
+            | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+            status="running",
+            claimed_by__isnull=False,
+            prefect_flow_run_id__isnull=True,
+        ).only("id", "claimed_by", "heartbeat_at")
+    )
+    reaped = []
+    for run in stale:
+        # Conditional, in case the worker came back since.
+        if Run.objects.filter(
+            pk=run.pk, status="running", heartbeat_at=run.heartbeat_at
+        ).update(status="failure", finished_at=now):
+            with RunLogWriter(run) as log:
+                log.write(
+                    f"Worker {run.claimed_by} stopped renewing its claim;"
+                    " marked as failed"
+                )
+            reaped.append(run)
+    return reaped
+
+
+def queue_depth():
+    """Number of runs waiting to be claimed."""
+    return _queued(router.db_for_read(Run)).count()
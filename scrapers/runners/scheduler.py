@@ -0,0 +1,140 @@
+"""Queueing runs of scheduled jobs when they are due.
+
+Every job with a ``schedule`` carries ``next_run_at``, the next time it is
+due (its cron time plus its jitter offset, see ``Job.schedule_offset``). A
+tick of the :class:`Scheduler` therefore never scans the jobs table: it reads
+the due jobs, earliest first, from the ``(is_active, next_run_at)`` index, at
+most ``batch_size`` of them, creates their runs with one ``bulk_create`` and
+moves each job's ``next_run_at`` on with one ``bulk_update``.
+
+A job that still has a run queued or running is not queued again; that
+occurrence is skipped. Projects are capped at ``max_queued`` queued runs:
+their due jobs are left due, and queued as soon as the project's workers
+catch up. Missed occurrences, say while the scheduler was down, are not
+replayed: an overdue job is queued once and rescheduled after the present.
+
+Each tick also reaps the runs of workers that died (see
+:func:`~scrapers.runners.run_queue.reap_stale_runs`).
+
+Where the database supports ``SELECT ... FOR UPDATE SKIP LOCKED`` the due
+jobs are locked while a tick runs, so several schedulers can run side by
+side; on SQLite run a single one.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, router, transaction
+from django.db.models import Count
+from django.utils import timezone
+from scraper.models import Job, Run
+
+from scrapers.core.cron import CronError
+from scrapers.runners.run_queue import _supports_skip_locked, reap_stale_runs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 5.0
+
+
+def _queued_per_project(using):
+    counts = (
+        Run.objects.using(using)
+        .filter(status="queued", job__project__isnull=False)
+        .values_list("job__project_id")
+        .annotate(count=Count("id"))
+    )
+    return dict(counts)
+
+
+def _due_jobs(using, now, limit, capped):
+    jobs = (
+        Job.objects.using(using)
+        .filter(is_active=True, next_run_at__lte=now)
+        .exclude(project_id__in=capped)
+        .order_by("next_run_at")
+        .only("id", "project_id", "schedule", "schedule_timezone", "next_run_at")
+    )
+    if _supports_skip_locked(using):
+        jobs = jobs.select_for_update(skip_locked=True)
+    return list(jobs[:limit])
+
+
+def _reschedule(job, now):
+    try:
+        job.next_run_at = job.next_scheduled_run(now)
+    except CronError:
+        # Saved before validation existed, or the time zone went away.
+        logger.exception("Job %s has an invalid schedule", job.pk)
+        job.next_run_at = None
+
+
+def schedule_due_runs(now=None, batch_size=None, max_queued=None):
+    """Queue a run for each due job; return the runs created.
+
+    ``batch_size`` defaults to ``settings.SCRAPER_SCHEDULE_BATCH`` and
+    ``max_queued`` to ``settings.SCRAPER_MAX_QUEUED_PER_PROJECT``.
+    """
+    now = now or timezone.now()
+    if batch_size is None:
+        batch_size = settings.SCRAPER_SCHEDULE_BATCH
+    if max_queued is None:
+        max_queued = settings.SCRAPER_MAX_QUEUED_PER_PROJECT
+    using = router.db_for_write(Job)
+    with transaction.atomic(using=using):
+        queued = _queued_per_project(using) if max_queued is not None else {}
+        capped = [project for project, count in queued.items() if count >= max_queued]
+        jobs = _due_jobs(using, now, batch_size, capped)
+        waiting = set(
+            Run.objects.using(using)
+            .filter(job__in=jobs, status__in=("queued", "running"))
+            .values_list("job_id", flat=True)
+        )
+        runs, rescheduled = [], []
+        for job in jobs:
+            if job.pk not in waiting:
+                project = job.project_id
+                if max_queued is not None and project is not None:
+                    if queued.get(project, 0) >= max_queued:
+                        continue
+                    queued[project] = queued.get(project, 0) + 1
+                runs.append(Run(job=job, status="queued"))
+            _reschedule(job, now)
+            rescheduled.append(job)
+        Run.objects.using(using).bulk_create(runs)
+        Job.objects.using(using).bulk_update(rescheduled, ["next_run_at"])
+    return runs
+
+
+class Scheduler:
+    """Queues due runs every ``interval`` seconds until stopped."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, batch_size=None, max_queued=None):
+        self.interval = interval
+        self.batch_size = batch_size or settings.SCRAPER_SCHEDULE_BATCH
+        self.max_queued = max_queued
+        self.queued = 0
+        self.reaped = 0
+        self._stopping = False
+
+    def stop(self):
+        self._stopping = True
+
+    def tick(self):
+        """Queue the runs due now; return how many were queued."""
+        close_old_connections()
+        self.reaped += len(reap_stale_runs())
+        runs = schedule_due_runs(batch_size=self.batch_size, max_queued=self.max_queued)
+        self.queued += len(runs)
+        return len(runs)
+
+    def run(self):
+        while not self._stopping:
+            try:
+                # A full batch may mean more jobs are due; go again at once.
+                if self.tick() >= self.batch_size:
+                    continue
+            except DatabaseError:
+                logger.exception("Scheduler could not queue runs")
+            time.sleep(self.interval)
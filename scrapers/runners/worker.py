@@ -0,0 +1,80 @@
+"""Long-running worker that drains the run queue."""
+
+import logging
+import os
+import socket
+import time
+import traceback
+
+from django.db import DatabaseError, close_old_connections
+
+from scrapers.runners.logs import RunLogWriter
+from scrapers.runners.run_queue import Heartbeat, claim_runs, finish_run
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Worker:
+    """Claims queued runs and executes them one by one.
+
+    A worker claims a run only when it is ready to execute it, so runs it
+    could not start yet stay in the queue for other workers. ``execute`` is
+    called with each claimed run; returning marks the run as
+    ``success`` and raising marks it as ``failure`` with the traceback
+    appended to the run's log. While :meth:`run` goes on, a
+    :class:`~scrapers.runners.run_queue.Heartbeat` renews the worker's claims.
+    """
+
+    def __init__(self, execute=None, worker_id=None, poll_interval=1.0):
+        if execute is None:
+            from scrapers.runners.executor import execute_run as execute
+        self.execute = execute
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._stopping = False
+
+    def stop(self):
+        """Finish the current run, then return from :meth:`run`."""
+        self._stopping = True
+
+    def run_once(self):
+        """Claim and execute a run; return the number of runs handled."""
+        close_old_connections()
+        runs = claim_runs(self.worker_id, limit=1)
+        for run in runs:
+            self._execute(run)
+        return len(runs)
+
+    def run(self, exit_when_empty=False):
+        with Heartbeat(self.worker_id):
+            self._loop(exit_when_empty)
+
+    def _loop(self, exit_when_empty):
+        while not self._stopping:
+            try:
+                if self.run_once():
+                    continue
+            except DatabaseError:
+                # e.g. a lock timeout under contention; back off and retry.
+                logger.exception("Worker %s could not claim runs", self.worker_id)
+            else:
+                if exit_when_empty:
+                    break
+            time.sleep(self.poll_interval)
+
+    def _execute(self, run):
+        try:
+            self.execute(run)
+        except Exception:
+            logger.exception("Run %s failed", run.pk)
+            with RunLogWriter(run) as log:
+                log.write(traceback.format_exc())
+            finish_run(run, "failure")
+        else:
+            finish_run(run, "success")
+        self.processed += 1